@@ -3,26 +3,67 @@ WebSocket Consumer for real-time Chinese tutoring chat.
 Handles connection, message processing, AI response generation, and TTS.
 """
 
+import asyncio
+import base64
 import json
 import logging
 from datetime import datetime
-from typing import Any, Dict, Optional
+from typing import Any, Awaitable, Callable, Coroutine, Dict, List, Optional, Set
+from urllib.parse import parse_qs
 from channels.generic.websocket import AsyncWebsocketConsumer
-from .services.ai_agent import ChineseTutorAgent
-from .services.tts_handler import generate_tts_with_emotion
+from django.conf import settings
+from .services.agent_registry import get_tutor_agent
+from .services.tts_handler import synthesize_with_emotion
+from .services.quiz_grader import grade_quiz
+from .services.intent_router import INTENT_REPEAT, INTENTS, get_intent_router
+from .services.hedging import turn_deadline
+from .services.metrics import QUIZ_ANSWERS
+from .services.audio_frames import (
+    AUDIO_TRANSPORT_BASE64,
+    AUDIO_TRANSPORT_BINARY,
+    AUDIO_TRANSPORTS,
+    encode_audio_frame,
+    new_audio_id,
+)
+from .services.tts_pipeline import SentenceTTSPipeline
+from .services.tracing import NOOP_SPAN, Span, get_tracer
+from .services.metrics import WEBSOCKET_CONNECTIONS
 from .services.redis_client import RedisClient
+from .services.turn_scheduler import TurnScheduler
+from .services.static_lines import (
+    WELCOME_EMOTION,
+    WELCOME_MESSAGE,
+    StaticAudio,
+    get_reset_message,
+    get_routed_reply,
+    get_static_audio,
+    start_prerender,
+)
+from .tasks import summarize_conversation
 from .services.role_mapper import get_agent_role, validate_user_role, is_sulking_enabled
 
 logger = logging.getLogger(__name__)
 
 
 class ChineseTutorConsumer(AsyncWebsocketConsumer):
+    ACTIONS = ("chat", "reset", "get_state", "set_sulking", "answer_quiz")
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
         self.user_id: Optional[str] = None
-        self.ai_agent = ChineseTutorAgent()
+        self.ai_agent = get_tutor_agent()
         self.redis_client = RedisClient()
         self.user_state: Dict[str, Any] = {}
+        self.audio_transport = AUDIO_TRANSPORT_BASE64
+        self.turn_scheduler = TurnScheduler(max_pending=settings.XIAOYUE_TURN_QUEUE_SIZE)
+        self.tracer = get_tracer()
+        self.intent_router = get_intent_router()
+        self.connected = False
+        # Work finishing after its reply was sent (deferred audio, quiz explanations)
+        self.background_tasks: Set[asyncio.Task] = set()
+    
+    @property
+    def binary_audio(self) -> bool:
+        return self.audio_transport == AUDIO_TRANSPORT_BINARY
     
     async def connect(self):
         self.user_id = self.scope.get("url_route", {}).get("kwargs", {}).get("user_id")
@@ -30,50 +71,136 @@ class ChineseTutorConsumer(AsyncWebsocketConsumer):
             self.user_id = self.scope.get("session", {}).get("session_key", "anonymous")
         
         logger.info(f"WebSocket connection attempt for user: {self.user_id}")
+        self.audio_transport = self.negotiate_audio_transport()
+        await start_prerender()
 
         await self.accept()
+        self.connected = True
+        WEBSOCKET_CONNECTIONS.inc()
         try:
             self.user_state = await self.redis_client.get_user_state(self.user_id)
             logger.info(f"User state loaded: {self.user_state}")
 
-            await self.send_json({
+            prerendered = get_static_audio(
+                WELCOME_MESSAGE,
+                WELCOME_EMOTION,
+                self.user_state.get("preferred_voice")
+            )
+            welcome = {
                 "status": "connected",
-                "message": "欢迎回来！小师妹准备好教你中文了~",
-                "user_state": self.user_state
-            })
+                "message": WELCOME_MESSAGE,
+                "user_state": self.user_state,
+                "audio_transport": self.audio_transport
+            }
+            await self.send_with_static_audio(welcome, welcome, prerendered)
         except Exception as e:
             logger.error(f"Error loading user state: {e}")
             await self.send_error("连接失败，请重试")
     
     async def disconnect(self, close_code):
         logger.info(f"WebSocket disconnected for user: {self.user_id}, code: {close_code}")
+        if self.connected:
+            self.connected = False
+            WEBSOCKET_CONNECTIONS.dec()
 
+        # Stop paying for generations nobody will receive
+        await self.turn_scheduler.cancel()
+        for task in list(self.background_tasks):
+            task.cancel()
+        await asyncio.gather(*self.background_tasks, return_exceptions=True)
         await self.redis_client.close()
     
-    async def receive(self, text_data):
+    async def receive(self, text_data=None, bytes_data=None):
+        if text_data is None:
+            await self.send_error("消息格式错误")
+            return
+
+        # One trace per message; queued turns carry it into run_turn
+        trace = self.tracer.start_span("ws.receive", user_id=self.user_id)
+        handed_off = False
         try:
-            data = json.loads(text_data)
+            with self.tracer.span("ws.decode", parent=trace):
+                data = json.loads(text_data)
             action = data.get("action", "chat")
+            if action in self.ACTIONS:
+                trace.update_name(f"ws.{action}")
 
             logger.info(f"Received message from {self.user_id}: action={action}")
 
             if action == "chat":
-                await self.handle_chat_message(data)
+                handed_off = await self.schedule_turn(self.handle_chat_message, data, trace)
             elif action == "reset":
-                await self.handle_reset_conversation(data)
+                handed_off = await self.schedule_turn(self.handle_reset_conversation, data, trace)
             elif action == "get_state":
                 await self.handle_get_state()
             elif action == "set_sulking":
                 await self.handle_set_sulking(data)
+            elif action == "answer_quiz":
+                await self.handle_answer_quiz(data)
             else:
                 await self.send_error(f"Unknown action: {action}")
                 
-        except json.JSONDecodeError:
+        except json.JSONDecodeError as e:
             logger.error("Invalid JSON received")
+            trace.record_error(e)
             await self.send_error("消息格式错误")
         except Exception as e:
             logger.error(f"Error handling message: {e}", exc_info=True)
+            trace.record_error(e)
             await self.send_error("处理消息时出错")
+        finally:
+            if not handed_off:
+                trace.end()
+    
+    async def schedule_turn(
+        self,
+        handler: Callable[[Dict[str, Any]], Awaitable[None]],
+        data: Dict[str, Any],
+        trace: Span = NOOP_SPAN
+    ) -> bool:
+        """
+        Queue a history-changing action behind the in-flight turn, or
+        answer "busy" when the per-connection queue is full.
+        
+        Returns:
+            True if the turn was queued (run_turn then ends ``trace``)
+        """
+        if not self.turn_scheduler.submit(lambda: self.run_turn(handler, data, trace)):
+            logger.warning(f"Turn queue full for {self.user_id}, rejecting message")
+            trace.set_attribute("rejected", "queue_full")
+            await self.send_busy("queue_full")
+            return False
+        return True
+    
+    async def run_turn(
+        self,
+        handler: Callable[[Dict[str, Any]], Awaitable[None]],
+        data: Dict[str, Any],
+        trace: Span = NOOP_SPAN
+    ):
+        """Run one turn while holding the user's cross-worker turn lock."""
+        with self.tracer.use_span(trace):
+            try:
+                with self.tracer.span("redis.turn_lock"):
+                    lock = await self.redis_client.acquire_turn_lock(
+                        self.user_id,
+                        blocking_timeout=settings.XIAOYUE_TURN_LOCK_WAIT
+                    )
+            except Exception as e:
+                logger.warning(f"Turn lock unavailable, running turn unlocked: {e}")
+                lock = None
+            else:
+                if lock is None:
+                    logger.warning(f"Another turn is in progress for {self.user_id}")
+                    trace.set_attribute("rejected", "turn_in_progress")
+                    await self.send_busy("turn_in_progress")
+                    return
+            
+            try:
+                await handler(data)
+            finally:
+                if lock is not None:
+                    await self.redis_client.release_turn_lock(lock)
     
     async def handle_chat_message(self, data: Dict[str, Any]):
         user_message = data.get("message", "").strip()
@@ -82,113 +209,379 @@ class ChineseTutorConsumer(AsyncWebsocketConsumer):
             await self.send_error("消息不能为空")
             return
         
+        # Gemini calls made for this turn must finish by then (see hedging)
+        deadline = turn_deadline()
+        tts_pipeline: Optional[SentenceTTSPipeline] = None
+        audio_bytes: Optional[bytes] = None
+        deferred_audio = False
         try:
+            # Round-trip 1: state, sulking level and history in one pipeline
+            with self.tracer.span("redis.load_context"):
+                turn_context = await self.redis_client.load_turn_context(
+                    self.user_id,
+                    history_limit=20
+                )
+            self.user_state.update(turn_context["state"])
+            state_changed = False
+
             if "user_role" in data:
                 user_role = validate_user_role(data["user_role"])
-                self.user_state["user_role"] = user_role
                 agent_role = get_agent_role(user_role)
-                self.user_state["agent_role"] = agent_role
-                await self.redis_client.set_user_state(self.user_id, self.user_state)
-                
-                logger.info(f"Roles updated: user={user_role}, agent={agent_role}")
+                if (user_role, agent_role) != (self.user_state.get("user_role"), self.user_state.get("agent_role")):
+                    self.user_state["user_role"] = user_role
+                    self.user_state["agent_role"] = agent_role
+                    state_changed = True
+                    
+                    logger.info(f"Roles updated: user={user_role}, agent={agent_role}")
             if "agent_role" not in self.user_state or not self.user_state["agent_role"]:
                 user_role = self.user_state.get("user_role", "Sư huynh")
                 self.user_state["agent_role"] = get_agent_role(user_role)
 
             user_role = self.user_state.get("user_role", "Sư huynh")
             if is_sulking_enabled(user_role):
-                sulking_level = await self.redis_client.get_sulking_level(self.user_id)
+                sulking_level = turn_context["sulking_level"]
             else:
                 sulking_level = 0
             
             self.user_state["sulking_level"] = sulking_level
-            conversation_history = await self.redis_client.get_conversation_history(
-                self.user_id,
-                limit=20
-            )
+            conversation_history = turn_context["history"]
             
             logger.info(f"Processing message with sulking_level={sulking_level}, history_length={len(conversation_history)}")
 
-            await self.send_json({
-                "status": "typing",
-                "message": "小师妹正在思考..."
-            })
+            # Trivial intents are answered from templates without Gemini
+            ai_response = self.route_locally(user_message, user_role, sulking_level, conversation_history)
+
+            if ai_response is None:
+                await self.send_json({
+                    "status": "typing",
+                    "message": "小师妹正在思考..."
+                })
 
             user_role = self.user_state.get("user_role", "Sư huynh")
             agent_role = self.user_state.get("agent_role", "Muội muội")
             
             logger.info(f"Generating response with roles: user={user_role}, agent={agent_role}, sulking={sulking_level}")
             
-            ai_response = await self.ai_agent.generate_response(
-                user_text=user_message,
-                user_role=user_role,
-                agent_role=agent_role,
-                sulking_level=sulking_level,
-                conversation_history=conversation_history
-            )
+            if settings.XIAOYUE_PIPELINED_TTS and ai_response is None:
+                tts_pipeline = SentenceTTSPipeline(
+                    on_chunk=self.send_audio_chunk,
+                    custom_voice=self.user_state.get("preferred_voice"),
+                    binary=self.binary_audio,
+                    text_filter=self.ai_agent.language_validator.filter_sentence,
+                    timeout=settings.XIAOYUE_TTS_TIMEOUT or None
+                )
+
+            if ai_response is not None:
+                logger.info(f"Answered {self.user_id} locally: {ai_response['thought']}")
+            elif settings.XIAOYUE_STREAM_RESPONSES:
+                ai_response = await self.stream_ai_response(
+                    tts_pipeline=tts_pipeline,
+                    user_text=user_message,
+                    user_role=user_role,
+                    agent_role=agent_role,
+                    sulking_level=sulking_level,
+                    conversation_history=conversation_history,
+                    conversation_summary=turn_context["summary"],
+                    deadline=deadline
+                )
+            else:
+                ai_response = await self.ai_agent.generate_response(
+                    user_text=user_message,
+                    user_role=user_role,
+                    agent_role=agent_role,
+                    sulking_level=sulking_level,
+                    conversation_history=conversation_history,
+                    conversation_summary=turn_context["summary"],
+                    deadline=deadline
+                )
+
+            streamed_content = tts_pipeline.text if tts_pipeline else ""
+            raw_content = ai_response.get("chinese_content", "")
+
+            # Pinyin/Vietnamese/English in chinese_content would be read by the
+            # Chinese voice; streamed sentences were already filtered per sentence
+            with self.tracer.span("response.validate_language"):
+                await self.ai_agent.language_validator.enforce(
+                    ai_response,
+                    regenerate=None if streamed_content else self.ai_agent.regenerate_chinese_content
+                )
 
             chinese_content = ai_response.get("chinese_content", "")
             emotion = ai_response.get("emotion", "neutral")
 
-            if chinese_content:
+            # Audio frames sent after the reply reference it by message_id
+            ai_response["message_id"] = new_audio_id()
 
-                has_chinese = any('\u4e00' <= char <= '\u9fff' for char in chinese_content)
+            # Canned lines (fallback replies) already have pre-rendered audio
+            prerendered = get_static_audio(chinese_content, emotion, self.user_state.get("preferred_voice"))
+            if prerendered and tts_pipeline and not tts_pipeline.text:
+                await tts_pipeline.cancel()
+                tts_pipeline = None
 
-                has_latin = any('a' <= char.lower() <= 'z' for char in chinese_content)
-                has_vietnamese = any(char in 'áàảãạăắằẳẵặâấầẩẫậéèẻẽẹêếềểễệíìỉĩịóòỏõọôốồổỗộơớờởỡợúùủũụưứừửữựýỳỷỹỵđ' for char in chinese_content)
-                
-                if not has_chinese or has_latin or has_vietnamese:
-                    logger.error(f"   AI RETURNED WRONG LANGUAGE in chinese_content!")
-                    logger.error(f"   Content: {chinese_content[:100]}")
-                    logger.error(f"   has_chinese={has_chinese}, has_latin={has_latin}, has_vietnamese={has_vietnamese}")
-                    logger.error(f"   User role: {user_role}, Agent role: {agent_role}")
-                    logger.error("   This MUST be fixed! TTS will sound wrong!")
-            
-            audio_base64 = await generate_tts_with_emotion(
-                text=chinese_content,
-                emotion=emotion,
-                custom_voice=self.user_state.get("preferred_voice")
-            )
-            
-            if audio_base64:
-                ai_response["audio_base64"] = audio_base64
-            else:
-                logger.warning("TTS generation failed, sending response without audio")
+            if tts_pipeline:
+                if not tts_pipeline.text:
+                    # Nothing was streamed (non-streaming mode or fallback reply)
+                    tts_pipeline.emotion = emotion
+                    tts_pipeline.feed(chinese_content)
+                elif streamed_content != raw_content:
+                    logger.warning("Streamed chinese_content differs from final response")
+
+                # Audio follows as ordered "audio_chunk" frames
+                ai_response["audio_base64"] = None
+                ai_response["audio_chunks"] = tts_pipeline.flush()
+            elif settings.XIAOYUE_DEFERRED_AUDIO and not prerendered and chinese_content:
+                # Text goes out now; audio follows as "audio_ready"/"audio_failed"
                 ai_response["audio_base64"] = None
+                ai_response["audio_pending"] = True
+                deferred_audio = True
+            else:
+                if prerendered:
+                    audio_bytes = prerendered.audio
+                else:
+                    try:
+                        audio_bytes = await self.synthesize_reply(chinese_content, emotion)
+                    except asyncio.TimeoutError:
+                        audio_bytes = None
+                if not audio_bytes:
+                    logger.warning("TTS generation failed, sending response without audio")
+
+                if self.binary_audio:
+                    # Audio follows the success frame as one binary frame
+                    ai_response["audio_base64"] = None
+                    ai_response["audio_id"] = new_audio_id() if audio_bytes else None
+                else:
+                    if prerendered:
+                        ai_response["audio_base64"] = prerendered.base64
+                    elif audio_bytes:
+                        ai_response["audio_base64"] = base64.b64encode(audio_bytes).decode("utf-8")
+                    else:
+                        ai_response["audio_base64"] = None
+                    audio_bytes = None
 
             ai_response["sulking_level"] = sulking_level
             ai_response["timestamp"] = datetime.utcnow().isoformat() + "Z"
 
-            await self.redis_client.add_to_conversation_history(
-                self.user_id,
-                {
+            # Token counts are stored with each entry so later turns can pack
+            # history into the prompt budget without re-counting
+            user_entry, assistant_entry = await asyncio.gather(
+                self.ai_agent.token_counter.annotate({
                     "role": "user",
                     "content": user_message,
                     "timestamp": datetime.utcnow().isoformat()
-                }
-            )
-            
-            await self.redis_client.add_to_conversation_history(
-                self.user_id,
-                {
+                }),
+                self.ai_agent.token_counter.annotate({
                     "role": "assistant",
                     "content": chinese_content,
                     "emotion": emotion,
+                    # Tells the intent router a quiz or correction awaits an answer
+                    "action": ai_response.get("action", "none"),
+                    # Kept so a "say that again" can be answered from history
+                    "vietnamese_display": ai_response.get("vietnamese_display", ""),
+                    "pinyin": ai_response.get("pinyin", ""),
                     "timestamp": datetime.utcnow().isoformat()
-                }
+                })
             )
 
-            await self.send_json({
-                "status": "success",
-                "data": ai_response
-            })
+            # Round-trip 2: both history entries (+ state if roles changed) in one MULTI
+            with self.tracer.span("redis.commit_turn"):
+                await self.redis_client.commit_turn(
+                    self.user_id,
+                    user_message=user_entry,
+                    assistant_message=assistant_entry,
+                    state=self.user_state if state_changed else None,
+                    quiz_list=ai_response.get("quiz_list") if ai_response.get("action") == "quiz" else None
+                )
+
+            with self.tracer.span("ws.send"):
+                await self.send_json({
+                    "status": "success",
+                    "data": ai_response
+                })
+
+            with self.tracer.span("tts.drain"):
+                if tts_pipeline:
+                    await tts_pipeline.finish()
+                elif audio_bytes:
+                    await self.send_audio_frame({"audio_id": ai_response["audio_id"]}, audio_bytes)
+
+            if deferred_audio:
+                self.spawn_background(
+                    self.deliver_audio(ai_response["message_id"], chinese_content, emotion)
+                )
             
             logger.info(f"Response sent successfully to {self.user_id}")
             
+            self.maybe_summarize_history(len(conversation_history) + 2)
+            
+        except asyncio.CancelledError:
+            logger.info(f"Chat turn cancelled for {self.user_id}")
+            if tts_pipeline:
+                await tts_pipeline.cancel()
+            raise
         except Exception as e:
             logger.error(f"Error in handle_chat_message: {e}", exc_info=True)
+            if tts_pipeline:
+                await tts_pipeline.cancel()
             await self.send_error("处理消息时出错，请稍后重试")
     
+    def route_locally(
+        self,
+        user_message: str,
+        user_role: str,
+        sulking_level: int,
+        conversation_history: List[Dict[str, Any]]
+    ) -> Optional[Dict[str, Any]]:
+        """
+        Answer a trivial intent (greeting, thanks, goodbye, repeat, quiz
+        request) from the role's templates.
+        
+        Returns:
+            A reply shaped like Gemini's, or None to ask Gemini
+        """
+        # A sulking tutor's mood is the model's job
+        if sulking_level >= 2:
+            return None
+        
+        last_reply = next(
+            (entry for entry in reversed(conversation_history) if entry.get("role") == "assistant"),
+            None
+        )
+        allowed = INTENTS if last_reply else tuple(i for i in INTENTS if i != INTENT_REPEAT)
+        
+        with self.tracer.span("intent.route") as span:
+            decision = self.intent_router.route(user_message, self.user_id, allowed=allowed, previous=last_reply)
+            if decision is None:
+                return None
+            span.set_attribute("intent", decision.intent)
+            span.set_attribute("source", decision.source)
+        
+        if decision.intent == INTENT_REPEAT:
+            return {
+                "thought": f"Answered locally (intent: {INTENT_REPEAT})",
+                "chinese_content": last_reply.get("content", ""),
+                "vietnamese_display": last_reply.get("vietnamese_display", ""),
+                "pinyin": last_reply.get("pinyin", ""),
+                "emotion": last_reply.get("emotion", "neutral"),
+                "action": "none",
+                "quiz_list": []
+            }
+        return get_routed_reply(user_role, decision.intent, rotation=len(conversation_history) // 2)
+    
+    def spawn_background(self, coro: Coroutine[Any, Any, None]):
+        """Run ``coro`` past the current message; it is cancelled on disconnect."""
+        task = asyncio.create_task(coro)
+        self.background_tasks.add(task)
+        task.add_done_callback(self.background_tasks.discard)
+    
+    async def synthesize_reply(self, text: str, emotion: str) -> Optional[bytes]:
+        """
+        Synthesize a whole reply in the user's voice.
+        
+        Raises:
+            asyncio.TimeoutError: after XIAOYUE_TTS_TIMEOUT seconds
+        """
+        try:
+            return await asyncio.wait_for(
+                synthesize_with_emotion(
+                    text=text,
+                    emotion=emotion,
+                    custom_voice=self.user_state.get("preferred_voice")
+                ),
+                timeout=settings.XIAOYUE_TTS_TIMEOUT or None
+            )
+        except asyncio.TimeoutError:
+            logger.warning(f"TTS timed out after {settings.XIAOYUE_TTS_TIMEOUT}s for {self.user_id}")
+            raise
+    
+    async def deliver_audio(self, message_id: str, text: str, emotion: str):
+        """
+        Synthesize the audio of a reply whose text was already sent and push
+        it as an "audio_ready" frame (Base64 inline, or an audio_id followed
+        by a binary frame), or "audio_failed" with the reason.
+        """
+        try:
+            try:
+                audio_bytes = await self.synthesize_reply(text, emotion)
+                reason = "tts_failed"
+            except asyncio.TimeoutError:
+                audio_bytes, reason = None, "timeout"
+
+            if not audio_bytes:
+                await self.send_json({
+                    "status": "audio_failed",
+                    "data": {"message_id": message_id, "reason": reason}
+                })
+                return
+
+            data: Dict[str, Any] = {"message_id": message_id}
+            if self.binary_audio:
+                data.update(audio_base64=None, audio_id=new_audio_id())
+            else:
+                data["audio_base64"] = base64.b64encode(audio_bytes).decode("utf-8")
+            await self.send_json({"status": "audio_ready", "data": data})
+            if self.binary_audio:
+                await self.send_audio_frame({"audio_id": data["audio_id"]}, audio_bytes)
+        except Exception as e:
+            logger.error(f"Error delivering audio for message {message_id}: {e}", exc_info=True)
+    
+    def maybe_summarize_history(self, history_length: int):
+        """Queue the rolling summary task once history is long enough."""
+        if not settings.XIAOYUE_SUMMARY_ENABLED:
+            return
+        if history_length < settings.XIAOYUE_SUMMARY_TRIGGER_MESSAGES:
+            return
+        # Publishing to the broker is blocking I/O; don't hold up the next turn on it
+        future = asyncio.get_running_loop().run_in_executor(
+            None,
+            lambda: summarize_conversation.apply_async(args=[self.user_id], retry=False)
+        )
+        future.add_done_callback(self._log_summary_enqueue_error)
+    
+    def _log_summary_enqueue_error(self, future: asyncio.Future):
+        if not future.cancelled() and future.exception():
+            logger.warning(f"Could not queue conversation summary for {self.user_id}: {future.exception()}")
+    
+    async def stream_ai_response(
+        self,
+        tts_pipeline: Optional[SentenceTTSPipeline] = None,
+        **kwargs
+    ) -> Dict[str, Any]:
+        """
+        Run the agent in streaming mode, forwarding field deltas as
+        "partial" frames. chinese_content deltas also feed the TTS
+        pipeline so synthesis starts before generation finishes.
+        Returns the final parsed response.
+        """
+        ai_response: Dict[str, Any] = {}
+
+        async for event in self.ai_agent.stream_response(**kwargs):
+            if event["type"] == "field":
+                if event["field"] == "emotion" and tts_pipeline:
+                    tts_pipeline.emotion = event["value"]
+            elif event["type"] == "delta":
+                if event["field"] == "chinese_content" and tts_pipeline:
+                    tts_pipeline.feed(event["delta"])
+                await self.send_json({
+                    "status": "partial",
+                    "data": {
+                        "field": event["field"],
+                        "delta": event["delta"]
+                    }
+                })
+            elif event["type"] == "restart":
+                # The reply is being redone on the pro model; the client
+                # drops what it was shown and the audio starts over
+                if tts_pipeline:
+                    await tts_pipeline.reset()
+                await self.send_json({
+                    "status": "partial_reset",
+                    "data": {"reason": event["reason"]}
+                })
+            elif event["type"] == "final":
+                ai_response = event["data"]
+
+        return ai_response
+
     async def handle_reset_conversation(self, data: Dict[str, Any] = None):
         try:
             # 1. Cập nhật Role nếu Frontend gửi lên (Logic cũ)
@@ -208,74 +601,14 @@ class ChineseTutorConsumer(AsyncWebsocketConsumer):
             # Quy định: Nếu level >= 2 thì coi là đang dỗi (muội có thể chỉnh số này)
             is_sulking = current_sulking_level >= 2
 
-            # 3. Định nghĩa kịch bản lời thoại (Chia làm 2 thái cực: Normal & Sulking)
-            reset_messages = {
-                "Sư huynh": {
-                    "normal": {
-                        "chinese": "既然师兄想重新开始，那师妹就陪你多练几次吧。",
-                        "vietnamese": "Được thôi, nếu sư huynh muốn bắt đầu lại, muội sẽ cùng luyện tập với huynh thêm lần nữa.",
-                        "pinyin": "Jìrán shīxiōng xiǎng chóngxīn kāishǐ, nà shīmèi jiù péi nǐ duō liàn jǐ cì ba.",
-                        "emotion": "happy"
-                    },
-                    "sulking": {
-                        "chinese": "哼！怎么什么都忘了？真是拿你没办法。好吧，最后再教你一次！",
-                        "vietnamese": "Hừ! Sao cái gì cũng quên hết vậy? Thật hết cách với huynh. Được rồi, muội dạy lại lần cuối đấy nhé!",
-                        "pinyin": "Heng! Zěnme shénme dōu wàng le? Zhēnshi ná nǐ méi bànfǎ. Hǎo ba, zuìhòu zài jiāo nǐ yīcì!",
-                        "emotion": "sulking"
-                    }
-                },
-                "Tỷ tỷ": {
-                    "normal": {
-                        "chinese": "好的姐姐，我们重新来过。这次小月会讲慢一点的。",
-                        "vietnamese": "Vâng ạ tỷ tỷ, chúng ta bắt đầu lại nhé. Lần này Tiểu Nguyệt sẽ giảng chậm hơn một chút.",
-                        "pinyin": "Hǎo de jiějie, wǒmen chóngxīn láiguò. Zhècì Xiǎoyuè huì jiǎng màn yīdiǎn de.",
-                        "emotion": "happy"
-                    },
-                    "sulking": {
-                        "chinese": "哎，姐姐刚才还不理人家呢... 好吧，都听姐姐的，重新开始。",
-                        "vietnamese": "Haizz, nãy tỷ tỷ còn chẳng thèm để ý muội... Thôi được, nghe theo tỷ hết, chúng ta làm lại nào.",
-                        "pinyin": "Ai, jiějie gāngcái hái bù lǐ rénjia ne... Hǎo ba, dōu tīng jiějie de, chóngxīn kāishǐ.",
-                        "emotion": "sad"
-                    }
-                },
-                
-                # ===> ĐỆ ĐỆ (Ác Ma Tỷ Tỷ): Dùng "Ta - Đệ/Ngươi" <===
-                "Đệ đệ": {
-                    "normal": {
-                        "chinese": "怎么？觉得难就想把进度清零？真是没耐心的弟弟。行吧，重新来，这次给我专心点。",
-                        "vietnamese": "Sao? Thấy khó là muốn xóa sạch làm lại à? Đúng là đệ đệ thiếu kiên nhẫn. Được thôi, lại từ đầu, lần này tập trung vào cho ta.",
-                        "pinyin": "Zěnme? Juéde nán jiù xiǎng bǎ jìndù qīnglíng? Zhēnshi méi nàixīn de dìdì. Xíng ba, chóngxīn lái, zhècì gěi wǒ zhuānxīn diǎn.",
-                        "emotion": "smug"
-                    },
-                    "sulking": {
-                        "chinese": "呵，以为按个重置键就能逃避挨骂了？想得美！给我坐好，魔鬼特训现在开始！",
-                        "vietnamese": "Hơ, tưởng ấn nút reset là trốn được vụ bị mắng hả? Mơ đi! Ngồi ngay ngắn vào, khóa huấn luyện địa ngục của ta bắt đầu ngay bây giờ!",
-                        "pinyin": "Hē, yǐwéi àn gè chóngzhì jiàn jiù néng táobì áimà le? Xiǎng de měi! Gěi wǒ zuòhǎo, móguǐ tèxùn xiànzài kāishǐ!",
-                        "emotion": "angry"
-                    }
-                },
-                
-                # ===> MUỘI MUỘI (Hiền Hậu Tỷ Tỷ): Dùng "Tỷ - Muội" <===
-                "Muội muội": {
-                    "normal": {
-                        "chinese": "没关系妹妹，熟能生巧嘛。我们再把基础巩固一下！",
-                        "vietnamese": "Không sao đâu muội muội, trăm hay không bằng tay quen mà. Tỷ muội ta cùng củng cố lại kiến thức nhé!",
-                        "pinyin": "Méiguānxi mèimei, shúnéngshēngqiǎo ma. Wǒmen zài bǎ jīchǔ gǒnggù yīxià!",
-                        "emotion": "happy"
-                    },
-                    "sulking": {
-                        "chinese": "哼，刚才叫你听讲你不听。现在知道难了吧？好吧，姐姐再带你过一遍。",
-                        "vietnamese": "Hừ, nãy bảo nghe giảng thì không nghe. Giờ thấy khó rồi chứ gì? Được rồi, tỷ sẽ dẫn muội đi lại một lượt nữa.",
-                        "pinyin": "Heng, gāngcái jiào nǐ tīngjiǎng nǐ bù tīng. Xiànzài zhīdào nán le ba? Hǎo ba, jiějie zài dài nǐ guò yībiàn.",
-                        "emotion": "sulking"
-                    }
-                }
-            }
-
-            # 4. Chọn nội dung dựa trên Role và Mood
+            # 3-4. Chọn lời thoại dựa trên Role và Mood (kịch bản cố định trong static_lines)
             mood_key = "sulking" if is_sulking else "normal"
-            role_data = reset_messages.get(current_user_role, reset_messages["Sư huynh"])
-            message_content = role_data.get(mood_key, role_data["normal"])
+            message_content = get_reset_message(current_user_role, is_sulking)
+            prerendered = get_static_audio(
+                message_content["chinese"],
+                message_content["emotion"],
+                self.user_state.get("preferred_voice")
+            )
 
             # 5. BÂY GIỜ MỚI THỰC SỰ RESET DATA
             # (Phải làm sau bước chọn tin nhắn, nhưng trước khi gửi response cuối cùng để đảm bảo hệ thống sạch)
@@ -283,20 +616,21 @@ class ChineseTutorConsumer(AsyncWebsocketConsumer):
             await self.redis_client.set_sulking_level(self.user_id, 0)
             
             # 6. Gửi phản hồi về Client
-            await self.send_json({
-                "status": "success",
-                "message": "对话已重置",
-                "data": {
-                    "thought": f"User ({current_user_role}) requested reset. Previous mood: {mood_key}.",
-                    "chinese_content": message_content["chinese"],
-                    "vietnamese_display": message_content["vietnamese"],
-                    "pinyin": message_content["pinyin"],
-                    # Emotion này sẽ điều khiển avatar hiển thị lúc nói câu "Hừ!"
-                    "emotion": message_content["emotion"], 
-                    "action": "reset_ui",
-                    "quiz_list": []
-                }
-            })
+            reset_data = {
+                "thought": f"User ({current_user_role}) requested reset. Previous mood: {mood_key}.",
+                "chinese_content": message_content["chinese"],
+                "vietnamese_display": message_content["vietnamese"],
+                "pinyin": message_content["pinyin"],
+                # Emotion này sẽ điều khiển avatar hiển thị lúc nói câu "Hừ!"
+                "emotion": message_content["emotion"], 
+                "action": "reset_ui",
+                "quiz_list": []
+            }
+            await self.send_with_static_audio(
+                {"status": "success", "message": "对话已重置", "data": reset_data},
+                reset_data,
+                prerendered
+            )
             
             logger.info(f"Conversation reset for user {self.user_id} (Role: {current_user_role}, Was Sulking: {is_sulking})")
             
@@ -337,9 +671,137 @@ class ChineseTutorConsumer(AsyncWebsocketConsumer):
             logger.error(f"Error setting sulking level: {e}")
             await self.send_error("设置失败")
     
+    async def handle_answer_quiz(self, data: Dict[str, Any]):
+        """
+        Grade answers to the latest quiz locally, without calling Gemini, and
+        send a "quiz_result" frame. With "explain": true the wrong items get
+        one batched explanation afterwards as a "quiz_explanation" frame.
+        """
+        answers = data.get("answers")
+        if not isinstance(answers, (dict, list)):
+            await self.send_error("答案格式错误")
+            return
+        
+        try:
+            with self.tracer.span("redis.load_quiz"):
+                quiz_list = await self.redis_client.get_quiz_set(self.user_id)
+        except Exception as e:
+            logger.error(f"Error loading quiz: {e}")
+            await self.send_error("获取测验失败")
+            return
+        if not quiz_list:
+            await self.send_error("现在没有测验哦~")
+            return
+        
+        with self.tracer.span("quiz.grade", items=len(quiz_list)) as span:
+            grade = grade_quiz(quiz_list, answers)
+            span.set_attribute("score", grade["score"])
+        for result in grade["results"]:
+            QUIZ_ANSWERS.labels(match=result["match"] or ("wrong" if result["answer"] else "blank")).inc()
+        
+        wrong_items = [
+            {**item, "given": result["answer"]}
+            for item, result in zip(quiz_list, grade["results"])
+            if not result["correct"]
+        ]
+        explain = bool(data.get("explain") and wrong_items and settings.XIAOYUE_QUIZ_EXPLANATIONS)
+        grade["explanation_pending"] = explain
+        
+        await self.send_json({
+            "status": "quiz_result",
+            "data": grade
+        })
+        if explain:
+            self.spawn_background(self.explain_quiz(wrong_items))
+        
+        logger.info(f"Quiz graded for {self.user_id}: {grade['score']}/{grade['total']}")
+    
+    async def explain_quiz(self, wrong_items: List[Dict[str, Any]]):
+        """Send the batched explanation of wrong quiz items (empty if Gemini failed)."""
+        try:
+            explanations = await self.ai_agent.explain_quiz_mistakes(
+                wrong_items,
+                user_role=self.user_state.get("user_role", "Sư huynh")
+            )
+            await self.send_json({
+                "status": "quiz_explanation",
+                "data": {
+                    "explanations": explanations
+                }
+            })
+        except Exception as e:
+            logger.error(f"Error explaining quiz for {self.user_id}: {e}", exc_info=True)
+    
+    def negotiate_audio_transport(self) -> str:
+        """
+        Pick the audio transport from the ``audio`` query parameter
+        (``?audio=binary``), falling back to Base64 in JSON.
+        """
+        query = parse_qs(self.scope.get("query_string", b"").decode("utf-8"))
+        requested = query.get("audio", [AUDIO_TRANSPORT_BASE64])[0]
+
+        if requested not in AUDIO_TRANSPORTS:
+            return AUDIO_TRANSPORT_BASE64
+        if requested == AUDIO_TRANSPORT_BINARY and not settings.XIAOYUE_BINARY_AUDIO:
+            return AUDIO_TRANSPORT_BASE64
+        return requested
+
+    async def send_audio_chunk(self, chunk: Dict[str, Any]):
+        if "audio_bytes" not in chunk:
+            await self.send_json({
+                "status": "audio_chunk",
+                "data": chunk
+            })
+            return
+
+        audio_bytes = chunk.pop("audio_bytes")
+        chunk["audio_id"] = new_audio_id() if audio_bytes else None
+        await self.send_json({
+            "status": "audio_chunk",
+            "data": chunk
+        })
+        if audio_bytes:
+            await self.send_audio_frame({"audio_id": chunk["audio_id"], "seq": chunk["seq"]}, audio_bytes)
+
+    async def send_audio_frame(self, header: Dict[str, Any], audio_bytes: bytes):
+        await self.send(bytes_data=encode_audio_frame(header, audio_bytes))
+
+    async def send_with_static_audio(
+        self,
+        content: Dict[str, Any],
+        audio_fields: Dict[str, Any],
+        prerendered: Optional[StaticAudio]
+    ):
+        """
+        Send a frame for a fixed line with its pre-rendered audio added to
+        ``audio_fields`` (the frame itself or its "data"): inline Base64,
+        or an audio_id followed by a binary frame.
+        """
+        audio_id = None
+        if prerendered is None:
+            audio_fields["audio_base64"] = None
+        elif self.binary_audio:
+            audio_id = new_audio_id()
+            audio_fields.update(audio_base64=None, audio_id=audio_id)
+        else:
+            audio_fields["audio_base64"] = prerendered.base64
+
+        await self.send_json(content)
+        if audio_id:
+            await self.send_audio_frame({"audio_id": audio_id}, prerendered.audio)
+
     async def send_json(self, content: Dict[str, Any]):
         await self.send(text_data=json.dumps(content, ensure_ascii=False))
     
+    async def send_busy(self, reason: str):
+        await self.send_json({
+            "status": "busy",
+            "message": "小师妹还在回答上一条消息，请稍等~",
+            "data": {
+                "reason": reason
+            }
+        })
+    
     async def send_error(self, error_message: str):
         await self.send_json({
             "status": "error",
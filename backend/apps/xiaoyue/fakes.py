@@ -0,0 +1,242 @@
+"""
+Local stand-ins for external services.
+FakeGeminiClient mimics the parts of google.genai.Client the agent uses
+(generate_content, generate_content_stream, count_tokens, cached contents)
+without any network access, and records every call for assertions.
+FakeEdgeTTS replaces edge-tts synthesis (see tts_handler.set_tts_backend).
+Both can simulate latency and failures for load tests.
+"""
+
+import asyncio
+import json
+import logging
+import random
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import Any, Callable, Dict, List, Optional
+from google.genai import errors, types
+
+DEFAULT_FAKE_RESPONSE = {
+    "thought": "Fake Gemini reply",
+    "emotion": "happy",
+    "chinese_content": "师兄好~！我们开始练习吧。",
+    "vietnamese_display": "Chào sư huynh~! Chúng ta bắt đầu luyện tập nhé.",
+    "pinyin": "Shīxiōng hǎo~! Wǒmen kāishǐ liànxí ba.",
+    "action": "none",
+    "quiz_list": [],
+}
+
+
+def _estimate_tokens(text: str) -> int:
+    return max(1, len(text) // 4)
+
+
+def _contents_text(contents: Any) -> str:
+    if isinstance(contents, str):
+        return contents
+    parts = []
+    for content in contents or []:
+        for part in getattr(content, "parts", None) or []:
+            parts.append(getattr(part, "text", "") or "")
+    return "".join(parts)
+
+
+class _FakeCaches:
+    def __init__(self, owner: "FakeGeminiClient"):
+        self.owner = owner
+        self.store: Dict[str, types.CachedContent] = {}
+
+    async def create(self, *, model: str, config: types.CreateCachedContentConfig) -> types.CachedContent:
+        self.owner.calls.append(("caches.create", model))
+        ttl = int(str(config.ttl).rstrip("s"))
+        name = f"cachedContents/fake-{uuid.uuid4().hex[:12]}"
+        cached = types.CachedContent(
+            name=name,
+            model=model,
+            display_name=config.display_name,
+            expire_time=datetime.now(timezone.utc) + timedelta(seconds=ttl),
+        )
+        self.store[name] = cached
+        self.owner.cached_prompts[name] = config.system_instruction or ""
+        return cached
+
+    async def update(self, *, name: str, config: types.UpdateCachedContentConfig) -> types.CachedContent:
+        self.owner.calls.append(("caches.update", name))
+        ttl = int(str(config.ttl).rstrip("s"))
+        cached = self.store[name].model_copy(
+            update={"expire_time": datetime.now(timezone.utc) + timedelta(seconds=ttl)}
+        )
+        self.store[name] = cached
+        return cached
+
+    async def get(self, *, name: str) -> types.CachedContent:
+        return self.store[name]
+
+    async def delete(self, *, name: str):
+        self.store.pop(name, None)
+        self.owner.cached_prompts.pop(name, None)
+
+
+class _FakeModels:
+    def __init__(self, owner: "FakeGeminiClient"):
+        self.owner = owner
+
+    async def generate_content(self, *, model: str, contents: Any, config: Any = None) -> types.GenerateContentResponse:
+        self.owner.calls.append(("generate_content", model))
+        await asyncio.sleep(self.owner.latency)
+        response = self.owner._response(model, contents, config)
+        if self.owner.token_rate:
+            await asyncio.sleep(response.usage_metadata.candidates_token_count / self.owner.token_rate)
+        return response
+
+    async def generate_content_stream(self, *, model: str, contents: Any, config: Any = None):
+        self.owner.calls.append(("generate_content_stream", model))
+        await asyncio.sleep(self.owner.latency)
+        response = self.owner._response(model, contents, config)
+        text = response.text
+        chunk_size = self.owner.stream_chunk_chars
+
+        async def chunks():
+            for start in range(0, len(text), chunk_size):
+                piece = text[start:start + chunk_size]
+                if self.owner.token_rate:
+                    await asyncio.sleep(_estimate_tokens(piece) / self.owner.token_rate)
+                yield self.owner._wrap(piece, response.usage_metadata)
+                await asyncio.sleep(0)
+
+        return chunks()
+
+    async def count_tokens(self, *, model: str, contents: Any, config: Any = None) -> types.CountTokensResponse:
+        self.owner.calls.append(("count_tokens", model))
+        return types.CountTokensResponse(total_tokens=_estimate_tokens(_contents_text(contents)))
+
+
+class _FakeAio:
+    def __init__(self, owner: "FakeGeminiClient"):
+        self.models = _FakeModels(owner)
+        self.caches = _FakeCaches(owner)
+
+    async def aclose(self):
+        pass
+
+
+class FakeGeminiClient:
+    """
+    Drop-in replacement for genai.Client in tests and local runs.
+
+    Args:
+        response: Dict returned as the JSON body (a str is sent as-is), or
+            a callable taking (model, user_text) and returning one
+        latency: Seconds to wait before responding
+        stream_chunk_chars: Characters per streamed chunk
+        token_rate: Output tokens per second (0 = instant)
+        error_rate: Fraction of generate calls failing with a 503
+        seed: Seed for the error draws
+    """
+
+    def __init__(
+        self,
+        response: Optional[Any] = None,
+        latency: float = 0.0,
+        stream_chunk_chars: int = 8,
+        token_rate: float = 0.0,
+        error_rate: float = 0.0,
+        seed: Optional[int] = None
+    ):
+        self.response = response if response is not None else DEFAULT_FAKE_RESPONSE
+        self.latency = latency
+        self.stream_chunk_chars = stream_chunk_chars
+        self.token_rate = token_rate
+        self.error_rate = error_rate
+        self._random = random.Random(seed)
+        self.failures = 0
+        self.calls: List[tuple] = []
+        self.cached_prompts: Dict[str, str] = {}
+        self.usage: List[types.GenerateContentResponseUsageMetadata] = []
+        self.aio = _FakeAio(self)
+
+    def _response(self, model: str, contents: Any, config: Any) -> types.GenerateContentResponse:
+        if self.error_rate and self._random.random() < self.error_rate:
+            self.failures += 1
+            raise errors.ServerError(503, {"error": {"code": 503, "message": "Simulated overload", "status": "UNAVAILABLE"}})
+
+        user_text = _contents_text(contents)
+        body = self.response(model, user_text) if callable(self.response) else self.response
+        text = body if isinstance(body, str) else json.dumps(body, ensure_ascii=False)
+
+        cached_content = getattr(config, "cached_content", None)
+        if cached_content and cached_content not in self.aio.caches.store:
+            raise errors.ClientError(404, {"error": {"code": 404, "message": "CachedContent not found", "status": "NOT_FOUND"}})
+
+        system_instruction = getattr(config, "system_instruction", None) or ""
+        cached_tokens = _estimate_tokens(self.cached_prompts[cached_content]) if cached_content else 0
+        usage = types.GenerateContentResponseUsageMetadata(
+            prompt_token_count=_estimate_tokens(str(system_instruction) + user_text) + cached_tokens,
+            cached_content_token_count=cached_tokens or None,
+            candidates_token_count=_estimate_tokens(text),
+        )
+        self.usage.append(usage)
+        return self._wrap(text, usage)
+
+    @staticmethod
+    def _wrap(text: str, usage: Any = None) -> types.GenerateContentResponse:
+        return types.GenerateContentResponse(
+            candidates=[types.Candidate(content=types.Content(role="model", parts=[types.Part(text=text)]))],
+            usage_metadata=usage,
+        )
+
+
+class FakeEdgeTTS:
+    """
+    Stand-in for edge-tts synthesis, installed with tts_handler.set_tts_backend.
+
+    Args:
+        synthesis_time: Seconds per call
+        audio_bytes: Size of the returned fake MP3
+        error_rate: Fraction of calls failing
+        seed: Seed for the error draws
+    """
+
+    def __init__(
+        self,
+        synthesis_time: float = 0.0,
+        audio_bytes: int = 16 * 1024,
+        error_rate: float = 0.0,
+        seed: Optional[int] = None
+    ):
+        self.synthesis_time = synthesis_time
+        self.audio_bytes = audio_bytes
+        self.error_rate = error_rate
+        self._random = random.Random(seed)
+        self.calls = 0
+        self.failures = 0
+
+    async def __call__(self, text: str, voice: str, rate: str, volume: str) -> bytes:
+        self.calls += 1
+        await asyncio.sleep(self.synthesis_time)
+        if self.error_rate and self._random.random() < self.error_rate:
+            self.failures += 1
+            raise RuntimeError("Simulated edge-tts failure")
+        # MPEG frame sync header so clients treat it as MP3
+        return (b"\xff\xfb" + text.encode("utf-8")).ljust(self.audio_bytes, b"\x00")
+
+
+async def install_fake_upstreams():
+    """
+    Serve with FakeGeminiClient and FakeEdgeTTS when XIAOYUE_FAKE_UPSTREAMS
+    is on (startup hook; benchmark_workers runs servers this way).
+    """
+    from django.conf import settings
+    from .services import tts_handler
+    from .services.agent_registry import set_gemini_client_factory
+
+    if not settings.XIAOYUE_FAKE_UPSTREAMS:
+        return
+
+    logging.getLogger(__name__).warning("XIAOYUE_FAKE_UPSTREAMS is on: Gemini and edge-tts are simulated")
+    gemini = FakeGeminiClient(
+        latency=settings.XIAOYUE_FAKE_GEMINI_LATENCY,
+        token_rate=settings.XIAOYUE_FAKE_GEMINI_TOKEN_RATE
+    )
+    set_gemini_client_factory(lambda: gemini)
+    tts_handler.set_tts_backend(FakeEdgeTTS(synthesis_time=settings.XIAOYUE_FAKE_TTS_TIME))
@@ -0,0 +1,66 @@
+"""
+ASGI lifespan handling for the XiaoYue app.
+Runs registered startup hooks before the worker accepts connections and
+releases shared resources (Gemini HTTP client, Redis pools) on shutdown.
+"""
+
+import logging
+from typing import Awaitable, Callable, List
+from .fakes import install_fake_upstreams
+from .services.agent_registry import close_tutor_agents
+from .services.metrics import mark_worker_dead
+from .services.redis_client import close_connection_pools
+from .services.static_lines import start_prerender, stop_prerender
+
+logger = logging.getLogger(__name__)
+
+Hook = Callable[[], Awaitable[None]]
+
+_startup_hooks: List[Hook] = [install_fake_upstreams, start_prerender]
+_shutdown_hooks: List[Hook] = [stop_prerender, close_tutor_agents, close_connection_pools, mark_worker_dead]
+
+
+def on_startup(hook: Hook) -> Hook:
+    """Register a coroutine function to run at worker startup."""
+    _startup_hooks.append(hook)
+    return hook
+
+
+def on_shutdown(hook: Hook) -> Hook:
+    """Register a coroutine function to run at worker shutdown."""
+    _shutdown_hooks.append(hook)
+    return hook
+
+
+async def run_startup_hooks():
+    for hook in _startup_hooks:
+        await hook()
+
+
+async def run_shutdown_hooks():
+    # Keep going so one failing hook doesn't leak the other resources
+    for hook in _shutdown_hooks:
+        try:
+            await hook()
+        except Exception as e:
+            logger.error(f"Shutdown hook {hook.__name__} failed: {e}", exc_info=True)
+
+
+async def lifespan_app(scope, receive, send):
+    """ASGI application for the "lifespan" scope."""
+    while True:
+        message = await receive()
+
+        if message["type"] == "lifespan.startup":
+            try:
+                await run_startup_hooks()
+            except Exception as e:
+                logger.error(f"Startup failed: {e}", exc_info=True)
+                await send({"type": "lifespan.startup.failed", "message": str(e)})
+                return
+            await send({"type": "lifespan.startup.complete"})
+
+        elif message["type"] == "lifespan.shutdown":
+            await run_shutdown_hooks()
+            await send({"type": "lifespan.shutdown.complete"})
+            return
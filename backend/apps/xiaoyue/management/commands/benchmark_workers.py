@@ -0,0 +1,258 @@
+"""
+Django management command to check that chat throughput scales with workers.
+
+For each worker count it starts `manage.py serve` on a local port with
+Gemini and edge-tts simulated (XIAOYUE_FAKE_UPSTREAMS), drives it over real
+WebSockets from several client processes with zero think time, and reports
+turns/second, speedup and per-worker efficiency. Fake latencies are kept
+small so a single worker is CPU-bound; the command fails when the largest
+worker count falls below --min-efficiency. Redis is the one configured in
+settings; the learners' keys are deleted afterwards.
+
+Usage:
+    python manage.py benchmark_workers
+    python manage.py benchmark_workers --workers 1,2,4,8 --learners 400 --duration 30
+"""
+
+import asyncio
+import json
+import os
+import signal
+import socket
+import subprocess
+import sys
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, List
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from .load_test import LEARNER_MESSAGES, LoadStats, delete_test_users, percentile, run_turn
+
+
+def default_worker_counts() -> str:
+    cores = os.cpu_count() or 1
+    counts = []
+    n = 1
+    while n < cores:
+        counts.append(n)
+        n *= 2
+    counts.append(cores)
+    return ",".join(str(n) for n in counts)
+
+
+async def _drive(url: str, user_ids: List[str], warmup: float, duration: float, timeout: float) -> Dict[str, Any]:
+    """Closed-loop learners; only turns finishing inside the window count."""
+    from websockets.asyncio.client import connect
+    from websockets.exceptions import ConnectionClosed
+
+    stats = LoadStats()
+    window_start = time.monotonic() + warmup
+    window_end = window_start + duration
+    measured: List[float] = []
+
+    async def learner(user_id: str):
+        try:
+            websocket = await connect(f"{url}/ws/chat/{user_id}/?audio=binary", open_timeout=timeout)
+        except Exception:
+            stats.connect_errors += 1
+            return
+
+        async def receive(wait: float) -> Dict[str, Any]:
+            try:
+                message = await asyncio.wait_for(websocket.recv(), wait)
+            except ConnectionClosed:
+                return {"type": "websocket.close"}
+            key = "bytes" if isinstance(message, bytes) else "text"
+            return {"type": "websocket.send", key: message}
+
+        try:
+            welcome = json.loads((await receive(timeout))["text"])
+            if welcome.get("audio_id"):
+                await receive(timeout)
+
+            turn = 0
+            while time.monotonic() < window_end:
+                completed = stats.completed
+                await run_turn(websocket.send, receive, LEARNER_MESSAGES[turn % len(LEARNER_MESSAGES)], timeout, stats)
+                turn += 1
+                if stats.completed > completed and window_start <= time.monotonic() <= window_end:
+                    measured.append(stats.turn_time[-1])
+        except Exception:
+            stats.errors += 1
+        finally:
+            await websocket.close()
+
+    await asyncio.gather(*(learner(user_id) for user_id in user_ids))
+    return {
+        "completed": len(measured),
+        "turn_time": measured,
+        "errors": stats.errors,
+        "timeouts": stats.timeouts,
+        "busy": stats.busy,
+        "connect_errors": stats.connect_errors,
+    }
+
+
+def drive_learners(url: str, user_ids: List[str], warmup: float, duration: float, timeout: float) -> Dict[str, Any]:
+    """Entry point of one client process."""
+    return asyncio.run(_drive(url, user_ids, warmup, duration, timeout))
+
+
+class Command(BaseCommand):
+    help = 'Measure chat throughput per uvicorn worker count with simulated upstreams'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', default=default_worker_counts(),
+                            help='Comma-separated worker counts to compare (default: 1,2,4..cores)')
+        parser.add_argument('--learners', type=int, default=200, help='Concurrent learners (same for every run)')
+        parser.add_argument('--clients', type=int, default=max(1, (os.cpu_count() or 1) // 2),
+                            help='Client processes generating load')
+        parser.add_argument('--duration', type=float, default=20.0, help='Measured seconds per run')
+        parser.add_argument('--warmup', type=float, default=5.0, help='Unmeasured seconds before each run')
+        parser.add_argument('--timeout', type=float, default=30.0, help='Seconds before a turn counts as timed out')
+        parser.add_argument('--port', type=int, default=8765, help='Port for the benchmarked server')
+        parser.add_argument('--gemini-latency', type=float, default=0.02, help='Fake Gemini time to first token (s)')
+        parser.add_argument('--tts-time', type=float, default=0.01, help='Fake edge-tts seconds per synthesis')
+        parser.add_argument('--min-efficiency', type=float, default=0.5,
+                            help='Fail if throughput per worker at the largest count drops below this share of one worker\'s')
+
+    def handle(self, *args, **options):
+        """Run the benchmark."""
+        counts = sorted({int(n) for n in options['workers'].split(',') if n.strip()})
+        if not counts:
+            raise CommandError("--workers needs at least one count")
+
+        self.stdout.write("=" * 60)
+        self.stdout.write(self.style.SUCCESS(
+            f"Worker scaling: {counts} workers, {options['learners']} learners, "
+            f"{options['clients']} client processes, {os.cpu_count()} cores"
+        ))
+        self.stdout.write("=" * 60)
+
+        results = []
+        for workers in counts:
+            result = self.run_one(workers, options)
+            results.append(result)
+            self.stdout.write(
+                f"{workers:>3} workers: {result['throughput']:.1f} turns/s  "
+                f"p50={self.ms(result, 50)}  p95={self.ms(result, 95)}  "
+                f"errors={result['errors']} timeouts={result['timeouts']} busy={result['busy']}"
+            )
+
+        self.report(results, options['min_efficiency'])
+
+    def run_one(self, workers: int, options: Dict[str, Any]) -> Dict[str, Any]:
+        server = self.start_server(workers, options)
+        run_id = uuid.uuid4().hex[:8]
+        user_ids = [f"bench-{run_id}-{i}" for i in range(options['learners'])]
+        try:
+            self.wait_until_listening(options['port'], server)
+            url = f"ws://127.0.0.1:{options['port']}"
+            shards = [user_ids[i::options['clients']] for i in range(options['clients'])]
+            with ProcessPoolExecutor(max_workers=len(shards)) as pool:
+                parts = list(pool.map(
+                    drive_learners,
+                    [url] * len(shards),
+                    shards,
+                    [options['warmup']] * len(shards),
+                    [options['duration']] * len(shards),
+                    [options['timeout']] * len(shards),
+                ))
+        finally:
+            self.stop_server(server)
+            asyncio.run(self.cleanup(user_ids))
+
+        result: Dict[str, Any] = {"workers": workers, "turn_time": []}
+        for key in ("completed", "errors", "timeouts", "busy", "connect_errors"):
+            result[key] = sum(part[key] for part in parts)
+        for part in parts:
+            result["turn_time"].extend(part["turn_time"])
+        result["throughput"] = result["completed"] / options['duration']
+        return result
+
+    def start_server(self, workers: int, options: Dict[str, Any]) -> subprocess.Popen:
+        env = dict(
+            os.environ,
+            XIAOYUE_FAKE_UPSTREAMS="True",
+            XIAOYUE_FAKE_GEMINI_LATENCY=str(options['gemini_latency']),
+            XIAOYUE_FAKE_GEMINI_TOKEN_RATE="0",
+            XIAOYUE_FAKE_TTS_TIME=str(options['tts_time']),
+            # Fake audio must not reach the shared caches, and there is no Celery worker
+            XIAOYUE_TTS_CACHE_ENABLED="False",
+            GEMINI_CONTEXT_CACHE_ENABLED="False",
+            XIAOYUE_SUMMARY_ENABLED="False",
+        )
+        env.pop("PROMETHEUS_MULTIPROC_DIR", None)
+        return subprocess.Popen(
+            [
+                sys.executable, "manage.py", "serve",
+                "--host", "127.0.0.1",
+                "--port", str(options['port']),
+                "--workers", str(workers),
+                "--log-level", "warning",
+            ],
+            cwd=settings.BASE_DIR,
+            env=env,
+            stdout=subprocess.DEVNULL,
+        )
+
+    def wait_until_listening(self, port: int, server: subprocess.Popen, timeout: float = 60.0):
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            if server.poll() is not None:
+                raise CommandError(f"Server exited with code {server.returncode}")
+            try:
+                with socket.create_connection(("127.0.0.1", port), timeout=1):
+                    # The socket is bound before workers finish their startup hooks
+                    time.sleep(2)
+                    return
+            except OSError:
+                time.sleep(0.5)
+        raise CommandError(f"Server did not listen on port {port} within {timeout:.0f}s")
+
+    def stop_server(self, server: subprocess.Popen):
+        server.send_signal(signal.SIGINT)
+        try:
+            server.wait(timeout=30)
+        except subprocess.TimeoutExpired:
+            server.kill()
+            server.wait()
+
+    async def cleanup(self, user_ids: List[str]):
+        from apps.xiaoyue.services.redis_client import close_connection_pools
+
+        try:
+            await delete_test_users(user_ids)
+        finally:
+            await close_connection_pools()
+
+    @staticmethod
+    def ms(result: Dict[str, Any], pct: float) -> str:
+        value = percentile(result["turn_time"], pct)
+        return "n/a" if value is None else f"{value * 1000:.0f}ms"
+
+    def report(self, results: List[Dict[str, Any]], min_efficiency: float):
+        base = results[0]
+        if not base["throughput"]:
+            raise CommandError("No turns completed with the smallest worker count")
+
+        self.stdout.write("\nworkers  turns/s  speedup  efficiency")
+        for result in results:
+            speedup = result["throughput"] / base["throughput"]
+            result["efficiency"] = speedup * base["workers"] / result["workers"]
+            self.stdout.write(
+                f"{result['workers']:>7}  {result['throughput']:>7.1f}  {speedup:>6.2f}x  {result['efficiency']:>9.0%}"
+            )
+
+        largest = results[-1]
+        if largest["workers"] > (os.cpu_count() or 1):
+            self.stdout.write(self.style.WARNING(
+                f"{largest['workers']} workers exceed the {os.cpu_count()} available cores"
+            ))
+        if largest["efficiency"] < min_efficiency:
+            raise CommandError(
+                f"Throughput does not scale: {largest['efficiency']:.0%} efficiency at "
+                f"{largest['workers']} workers (minimum {min_efficiency:.0%})"
+            )
+        self.stdout.write(self.style.SUCCESS("\n✅ Throughput scales across workers"))
@@ -0,0 +1,343 @@
+"""
+Django management command to load-test the chat consumer.
+
+Simulated learners talk to ChineseTutorConsumer in-process while Gemini and
+edge-tts are replaced by local fakes, so no API quota is used. Redis is the
+one configured in settings; the learners' keys are deleted afterwards.
+
+Usage:
+    python manage.py load_test --learners 2000 --turns 3 --ramp 10
+    python manage.py load_test --gemini-latency 0.8 --gemini-token-rate 150 --tts-time 0.4 --binary
+"""
+
+import asyncio
+import json
+import logging
+import time
+import uuid
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+from channels.testing import WebsocketCommunicator
+from django.core.management.base import BaseCommand
+from django.test import override_settings
+from apps.xiaoyue.consumers import ChineseTutorConsumer
+from apps.xiaoyue.fakes import DEFAULT_FAKE_RESPONSE, FakeEdgeTTS, FakeGeminiClient
+from apps.xiaoyue.services import tts_handler
+from apps.xiaoyue.services.agent_registry import close_tutor_agents, set_gemini_client_factory
+from apps.xiaoyue.services.audio_frames import decode_audio_frame
+from apps.xiaoyue.services.intent_router import get_intent_router
+from apps.xiaoyue.services.model_router import get_model_router
+from apps.xiaoyue.services.hedging import get_hedge_policy
+from apps.xiaoyue.services.redis_client import RedisClient, close_connection_pools
+from apps.xiaoyue.services.response_cache import get_response_cache
+from apps.xiaoyue.services.static_lines import FALLBACK_RESPONSES
+
+LEARNER_MESSAGES = [
+    "你好，小师妹！",
+    "我今天想学习怎么点菜。",
+    "这个字怎么读？",
+    "请给我出一个小测验。",
+    "谢谢你，我明白了。",
+]
+
+FALLBACK_LINES = {response["chinese_content"] for response in FALLBACK_RESPONSES.values()}
+
+
+def percentile(values: List[float], pct: float) -> Optional[float]:
+    """Nearest-rank percentile (None for no samples)."""
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = max(1, -(-len(ordered) * pct // 100))
+    return ordered[int(rank) - 1]
+
+
+@dataclass
+class LoadStats:
+    connect_errors: int = 0
+    turns: int = 0
+    completed: int = 0
+    fallbacks: int = 0
+    errors: int = 0
+    busy: int = 0
+    timeouts: int = 0
+    first_frame: List[float] = field(default_factory=list)
+    first_audio: List[float] = field(default_factory=list)
+    turn_time: List[float] = field(default_factory=list)
+
+
+async def run_turn(
+    send: Callable[[str], Awaitable[None]],
+    receive: Callable[[float], Awaitable[Dict[str, Any]]],
+    message: str,
+    timeout: float,
+    stats: LoadStats
+):
+    """
+    Send one message and wait for the reply and all of its audio.
+
+    Args:
+        send: Coroutine function sending a text frame
+        receive: Coroutine function taking a timeout and returning the next
+            ASGI send event ({"type", "text"/"bytes"}); raises
+            asyncio.TimeoutError when nothing arrives in time
+    """
+    stats.turns += 1
+    sent = time.monotonic()
+    deadline = sent + timeout
+    first_frame = first_audio = None
+    success = None
+    chunks_expected = None
+    chunks_seen = 0
+    deferred_pending = False
+    audio_ids: set = set()
+    audio_frames: set = set()
+
+    await send(json.dumps({"action": "chat", "message": message}))
+
+    while True:
+        if success is not None:
+            audio_pending = audio_ids - audio_frames
+            chunks_done = chunks_expected is None or chunks_seen >= chunks_expected
+            if chunks_done and not audio_pending and not deferred_pending:
+                break
+
+        try:
+            output = await receive(max(0.0, deadline - time.monotonic()))
+        except asyncio.TimeoutError:
+            stats.timeouts += 1
+            return
+        now = time.monotonic() - sent
+
+        if output.get("type") == "websocket.close":
+            stats.errors += 1
+            return
+        if output.get("bytes") is not None:
+            header, _ = decode_audio_frame(output["bytes"])
+            audio_frames.add(header.get("audio_id"))
+            first_audio = first_audio if first_audio is not None else now
+            continue
+
+        frame = json.loads(output["text"])
+        status = frame.get("status")
+        if status == "typing":
+            continue
+        first_frame = first_frame if first_frame is not None else now
+
+        if status in ("error", "busy"):
+            if status == "busy":
+                stats.busy += 1
+            else:
+                stats.errors += 1
+            return
+        data = frame.get("data") or {}
+        if status == "audio_chunk":
+            chunks_seen += 1
+            if data.get("audio_id"):
+                audio_ids.add(data["audio_id"])
+            if data.get("audio_base64") and first_audio is None:
+                first_audio = now
+        elif status == "partial_reset":
+            # Sentences of the abandoned flash draft; the pro reply starts again at seq 0
+            chunks_seen = 0
+        elif status in ("audio_ready", "audio_failed"):
+            deferred_pending = False
+            if data.get("audio_id"):
+                audio_ids.add(data["audio_id"])
+            if data.get("audio_base64") and first_audio is None:
+                first_audio = now
+        elif status == "success":
+            success = data
+            chunks_expected = data.get("audio_chunks")
+            deferred_pending = bool(data.get("audio_pending"))
+            if data.get("audio_id"):
+                audio_ids.add(data["audio_id"])
+            if data.get("audio_base64") and first_audio is None:
+                first_audio = now
+
+    stats.completed += 1
+    if success.get("chinese_content") in FALLBACK_LINES:
+        stats.fallbacks += 1
+    stats.first_frame.append(first_frame)
+    stats.turn_time.append(time.monotonic() - sent)
+    if first_audio is not None:
+        stats.first_audio.append(first_audio)
+
+
+async def delete_test_users(user_ids: List[str]):
+    """Delete the chat:* keys the simulated learners created."""
+    client = await RedisClient().get_client()
+    for start in range(0, len(user_ids), 500):
+        keys = [
+            f"chat:{kind}:{user_id}"
+            for user_id in user_ids[start:start + 500]
+            for kind in ("history", "state", "sulking", "summary", "turn_lock", "quiz")
+        ]
+        await client.delete(*keys)
+
+
+class Command(BaseCommand):
+    help = 'Load-test ChineseTutorConsumer with simulated learners and fake Gemini/edge-tts'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--learners', type=int, default=100, help='Concurrent simulated learners')
+        parser.add_argument('--turns', type=int, default=3, help='Chat messages per learner')
+        parser.add_argument('--ramp', type=float, default=5.0, help='Seconds over which learners connect')
+        parser.add_argument('--think-time', type=float, default=1.0, help='Pause between a reply and the next message')
+        parser.add_argument('--timeout', type=float, default=60.0, help='Seconds before a turn counts as timed out')
+        parser.add_argument('--binary', action='store_true', help='Negotiate binary audio frames')
+        parser.add_argument('--gemini-latency', type=float, default=0.5, help='Fake Gemini time to first token (s)')
+        parser.add_argument('--gemini-token-rate', type=float, default=200.0, help='Fake Gemini output tokens per second')
+        parser.add_argument('--gemini-error-rate', type=float, default=0.0, help='Fraction of fake Gemini calls failing')
+        parser.add_argument('--tts-time', type=float, default=0.3, help='Fake edge-tts seconds per synthesis')
+        parser.add_argument('--tts-bytes', type=int, default=16 * 1024, help='Fake MP3 size per synthesis')
+        parser.add_argument('--tts-error-rate', type=float, default=0.0, help='Fraction of fake edge-tts calls failing')
+        parser.add_argument('--tts-cache', action='store_true', help='Keep the in-process TTS cache on')
+        parser.add_argument('--seed', type=int, default=None, help='Seed for simulated failures')
+
+    def handle(self, *args, **options):
+        """Run the load test."""
+        if options['verbosity'] < 2:
+            logging.getLogger('apps.xiaoyue').setLevel(logging.WARNING)
+
+        self.stdout.write("=" * 60)
+        self.stdout.write(self.style.SUCCESS(
+            f"Load test: {options['learners']} learners x {options['turns']} turns"
+        ))
+        self.stdout.write("=" * 60)
+
+        # Fake upstreams must not leak into shared Redis caches, and there is
+        # no Celery worker to summarize
+        with override_settings(
+            GEMINI_CONTEXT_CACHE_ENABLED=False,
+            XIAOYUE_TTS_CACHE_ENABLED=options['tts_cache'],
+            XIAOYUE_TTS_CACHE_REDIS=False,
+            XIAOYUE_SUMMARY_ENABLED=False
+        ):
+            asyncio.run(self.run_load_test(options))
+
+    async def run_load_test(self, options: Dict[str, Any]):
+        counter = iter(range(1, 10 ** 9))
+
+        def respond(model: str, user_text: str) -> Dict[str, Any]:
+            # A different line per reply, so TTS caching doesn't flatter the numbers
+            n = next(counter)
+            return dict(
+                DEFAULT_FAKE_RESPONSE,
+                chinese_content=f"师兄好~！这是第{n}个回答。我们继续练习吧。"
+            )
+
+        gemini = FakeGeminiClient(
+            response=respond,
+            latency=options['gemini_latency'],
+            token_rate=options['gemini_token_rate'],
+            error_rate=options['gemini_error_rate'],
+            seed=options['seed']
+        )
+        tts = FakeEdgeTTS(
+            synthesis_time=options['tts_time'],
+            audio_bytes=options['tts_bytes'],
+            error_rate=options['tts_error_rate'],
+            seed=options['seed']
+        )
+        set_gemini_client_factory(lambda: gemini)
+        tts_handler.set_tts_backend(tts)
+
+        run_id = uuid.uuid4().hex[:8]
+        user_ids = [f"loadtest-{run_id}-{i}" for i in range(options['learners'])]
+        stats = LoadStats()
+        started = time.monotonic()
+
+        try:
+            interval = options['ramp'] / max(1, len(user_ids))
+            await asyncio.gather(*(
+                self.run_learner(user_id, i * interval, options, stats)
+                for i, user_id in enumerate(user_ids)
+            ))
+            elapsed = time.monotonic() - started
+        finally:
+            await delete_test_users(user_ids)
+            set_gemini_client_factory(None)
+            tts_handler.set_tts_backend(None)
+            await close_tutor_agents()
+            await close_connection_pools()
+
+        self.report(stats, elapsed, gemini, tts)
+
+    async def run_learner(self, user_id: str, delay: float, options: Dict[str, Any], stats: LoadStats):
+        await asyncio.sleep(delay)
+
+        query = "audio=binary" if options['binary'] else ""
+        communicator = WebsocketCommunicator(
+            ChineseTutorConsumer.as_asgi(),
+            f"/ws/chat/{user_id}/" + (f"?{query}" if query else "")
+        )
+        communicator.scope["url_route"] = {"kwargs": {"user_id": user_id}}
+        communicator.scope["query_string"] = query.encode()
+
+        try:
+            connected, _ = await communicator.connect(timeout=options['timeout'])
+            if not connected:
+                stats.connect_errors += 1
+                return
+            welcome = json.loads(await communicator.receive_from(timeout=options['timeout']))
+            if welcome.get("audio_id"):
+                await communicator.receive_output(timeout=options['timeout'])
+        except Exception:
+            stats.connect_errors += 1
+            return
+
+        try:
+            for turn in range(options['turns']):
+                message = LEARNER_MESSAGES[turn % len(LEARNER_MESSAGES)]
+                await run_turn(
+                    lambda text: communicator.send_to(text_data=text),
+                    lambda timeout: communicator.receive_output(timeout=timeout),
+                    message,
+                    options['timeout'],
+                    stats
+                )
+                await asyncio.sleep(options['think_time'])
+        finally:
+            await communicator.disconnect()
+
+    def report(self, stats: LoadStats, elapsed: float, gemini: FakeGeminiClient, tts: FakeEdgeTTS):
+        def fmt(values: List[float]) -> str:
+            if not values:
+                return "n/a"
+            return "  ".join(
+                f"p{pct}={percentile(values, pct) * 1000:.0f}ms" for pct in (50, 95, 99)
+            )
+
+        def rate(count: int) -> str:
+            return f"{count} ({count / stats.turns:.1%})" if stats.turns else str(count)
+
+        self.stdout.write(f"\nDuration: {elapsed:.1f}s")
+        self.stdout.write(f"Turns: {stats.turns} sent, {stats.completed} completed, "
+                          f"{stats.completed / elapsed:.1f} turns/s")
+        self.stdout.write(f"Time to first frame: {fmt(stats.first_frame)}")
+        self.stdout.write(f"Time to audio:       {fmt(stats.first_audio)}")
+        self.stdout.write(f"Turn duration:       {fmt(stats.turn_time)}")
+        self.stdout.write(f"Fallback replies: {rate(stats.fallbacks)}")
+        routing = get_intent_router().stats()
+        self.stdout.write(f"Answered without Gemini: {routing['routed']} "
+                          f"(hit rate {routing['hit_rate']:.1%}, XIAOYUE_INTENT_ROUTER_RATE={routing['rate']})")
+        tiers = get_model_router().stats()
+        self.stdout.write(f"Model tiers: {tiers['turns']}  escalated to pro: {tiers['escalations']}")
+        hedging = get_hedge_policy().stats()
+        self.stdout.write(f"Hedged requests: {hedging['hedged']} of {hedging['requests']} "
+                          f"({hedging['hedge_rate']:.1%}, hedge won {hedging['hedge_wins']}), "
+                          f"wasted tokens: {hedging['wasted_tokens']}")
+        response_cache = get_response_cache()
+        if response_cache:
+            cached = response_cache.stats()
+            self.stdout.write(f"Cached replies: {cached['hits']} (hit ratio {cached['hit_ratio']:.1%}, "
+                              f"{cached['skipped']} turns not cacheable)")
+        self.stdout.write(f"Errors: {rate(stats.errors)}  busy: {rate(stats.busy)}  "
+                          f"timeouts: {rate(stats.timeouts)}  connect failures: {stats.connect_errors}")
+        self.stdout.write(f"Fake Gemini: {len(gemini.calls)} calls, {gemini.failures} simulated failures")
+        self.stdout.write(f"Fake edge-tts: {tts.calls} calls, {tts.failures} simulated failures")
+
+        failed = stats.errors + stats.timeouts + stats.connect_errors
+        style = self.style.SUCCESS if not failed else self.style.WARNING
+        self.stdout.write(style(f"\n{'✅' if not failed else '⚠️'} Load test finished"))
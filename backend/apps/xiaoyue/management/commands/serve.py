@@ -0,0 +1,78 @@
+"""
+Django management command to run the production ASGI server.
+
+Starts uvicorn with several worker processes sharing one listening socket,
+using uvloop and httptools when they are installed. Each worker has its own
+Gemini client, Redis pools and admission limits, so per-worker settings
+(REDIS_POOL_MAX_CONNECTIONS, GEMINI_MAX_CONCURRENCY, ...) multiply by the
+worker count.
+
+Usage:
+    python manage.py serve --workers 4 --port 8000
+"""
+
+import importlib.util
+import os
+import shutil
+import tempfile
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+
+def prepare_multiprocess_dir(port: int) -> str:
+    """
+    Point PROMETHEUS_MULTIPROC_DIR at an empty directory before any worker
+    imports prometheus_client (a directory set by the caller is wiped too:
+    samples from a previous run would be added to this one's).
+    """
+    path = os.environ.get("PROMETHEUS_MULTIPROC_DIR") or os.path.join(
+        tempfile.gettempdir(), f"xiaoyue-prometheus-{port}"
+    )
+    shutil.rmtree(path, ignore_errors=True)
+    os.makedirs(path)
+    os.environ["PROMETHEUS_MULTIPROC_DIR"] = path
+    return path
+
+
+class Command(BaseCommand):
+    help = 'Run the ASGI app under uvicorn with multiple workers'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--host', default='0.0.0.0', help='Interface to bind')
+        parser.add_argument('--port', type=int, default=8000, help='Port to bind')
+        parser.add_argument('--workers', type=int, default=settings.UVICORN_WORKERS,
+                            help='Worker processes (default: UVICORN_WORKERS, one per core)')
+        parser.add_argument('--backlog', type=int, default=2048, help='Listen backlog for the shared socket')
+        parser.add_argument('--log-level', default='info', help='uvicorn log level')
+
+    def handle(self, *args, **options):
+        """Start uvicorn (blocks until it exits)."""
+        import uvicorn
+
+        loop = "uvloop" if importlib.util.find_spec("uvloop") else "asyncio"
+        http = "httptools" if importlib.util.find_spec("httptools") else "h11"
+        if settings.XIAOYUE_METRICS_ENABLED and options['workers'] > 1:
+            metrics_dir = prepare_multiprocess_dir(options['port'])
+        else:
+            metrics_dir = None
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Serving on {options['host']}:{options['port']} with {options['workers']} workers "
+            f"(loop={loop}, http={http})"
+        ))
+        if metrics_dir:
+            self.stdout.write(f"Prometheus multiprocess dir: {metrics_dir}")
+
+        uvicorn.run(
+            "config.asgi:application",
+            host=options['host'],
+            port=options['port'],
+            workers=options['workers'],
+            loop=loop,
+            http=http,
+            ws="websockets",
+            lifespan="on",
+            backlog=options['backlog'],
+            proxy_headers=True,
+            log_level=options['log_level'],
+        )
@@ -4,13 +4,16 @@ Contains AI agent, TTS handler, Redis client, and role mapper.
 """
 
 from .ai_agent import ChineseTutorAgent
-from .tts_handler import generate_tts_audio
+from .agent_registry import get_tutor_agent
+from .tts_handler import generate_tts_audio, synthesize_speech
 from .redis_client import RedisClient
 from .role_mapper import get_agent_role, validate_user_role, is_sulking_enabled
 
 __all__ = [
     "ChineseTutorAgent",
+    "get_tutor_agent",
     "generate_tts_audio",
+    "synthesize_speech",
     "RedisClient",
     "get_agent_role",
     "validate_user_role",
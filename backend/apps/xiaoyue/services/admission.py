@@ -0,0 +1,279 @@
+"""
+Admission control for upstream services (Gemini, edge-tts).
+A per-process controller bounds concurrency and request rate with a token
+bucket, queueing callers by priority; an optional Redis counter enforces a
+cluster-wide rate. Callers wait briefly instead of turning traffic spikes
+into upstream 429s.
+"""
+
+import asyncio
+import contextvars
+import heapq
+import itertools
+import logging
+import time
+import weakref
+from contextlib import asynccontextmanager, contextmanager
+from enum import IntEnum
+from typing import Any, AsyncIterator, Dict, Iterator, List, Optional, Tuple
+from django.conf import settings
+from .redis_client import RedisClient
+from .metrics import ADMISSION_REJECTIONS, ADMISSION_WAIT_SECONDS
+
+logger = logging.getLogger(__name__)
+
+
+class Priority(IntEnum):
+    """Lower value is admitted first."""
+    INTERACTIVE = 0  # A learner is waiting on this turn
+    BACKGROUND = 1   # Summaries, pre-rendering, warm-up
+
+
+_current_priority: contextvars.ContextVar[Priority] = contextvars.ContextVar(
+    "admission_priority", default=Priority.INTERACTIVE
+)
+
+
+@contextmanager
+def admission_priority(priority: Priority) -> Iterator[None]:
+    """Run upstream calls made inside the block at the given priority."""
+    token = _current_priority.set(priority)
+    try:
+        yield
+    finally:
+        _current_priority.reset(token)
+
+
+class AdmissionTimeout(Exception):
+    """Raised when a caller waited longer than ``max_wait`` to be admitted."""
+
+
+class AdmissionController:
+    """
+    Concurrency limit + token bucket with a priority queue of waiters.
+
+    Args:
+        name: Service name, used in metrics and Redis keys
+        max_concurrency: Calls allowed in flight at once (0 = unlimited)
+        rate: Calls started per second in this process (0 = unlimited)
+        burst: Token bucket size (defaults to max(1, rate))
+        max_wait: Seconds a caller may queue before AdmissionTimeout
+        cluster_rate: Calls per second across all workers (0 = off)
+        redis_client: Required when cluster_rate is set
+    """
+
+    REDIS_PREFIX = "ratelimit:"
+
+    def __init__(
+        self,
+        name: str,
+        max_concurrency: int = 0,
+        rate: float = 0.0,
+        burst: Optional[float] = None,
+        max_wait: float = 10.0,
+        cluster_rate: int = 0,
+        redis_client: Optional[RedisClient] = None
+    ):
+        self.name = name
+        self.max_concurrency = max_concurrency
+        self.rate = rate
+        self.burst = burst if burst is not None else max(1.0, rate)
+        self.max_wait = max_wait
+        self.cluster_rate = cluster_rate
+        self.redis_client = redis_client
+
+        self._tokens = self.burst
+        self._refilled_at = time.monotonic()
+        self._paused_until = 0.0
+        self._in_flight = 0
+        self._waiters: List[Tuple[int, int, asyncio.Future]] = []
+        self._seq = itertools.count()
+        self._timer: Optional[asyncio.TimerHandle] = None
+
+        self.admitted: Dict[str, int] = {p.name.lower(): 0 for p in Priority}
+        self.timed_out: Dict[str, int] = {p.name.lower(): 0 for p in Priority}
+        self.wait_seconds_total: Dict[str, float] = {p.name.lower(): 0.0 for p in Priority}
+        self.wait_seconds_max: Dict[str, float] = {p.name.lower(): 0.0 for p in Priority}
+        self.throttled = 0
+
+    @asynccontextmanager
+    async def admit(self, priority: Optional[Priority] = None) -> AsyncIterator[None]:
+        """
+        Hold an admission slot for the duration of the block.
+
+        Raises:
+            AdmissionTimeout: If not admitted within max_wait seconds
+        """
+        priority = _current_priority.get() if priority is None else priority
+        await self._acquire(priority)
+        try:
+            yield
+        finally:
+            self._release()
+
+    def throttle(self, seconds: float):
+        """Pause new admissions, e.g. after the upstream answered 429."""
+        self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+        self.throttled += 1
+        logger.warning(f"Admission for {self.name} paused for {seconds}s")
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "name": self.name,
+            "in_flight": self._in_flight,
+            "queued": sum(1 for _, _, f in self._waiters if not f.done()),
+            "max_concurrency": self.max_concurrency,
+            "rate": self.rate,
+            "cluster_rate": self.cluster_rate,
+            "admitted": dict(self.admitted),
+            "timed_out": dict(self.timed_out),
+            "wait_seconds_total": dict(self.wait_seconds_total),
+            "wait_seconds_max": dict(self.wait_seconds_max),
+            "throttled": self.throttled,
+        }
+
+    async def _acquire(self, priority: Priority):
+        label = priority.name.lower()
+        started = time.monotonic()
+        deadline = started + self.max_wait
+
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (int(priority), next(self._seq), future))
+        self._dispatch()
+
+        try:
+            await asyncio.wait_for(future, timeout=self.max_wait)
+        except (asyncio.TimeoutError, asyncio.CancelledError) as e:
+            if future.done() and not future.cancelled():
+                # Admitted just as we gave up; hand the slot back
+                self._release()
+            else:
+                future.cancel()
+            if isinstance(e, asyncio.TimeoutError):
+                self.timed_out[label] += 1
+                ADMISSION_REJECTIONS.labels(service=self.name, priority=label, reason="timeout").inc()
+                raise AdmissionTimeout(f"{self.name}: not admitted within {self.max_wait}s") from None
+            raise
+
+        try:
+            if self.cluster_rate and self.redis_client:
+                await self._acquire_cluster_token(deadline)
+        except AdmissionTimeout:
+            self._release()
+            self.timed_out[label] += 1
+            ADMISSION_REJECTIONS.labels(service=self.name, priority=label, reason="cluster_rate").inc()
+            raise
+        except BaseException:
+            self._release()
+            raise
+        finally:
+            waited = time.monotonic() - started
+            self.wait_seconds_total[label] += waited
+            self.wait_seconds_max[label] = max(self.wait_seconds_max[label], waited)
+            ADMISSION_WAIT_SECONDS.labels(service=self.name, priority=label).observe(waited)
+
+        self.admitted[label] += 1
+
+    def _release(self):
+        self._in_flight -= 1
+        self._dispatch()
+
+    def _dispatch(self):
+        """Admit as many queued callers as concurrency and tokens allow."""
+        now = time.monotonic()
+        if self.rate:
+            self._tokens = min(self.burst, self._tokens + (now - self._refilled_at) * self.rate)
+            self._refilled_at = now
+
+        while self._waiters:
+            _, _, future = self._waiters[0]
+            if future.done():
+                heapq.heappop(self._waiters)
+                continue
+            if self.max_concurrency and self._in_flight >= self.max_concurrency:
+                return  # Woken again by _release
+
+            delay = self._paused_until - now
+            if self.rate and self._tokens < 1:
+                delay = max(delay, (1 - self._tokens) / self.rate)
+            if delay > 0:
+                self._schedule(delay)
+                return
+
+            heapq.heappop(self._waiters)
+            if self.rate:
+                self._tokens -= 1
+            self._in_flight += 1
+            future.set_result(None)
+
+    def _schedule(self, delay: float):
+        if self._timer is not None:
+            self._timer.cancel()
+        self._timer = asyncio.get_running_loop().call_later(delay, self._on_timer)
+
+    def _on_timer(self):
+        self._timer = None
+        self._dispatch()
+
+    async def _acquire_cluster_token(self, deadline: float):
+        """Fixed one-second window counter shared by every worker."""
+        while True:
+            now = time.time()
+            window = int(now)
+            try:
+                client = await self.redis_client.get_client()
+                key = f"{self.REDIS_PREFIX}{self.name}:{window}"
+                async with client.pipeline(transaction=False) as pipe:
+                    pipe.incr(key)
+                    pipe.expire(key, 2)
+                    count, _ = await pipe.execute()
+            except Exception as e:
+                logger.warning(f"Cluster rate limit for {self.name} unavailable: {e}")
+                return
+
+            if count <= self.cluster_rate:
+                return
+
+            wait = window + 1 - now
+            if time.monotonic() + wait > deadline:
+                raise AdmissionTimeout(f"{self.name}: cluster rate limit reached")
+            await asyncio.sleep(wait)
+
+
+# Futures and timers belong to one event loop, so controllers are per loop
+_controllers: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, Dict[str, AdmissionController]]" = (
+    weakref.WeakKeyDictionary()
+)
+
+# Service name -> settings prefix
+ADMISSION_SERVICES = {
+    "gemini": "GEMINI",
+    "edge_tts": "EDGE_TTS",
+}
+
+
+def get_admission_controller(name: str) -> AdmissionController:
+    """Shared controller for a service on the running event loop."""
+    loop = asyncio.get_running_loop()
+    loop_controllers = _controllers.setdefault(loop, {})
+
+    controller = loop_controllers.get(name)
+    if controller is None:
+        prefix = ADMISSION_SERVICES[name]
+        cluster_rate = getattr(settings, f"{prefix}_CLUSTER_RATE_PER_SECOND")
+        controller = AdmissionController(
+            name,
+            max_concurrency=getattr(settings, f"{prefix}_MAX_CONCURRENCY"),
+            rate=getattr(settings, f"{prefix}_RATE_PER_SECOND"),
+            max_wait=getattr(settings, f"{prefix}_ADMISSION_MAX_WAIT"),
+            cluster_rate=cluster_rate,
+            redis_client=RedisClient("cache") if cluster_rate else None
+        )
+        loop_controllers[name] = controller
+    return controller
+
+
+def get_admission_stats() -> List[Dict[str, Any]]:
+    """Stats for every controller on the running event loop."""
+    loop = asyncio.get_running_loop()
+    return [controller.stats() for controller in _controllers.get(loop, {}).values()]
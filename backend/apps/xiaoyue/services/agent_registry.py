@@ -0,0 +1,86 @@
+"""
+Process-level registry of ChineseTutorAgent instances.
+All consumers share one agent (and one bounded HTTP connection pool to the
+Gemini endpoint) per event loop instead of building a client per socket.
+"""
+
+import asyncio
+import logging
+import weakref
+from typing import Any, Callable, Optional
+import httpx
+from google import genai
+from google.genai import types
+from django.conf import settings
+from .ai_agent import ChineseTutorAgent
+
+logger = logging.getLogger(__name__)
+
+# httpx connections are bound to the event loop that opened them, so the
+# registry keeps one agent per loop (a uvicorn worker has exactly one).
+_agents: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, ChineseTutorAgent]" = (
+    weakref.WeakKeyDictionary()
+)
+_http_clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, httpx.AsyncClient]" = (
+    weakref.WeakKeyDictionary()
+)
+
+
+# Optional factory for the Gemini client (load tests install fakes.FakeGeminiClient)
+_client_factory: Optional[Callable[[], Any]] = None
+
+
+def set_gemini_client_factory(factory: Optional[Callable[[], Any]]):
+    """Build agents with ``factory()`` instead of a real genai.Client (None restores it)."""
+    global _client_factory
+    _client_factory = factory
+
+
+def _build_http_client() -> httpx.AsyncClient:
+    """Bounded keep-alive HTTP client shared by every Gemini request."""
+    return httpx.AsyncClient(
+        limits=httpx.Limits(
+            max_connections=settings.GEMINI_HTTP_MAX_CONNECTIONS,
+            max_keepalive_connections=settings.GEMINI_HTTP_MAX_KEEPALIVE,
+            keepalive_expiry=settings.GEMINI_HTTP_KEEPALIVE_EXPIRY
+        ),
+        timeout=httpx.Timeout(settings.GEMINI_HTTP_TIMEOUT)
+    )
+
+
+def get_tutor_agent() -> ChineseTutorAgent:
+    """
+    Get the shared agent for the running event loop, creating it (and its
+    HTTP client) on first use.
+    """
+    loop = asyncio.get_running_loop()
+
+    agent = _agents.get(loop)
+    if agent is None:
+        if _client_factory is not None:
+            agent = ChineseTutorAgent(client=_client_factory())
+            _agents[loop] = agent
+            return agent
+
+        http_client = _build_http_client()
+        client = genai.Client(
+            api_key=settings.GOOGLE_API_KEY,
+            http_options=types.HttpOptions(httpx_async_client=http_client)
+        )
+        agent = ChineseTutorAgent(client=client)
+        _agents[loop] = agent
+        _http_clients[loop] = http_client
+        logger.info("Created shared ChineseTutorAgent for this worker")
+    return agent
+
+
+async def close_tutor_agents():
+    """Close the shared agent and its HTTP client (shutdown hook)."""
+    loop = asyncio.get_running_loop()
+    agent: Optional[ChineseTutorAgent] = _agents.pop(loop, None)
+    http_client = _http_clients.pop(loop, None)
+
+    if agent is not None:
+        await agent.client.aio.aclose()
+    if http_client is not None:
+        await http_client.aclose()
@@ -1,21 +1,62 @@
 """
-AI Agent service using Google Gemini 2.0 Flash Experimental.
+AI Agent service using Google Gemini 2.5 (flash or pro per turn).
 Handles Chinese tutoring with structured output.
 """
 
 import logging
-from typing import Any, Dict, List, Optional
+import time
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
 from google import genai
 from google.genai import types
+from google.genai import errors as genai_errors
 from django.conf import settings
-from .prompts import SYSTEM_PROMPT_TEMPLATE, MAX_HISTORY_TURNS
+from .prompts import (
+    SYSTEM_PROMPT_TEMPLATE,
+    LANGUAGE_FIX_PROMPT_TEMPLATE,
+    QUIZ_EXPLANATION_PROMPT_TEMPLATE,
+    MAX_HISTORY_TURNS,
+)
+from .stream_parser import StreamingJSONFieldParser
+from .response_parser import ResponseParseError, ResponseParser
+from .language_validator import LanguageValidator, classify
+from .prompt_cache import PromptCacheManager
+from .response_cache import get_response_cache
+from .model_router import (
+    PROBLEM_ERROR,
+    PROBLEM_LANGUAGE,
+    PROBLEM_SCHEMA,
+    TIER_FLASH,
+    TIER_PRO,
+    TierDecision,
+    get_model_router,
+)
+from .hedging import (
+    HEDGE_FLASH,
+    BufferedStream,
+    DeadlineExceeded,
+    HedgeCopy,
+    RaceOutcome,
+    get_hedge_policy,
+    race,
+    within,
+)
+from .summarizer import format_summary_turn
+from .token_budget import HistoryPacker, TokenCounter, estimate_tokens
+from .admission import Priority, get_admission_controller
+from .tracing import current_span, get_tracer
+from .metrics import FALLBACK_RESPONSES, TURN_DEADLINES_EXCEEDED, record_gemini_usage, record_history_packing
+from .static_lines import get_fallback_response
+from .redis_client import RedisClient
 
 logger = logging.getLogger(__name__)
 
 
 class ChineseTutorAgent:
     """
-    AI agent for Chinese language tutoring using Gemini 2.0 Flash.
+    AI agent for Chinese language tutoring on Gemini.
+    Each turn goes to the flash or pro tier (model_router), and a flash
+    reply that fails validation is redone on pro; slow requests are
+    hedged within the turn's deadline (hedging).
     Returns structured JSON responses with emotion, content, and actions.
     """
     
@@ -97,31 +138,135 @@ class ChineseTutorAgent:
         required=[
             "thought", "chinese_content", "vietnamese_display",
             "pinyin", "emotion", "action", "quiz_list"
+        ],
+        # emotion first so streaming TTS knows the voice preset before
+        # chinese_content starts arriving
+        property_ordering=[
+            "thought", "emotion", "chinese_content", "vietnamese_display",
+            "pinyin", "action", "correction_detail", "quiz_list"
         ]
     )
     
-    def __init__(self):
-        """Initialize the Gemini client."""
+    # Targeted re-generation of a chinese_content that was not pure Chinese
+    LANGUAGE_FIX_SCHEMA = types.Schema(
+        type=types.Type.OBJECT,
+        properties={
+            "chinese_content": types.Schema(type=types.Type.STRING),
+            "pinyin": types.Schema(type=types.Type.STRING)
+        },
+        required=["chinese_content", "pinyin"]
+    )
+    
+    # One batched explanation per wrongly answered quiz item
+    QUIZ_EXPLANATION_SCHEMA = types.Schema(
+        type=types.Type.OBJECT,
+        properties={
+            "explanations": types.Schema(
+                type=types.Type.ARRAY,
+                items=types.Schema(
+                    type=types.Type.OBJECT,
+                    properties={
+                        "id": types.Schema(type=types.Type.INTEGER),
+                        "explanation": types.Schema(type=types.Type.STRING)
+                    },
+                    required=["id", "explanation"]
+                )
+            )
+        },
+        required=["explanations"]
+    )
+    
+    def __init__(self, client: Optional[genai.Client] = None):
+        """
+        Initialize the Gemini client.
+        
+        Args:
+            client: Shared genai.Client (see agent_registry); a private one
+                is created when omitted
+        """
         self.api_key = settings.GOOGLE_API_KEY
-        self.client = genai.Client(api_key=self.api_key)
-        self.model_name = "gemini-2.5-pro"#"gemini-2.5-flash"
+        self.client = client or genai.Client(api_key=self.api_key)
+        # Each turn picks flash or pro (see model_router); model_name is the
+        # pro tier, also used for token counting
+        self.model_router = get_model_router()
+        self.model_name = self.model_router.pro_model
+        # Requests slower than usual get a second copy (see hedging)
+        self.hedge_policy = get_hedge_policy()
+        
+        # Role x sulking system prompts are uploaded once and reused by handle
+        self.prompt_cache: Optional[PromptCacheManager] = None
+        if settings.GEMINI_CONTEXT_CACHE_ENABLED:
+            self.prompt_cache = PromptCacheManager(
+                self.client,
+                ttl=settings.GEMINI_CONTEXT_CACHE_TTL,
+                redis_client=RedisClient("cache")
+            )
+        
+        # History is packed newest-first into a token budget; entries carry
+        # their own counts, measured once by token_counter at commit time
+        self.token_counter = TokenCounter(
+            self.client,
+            self.model_name,
+            use_api=settings.XIAOYUE_COUNT_TOKENS_API
+        )
+        self.history_packer = HistoryPacker(
+            budget=settings.XIAOYUE_HISTORY_TOKEN_BUDGET,
+            max_messages=MAX_HISTORY_TURNS
+        )
+        
+        self.response_parser = ResponseParser(self.RESPONSE_SCHEMA)
+        # Opt-in: replies to context-free turns are reused (see response_cache)
+        self.response_cache = get_response_cache()
+        self.tracer = get_tracer()
+        self.language_validator = LanguageValidator(settings.XIAOYUE_LANGUAGE_POLICY)
+        self._language_fix_parser = ResponseParser(self.LANGUAGE_FIX_SCHEMA, name="language_fix")
+        self._quiz_explanation_parser = ResponseParser(self.QUIZ_EXPLANATION_SCHEMA, name="quiz_explanation")
+        
+        # Prompt tokens the running summaries have saved versus raw history
+        self.summary_turns = 0
+        self.summary_tokens_saved = 0
     
     def _format_conversation_history(
         self, 
-        conversation_history: List[Dict[str, Any]]
+        conversation_history: List[Dict[str, Any]],
+        conversation_summary: Optional[Dict[str, Any]] = None
     ) -> List[types.Content]:
         """
         Convert Redis conversation history to Gemini format.
         
         Args:
-            conversation_history: List of dicts with 'role' and 'content' keys
+            conversation_history: List of dicts with 'role' and 'content'
+                keys (and 'tokens' once counted), oldest to newest; the newest
+                entries that fit XIAOYUE_HISTORY_TOKEN_BUDGET are sent
+            conversation_summary: Running summary of turns folded out of
+                history; sent first, ahead of the recent turns
             
         Returns:
             List of Gemini Content objects
         """
         formatted_history = []
+        summary_tokens = 0
+        
+        if conversation_summary:
+            summary_text = format_summary_turn(conversation_summary)
+            summary_tokens = conversation_summary.get("summary_tokens") or estimate_tokens(summary_text)
+            formatted_history.append(
+                types.Content(
+                    role="user",
+                    parts=[types.Part(text=summary_text)]
+                )
+            )
+            self._record_summary_savings(conversation_summary)
         
-        for msg in conversation_history[-MAX_HISTORY_TURNS:]:
+        packed = self.history_packer.pack(conversation_history, reserved_tokens=summary_tokens)
+        record_history_packing(packed)
+        span = current_span()
+        if span is not None:
+            span.set_attribute("history_messages", len(packed.messages))
+            span.set_attribute("history_tokens", packed.tokens)
+            span.set_attribute("history_dropped", packed.dropped)
+        
+        for msg in packed.messages:
             role = msg.get("role", "user")
             content = msg.get("content", "")
             
@@ -137,13 +282,444 @@ class ChineseTutorAgent:
         
         return formatted_history
     
+    def _record_summary_savings(self, summary: Dict[str, Any]):
+        saved = summary.get("source_tokens", 0) - summary.get("summary_tokens", 0)
+        self.summary_turns += 1
+        self.summary_tokens_saved += max(saved, 0)
+        logger.info(
+            f"Using conversation summary of {summary.get('messages', 0)} messages: "
+            f"~{saved} prompt tokens saved this turn"
+        )
+
+    async def _build_request(
+        self,
+        user_text: str,
+        user_role: str,
+        agent_role: str,
+        sulking_level: int,
+        conversation_history: Optional[List[Dict[str, Any]]],
+        conversation_summary: Optional[Dict[str, Any]] = None,
+        decision: Optional[TierDecision] = None
+    ) -> Tuple[List[types.Content], types.GenerateContentConfig]:
+        """
+        Build the contents and generation config for a tutoring turn.
+
+        Args:
+            decision: Model tier and thinking budget (default: model_name
+                with the model's default thinking)
+
+        Returns:
+            Tuple of (contents, config) ready for the Gemini API
+        """
+        # Format system prompt with user context
+        system_instruction = SYSTEM_PROMPT_TEMPLATE.format(
+            agent_role=agent_role,
+            user_role=user_role,
+            sulking_level=sulking_level
+        )
+
+        # Prepare conversation history
+        history = []
+        if conversation_history or conversation_summary:
+            history = self._format_conversation_history(
+                conversation_history or [],
+                conversation_summary
+            )
+
+        # Add current user message
+        history.append(
+            types.Content(
+                role="user",
+                parts=[types.Part(text=user_text)]
+            )
+        )
+
+        # Reference the cached system prompt when available
+        model = decision.model if decision else self.model_name
+        cached_content = None
+        if self.prompt_cache:
+            cached_content = await self.prompt_cache.get_handle(model, system_instruction)
+
+        thinking_config = None
+        if decision and decision.thinking_budget is not None:
+            thinking_config = types.ThinkingConfig(thinking_budget=decision.thinking_budget)
+
+        # Configure generation parameters
+        config = types.GenerateContentConfig(
+            temperature=0.9,  # More creative/personality
+            top_p=0.95,
+            top_k=40,
+            max_output_tokens=2048*4,
+            response_mime_type="application/json",
+            response_schema=self.RESPONSE_SCHEMA,
+            system_instruction=None if cached_content else system_instruction,
+            cached_content=cached_content,
+            thinking_config=thinking_config
+        )
+
+        return history, config
+
+    async def _lookup_cached_response(
+        self,
+        user_text: str,
+        user_role: str,
+        agent_role: str,
+        sulking_level: int,
+        conversation_history: Optional[List[Dict[str, Any]]],
+        conversation_summary: Optional[Dict[str, Any]],
+        model: str
+    ) -> Tuple[Optional[str], Optional[Dict[str, Any]]]:
+        """
+        Returns:
+            (cache key or None if the turn is not cacheable, cached reply or None)
+        """
+        if not self.response_cache or not self.response_cache.cacheable(conversation_history, conversation_summary):
+            return None, None
+
+        key = self.response_cache.make_key(user_text, user_role, agent_role, sulking_level, model)
+        with self.tracer.span("response_cache.lookup") as span:
+            cached = await self.response_cache.get(key)
+            span.set_attribute("hit", cached is not None)
+        if cached is not None:
+            logger.info(f"Serving cached reply for: {user_text[:50]}...")
+        return key, cached
+
+    def _parse_reply(self, text: str) -> Tuple[Dict[str, Any], bool]:
+        """
+        Returns:
+            (parsed reply, whether it passed schema validation without defaults)
+        """
+        invalid = self.response_parser.invalid
+        result = self.response_parser.parse(text)
+        return result, self.response_parser.invalid == invalid
+
+    @staticmethod
+    def _reply_problem(result: Dict[str, Any], valid: bool) -> Optional[str]:
+        """What would make a flash reply worth redoing on pro, if anything."""
+        if not valid:
+            return PROBLEM_SCHEMA
+        if classify(result.get("chinese_content", "")).foreign:
+            return PROBLEM_LANGUAGE
+        return None
+
+    def _failed_attempt(
+        self,
+        decision: TierDecision,
+        config: Optional[types.GenerateContentConfig],
+        error: Exception
+    ) -> str:
+        """
+        Classify a request that raised, re-raising it unless the turn can
+        be redone on pro (a missed turn deadline never is).
+        """
+        problem = PROBLEM_SCHEMA if isinstance(error, ResponseParseError) else PROBLEM_ERROR
+        if isinstance(error, DeadlineExceeded) or not self.model_router.can_escalate(decision, problem):
+            raise error
+        logger.warning(f"{decision.model} request failed ({problem}): {error}")
+        self._invalidate_prompt_cache(config, error)
+        self._throttle_if_rate_limited(error)
+        return problem
+
+    def _missed_deadline(
+        self,
+        previous: Optional[Dict[str, Any]],
+        user_text: str,
+        sulking_level: int
+    ) -> Dict[str, Any]:
+        """
+        Reply for a turn whose deadline passed: the flash reply a late pro
+        redo was meant to improve on, else the fallback.
+        """
+        if previous is not None:
+            logger.warning("Pro redo missed the turn deadline, keeping the flash reply")
+            TURN_DEADLINES_EXCEEDED.labels(outcome="kept_previous").inc()
+            return previous
+        logger.warning(f"Gemini missed the turn deadline for: {user_text[:50]}...")
+        TURN_DEADLINES_EXCEEDED.labels(outcome="fallback").inc()
+        return self._get_fallback_response(user_text, sulking_level)
+
+    def _hedge_decisions(self, decision: TierDecision) -> List[TierDecision]:
+        """Tiers of the primary request and of its hedge copy."""
+        if (
+            self.hedge_policy.hedge_tier == HEDGE_FLASH
+            and decision.tier == TIER_PRO
+            and not decision.reason.startswith("escalated_")  # Flash already failed this turn
+        ):
+            router = self.model_router
+            return [decision, TierDecision(TIER_FLASH, router.flash_model, router.flash_thinking_budget, "hedge")]
+        return [decision, decision]
+
+    async def _request_for(
+        self,
+        decision: TierDecision,
+        turn: Dict[str, Any],
+        built: Dict[TierDecision, Tuple[List[types.Content], types.GenerateContentConfig]]
+    ) -> Tuple[List[types.Content], types.GenerateContentConfig]:
+        """_build_request() for ``decision``, built once per turn and tier."""
+        if decision not in built:
+            with self.tracer.span("prompt.build"):
+                built[decision] = await self._build_request(**turn, decision=decision)
+        return built[decision]
+
+    def _settle_race(self, copies: Dict[int, HedgeCopy], winner: int, stream: bool):
+        """Record the copies of a finished request (every copy's tokens are billed)."""
+        ordered = [copies[index] for index in sorted(copies)]
+        self.hedge_policy.settle(ordered, winner, stream)
+        for copy in ordered:
+            record_gemini_usage(copy.model, copy.usage)
+
+    @staticmethod
+    def _record_prompt_tokens(request_span, usage):
+        """Put a request's prompt token counts on its span."""
+        if usage is not None:
+            request_span.set_attribute("prompt_tokens", usage.prompt_token_count or 0)
+            request_span.set_attribute("cached_tokens", usage.cached_content_token_count or 0)
+
+    async def _generate_copy(
+        self,
+        decision: TierDecision,
+        request: Tuple[List[types.Content], types.GenerateContentConfig],
+        copy: HedgeCopy
+    ) -> Tuple[Dict[str, Any], bool]:
+        """One copy of a non-streaming request; returns _parse_reply() of its reply."""
+        history, config = request
+        # Without streaming the first byte is the whole reply
+        with self.tracer.span(
+            "gemini.request", model=decision.model, tier=decision.tier, stream=False, hedge=copy.hedge
+        ) as request_span:
+            async with get_admission_controller("gemini").admit(Priority.BACKGROUND if copy.hedge else None):
+                response = await self.client.aio.models.generate_content(
+                    model=decision.model,
+                    contents=history,
+                    config=config
+                )
+            copy.latency = time.monotonic() - copy.started
+            copy.usage = response.usage_metadata
+            self._record_prompt_tokens(request_span, copy.usage)
+
+        with self.tracer.span("response.parse"):
+            return self._parse_reply(response.text)
+
+    async def _stream_copy(
+        self,
+        decision: TierDecision,
+        request: Tuple[List[types.Content], types.GenerateContentConfig],
+        copy: HedgeCopy
+    ) -> AsyncIterator[str]:
+        """One copy of a streaming request, as the text of each chunk."""
+        history, config = request
+        # Runs in its own task (see BufferedStream), so its spans can be current
+        with self.tracer.span(
+            "gemini.request", model=decision.model, tier=decision.tier, stream=True, hedge=copy.hedge
+        ) as request_span:
+            # The admission slot is held for the whole stream
+            async with get_admission_controller("gemini").admit(Priority.BACKGROUND if copy.hedge else None):
+                with self.tracer.span("gemini.ttfb", model=decision.model) as ttfb_span:
+                    stream = await self.client.aio.models.generate_content_stream(
+                        model=decision.model,
+                        contents=history,
+                        config=config
+                    )
+                    async for chunk in stream:
+                        if copy.latency is None:
+                            copy.latency = time.monotonic() - copy.started
+                            ttfb_span.end()
+                        copy.usage = chunk.usage_metadata or copy.usage
+                        text = chunk.text or ""
+                        copy.text += text
+                        yield text
+            self._record_prompt_tokens(request_span, copy.usage)
+
+    async def _race_generate(
+        self,
+        decisions: List[TierDecision],
+        turn: Dict[str, Any],
+        built: Dict[TierDecision, Tuple[List[types.Content], types.GenerateContentConfig]],
+        copies: Dict[int, HedgeCopy],
+        deadline: Optional[float]
+    ) -> RaceOutcome[Tuple[Dict[str, Any], bool]]:
+        """
+        Request a reply, hedged with a second copy if the first is slow;
+        the first reply without a problem wins.
+        """
+        async def start(index: int) -> Tuple[Dict[str, Any], bool]:
+            copy = copies[index] = HedgeCopy(decisions[index].model, hedge=index > 0)
+            try:
+                request = await self._request_for(decisions[index], turn, built)
+                return await self._generate_copy(decisions[index], request, copy)
+            except Exception:
+                copy.failed = True
+                raise
+
+        return await within(deadline, race(
+            start,
+            self.hedge_policy.delay(decisions[0].model, stream=False),
+            accept=lambda reply: self._reply_problem(*reply) is None
+        ))
+
+    async def _race_stream(
+        self,
+        decisions: List[TierDecision],
+        turn: Dict[str, Any],
+        built: Dict[TierDecision, Tuple[List[types.Content], types.GenerateContentConfig]],
+        copies: Dict[int, HedgeCopy],
+        streams: Dict[int, BufferedStream],
+        deadline: Optional[float]
+    ) -> RaceOutcome[Tuple[BufferedStream, Any]]:
+        """
+        Start a stream, hedged with a second copy if its first chunk is
+        late; the first copy to produce text wins and the other is
+        cancelled. A streamed reply is shown as it arrives, so it can only
+        be raced on time to first chunk, not on validity.
+
+        Returns:
+            Outcome whose value is (winning stream, its first chunk's text)
+        """
+        async def start(index: int) -> Tuple[BufferedStream, Any]:
+            copy = copies[index] = HedgeCopy(decisions[index].model, hedge=index > 0)
+            try:
+                request = await self._request_for(decisions[index], turn, built)
+                streams[index] = BufferedStream(self._stream_copy(decisions[index], request, copy))
+                return streams[index], await streams[index].next()
+            except Exception:
+                copy.failed = True
+                raise
+
+        outcome = await within(deadline, race(
+            start,
+            self.hedge_policy.delay(decisions[0].model, stream=True),
+            accept=lambda first: first[1] is not BufferedStream.END
+        ))
+        for index, copy in copies.items():
+            if index != outcome.winner:
+                copy.stop()
+                if index in streams:
+                    streams[index].cancel()
+        return outcome
+
+    async def stream_response(
+        self,
+        user_text: str,
+        user_role: str = "师兄",
+        agent_role: str = "小师妹",
+        sulking_level: int = 0,
+        conversation_history: Optional[List[Dict[str, Any]]] = None,
+        conversation_summary: Optional[Dict[str, Any]] = None,
+        deadline: Optional[float] = None
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Stream a structured response from the AI tutor.
+
+        Args:
+            deadline: time.monotonic() by which the reply must be complete
+                (see hedging.turn_deadline); None waits indefinitely
+
+        Yields events as the JSON arrives:
+            {"type": "delta", "field": <field>, "delta": <text>} for each
+            new piece of chinese_content / vietnamese_display / pinyin
+            {"type": "field", "field": <field>, "value": <text>} when any
+            other top-level string (e.g. emotion) is complete
+            {"type": "restart", "reason": <problem>} when a flash reply
+            already being streamed is redone on pro, or a reply still
+            streaming misses the deadline; everything received so far is void
+            {"type": "final", "data": <response dict>} exactly once, last
+
+        On API failure the final event carries the fallback response, so
+        callers should always replace any partial output with it.
+        """
+        decision = self.model_router.choose(user_text)
+        cache_key, cached = await self._lookup_cached_response(
+            user_text, user_role, agent_role, sulking_level, conversation_history, conversation_summary,
+            decision.model
+        )
+        if cached is not None:
+            yield {"type": "final", "data": cached}
+            return
+
+        turn = dict(
+            user_text=user_text,
+            user_role=user_role,
+            agent_role=agent_role,
+            sulking_level=sulking_level,
+            conversation_history=conversation_history,
+            conversation_summary=conversation_summary
+        )
+        built = {}
+        config = None
+        parser = StreamingJSONFieldParser()
+        previous = None  # Flash reply being redone on pro
+        try:
+            while True:
+                parser = StreamingJSONFieldParser()
+                result = None
+                history, config = await self._request_for(decision, turn, built)
+
+                logger.info(f"Streaming {decision.model} ({decision.reason}) for user message: {user_text[:50]}...")
+
+                copies: Dict[int, HedgeCopy] = {}
+                streams: Dict[int, BufferedStream] = {}
+                try:
+                    try:
+                        decisions = self._hedge_decisions(decision)
+                        outcome = await self._race_stream(decisions, turn, built, copies, streams, deadline)
+                        decision = decisions[outcome.winner]
+                        stream, text = outcome.value
+
+                        announced = set()
+                        while text is not BufferedStream.END:
+                            for field, delta in parser.feed(text):
+                                yield {"type": "delta", "field": field, "delta": delta}
+
+                            for field in parser.completed - parser.fields - announced:
+                                announced.add(field)
+                                yield {"type": "field", "field": field, "value": parser.values[field]}
+                            text = await within(deadline, stream.next())
+                    finally:
+                        for copy_stream in streams.values():
+                            copy_stream.cancel()
+
+                    self._settle_race(copies, outcome.winner, stream=True)
+                    with self.tracer.span("response.parse"):
+                        result, valid = self._parse_reply(parser.text)
+                    problem = self._reply_problem(result, valid)
+                except Exception as e:
+                    problem = self._failed_attempt(decision, config, e)
+
+                escalation = self.model_router.record(decision, problem)
+                if escalation is None:
+                    break
+                if parser.text:
+                    yield {"type": "restart", "reason": problem}
+                previous = result
+                decision = escalation
+
+            if cache_key and problem is None:
+                await self.response_cache.add(cache_key, result)
+
+            logger.info(f"Gemini stream completed: emotion={result.get('emotion')}, action={result.get('action')}")
+
+        except DeadlineExceeded:
+            if parser.text:
+                yield {"type": "restart", "reason": "deadline"}
+            result = self._missed_deadline(previous, user_text, sulking_level)
+
+        except Exception as e:
+            logger.error(f"Error streaming AI response: {e}", exc_info=True)
+            self._invalidate_prompt_cache(config, e)
+            self._throttle_if_rate_limited(e)
+            result = self._get_fallback_response(user_text, sulking_level)
+
+        yield {"type": "final", "data": result}
+
     async def generate_response(
         self,
         user_text: str,
         user_role: str = "师兄",
         agent_role: str = "小师妹",
         sulking_level: int = 0,
-        conversation_history: Optional[List[Dict[str, Any]]] = None
+        conversation_history: Optional[List[Dict[str, Any]]] = None,
+        conversation_summary: Optional[Dict[str, Any]] = None,
+        deadline: Optional[float] = None
     ) -> Dict[str, Any]:
         """
         Generate a structured response from the AI tutor.
@@ -154,6 +730,9 @@ class ChineseTutorAgent:
             agent_role: Role of the AI (e.g., "小师妹")
             sulking_level: Current sulking level (0-3)
             conversation_history: Previous conversation turns
+            conversation_summary: Running summary of older turns, if any
+            deadline: time.monotonic() by which the reply must arrive
+                (see hedging.turn_deadline); None waits indefinitely
             
         Returns:
             Dict containing the structured AI response
@@ -161,61 +740,158 @@ class ChineseTutorAgent:
         Raises:
             Exception: If API call fails
         """
+        decision = self.model_router.choose(user_text)
+        cache_key, cached = await self._lookup_cached_response(
+            user_text, user_role, agent_role, sulking_level, conversation_history, conversation_summary,
+            decision.model
+        )
+        if cached is not None:
+            return cached
+        
+        turn = dict(
+            user_text=user_text,
+            user_role=user_role,
+            agent_role=agent_role,
+            sulking_level=sulking_level,
+            conversation_history=conversation_history,
+            conversation_summary=conversation_summary
+        )
+        built = {}
+        config = None
+        previous = None  # Flash reply being redone on pro
         try:
-            # Format system prompt with user context
-            system_instruction = SYSTEM_PROMPT_TEMPLATE.format(
-                agent_role=agent_role,
-                user_role=user_role,
-                sulking_level=sulking_level
-            )
+            while True:
+                result = None
+                history, config = await self._request_for(decision, turn, built)
+                
+                logger.info(f"Calling {decision.model} ({decision.reason}) for user message: {user_text[:50]}...")
+                
+                copies: Dict[int, HedgeCopy] = {}
+                try:
+                    decisions = self._hedge_decisions(decision)
+                    outcome = await self._race_generate(decisions, turn, built, copies, deadline)
+                    decision = decisions[outcome.winner]
+                    self._settle_race(copies, outcome.winner, stream=False)
+                    
+                    result, valid = outcome.value
+                    problem = self._reply_problem(result, valid)
+                except Exception as e:
+                    problem = self._failed_attempt(decision, config, e)
+                
+                escalation = self.model_router.record(decision, problem)
+                if escalation is None:
+                    break
+                previous = result
+                decision = escalation
             
-            # Prepare conversation history
-            history = []
-            if conversation_history:
-                history = self._format_conversation_history(conversation_history)
-            
-            # Add current user message
-            history.append(
-                types.Content(
-                    role="user",
-                    parts=[types.Part(text=user_text)]
-                )
-            )
-            
-            # Configure generation parameters
-            config = types.GenerateContentConfig(
-                temperature=0.9,  # More creative/personality
-                top_p=0.95,
-                top_k=40,
-                max_output_tokens=2048*4,
-                response_mime_type="application/json",
-                response_schema=self.RESPONSE_SCHEMA,
-                system_instruction=system_instruction
-            )
-            
-            logger.info(f"Calling Gemini API for user message: {user_text[:50]}...")
-            
-            # Call Gemini API
-            response = await self.client.aio.models.generate_content(
-                model=self.model_name,
-                contents=history,
-                config=config
-            )
-            
-            # Parse the JSON response
-            import json_repair
-            result = json_repair.loads(response.text)
+            if cache_key and problem is None:
+                await self.response_cache.add(cache_key, result)
             
             logger.info(f"Gemini response received: emotion={result.get('emotion')}, action={result.get('action')}")
             
             return result
             
+        except DeadlineExceeded:
+            return self._missed_deadline(previous, user_text, sulking_level)
+            
         except Exception as e:
             logger.error(f"Error generating AI response: {e}", exc_info=True)
+            self._invalidate_prompt_cache(config, e)
+            self._throttle_if_rate_limited(e)
             
             # Return fallback response
             return self._get_fallback_response(user_text, sulking_level)
     
+    async def regenerate_chinese_content(self, response: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """
+        Ask the cheap model to redo chinese_content (and pinyin) in pure Chinese.
+        
+        Returns:
+            Dict with 'chinese_content' and 'pinyin', or None on failure
+        """
+        prompt = LANGUAGE_FIX_PROMPT_TEMPLATE.format(
+            chinese_content=response.get("chinese_content", ""),
+            vietnamese_display=response.get("vietnamese_display", "")
+        )
+        try:
+            async with get_admission_controller("gemini").admit():
+                fixed = await self.client.aio.models.generate_content(
+                    model=settings.GEMINI_LANGUAGE_FIX_MODEL,
+                    contents=prompt,
+                    config=types.GenerateContentConfig(
+                        temperature=0.2,
+                        max_output_tokens=512,
+                        response_mime_type="application/json",
+                        response_schema=self.LANGUAGE_FIX_SCHEMA
+                    )
+                )
+            return self._language_fix_parser.parse(fixed.text)
+        except Exception as e:
+            logger.error(f"Error regenerating chinese_content: {e}")
+            self._throttle_if_rate_limited(e)
+            return None
+    
+    async def explain_quiz_mistakes(
+        self,
+        wrong_items: List[Dict[str, Any]],
+        user_role: str
+    ) -> Dict[str, str]:
+        """
+        Explain every wrongly answered quiz item in one cheap-model call.
+        
+        Args:
+            wrong_items: Quiz items with the learner's answer under 'given'
+            user_role: How the learner is addressed
+            
+        Returns:
+            {item id (as a string): Vietnamese explanation}; empty on failure
+        """
+        items = "\n".join(
+            f"- id {item.get('id')}: {item.get('question', '')} | "
+            f"expected: {item.get('answer', '')} | learner: {item.get('given') or '(blank)'}"
+            for item in wrong_items
+        )
+        prompt = QUIZ_EXPLANATION_PROMPT_TEMPLATE.format(user_role=user_role, items=items)
+        try:
+            with self.tracer.span("gemini.request", model=settings.GEMINI_QUIZ_EXPLANATION_MODEL, stream=False):
+                async with get_admission_controller("gemini").admit():
+                    result = await self.client.aio.models.generate_content(
+                        model=settings.GEMINI_QUIZ_EXPLANATION_MODEL,
+                        contents=prompt,
+                        config=types.GenerateContentConfig(
+                            temperature=0.3,
+                            max_output_tokens=256 + 128 * len(wrong_items),
+                            response_mime_type="application/json",
+                            response_schema=self.QUIZ_EXPLANATION_SCHEMA
+                        )
+                    )
+            parsed = self._quiz_explanation_parser.parse(result.text)
+            return {
+                str(entry.get("id")): entry.get("explanation", "")
+                for entry in parsed.get("explanations") or []
+                if isinstance(entry, dict)
+            }
+        except Exception as e:
+            logger.error(f"Error explaining quiz mistakes: {e}")
+            self._throttle_if_rate_limited(e)
+            return {}
+    
+    def _invalidate_prompt_cache(
+        self,
+        config: Optional[types.GenerateContentConfig],
+        error: Exception
+    ):
+        """Drop the cached prompt handle if the API rejected it (expired/deleted)."""
+        if not (self.prompt_cache and config is not None and config.cached_content):
+            return
+        if isinstance(error, genai_errors.ClientError) and error.code in (403, 404):
+            self.prompt_cache.invalidate(config.cached_content)
+    
+    def _throttle_if_rate_limited(self, error: Exception):
+        """Pause Gemini admissions briefly after a 429 so later turns queue instead."""
+        if isinstance(error, genai_errors.ClientError) and error.code == 429:
+            get_admission_controller("gemini").throttle(settings.GEMINI_RATE_LIMIT_COOLDOWN)
+    
     def _get_fallback_response(
         self, 
         user_text: str, 
@@ -224,26 +900,8 @@ class ChineseTutorAgent:
         """
         Generate a fallback response when API fails.
         """
-        if sulking_level >= 2:
-            return {
-                "thought": "API error, using fallback",
-                "chinese_content": "哼，现在系统出问题了，师妹暂时不能教你了。",
-                "vietnamese_display": "Hừm, hệ thống đang có vấn đề, tiểu sư muội tạm thời không thể dạy anh được.",
-                "pinyin": "Hng, xiànzài xìtǒng chū wèntí le, shī mèi zànshí bù néng jiāo nǐ le.",
-                "emotion": "sulking",
-                "action": "none",
-                "quiz_list": []
-            }
-        else:
-            return {
-                "thought": "API error, using fallback",
-                "chinese_content": "师兄，系统有点小问题，稍等一下好吗？",
-                "vietnamese_display": "Sư huynh, hệ thống có chút vấn đề, chờ một chút được không?",
-                "pinyin": "Shī xiōng, xìtǒng yǒudiǎn xiǎo wèntí, shāo děng yīxià hǎo ma?",
-                "emotion": "concerned",
-                "action": "none",
-                "quiz_list": []
-            }
+        FALLBACK_RESPONSES.inc()
+        return get_fallback_response(sulking_level)
     
     async def test_connection(self) -> bool:
         """
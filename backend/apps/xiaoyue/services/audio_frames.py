@@ -0,0 +1,65 @@
+"""
+Binary WebSocket audio frames.
+Clients that negotiate ``audio=binary`` receive MP3 bytes as binary frames
+instead of Base64 inside JSON. The JSON response carries an ``audio_id``
+and the binary frame repeats it in a small header:
+
+    [uint16 big-endian header length][UTF-8 JSON header][raw MP3 bytes]
+"""
+
+import json
+import struct
+import uuid
+from typing import Any, Dict, Tuple
+
+AUDIO_TRANSPORT_BASE64 = "base64"
+AUDIO_TRANSPORT_BINARY = "binary"
+AUDIO_TRANSPORTS = (AUDIO_TRANSPORT_BASE64, AUDIO_TRANSPORT_BINARY)
+
+AUDIO_MIME_TYPE = "audio/mpeg"
+
+_HEADER_LENGTH = struct.Struct(">H")
+
+
+def new_audio_id() -> str:
+    """Short random id linking a JSON frame to its binary audio frame."""
+    return uuid.uuid4().hex[:16]
+
+
+def encode_audio_frame(header: Dict[str, Any], audio: bytes) -> bytes:
+    """
+    Pack a header and MP3 bytes into one binary frame.
+
+    Args:
+        header: JSON-serializable metadata (must include audio_id)
+        audio: Raw MP3 bytes
+
+    Returns:
+        Frame bytes ready for ``send(bytes_data=...)``
+    """
+    header_bytes = json.dumps(
+        {"mime": AUDIO_MIME_TYPE, **header},
+        ensure_ascii=False,
+        separators=(",", ":")
+    ).encode("utf-8")
+    if len(header_bytes) > 0xFFFF:
+        raise ValueError("Audio frame header too large")
+    return b"".join((_HEADER_LENGTH.pack(len(header_bytes)), header_bytes, audio))
+
+
+def decode_audio_frame(frame: bytes) -> Tuple[Dict[str, Any], bytes]:
+    """
+    Split a binary frame back into (header, audio bytes).
+
+    Raises:
+        ValueError: If the frame is truncated or the header is not JSON
+    """
+    if len(frame) < _HEADER_LENGTH.size:
+        raise ValueError("Audio frame too short")
+    (header_length,) = _HEADER_LENGTH.unpack_from(frame)
+    start = _HEADER_LENGTH.size
+    end = start + header_length
+    if len(frame) < end:
+        raise ValueError("Audio frame header truncated")
+    header = json.loads(frame[start:end].decode("utf-8"))
+    return header, frame[end:]
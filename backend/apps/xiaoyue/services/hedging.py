@@ -0,0 +1,290 @@
+"""
+Hedged, deadline-bounded Gemini requests.
+A turn gets one deadline (XIAOYUE_TURN_DEADLINE) that every Gemini call
+made for it must meet. Within it, a request that has produced nothing by
+a high percentile of recent latency for its model gets a second copy
+(optionally on the flash tier); the first good result wins and the other
+copy is cancelled. Hedge rate and the tokens spent on losing copies are
+counted so the percentile can be tuned.
+"""
+
+import asyncio
+import logging
+import time
+from collections import Counter, deque
+from dataclasses import dataclass, field
+from typing import Any, AsyncIterator, Awaitable, Callable, Deque, Dict, Generic, List, Optional, Tuple, TypeVar
+from django.conf import settings
+from .metrics import GEMINI_HEDGED_REQUESTS, HEDGE_WASTED_TOKENS
+from .token_budget import estimate_tokens
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+HEDGE_SAME = "same"    # The hedge copy goes to the primary's model
+HEDGE_FLASH = "flash"  # Pro requests are hedged on the flash tier
+
+
+class DeadlineExceeded(Exception):
+    """Raised when a turn's deadline passes before its Gemini reply arrives."""
+
+
+def turn_deadline() -> Optional[float]:
+    """time.monotonic() deadline for a turn starting now, or None when unbounded."""
+    if settings.XIAOYUE_TURN_DEADLINE <= 0:
+        return None
+    return time.monotonic() + settings.XIAOYUE_TURN_DEADLINE
+
+
+async def within(deadline: Optional[float], awaitable: Awaitable[T]) -> T:
+    """
+    Await ``awaitable`` until ``deadline`` (time.monotonic()).
+
+    Raises:
+        DeadlineExceeded: If the deadline has passed or passes first
+    """
+    if deadline is None:
+        return await awaitable
+    remaining = deadline - time.monotonic()
+    if remaining <= 0:
+        if asyncio.iscoroutine(awaitable):
+            awaitable.close()
+        raise DeadlineExceeded("turn deadline already passed")
+    try:
+        return await asyncio.wait_for(awaitable, timeout=remaining)
+    except asyncio.TimeoutError:
+        if time.monotonic() < deadline:
+            raise  # A timeout of the call itself, not ours
+        raise DeadlineExceeded(f"no reply within the turn deadline ({remaining:.1f}s left)") from None
+
+
+@dataclass
+class HedgeCopy:
+    """One copy of a (possibly hedged) request, filled in as it runs."""
+    model: str
+    hedge: bool = False
+    started: float = field(default_factory=time.monotonic)
+    latency: Optional[float] = None  # To the whole reply, or to the first chunk when streaming
+    usage: Any = None                # usage_metadata, once known
+    text: str = ""                   # Streamed text received so far
+    failed: bool = False             # Raised instead of replying
+
+    def stop(self):
+        """Freeze the latency of a copy that is being cancelled."""
+        if self.latency is None:
+            self.latency = time.monotonic() - self.started
+
+
+@dataclass
+class RaceOutcome(Generic[T]):
+    value: T
+    winner: int  # 0 = primary, 1 = hedge
+    hedged: bool
+
+
+async def race(
+    start: Callable[[int], Awaitable[T]],
+    hedge_after: Optional[float],
+    accept: Callable[[T], bool] = lambda value: True
+) -> RaceOutcome[T]:
+    """
+    Run ``start(0)``; if it has not finished ``hedge_after`` seconds later
+    (None = never), also run ``start(1)``. The first value ``accept``
+    approves wins and the other copy is cancelled. Without an approved
+    value the earliest copy's value is returned, or its exception raised.
+    """
+    loop = asyncio.get_running_loop()
+    started = loop.time()
+    tasks: List[asyncio.Future] = [asyncio.ensure_future(start(0))]
+    values: Dict[int, T] = {}
+    errors: Dict[int, BaseException] = {}
+
+    try:
+        pending = set(tasks)
+        while pending:
+            timeout = None
+            if hedge_after is not None and len(tasks) == 1:
+                timeout = max(0.0, started + hedge_after - loop.time())
+            done, pending = await asyncio.wait(pending, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+            if not done:
+                tasks.append(asyncio.ensure_future(start(1)))
+                pending.add(tasks[1])
+                continue
+
+            for task in sorted(done, key=tasks.index):
+                index = tasks.index(task)
+                if task.exception() is not None:
+                    errors[index] = task.exception()
+                    continue
+                values[index] = task.result()
+                if accept(values[index]):
+                    return RaceOutcome(values[index], index, len(tasks) > 1)
+
+        if values:
+            index = min(values)
+            return RaceOutcome(values[index], index, len(tasks) > 1)
+        raise errors[min(errors)]
+    finally:
+        for task in tasks:
+            if not task.done():
+                task.cancel()
+
+
+_END = object()
+
+
+class BufferedStream:
+    """
+    Drains an async iterator in a background task so a streamed copy can
+    be raced on its first item and dropped (cancelled) if it loses.
+    """
+
+    END = _END
+
+    def __init__(self, items: AsyncIterator[Any]):
+        self._queue: asyncio.Queue = asyncio.Queue()
+        self._task = asyncio.ensure_future(self._drain(items))
+
+    async def _drain(self, items: AsyncIterator[Any]):
+        try:
+            async for item in items:
+                self._queue.put_nowait(item)
+            self._queue.put_nowait(_END)
+        except Exception as e:
+            self._queue.put_nowait(e)
+
+    async def next(self) -> Any:
+        """Next item, or BufferedStream.END; re-raises the iterator's error."""
+        item = await self._queue.get()
+        if isinstance(item, Exception):
+            raise item
+        return item
+
+    def cancel(self):
+        self._task.cancel()
+
+
+class HedgePolicy:
+    """
+    When to hedge, from the latency of recent requests per model.
+
+    Args:
+        enabled: False never hedges
+        percentile: Hedge once a request has taken longer than this
+            percentile of recent ones (to the first chunk when streaming)
+        min_samples: Requests a model must have seen before it is hedged
+        min_delay: Never hedge sooner than this many seconds
+        hedge_tier: HEDGE_SAME or HEDGE_FLASH
+        window: Latency samples kept per model and mode
+    """
+
+    def __init__(
+        self,
+        enabled: bool = True,
+        percentile: float = 95,
+        min_samples: int = 20,
+        min_delay: float = 1.0,
+        hedge_tier: str = HEDGE_SAME,
+        window: int = 200
+    ):
+        if hedge_tier not in (HEDGE_SAME, HEDGE_FLASH):
+            raise ValueError(f"Unknown hedge tier: {hedge_tier!r}")
+        self.enabled = enabled
+        self.percentile = percentile
+        self.min_samples = min_samples
+        self.min_delay = min_delay
+        self.hedge_tier = hedge_tier
+        self.window = window
+
+        self._latencies: Dict[Tuple[str, bool], Deque[float]] = {}
+        self.requests = 0
+        self.hedged = 0
+        self.hedge_wins = 0
+        self.wasted_tokens: Counter = Counter()
+
+    def delay(self, model: str, stream: bool) -> Optional[float]:
+        """Seconds after which to hedge a request, or None not to hedge it."""
+        samples = self._latencies.get((model, stream))
+        if not self.enabled or not samples or len(samples) < self.min_samples:
+            return None
+        ordered = sorted(samples)
+        index = min(len(ordered) - 1, int(len(ordered) * self.percentile / 100))
+        return max(self.min_delay, ordered[index])
+
+    def settle(self, copies: List[HedgeCopy], winner: int, stream: bool):
+        """
+        Record a finished race: latency samples, hedge outcome and the
+        tokens the losing copy cost.
+        """
+        for index, copy in enumerate(copies):
+            # A cancelled copy counts with the time it had taken so far, so
+            # slow requests that lost to a hedge don't vanish from the tail;
+            # how fast a copy failed says nothing about reply latency
+            copy.stop()
+            if not copy.failed:
+                self._latencies.setdefault((copy.model, stream), deque(maxlen=self.window)).append(copy.latency)
+            if index != winner:
+                self._record_waste(copy, copies[winner])
+
+        self.requests += 1
+        mode = str(stream).lower()
+        if len(copies) == 1:
+            GEMINI_HEDGED_REQUESTS.labels(stream=mode, outcome="none").inc()
+            return
+        self.hedged += 1
+        self.hedge_wins += winner == 1
+        GEMINI_HEDGED_REQUESTS.labels(stream=mode, outcome="hedge" if winner else "primary").inc()
+        logger.info(f"Hedged {copies[0].model} request won by the {'hedge' if winner else 'primary'} copy")
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "enabled": self.enabled,
+            "percentile": self.percentile,
+            "requests": self.requests,
+            "hedged": self.hedged,
+            "hedge_rate": self.hedged / self.requests if self.requests else 0.0,
+            "hedge_wins": self.hedge_wins,
+            "wasted_tokens": dict(self.wasted_tokens),
+            "delays": {
+                f"{model}{' (stream)' if stream else ''}": self.delay(model, stream)
+                for model, stream in self._latencies
+            },
+        }
+
+    def _record_waste(self, loser: HedgeCopy, winner: HedgeCopy):
+        usage = loser.usage
+        if usage is not None:
+            spent = {
+                "prompt": usage.prompt_token_count or 0,
+                "output": usage.candidates_token_count or 0,
+                "thinking": getattr(usage, "thoughts_token_count", None) or 0,
+            }
+        elif loser.failed:
+            return  # Nothing reported: the request was rejected
+        else:
+            # Cancelled before Gemini reported usage: the prompt was sent
+            # (same contents as the winner's) plus whatever had streamed
+            prompt = winner.usage.prompt_token_count if winner.usage is not None else 0
+            spent = {"prompt": prompt or 0, "output": estimate_tokens(loser.text) if loser.text else 0}
+        for kind, tokens in spent.items():
+            if tokens:
+                self.wasted_tokens[kind] += tokens
+                HEDGE_WASTED_TOKENS.labels(model=loser.model, kind=kind).inc(tokens)
+
+
+_policy: Optional[HedgePolicy] = None
+
+
+def get_hedge_policy() -> HedgePolicy:
+    """Process-wide hedge policy configured from settings."""
+    global _policy
+    if _policy is None:
+        _policy = HedgePolicy(
+            enabled=settings.XIAOYUE_HEDGE_ENABLED,
+            percentile=settings.XIAOYUE_HEDGE_PERCENTILE,
+            min_samples=settings.XIAOYUE_HEDGE_MIN_SAMPLES,
+            min_delay=settings.XIAOYUE_HEDGE_MIN_DELAY,
+            hedge_tier=settings.XIAOYUE_HEDGE_TIER
+        )
+    return _policy
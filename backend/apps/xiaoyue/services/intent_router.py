@@ -0,0 +1,322 @@
+"""
+Local intent routing ahead of Gemini.
+Greetings, thanks, goodbyes, "say that again" and quiz requests don't need
+the tutor model: a precompiled rule set, then a small character n-gram
+classifier, recognize them in short Vietnamese/Chinese messages so the
+consumer can answer from per-role templates with pre-rendered audio.
+Everything else, and anything below the confidence threshold, is forwarded,
+as are answers to a question the tutor just asked and hanzi sentences the
+learner may be practising.
+"""
+
+import logging
+import math
+import re
+import unicodedata
+import zlib
+from collections import Counter
+from dataclasses import dataclass
+from typing import Collection, Dict, List, Optional, Tuple
+from django.conf import settings
+from .metrics import INTENT_ROUTES
+
+logger = logging.getLogger(__name__)
+
+INTENT_GREETING = "greeting"
+INTENT_THANKS = "thanks"
+INTENT_GOODBYE = "goodbye"
+INTENT_REPEAT = "repeat"  # Say the previous reply again
+INTENT_QUIZ = "quiz"
+INTENTS = (INTENT_GREETING, INTENT_THANKS, INTENT_GOODBYE, INTENT_REPEAT, INTENT_QUIZ)
+OTHER = "other"
+
+SOURCE_RULE = "rule"
+SOURCE_CLASSIFIER = "classifier"
+
+# Replies after which the learner's next message is an answer for the tutor
+AWAITING_ACTIONS = frozenset({"quiz", "correction"})
+
+# Forms of address and particles that don't change a trivial intent
+_FILLER = (
+    r"(?:su huynh|su muoi|muoi muoi|muoi|ty ty|tieu nguyet|de de|xiao yue|oi|a|nhe|nha|"
+    r"ban|em|anh|chi|ne|di|voi|please|pls|"
+    r"小师妹|师妹|师兄|姐姐|妹妹|弟弟|小月|请|呀|啊|哦|啦|吧|呢|嘛)"
+)
+
+# Full-message patterns over fold_text() output, one per intent
+_RULES = {
+    INTENT_GREETING: r"xin chao|chao|hello|hi|hey|chao buoi (?:sang|chieu|toi)|ni ?hao|"
+                     r"你好|您好|嗨|哈喽|早上好|早安|下午好|晚上好",
+    INTENT_THANKS: r"cam on(?: nhieu| rat nhieu)?|thank you|thanks|thank|xie ?xie|"
+                   r"谢谢你?|多谢|感谢|谢啦",
+    INTENT_GOODBYE: r"tam biet|bye(?: bye)?|goodbye|hen gap lai|zai ?jian|"
+                    r"再见|拜拜|明天见|下次见",
+    INTENT_REPEAT: r"(?:noi|doc|nhac) lai(?: (?:lan nua|di|duoc khong))?|lai lan nua|again|repeat|"
+                   r"再说一遍|再说一次|再来一遍|再读一遍|重复一下|重复一遍",
+    INTENT_QUIZ: r"(?:cho \w+ )?(?:ra de|lam bai tap|(?:mot |vai )?(?:bai kiem tra|kiem tra|quiz|(?:cau )?trac nghiem|cau do))"
+                 r"(?: (?:di|duoc khong))?|kiem tra \w+ di|"
+                 r"给我出(?:一个|几道)?(?:小)?(?:测验|题)|出(?:几道)?题|考考我|(?:做个?)?(?:小)?测验|做练习",
+}
+
+# Seed examples for the classifier (fold_text() is applied to them too)
+SEED_EXAMPLES = {
+    INTENT_GREETING: [
+        "xin chào sư muội", "chào em nhé", "chào buổi sáng", "hello tiểu nguyệt", "hi em",
+        "你好小师妹", "你好呀", "您好", "早上好姐姐", "嗨小月", "lâu rồi không gặp, chào em",
+    ],
+    INTENT_THANKS: [
+        "cảm ơn em nhiều", "cảm ơn sư muội", "cảm ơn nha", "thanks em", "thank you so much",
+        "谢谢你", "谢谢小师妹", "谢谢姐姐", "多谢", "非常感谢", "谢谢你，我明白了", "cảm ơn, anh hiểu rồi",
+    ],
+    INTENT_GOODBYE: [
+        "tạm biệt em", "bye em nhé", "hẹn gặp lại", "anh đi ngủ đây, bye", "mai gặp lại nhé",
+        "再见", "拜拜小师妹", "明天见", "下次见", "我先走了，再见",
+    ],
+    INTENT_REPEAT: [
+        "nói lại đi", "em nói lại được không", "nhắc lại lần nữa", "đọc lại câu đó", "nói lại chậm hơn",
+        "再说一遍", "请再说一次", "再读一遍", "你能重复一下吗", "没听清，再说一遍",
+    ],
+    INTENT_QUIZ: [
+        "cho anh làm bài kiểm tra", "ra đề cho anh đi", "kiểm tra anh đi", "cho em vài câu trắc nghiệm",
+        "làm bài tập nhé", "给我出一个小测验", "请给我出一个小测验", "考考我", "出几道题", "我想做练习",
+    ],
+    OTHER: [
+        "chữ này đọc thế nào", "dạy anh cách gọi món", "từ táo tiếng trung là gì", "anh muốn học số đếm",
+        "giải thích ngữ pháp của 了", "em có thể nói chậm hơn không", "sao em giận anh",
+        "我今天想学习怎么点菜", "这个字怎么读", "我不明白这个语法", "你叫什么名字", "我喜欢喝茶",
+        "hôm nay trời đẹp quá", "em ăn cơm chưa", "cách nói xin lỗi", "dịch câu này giúp anh",
+        "cảm ơn tiếng trung nói thế nào", "再见用越南语怎么说", "chào hỏi tiếng trung thế nào",
+        "bài kiểm tra hôm qua anh sai câu 2 vì sao", "我们学新的词吧", "kể chuyện cho anh nghe",
+    ],
+}
+
+# Folding turns "cháo" (rice porridge) into "chao": a greeting also needs
+# one of these in the message as typed
+_GREETING_WORD_RE = re.compile(
+    r"\b(?:chào|hello|hi|hey|ni ?hao)\b|你好|您好|嗨|哈喽|早上好|早安|下午好|晚上好"
+)
+
+_PUNCTUATION_RE = re.compile(r"[\W_]+", re.UNICODE)
+# Chinese needs no spaces between words; drop the ones punctuation left
+_CJK_GAP_RE = re.compile(r"(?<=[㐀-鿿]) (?=[㐀-鿿])")
+_CJK_ONLY_RE = re.compile(r"[㐀-鿿]+")
+
+
+def fold_text(text: str) -> str:
+    """
+    Lowercase, drop Vietnamese diacritics and punctuation, collapse spaces:
+    "Cảm ơn sư muội!!" -> "cam on su muoi". Chinese characters are kept.
+    """
+    text = unicodedata.normalize("NFD", text.lower()).replace("đ", "d")
+    text = "".join(char for char in text if unicodedata.category(char) != "Mn")
+    text = _PUNCTUATION_RE.sub(" ", unicodedata.normalize("NFC", text))
+    return " ".join(_CJK_GAP_RE.sub("", text).split())
+
+
+def awaits_answer(reply: Optional[Dict[str, object]]) -> bool:
+    """Whether a tutor reply (history entry) asked a question, set a quiz or made a correction."""
+    if not reply:
+        return False
+    if reply.get("action") in AWAITING_ACTIONS:
+        return True
+    return any("?" in text or "？" in text for text in (
+        str(reply.get("content") or ""), str(reply.get("vietnamese_display") or "")
+    ))
+
+
+def _compile_rules() -> Dict[str, "re.Pattern"]:
+    return {
+        intent: re.compile(rf"(?:{_FILLER} ?)*(?:{pattern})(?: ?{_FILLER})*")
+        for intent, pattern in _RULES.items()
+    }
+
+
+def _ngrams(text: str) -> Counter:
+    padded = f" {text} "
+    grams = Counter()
+    for n in (1, 2, 3):
+        for i in range(len(padded) - n + 1):
+            gram = padded[i:i + n]
+            if gram.strip():
+                grams[gram] += 1
+    return grams
+
+
+def _cosine(a: Counter, b: Counter, norm_a: float, norm_b: float) -> float:
+    if not norm_a or not norm_b:
+        return 0.0
+    if len(a) > len(b):
+        a, b = b, a
+    return sum(count * b[gram] for gram, count in a.items() if gram in b) / (norm_a * norm_b)
+
+
+class IntentClassifier:
+    """
+    Nearest-example classifier over character 1-3 grams. The confidence of
+    a label is its best cosine similarity to a seed example; a message is
+    classified only if that beats the best OTHER example by ``margin``.
+    """
+
+    def __init__(self, examples: Dict[str, List[str]], margin: float = 0.1):
+        self.margin = margin
+        self._examples: List[Tuple[str, Counter, float]] = []
+        for label, texts in examples.items():
+            for text in texts:
+                grams = _ngrams(fold_text(text))
+                self._examples.append((label, grams, math.sqrt(sum(c * c for c in grams.values()))))
+
+    def predict(self, folded: str) -> Tuple[str, float]:
+        """
+        Returns:
+            (intent or OTHER, confidence in [0, 1])
+        """
+        grams = _ngrams(folded)
+        norm = math.sqrt(sum(c * c for c in grams.values()))
+        best: Dict[str, float] = {}
+        for label, example, example_norm in self._examples:
+            score = _cosine(grams, example, norm, example_norm)
+            if score > best.get(label, 0.0):
+                best[label] = score
+
+        other = best.pop(OTHER, 0.0)
+        if not best:
+            return OTHER, other
+        label, score = max(best.items(), key=lambda item: item[1])
+        if score - other < self.margin:
+            return OTHER, other
+        return label, min(score, 1.0)
+
+
+@dataclass
+class RouteDecision:
+    intent: str
+    source: str
+    confidence: float
+
+
+class IntentRouter:
+    """
+    Decides whether a chat message can be answered without Gemini.
+
+    Args:
+        rate: Share of learners (stable per user id) whose messages are
+            routed; 0 disables routing, for A/B comparison
+        threshold: Minimum classifier confidence (rules always count)
+        max_chars: Longer messages are always forwarded
+    """
+
+    def __init__(self, rate: float = 1.0, threshold: float = 0.8, max_chars: int = 40):
+        self.rate = rate
+        self.threshold = threshold
+        self.max_chars = max_chars
+        self._rules = _compile_rules()
+        self._classifier = IntentClassifier(SEED_EXAMPLES)
+
+        self.checked = 0
+        self.routed: Counter = Counter()
+        self.holdout = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.rate > 0
+
+    def in_experiment(self, user_id: Optional[str]) -> bool:
+        """Whether this learner's messages may be routed (same answer every time)."""
+        if self.rate >= 1:
+            return True
+        bucket = zlib.crc32((user_id or "").encode("utf-8")) / 2 ** 32
+        return bucket < self.rate
+
+    def classify(self, message: str) -> Optional[RouteDecision]:
+        """
+        Rule match first, then the classifier above ``threshold``; None
+        forwards. A message in hanzi alone is only routed on a rule match:
+        anything looser may be a sentence the learner is practising.
+        """
+        if len(message) > self.max_chars:
+            return None
+        folded = fold_text(message)
+        if not folded:
+            return None
+
+        decision = None
+        for intent, rule in self._rules.items():
+            if rule.fullmatch(folded):
+                decision = RouteDecision(intent, SOURCE_RULE, 1.0)
+                break
+        else:
+            if _CJK_ONLY_RE.fullmatch(folded):
+                return None
+            intent, confidence = self._classifier.predict(folded)
+            if intent != OTHER and confidence >= self.threshold:
+                decision = RouteDecision(intent, SOURCE_CLASSIFIER, confidence)
+
+        if decision is not None and decision.intent == INTENT_GREETING and \
+                not _GREETING_WORD_RE.search(unicodedata.normalize("NFC", message.lower())):
+            return None
+        return decision
+
+    def route(
+        self,
+        message: str,
+        user_id: Optional[str] = None,
+        allowed: Collection[str] = INTENTS,
+        previous: Optional[Dict[str, object]] = None
+    ) -> Optional[RouteDecision]:
+        """
+        Classify a message and count the outcome.
+
+        Args:
+            allowed: Intents the caller can answer right now (e.g. no
+                "repeat" before the first reply); others are forwarded
+            previous: The tutor's last reply (history entry); if it is
+                waiting for an answer the message always goes to Gemini
+
+        Returns:
+            The decision, or None to send the message to Gemini
+        """
+        if not self.enabled:
+            return None
+        self.checked += 1
+        if not self.in_experiment(user_id):
+            self.holdout += 1
+            INTENT_ROUTES.labels(intent="none", source="holdout").inc()
+            return None
+        if awaits_answer(previous):
+            INTENT_ROUTES.labels(intent="none", source="context").inc()
+            return None
+
+        decision = self.classify(message)
+        if decision is None or decision.intent not in allowed:
+            INTENT_ROUTES.labels(intent="none", source="forwarded").inc()
+            return None
+        self.routed[decision.intent] += 1
+        INTENT_ROUTES.labels(intent=decision.intent, source=decision.source).inc()
+        return decision
+
+    def stats(self) -> Dict[str, object]:
+        routed = sum(self.routed.values())
+        eligible = self.checked - self.holdout
+        return {
+            "rate": self.rate,
+            "checked": self.checked,
+            "holdout": self.holdout,
+            "routed": routed,
+            "by_intent": dict(self.routed),
+            "hit_rate": routed / eligible if eligible else 0.0,
+        }
+
+
+_router: Optional[IntentRouter] = None
+
+
+def get_intent_router() -> IntentRouter:
+    """Process-wide router configured from settings."""
+    global _router
+    if _router is None:
+        _router = IntentRouter(
+            rate=settings.XIAOYUE_INTENT_ROUTER_RATE,
+            threshold=settings.XIAOYUE_INTENT_ROUTER_THRESHOLD,
+            max_chars=settings.XIAOYUE_INTENT_ROUTER_MAX_CHARS
+        )
+    return _router
@@ -0,0 +1,164 @@
+"""
+Script checks for chinese_content.
+chinese_content goes straight to a Chinese TTS voice, so pinyin, Vietnamese
+or English fragments in it sound wrong and waste synthesis time. One
+precompiled regex pass classifies the text; the configured policy then
+strips the fragments or asks Gemini for a corrected line.
+"""
+
+import logging
+import re
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Dict, Optional
+from .metrics import LANGUAGE_CHECKS
+
+logger = logging.getLogger(__name__)
+
+POLICY_LOG = "log"                # Only log and count
+POLICY_STRIP = "strip"            # Remove non-Chinese fragments before TTS
+POLICY_REGENERATE = "regenerate"  # Ask for a corrected line, strip if that fails
+POLICIES = (POLICY_LOG, POLICY_STRIP, POLICY_REGENERATE)
+
+_CJK = "㐀-䶿一-鿿豈-﫿"
+# Latin letters incl. the Latin-1/Extended/Vietnamese accented ranges
+_LETTERS = "A-Za-zÀ-ɏḀ-ỿ"
+
+_SCRIPT_RE = re.compile(f"(?P<cjk>[{_CJK}]+)|(?P<word>[{_LETTERS}]+)")
+
+# Tone marks only pinyin uses (macron, caron, ü) vs letters only Vietnamese uses
+_PINYIN_ONLY = frozenset("āēīōūǖǎěǐǒǔǚǘǜüĀĒĪŌŪǍĚǏǑǓÜ")
+_VIETNAMESE_ONLY = frozenset(
+    "ăâđêôơưảãạẻẽẹỉĩịỏõọủũụỳỷỹỵ"
+    "ắằẳẵặấầẩẫậếềểễệốồổỗộớờởỡợứừửữự"
+    "ĂÂĐÊÔƠƯẢÃẠẺẼẸỈĨỊỎÕỌỦŨỤỲỶỸỴ"
+    "ẮẰẲẴẶẤẦẨẪẬẾỀỂỄỆỐỒỔỖỘỚỜỞỠỢỨỪỬỮỰ"
+)
+
+# "你好（nǐ hǎo）" -> drop the whole bracket, not just the letters
+_BRACKETED_LATIN_RE = re.compile(f"\\s*[(（][\\s{_LETTERS}0-9'’,.，、\\-]*[{_LETTERS}][\\s{_LETTERS}0-9'’,.，、\\-]*[)）]")
+_LATIN_RUN_RE = re.compile(f"[{_LETTERS}][{_LETTERS}'’\\-]*(?:\\s+[{_LETTERS}][{_LETTERS}'’\\-]*)*")
+_SPACE_NEAR_CJK_RE = re.compile(f"(?<=[{_CJK}，。！？、：；~～])\\s+|\\s+(?=[{_CJK}，。！？、：；~～])")
+
+
+@dataclass
+class ScriptComposition:
+    """Character counts per script."""
+    cjk: int = 0
+    pinyin: int = 0
+    vietnamese: int = 0
+    latin: int = 0
+
+    @property
+    def foreign(self) -> int:
+        return self.pinyin + self.vietnamese + self.latin
+
+    @property
+    def is_clean(self) -> bool:
+        return self.cjk > 0 and self.foreign == 0
+
+
+def classify(text: str) -> ScriptComposition:
+    """Count CJK characters and letters of pinyin / Vietnamese / other Latin words."""
+    composition = ScriptComposition()
+    for match in _SCRIPT_RE.finditer(text):
+        run = match.group()
+        if match.lastgroup == "cjk":
+            composition.cjk += len(run)
+            continue
+        letters = set(run)
+        if letters & _PINYIN_ONLY:
+            composition.pinyin += len(run)
+        elif letters & _VIETNAMESE_ONLY:
+            composition.vietnamese += len(run)
+        else:
+            composition.latin += len(run)
+    return composition
+
+
+def strip_foreign(text: str) -> str:
+    """Remove Latin-script fragments (and brackets holding only them)."""
+    text = _BRACKETED_LATIN_RE.sub("", text)
+    text = _LATIN_RUN_RE.sub("", text)
+    text = _SPACE_NEAR_CJK_RE.sub("", text)
+    # Punctuation that belonged to a removed leading fragment
+    return text.strip().lstrip("!?,.:;，、：；")
+
+
+Regenerator = Callable[[Dict[str, Any]], Awaitable[Optional[Dict[str, Any]]]]
+
+
+class LanguageValidator:
+    """
+    Applies the chinese_content policy and counts outcomes in
+    xiaoyue_language_checks_total.
+
+    Args:
+        policy: One of POLICIES
+    """
+
+    def __init__(self, policy: str = POLICY_STRIP):
+        if policy not in POLICIES:
+            raise ValueError(f"Unknown language policy {policy!r}, expected one of {POLICIES}")
+        self.policy = policy
+
+    def filter_sentence(self, sentence: str) -> str:
+        """Per-sentence filter for streamed TTS (regeneration is too late there)."""
+        if self.policy == POLICY_LOG or classify(sentence).foreign == 0:
+            return sentence
+        return strip_foreign(sentence)
+
+    async def enforce(
+        self,
+        response: Dict[str, Any],
+        regenerate: Optional[Regenerator] = None
+    ) -> Dict[str, Any]:
+        """
+        Check response["chinese_content"] and fix it in place per policy.
+
+        Args:
+            response: Parsed tutor response
+            regenerate: Returns {"chinese_content", "pinyin"} for a corrected
+                line, or None; only used by the regenerate policy
+
+        Returns:
+            The same response
+        """
+        text = response.get("chinese_content") or ""
+        if not text:
+            return response
+
+        composition = classify(text)
+        if composition.is_clean:
+            self._count("clean")
+            return response
+
+        logger.warning(f"chinese_content is not pure Chinese ({composition}): {text[:100]}")
+        if self.policy == POLICY_LOG:
+            self._count("logged")
+            return response
+
+        if self.policy == POLICY_REGENERATE and regenerate is not None:
+            fixed = None
+            try:
+                fixed = await regenerate(response)
+            except Exception as e:
+                logger.error(f"Regenerating chinese_content failed: {e}")
+            if fixed and classify(fixed.get("chinese_content", "")).is_clean:
+                self._count("regenerated")
+                response["chinese_content"] = fixed["chinese_content"]
+                if fixed.get("pinyin"):
+                    response["pinyin"] = fixed["pinyin"]
+                return response
+
+        # Also where a failed regeneration ends up
+        response["chinese_content"] = strip_foreign(text)
+        if not classify(response["chinese_content"]).cjk:
+            # Nothing left worth speaking; TTS is skipped
+            response["chinese_content"] = ""
+            self._count("emptied")
+        else:
+            self._count("stripped")
+        return response
+
+    def _count(self, outcome: str):
+        LANGUAGE_CHECKS.labels(policy=self.policy, outcome=outcome).inc()
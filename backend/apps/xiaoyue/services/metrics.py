@@ -0,0 +1,275 @@
+"""
+Prometheus metrics for the chat pipeline.
+
+Latency histograms are fed from the per-turn trace spans (MetricsSpanExporter),
+so every stage is measured in one place; gauges and counters are updated where
+the event happens. With PROMETHEUS_MULTIPROC_DIR set (it must be set before
+this module is first imported, and emptied before the workers start) every
+uvicorn worker writes its samples there and /metrics aggregates them all.
+"""
+
+import os
+from typing import List
+from prometheus_client import (
+    REGISTRY,
+    CollectorRegistry,
+    Counter,
+    Gauge,
+    Histogram,
+    make_asgi_app,
+    multiprocess,
+)
+from .tracing import STATUS_ERROR, Span, SpanExporter
+
+LATENCY_BUCKETS = (0.1, 0.25, 0.5, 0.75, 1.0, 1.5, 2.0, 3.0, 5.0, 8.0, 13.0, 20.0, 30.0)
+TTS_BUCKETS = (0.05, 0.1, 0.25, 0.5, 0.75, 1.0, 1.5, 2.0, 3.0, 5.0, 10.0)
+REDIS_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0)
+AUDIO_BYTES_BUCKETS = tuple(2 ** n * 1024 for n in range(0, 11))  # 1 KiB .. 1 MiB
+ADMISSION_BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.0, 5.0, 10.0, 15.0)
+TOKEN_BUCKETS = tuple(2 ** n * 125 for n in range(0, 10))  # 125 .. 64k tokens
+
+# Root spans that are learner turns (other actions don't touch Gemini)
+TURN_ACTIONS = {"ws.chat": "chat", "ws.reset": "reset"}
+
+TURN_SECONDS = Histogram(
+    "xiaoyue_turn_seconds",
+    "Time from receiving a message to the last frame of its reply (queueing included)",
+    ["action", "status"],
+    buckets=LATENCY_BUCKETS,
+)
+GEMINI_SECONDS = Histogram(
+    "xiaoyue_gemini_request_seconds",
+    "Gemini generate_content duration, admission wait included",
+    ["model", "stream", "status"],
+    buckets=LATENCY_BUCKETS,
+)
+GEMINI_TTFB_SECONDS = Histogram(
+    "xiaoyue_gemini_first_chunk_seconds",
+    "Time from sending a streaming Gemini request to its first chunk",
+    ["model"],
+    buckets=LATENCY_BUCKETS,
+)
+TTS_SECONDS = Histogram(
+    "xiaoyue_tts_synthesis_seconds",
+    "Speech synthesis duration per utterance",
+    ["cache"],
+    buckets=TTS_BUCKETS,
+)
+TTS_BYTES = Histogram(
+    "xiaoyue_tts_audio_bytes",
+    "MP3 size per synthesized utterance",
+    buckets=AUDIO_BYTES_BUCKETS,
+)
+REDIS_SECONDS = Histogram(
+    "xiaoyue_redis_command_seconds",
+    "Duration of the Redis round-trips on the turn path",
+    ["operation"],
+    buckets=REDIS_BUCKETS,
+)
+ADMISSION_WAIT_SECONDS = Histogram(
+    "xiaoyue_admission_wait_seconds",
+    "Time upstream calls queued for admission before starting, by service and priority",
+    ["service", "priority"],
+    buckets=ADMISSION_BUCKETS,
+)
+ADMISSION_REJECTIONS = Counter(
+    "xiaoyue_admission_rejections_total",
+    "Upstream calls that gave up waiting for admission (timeout: local queue, "
+    "cluster_rate: cluster-wide rate limit)",
+    ["service", "priority", "reason"],
+)
+REDIS_POOL_ACQUIRE_SECONDS = Histogram(
+    "xiaoyue_redis_pool_acquire_seconds",
+    "Time to get a connection from the shared Redis pool, by database",
+    ["database"],
+    buckets=REDIS_BUCKETS,
+)
+REDIS_POOL_ACQUIRE_FAILURES = Counter(
+    "xiaoyue_redis_pool_acquire_failures_total",
+    "Redis pool acquisitions that failed, by database and reason (timeout waiting for a free "
+    "connection, or error connecting)",
+    ["database", "reason"],
+)
+REDIS_POOL_IN_USE = Gauge(
+    "xiaoyue_redis_pool_connections_in_use",
+    "Redis pool connections checked out (compare with REDIS_POOL_MAX_CONNECTIONS per worker)",
+    ["database"],
+    multiprocess_mode="livesum",
+)
+REDIS_POOL_WAITING = Gauge(
+    "xiaoyue_redis_pool_waiting",
+    "Callers waiting for a free Redis pool connection",
+    ["database"],
+    multiprocess_mode="livesum",
+)
+WEBSOCKET_CONNECTIONS = Gauge(
+    "xiaoyue_websocket_connections",
+    "Open chat WebSocket connections",
+    multiprocess_mode="livesum",
+)
+QUEUED_TURNS = Gauge(
+    "xiaoyue_queued_turns",
+    "Turns waiting behind the one in flight on their connection",
+    multiprocess_mode="livesum",
+)
+CACHE_LOOKUPS = Counter(
+    "xiaoyue_cache_lookups_total",
+    "Cache lookups by cache and result (hit ratio = hit / all)",
+    ["cache", "result"],
+)
+FALLBACK_RESPONSES = Counter(
+    "xiaoyue_fallback_responses_total",
+    "Canned replies sent because Gemini failed",
+)
+INTENT_ROUTES = Counter(
+    "xiaoyue_intent_routes_total",
+    "Chat messages by routing outcome: answered locally (source rule/classifier) or "
+    "sent to Gemini (intent none, source forwarded/holdout, or context when the last "
+    "reply awaits an answer)",
+    ["intent", "source"],
+)
+MODEL_TIER_TURNS = Counter(
+    "xiaoyue_model_tier_turns_total",
+    "Tutoring turns by the tier first chosen (flash/pro) and why",
+    ["tier", "reason"],
+)
+MODEL_ESCALATIONS = Counter(
+    "xiaoyue_model_escalations_total",
+    "Flash replies redone on pro, by what was wrong with them (error, schema, language)",
+    ["problem"],
+)
+PROMPT_TOKENS = Histogram(
+    "xiaoyue_gemini_prompt_tokens",
+    "Prompt tokens per Gemini request as reported by the API (cached included)",
+    ["model"],
+    buckets=TOKEN_BUCKETS,
+)
+PROMPT_HISTORY_TOKENS = Histogram(
+    "xiaoyue_prompt_history_tokens",
+    "History tokens packed into each tutoring prompt (summary excluded)",
+    buckets=TOKEN_BUCKETS,
+)
+PROMPT_HISTORY_DROPPED = Counter(
+    "xiaoyue_prompt_history_dropped_total",
+    "History messages left out of tutoring prompts by the token budget",
+)
+GEMINI_TOKENS = Counter(
+    "xiaoyue_gemini_tokens_total",
+    "Gemini tokens by model and kind (prompt includes cached; multiply by the model's prices for cost)",
+    ["model", "kind"],
+)
+GEMINI_HEDGED_REQUESTS = Counter(
+    "xiaoyue_gemini_hedged_requests_total",
+    "Gemini requests by hedging outcome: not hedged (none), or which copy won (primary/hedge)",
+    ["stream", "outcome"],
+)
+HEDGE_WASTED_TOKENS = Counter(
+    "xiaoyue_gemini_hedge_wasted_tokens_total",
+    "Tokens spent on the losing copy of hedged requests (estimated when it was cancelled)",
+    ["model", "kind"],
+)
+TURN_DEADLINES_EXCEEDED = Counter(
+    "xiaoyue_turn_deadlines_exceeded_total",
+    "Turns whose Gemini reply missed the turn deadline, by what was sent instead "
+    "(fallback, or kept_previous when only the pro redo was late)",
+    ["outcome"],
+)
+RESPONSE_PARSES = Counter(
+    "xiaoyue_response_parses_total",
+    "Gemini JSON replies by parser and outcome (strict, repaired, invalid = parsed but failing "
+    "the schema, failed = no JSON object even after repair)",
+    ["parser", "outcome"],
+)
+LANGUAGE_CHECKS = Counter(
+    "xiaoyue_language_checks_total",
+    "chinese_content checks by policy and outcome (clean, logged, regenerated, stripped, "
+    "emptied = nothing Chinese left to speak)",
+    ["policy", "outcome"],
+)
+QUIZ_ANSWERS = Counter(
+    "xiaoyue_quiz_answers_total",
+    "Locally graded quiz items by how they matched (wrong, blank, exact, variant, pinyin, typo)",
+    ["match"],
+)
+
+
+def record_cache_lookup(cache: str, hit: bool):
+    CACHE_LOOKUPS.labels(cache=cache, result="hit" if hit else "miss").inc()
+
+
+def record_history_packing(packed):
+    """Record one prompt's token_budget.PackedHistory."""
+    PROMPT_HISTORY_TOKENS.observe(packed.tokens)
+    if packed.dropped:
+        PROMPT_HISTORY_DROPPED.inc(packed.dropped)
+
+
+def record_gemini_usage(model: str, usage):
+    """Count a response's usage_metadata tokens (None fields are skipped)."""
+    if usage is None:
+        return
+    if usage.prompt_token_count:
+        PROMPT_TOKENS.labels(model=model).observe(usage.prompt_token_count)
+    for kind, attribute in (
+        ("prompt", "prompt_token_count"),
+        ("cached", "cached_content_token_count"),
+        ("output", "candidates_token_count"),
+        ("thinking", "thoughts_token_count"),
+    ):
+        tokens = getattr(usage, attribute, None)
+        if tokens:
+            GEMINI_TOKENS.labels(model=model, kind=kind).inc(tokens)
+
+
+class MetricsSpanExporter(SpanExporter):
+    """Turns finished spans into latency histogram samples."""
+
+    def export(self, spans: List[Span]):
+        for span in spans:
+            seconds = span.duration_ms / 1000
+            status = "error" if span.status == STATUS_ERROR else "ok"
+
+            if span.parent_id is None and span.name in TURN_ACTIONS:
+                TURN_SECONDS.labels(action=TURN_ACTIONS[span.name], status=status).observe(seconds)
+            elif span.name == "gemini.request":
+                if span.attributes.get("cancelled"):
+                    continue  # A hedge loser: its duration says nothing about Gemini
+                GEMINI_SECONDS.labels(
+                    model=span.attributes.get("model", ""),
+                    stream=str(span.attributes.get("stream", False)).lower(),
+                    status=status,
+                ).observe(seconds)
+            elif span.name == "gemini.ttfb":
+                if span.attributes.get("cancelled"):
+                    continue
+                GEMINI_TTFB_SECONDS.labels(model=span.attributes.get("model", "")).observe(seconds)
+            elif span.name == "tts.synthesize":
+                TTS_SECONDS.labels(cache=span.attributes.get("cache", "off")).observe(seconds)
+                if span.attributes.get("bytes"):
+                    TTS_BYTES.observe(span.attributes["bytes"])
+            elif span.name.startswith("redis."):
+                REDIS_SECONDS.labels(operation=span.name[len("redis."):]).observe(seconds)
+
+
+def multiprocess_enabled() -> bool:
+    return bool(os.environ.get("PROMETHEUS_MULTIPROC_DIR"))
+
+
+def metrics_registry() -> CollectorRegistry:
+    """Registry to expose: every worker's samples in multiprocess mode, else this process's."""
+    if not multiprocess_enabled():
+        return REGISTRY
+    registry = CollectorRegistry()
+    multiprocess.MultiProcessCollector(registry)
+    return registry
+
+
+def metrics_asgi_app():
+    """ASGI app serving the Prometheus text format (mounted at /metrics)."""
+    return make_asgi_app(registry=metrics_registry())
+
+
+async def mark_worker_dead():
+    """Drop this worker's live gauges from the shared directory (shutdown hook)."""
+    if multiprocess_enabled():
+        multiprocess.mark_process_dead(os.getpid())
@@ -0,0 +1,173 @@
+"""
+Per-turn model tiering for tutoring replies.
+Most turns are chat a fast model handles well; quiz requests, corrections
+and long messages need the stronger one. The tier and its thinking budget
+are picked from cheap features of the message, and a flash reply that
+fails schema or language validation is redone on pro. When flash keeps
+failing, every turn goes to pro until its recent failure rate drops.
+"""
+
+import logging
+import re
+from collections import Counter, deque
+from dataclasses import dataclass
+from typing import Collection, Deque, Dict, Optional
+from django.conf import settings
+from .intent_router import fold_text
+from .metrics import MODEL_ESCALATIONS, MODEL_TIER_TURNS
+
+logger = logging.getLogger(__name__)
+
+TIER_FLASH = "flash"
+TIER_PRO = "pro"
+
+# Why a reply was redone on pro
+PROBLEM_ERROR = "error"        # The flash request itself failed
+PROBLEM_SCHEMA = "schema"      # Unparseable, or fields had to be defaulted
+PROBLEM_LANGUAGE = "language"  # chinese_content is not pure Chinese
+PROBLEMS = (PROBLEM_ERROR, PROBLEM_SCHEMA, PROBLEM_LANGUAGE)
+
+# Requests that need a correct quiz or a careful correction (over fold_text() output)
+_DEMANDING_RE = re.compile(
+    r"kiem tra|trac nghiem|quiz|bai tap|ra de|cau do|sua (?:loi|giup|cau|cho)|"
+    r"dung khong|sai (?:o dau|cho nao|khong|gi)|chinh ta|ngu phap|giai thich|"
+    r"correct|grammar|explain|"
+    r"测验|练习|出题|考考|纠正|改正|语法|对不对|错在|哪里错|为什么"
+)
+_CJK_RE = re.compile(r"[㐀-鿿]")
+
+
+@dataclass(frozen=True)
+class TierDecision:
+    tier: str
+    model: str
+    thinking_budget: Optional[int]  # None = the model's default
+    reason: str
+
+
+class ModelRouter:
+    """
+    Picks the model and thinking budget for each tutoring turn.
+
+    Args:
+        flash_model / pro_model: Model names of the two tiers
+        flash_thinking_budget: Budget for flash turns containing Chinese
+            (plain chat gets none)
+        pro_thinking_budget: Budget for pro turns (-1 = dynamic)
+        long_message_chars: Longer messages go to pro
+        escalate_on: Problems with a flash reply that redo it on pro
+        failure_window / failure_threshold: Share of the last flash replies
+            with a problem above which every turn goes to pro
+        enabled: False sends every turn to pro with its default thinking
+    """
+
+    def __init__(
+        self,
+        flash_model: str = "gemini-2.5-flash",
+        pro_model: str = "gemini-2.5-pro",
+        flash_thinking_budget: int = 512,
+        pro_thinking_budget: int = 2048,
+        long_message_chars: int = 150,
+        escalate_on: Collection[str] = PROBLEMS,
+        failure_window: int = 50,
+        failure_threshold: float = 0.3,
+        enabled: bool = True
+    ):
+        self.flash_model = flash_model
+        self.pro_model = pro_model
+        self.flash_thinking_budget = flash_thinking_budget
+        self.pro_thinking_budget = pro_thinking_budget
+        self.long_message_chars = long_message_chars
+        self.escalate_on = set(escalate_on)
+        self.failure_threshold = failure_threshold
+        self.enabled = enabled
+
+        self._flash_outcomes: Deque[bool] = deque(maxlen=failure_window)
+        self.turns: Counter = Counter()
+        self.escalations: Counter = Counter()
+
+    @property
+    def flash_failure_rate(self) -> float:
+        if not self._flash_outcomes:
+            return 0.0
+        return sum(self._flash_outcomes) / len(self._flash_outcomes)
+
+    def _flash_unhealthy(self) -> bool:
+        # Judge only once the window holds enough replies to mean something
+        enough = len(self._flash_outcomes) >= max(1, (self._flash_outcomes.maxlen or 0) // 5)
+        return enough and self.flash_failure_rate > self.failure_threshold
+
+    def choose(self, user_text: str) -> TierDecision:
+        """Tier for a new turn."""
+        if not self.enabled:
+            decision = TierDecision(TIER_PRO, self.pro_model, None, "tiering_off")
+        elif _DEMANDING_RE.search(fold_text(user_text)):
+            decision = self._pro("quiz_or_correction")
+        elif len(user_text) > self.long_message_chars:
+            decision = self._pro("long_message")
+        elif self._flash_unhealthy():
+            decision = self._pro("flash_failing")
+        elif _CJK_RE.search(user_text):
+            # The learner wrote Chinese: give flash room to check it
+            decision = TierDecision(TIER_FLASH, self.flash_model, self.flash_thinking_budget, "chinese")
+        else:
+            decision = TierDecision(TIER_FLASH, self.flash_model, 0, "chat")
+
+        self.turns[decision.tier] += 1
+        MODEL_TIER_TURNS.labels(tier=decision.tier, reason=decision.reason).inc()
+        return decision
+
+    def can_escalate(self, decision: TierDecision, problem: str) -> bool:
+        return decision.tier == TIER_FLASH and problem in self.escalate_on
+
+    def record(self, decision: TierDecision, problem: Optional[str]) -> Optional[TierDecision]:
+        """
+        Record how a reply went.
+
+        Args:
+            problem: One of PROBLEMS, or None for a good reply
+
+        Returns:
+            The pro decision to redo the turn with, or None to keep the reply
+        """
+        if decision.tier != TIER_FLASH:
+            return None
+        self._flash_outcomes.append(problem is not None)
+        if problem is None or not self.can_escalate(decision, problem):
+            return None
+
+        self.escalations[problem] += 1
+        MODEL_ESCALATIONS.labels(problem=problem).inc()
+        logger.info(f"Redoing {decision.reason} turn on {self.pro_model}: flash reply had a {problem} problem")
+        return self._pro(f"escalated_{problem}")
+
+    def stats(self) -> Dict[str, object]:
+        return {
+            "enabled": self.enabled,
+            "turns": dict(self.turns),
+            "escalations": dict(self.escalations),
+            "flash_failure_rate": self.flash_failure_rate,
+        }
+
+    def _pro(self, reason: str) -> TierDecision:
+        return TierDecision(TIER_PRO, self.pro_model, self.pro_thinking_budget, reason)
+
+
+_router: Optional[ModelRouter] = None
+
+
+def get_model_router() -> ModelRouter:
+    """Process-wide router configured from settings."""
+    global _router
+    if _router is None:
+        _router = ModelRouter(
+            flash_model=settings.GEMINI_FLASH_MODEL,
+            pro_model=settings.GEMINI_PRO_MODEL,
+            flash_thinking_budget=settings.GEMINI_FLASH_THINKING_BUDGET,
+            pro_thinking_budget=settings.GEMINI_PRO_THINKING_BUDGET,
+            long_message_chars=settings.XIAOYUE_TIER_LONG_MESSAGE_CHARS,
+            escalate_on=settings.XIAOYUE_TIER_ESCALATE_ON,
+            failure_threshold=settings.XIAOYUE_TIER_FAILURE_THRESHOLD,
+            enabled=settings.XIAOYUE_MODEL_TIERING
+        )
+    return _router
@@ -0,0 +1,202 @@
+"""
+Gemini context caching for the system prompt.
+SYSTEM_PROMPT_TEMPLATE only varies by user_role, agent_role and
+sulking_level, so each combination is uploaded once as cached content and
+referenced by handle on every turn instead of being re-sent.
+"""
+
+import asyncio
+import hashlib
+import logging
+import time
+from dataclasses import dataclass
+from typing import Any, Dict, Optional
+from google.genai import types
+from .metrics import record_cache_lookup
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class _CacheEntry:
+    name: str
+    expires_at: float
+
+
+class PromptCacheManager:
+    """
+    Creates, refreshes and hands out cached-content handles per
+    (model, system instruction).
+
+    Handles are refreshed ``refresh_margin`` seconds before they expire.
+    When creation fails (e.g. the prompt is below the model's minimum
+    cacheable size) the key is skipped for ``failure_backoff`` seconds and
+    callers fall back to sending the system instruction inline.
+
+    If a ``redis_client`` is given, handles are shared across workers under
+    ``gemini:prompt_cache:{key}`` so the cluster keeps one cache per
+    combination.
+    """
+
+    REDIS_PREFIX = "gemini:prompt_cache:"
+
+    def __init__(
+        self,
+        client: Any,
+        ttl: int = 3600,
+        refresh_margin: int = 300,
+        failure_backoff: int = 600,
+        redis_client: Any = None
+    ):
+        self.client = client
+        self.ttl = ttl
+        self.refresh_margin = refresh_margin
+        self.failure_backoff = failure_backoff
+        self.redis_client = redis_client
+
+        self._entries: Dict[str, _CacheEntry] = {}
+        self._failed_until: Dict[str, float] = {}
+        self._locks: Dict[str, asyncio.Lock] = {}
+        self._rejected: Dict[str, float] = {}  # Handle name -> when to forget it
+
+        self.hits = 0
+        self.creates = 0
+        self.refreshes = 0
+        self.failures = 0
+
+    @staticmethod
+    def make_key(model: str, system_instruction: str) -> str:
+        digest = hashlib.sha256(system_instruction.encode("utf-8")).hexdigest()[:32]
+        return f"{model}:{digest}"
+
+    async def get_handle(self, model: str, system_instruction: str) -> Optional[str]:
+        """
+        Get a cached-content name for this prompt, creating or refreshing it
+        as needed.
+
+        Returns:
+            Cached content name, or None to send the prompt inline
+        """
+        key = self.make_key(model, system_instruction)
+        now = time.time()
+
+        if self._failed_until.get(key, 0) > now:
+            return None
+
+        entry = self._entries.get(key)
+        if entry and entry.expires_at - now > self.refresh_margin:
+            self.hits += 1
+            record_cache_lookup("prompt", hit=True)
+            return entry.name
+
+        lock = self._locks.setdefault(key, asyncio.Lock())
+        async with lock:
+            # Another task may have refreshed it while we waited
+            entry = self._entries.get(key)
+            now = time.time()
+            if entry and entry.expires_at - now > self.refresh_margin:
+                self.hits += 1
+                record_cache_lookup("prompt", hit=True)
+                return entry.name
+
+            record_cache_lookup("prompt", hit=False)
+            try:
+                if entry and entry.expires_at > now:
+                    entry = await self._refresh(key, entry)
+                else:
+                    entry = await self._load_shared(key) or await self._create(key, model, system_instruction)
+            except Exception as e:
+                logger.warning(f"Prompt cache unavailable for {key}, sending prompt inline: {e}")
+                self.failures += 1
+                self._entries.pop(key, None)
+                self._failed_until[key] = now + self.failure_backoff
+                return None
+
+            self._entries[key] = entry
+            return entry.name
+
+    def invalidate(self, name: str):
+        """Forget a handle the API rejected (expired or deleted elsewhere)."""
+        # Also skip it if another worker still advertises it in Redis;
+        # the next create overwrites the shared entry. No advertisement
+        # outlives one TTL, since refreshing a rejected handle fails too
+        now = time.time()
+        self._rejected = {
+            rejected: until for rejected, until in self._rejected.items() if until > now
+        }
+        self._rejected[name] = now + self.ttl
+        for key, entry in list(self._entries.items()):
+            if entry.name == name:
+                del self._entries[key]
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "creates": self.creates,
+            "refreshes": self.refreshes,
+            "failures": self.failures,
+        }
+
+    async def _create(self, key: str, model: str, system_instruction: str) -> _CacheEntry:
+        cached = await self.client.aio.caches.create(
+            model=model,
+            config=types.CreateCachedContentConfig(
+                display_name=f"xiaoyue-{key}"[:128],
+                system_instruction=system_instruction,
+                ttl=f"{self.ttl}s"
+            )
+        )
+        self.creates += 1
+        entry = _CacheEntry(name=cached.name, expires_at=self._expiry_of(cached))
+        await self._store_shared(key, entry)
+        logger.info(f"Created prompt cache {cached.name} for {key}")
+        return entry
+
+    async def _refresh(self, key: str, entry: _CacheEntry) -> _CacheEntry:
+        cached = await self.client.aio.caches.update(
+            name=entry.name,
+            config=types.UpdateCachedContentConfig(ttl=f"{self.ttl}s")
+        )
+        self.refreshes += 1
+        entry = _CacheEntry(name=entry.name, expires_at=self._expiry_of(cached))
+        await self._store_shared(key, entry)
+        return entry
+
+    async def _load_shared(self, key: str) -> Optional[_CacheEntry]:
+        if not self.redis_client:
+            return None
+        try:
+            client = await self.redis_client.get_client()
+            raw = await client.get(self.REDIS_PREFIX + key)
+        except Exception as e:
+            logger.warning(f"Prompt cache Redis lookup failed: {e}")
+            return None
+        if not raw:
+            return None
+
+        name, _, expires_at = raw.partition("|")
+        entry = _CacheEntry(name=name, expires_at=float(expires_at))
+        now = time.time()
+        if self._rejected.get(entry.name, 0) > now or entry.expires_at - now <= self.refresh_margin:
+            return None
+        return entry
+
+    async def _store_shared(self, key: str, entry: _CacheEntry):
+        if not self.redis_client:
+            return
+        remaining = int(entry.expires_at - time.time() - self.refresh_margin)
+        if remaining <= 0:
+            return
+        try:
+            client = await self.redis_client.get_client()
+            await client.set(self.REDIS_PREFIX + key, f"{entry.name}|{entry.expires_at}", ex=remaining)
+        except Exception as e:
+            logger.warning(f"Prompt cache Redis store failed: {e}")
+
+    def _expiry_of(self, cached: Any) -> float:
+        expire_time = getattr(cached, "expire_time", None)
+        if expire_time is not None:
+            return expire_time.timestamp()
+        return time.time() + self.ttl
+
@@ -268,9 +268,44 @@ ACTION_OPTIONS = [
 
 MAX_HISTORY_TURNS = 20
 
+LANGUAGE_FIX_PROMPT_TEMPLATE = """The following tutor line must be read aloud by a Chinese TTS voice, but it contains non-Chinese text.
+
+Line: {chinese_content}
+Meaning (Vietnamese): {vietnamese_display}
+
+Rewrite it as natural simplified Chinese with the same meaning and tone. Use ONLY Chinese characters and Chinese punctuation: no pinyin, no Vietnamese, no English. Also give its pinyin.
+"""
+
+QUIZ_EXPLANATION_PROMPT_TEMPLATE = """You are 小月, a Chinese tutor. The learner ({user_role}) answered these quiz items wrong.
+
+For EACH item, explain in Vietnamese, in one or two short sentences, why the expected answer is right and what the learner's answer got wrong. Quote Chinese exactly and add pinyin for new words. Return one explanation per item id.
+
+### WRONG ITEMS
+{items}
+"""
+
+SUMMARY_PROMPT_TEMPLATE = """You maintain a running summary of a Chinese lesson between a learner ({user_role}) and their tutor 小月 ({agent_role}).
+
+Merge the previous summary and the new conversation turns into ONE updated summary for the tutor to read before the next turn. Keep:
+- Topics, vocabulary and grammar already practised
+- Mistakes the learner made and whether they were corrected
+- Quizzes given and how the learner did
+- Relationship/mood facts (e.g. why the tutor is sulking), names and preferences the learner shared
+
+Write in Vietnamese, at most {max_words} words, as short bullet points. Quote Chinese words exactly. Do not invent anything.
+
+### PREVIOUS SUMMARY
+{previous_summary}
+
+### NEW TURNS
+{turns}
+"""
+
 REDIS_KEY_PATTERNS = {
     "conversation_history": "chat:history:{user_id}",
     "user_state": "chat:state:{user_id}",
     "sulking_level": "chat:sulking:{user_id}",
+    "conversation_summary": "chat:summary:{user_id}",
+    "quiz_set": "chat:quiz:{user_id}",
 }
 
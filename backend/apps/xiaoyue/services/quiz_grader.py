@@ -0,0 +1,214 @@
+"""
+Local grading for quiz answers.
+The quiz_list Gemini returns already carries the correct answer, so checking
+a learner's answers needs no model call: each answer is compared with the
+expected one exactly, then with traditional characters folded to simplified,
+then as toneless pinyin, then within a small edit distance.
+"""
+
+import logging
+import re
+import unicodedata
+from typing import Any, Dict, List, Mapping, Optional, Union
+
+logger = logging.getLogger(__name__)
+
+MATCH_EXACT = "exact"      # Same text once case, width, spaces and punctuation are ignored
+MATCH_VARIANT = "variant"  # Same after folding traditional characters to simplified
+MATCH_PINYIN = "pinyin"    # Same pinyin without tones (numbered or marked)
+MATCH_TYPO = "typo"        # Latin text within TYPO_RATIO edits of the expected answer
+MATCHES = (MATCH_EXACT, MATCH_VARIANT, MATCH_PINYIN, MATCH_TYPO)
+
+# Edits tolerated per letter of the expected answer, and overall
+TYPO_RATIO = 0.2
+MAX_TYPOS = 2
+
+# Traditional -> simplified pairs for characters common in beginner material
+_VARIANT_PAIRS = (
+    "們们 個个 這这 說说 學学 會会 對对 來来 時时 見见 點点 兒儿 麼么 嗎吗 國国 語语 話话 謝谢 "
+    "請请 問问 買买 賣卖 東东 車车 開开 關关 門门 電电 腦脑 書书 讀读 寫写 聽听 氣气 飯饭 館馆 "
+    "媽妈 貓猫 鳥鸟 魚鱼 馬马 錢钱 貴贵 實实 歡欢 愛爱 樂乐 漢汉 廣广 場场 機机 飛飞 發发 現现 "
+    "給给 還还 沒没 難难 紅红 藍蓝 綠绿 黃黄 遠远 邊边 歲岁 幾几 萬万 億亿 葉叶 風风 雲云 雙双 "
+    "頭头 臉脸 長长 師师 習习 題题 夢梦 覺觉 燈灯 鐘钟 錶表 雞鸡 鴨鸭 麵面 湯汤 壞坏 務务 員员 "
+    "間间 認认 識识 區区 醫医 樣样 種种 應应 該该 體体 運运 動动 視视 網网 號号 碼码 筆笔 記记 "
+    "憶忆 隊队 裡里 裏里 後后 從从 雖虽 雜杂 辦办 壓压 專专 業业 熱热 鬧闹 親亲 歷历 寶宝"
+)
+_VARIANTS = {ord(pair[0]): pair[1] for pair in _VARIANT_PAIRS.split()}
+
+_PUNCTUATION_RE = re.compile(r"[\s\W_]+", re.UNICODE)
+_TONE_DIGITS_RE = re.compile(r"(?<=[a-z])[1-5]")
+# "A", "B." or "c)" at the start of a multiple-choice option or answer
+_OPTION_LABEL_RE = re.compile(r"^\s*([A-Za-z])\s*(?:[.)、:：]\s*|$)")
+
+
+def normalize_answer(text: str) -> str:
+    """Fold width and case and drop whitespace and punctuation."""
+    text = unicodedata.normalize("NFKC", text or "").casefold()
+    return _PUNCTUATION_RE.sub("", text)
+
+
+def fold_variants(text: str) -> str:
+    """Replace traditional characters with their simplified forms."""
+    return text.translate(_VARIANTS)
+
+
+def strip_tones(text: str) -> str:
+    """
+    Toneless pinyin: "Xiè xie", "xie4xie5" and "xiexie" all become "xiexie"
+    (ü and u: become v). Non-pinyin text is only normalized.
+    """
+    text = normalize_answer((text or "").replace("u:", "v"))
+    text = unicodedata.normalize("NFD", text).replace("u\u0308", "v")
+    text = "".join(char for char in text if unicodedata.category(char) != "Mn")
+    return _TONE_DIGITS_RE.sub("", text)
+
+
+def hanzi_to_pinyin(text: str) -> Optional[str]:
+    """Toneless pinyin of Chinese text, or None when pypinyin is not installed."""
+    try:
+        from pypinyin import lazy_pinyin
+    except ImportError:
+        return None
+    return strip_tones("".join(lazy_pinyin(text, v_to_u=False)))
+
+
+def edit_distance(a: str, b: str, limit: int) -> int:
+    """
+    Levenshtein distance between ``a`` and ``b``, or ``limit + 1`` as soon
+    as it is known to exceed ``limit``.
+    """
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+
+    previous = list(range(len(b) + 1))
+    for i, char_a in enumerate(a, 1):
+        current = [i]
+        for j, char_b in enumerate(b, 1):
+            current.append(min(
+                previous[j] + 1,
+                current[j - 1] + 1,
+                previous[j - 1] + (char_a != char_b)
+            ))
+        if min(current) > limit:
+            return limit + 1
+        previous = current
+    return previous[-1]
+
+
+def allowed_typos(expected: str) -> int:
+    return min(MAX_TYPOS, int(len(expected) * TYPO_RATIO))
+
+
+def _is_chinese(text: str) -> bool:
+    return any(unicodedata.name(char, "").startswith("CJK") for char in text)
+
+
+def _resolve_option(answer: str, options: List[str]) -> str:
+    """Map an option label ("B", "b.") to that option's text; strip labels off option text."""
+    match = _OPTION_LABEL_RE.match(answer)
+    if match:
+        index = ord(match.group(1).lower()) - ord("a")
+        rest = answer[match.end():]
+        if not rest and 0 <= index < len(options):
+            return _resolve_option(options[index], [])
+        if rest:
+            return rest
+    return answer
+
+
+def match_answer(given: str, expected: str, options: Optional[List[str]] = None) -> Optional[str]:
+    """
+    Compare one answer with the expected one.
+
+    Args:
+        given: The learner's answer
+        expected: The quiz item's answer
+        options: Multiple-choice options; labels ("A") then count as their text
+
+    Returns:
+        The first of MATCHES that applies, or None if the answer is wrong
+    """
+    if options:
+        given = _resolve_option(given, options)
+        expected = _resolve_option(expected, options)
+
+    given_norm, expected_norm = normalize_answer(given), normalize_answer(expected)
+    if not given_norm:
+        return None
+    if given_norm == expected_norm:
+        return MATCH_EXACT
+
+    given_simple, expected_simple = fold_variants(given_norm), fold_variants(expected_norm)
+    if given_simple == expected_simple:
+        return MATCH_VARIANT
+
+    # Homophones are different answers, so two Chinese answers are never
+    # compared by sound, and characters typed where the pinyin was asked for
+    # don't answer the question; pinyin against characters needs pypinyin
+    given_chinese, expected_chinese = _is_chinese(given_simple), _is_chinese(expected_simple)
+    given_pinyin = expected_pinyin = None
+    if not given_chinese:
+        given_pinyin = strip_tones(given)
+        expected_pinyin = hanzi_to_pinyin(expected_simple) if expected_chinese else strip_tones(expected)
+        if given_pinyin and given_pinyin == expected_pinyin:
+            return MATCH_PINYIN
+
+    # A wrong option is wrong, however close its spelling
+    if options:
+        return None
+    # Typing slips only count in Latin text: one wrong character in Chinese
+    # is usually the very mistake the quiz is testing
+    if given_pinyin and expected_pinyin:
+        limit = allowed_typos(expected_pinyin)
+        if limit and edit_distance(given_pinyin, expected_pinyin, limit) <= limit:
+            return MATCH_TYPO
+    return None
+
+
+def grade_quiz(
+    quiz_list: List[Dict[str, Any]],
+    answers: Union[Mapping[Any, Any], List[Dict[str, Any]]]
+) -> Dict[str, Any]:
+    """
+    Grade answers against a stored quiz_list.
+
+    Args:
+        quiz_list: Items as returned by Gemini ({"id", "question", "options", "answer", ...})
+        answers: {item_id: answer} or [{"id": item_id, "answer": answer}, ...];
+            ids may be strings, unknown ids are ignored
+
+    Returns:
+        Dict with per-item 'results' ({"id", "answer", "expected", "correct",
+        "match"}), 'score', 'total' and 'percent'
+    """
+    if isinstance(answers, Mapping):
+        given_by_id = {str(item_id): answer for item_id, answer in answers.items()}
+    else:
+        given_by_id = {str(entry.get("id")): entry.get("answer") for entry in answers if isinstance(entry, Mapping)}
+
+    results = []
+    for item in quiz_list:
+        given = given_by_id.get(str(item.get("id")))
+        expected = str(item.get("answer", ""))
+        match = None
+        if isinstance(given, (str, int, float)):
+            given = str(given)
+            match = match_answer(given, expected, item.get("options") or None)
+        else:
+            given = None
+        results.append({
+            "id": item.get("id"),
+            "answer": given,
+            "expected": expected,
+            "correct": match is not None,
+            "match": match
+        })
+
+    score = sum(result["correct"] for result in results)
+    return {
+        "results": results,
+        "score": score,
+        "total": len(results),
+        "percent": round(100 * score / len(results)) if results else 0
+    }
+
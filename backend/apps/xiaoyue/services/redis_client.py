@@ -1,53 +1,173 @@
 """
 Redis client for managing conversation history and user state.
+All RedisClient instances borrow connections from a shared, process-wide
+connection pool.
 """
 
+import asyncio
 import json
 import logging
+import time
+import weakref
 from typing import Any, Dict, List, Optional
 from redis import asyncio as aioredis
+from redis.asyncio.lock import Lock
 from django.conf import settings
+from .metrics import (
+    REDIS_POOL_ACQUIRE_FAILURES,
+    REDIS_POOL_ACQUIRE_SECONDS,
+    REDIS_POOL_IN_USE,
+    REDIS_POOL_WAITING,
+)
 
 logger = logging.getLogger(__name__)
 
 
+class MeteredConnectionPool(aioredis.BlockingConnectionPool):
+    """
+    Blocking pool that waits for a free connection instead of opening more
+    than ``max_connections`` sockets, and records acquisition metrics
+    (also exported to Prometheus, labelled by database number). Failed
+    acquisitions are counted apart from the successful ones.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.acquired_total = 0
+        self.acquire_failures = 0
+        self.waiting = 0
+        self.acquire_seconds_total = 0.0
+        self.acquire_seconds_max = 0.0
+        self._database = str(self.connection_kwargs.get("db", 0))
+
+    async def get_connection(self, command_name=None, *keys, **options):
+        started = time.perf_counter()
+        self.waiting += 1
+        REDIS_POOL_WAITING.labels(database=self._database).inc()
+        try:
+            connection = await super().get_connection()
+        except Exception as e:
+            # The pool raises ConnectionError from the TimeoutError of its wait
+            reason = "timeout" if isinstance(e.__cause__, asyncio.TimeoutError) else "error"
+            self.acquire_failures += 1
+            REDIS_POOL_ACQUIRE_FAILURES.labels(database=self._database, reason=reason).inc()
+            raise
+        finally:
+            self.waiting -= 1
+            REDIS_POOL_WAITING.labels(database=self._database).dec()
+
+        waited = time.perf_counter() - started
+        self.acquired_total += 1
+        self.acquire_seconds_total += waited
+        self.acquire_seconds_max = max(self.acquire_seconds_max, waited)
+        REDIS_POOL_ACQUIRE_SECONDS.labels(database=self._database).observe(waited)
+        REDIS_POOL_IN_USE.labels(database=self._database).inc()
+        return connection
+
+    async def release(self, connection):
+        if connection in self._in_use_connections:
+            REDIS_POOL_IN_USE.labels(database=self._database).dec()
+        await super().release(connection)
+
+    def stats(self) -> Dict[str, Any]:
+        in_use = len(self._in_use_connections)
+        return {
+            "max_connections": self.max_connections,
+            "in_use": in_use,
+            "idle": len(self._available_connections),
+            "utilization": in_use / self.max_connections if self.max_connections else 0.0,
+            "waiting": self.waiting,
+            "acquired_total": self.acquired_total,
+            "acquire_failures": self.acquire_failures,
+            "acquire_seconds_total": self.acquire_seconds_total,
+            "acquire_seconds_max": self.acquire_seconds_max,
+        }
+
+
+# redis.asyncio connections are bound to the event loop that opened them,
+# so the process keeps one pool per (event loop, url).
+_pools: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, Dict[str, MeteredConnectionPool]]" = (
+    weakref.WeakKeyDictionary()
+)
+
+
+def get_connection_pool(redis_url: str) -> MeteredConnectionPool:
+    """Get (or lazily create) the shared pool for this event loop."""
+    loop = asyncio.get_running_loop()
+    loop_pools = _pools.setdefault(loop, {})
+
+    pool = loop_pools.get(redis_url)
+    if pool is None:
+        pool = MeteredConnectionPool.from_url(
+            redis_url,
+            max_connections=settings.REDIS_POOL_MAX_CONNECTIONS,
+            timeout=settings.REDIS_POOL_TIMEOUT,
+            health_check_interval=settings.REDIS_HEALTH_CHECK_INTERVAL,
+            encoding="utf-8",
+            decode_responses=True
+        )
+        loop_pools[redis_url] = pool
+        logger.info(
+            f"Created Redis pool for {redis_url} "
+            f"(max_connections={settings.REDIS_POOL_MAX_CONNECTIONS})"
+        )
+    return pool
+
+
+def get_pool_stats() -> List[Dict[str, Any]]:
+    """Utilization metrics for every live pool in this process."""
+    stats = []
+    for loop_pools in list(_pools.values()):
+        for redis_url, pool in loop_pools.items():
+            stats.append({"url": redis_url, **pool.stats()})
+    return stats
+
+
+async def close_connection_pools():
+    """Disconnect the pools owned by the running event loop (shutdown hook)."""
+    loop_pools = _pools.pop(asyncio.get_running_loop(), {})
+    for pool in loop_pools.values():
+        await pool.disconnect()
+
+
+# TTLs (seconds)
+HISTORY_TTL = 30 * 24 * 60 * 60  # 30 days
+STATE_TTL = 30 * 24 * 60 * 60  # 30 days
+SULKING_TTL = 7 * 24 * 60 * 60  # 7 days
+TURN_LOCK_TTL = 120  # Upper bound on one chat turn; frees the lock if a worker dies
+SUMMARY_LOCK_TTL = 120  # Upper bound on one summarization run
+QUIZ_TTL = 24 * 60 * 60  # 1 day to answer the latest quiz
+
+DEFAULT_USER_STATE = {
+    "user_role": "Sư huynh",
+    "agent_role": "Muội muội",
+    "sulking_level": 0,
+    "preferred_voice": "zh-CN-XiaoxiaoNeural"
+}
+
+
 class RedisClient:
     """
     Async Redis client for managing user conversations and state.
     """
     
-    def __init__(self):
-        # Lấy cấu hình host từ settings
-        # config có thể là tuple ('redis', 6379) HOẶC string "redis://..."
-        config = settings.CHANNEL_LAYERS["default"]["CONFIG"]["hosts"][0]
-        
-        # Logic xử lý thông minh:
-        if isinstance(config, (tuple, list)):
-            # Nếu là tuple ('redis', 6379) -> Chuyển thành chuỗi "redis://redis:6379"
-            host, port = config
-            self.redis_url = f"redis://{host}:{port}"
-        else:
-            # Nếu đã là string thì giữ nguyên
-            self.redis_url = config
-            
-        logger.info(f"Connecting to Redis at: {self.redis_url}")
-        self._client: Optional[aioredis.Redis] = None
+    def __init__(self, role: str = "state"):
+        """
+        Args:
+            role: Key of settings.REDIS_URLS selecting the database
+                ("state" for chat data, "cache" for disposable caches)
+        """
+        self.redis_url = settings.REDIS_URLS[role]
     
     async def get_client(self) -> aioredis.Redis:
-        """Get or create Redis client connection."""
-        if self._client is None:
-            self._client = await aioredis.from_url(
-                self.redis_url,
-                encoding="utf-8",
-                decode_responses=True
-            )
-        return self._client
+        """Get a Redis client backed by the shared connection pool."""
+        return aioredis.Redis(connection_pool=get_connection_pool(self.redis_url))
     
     async def close(self):
-        """Close Redis connection."""
-        if self._client:
-            await self._client.close()
-            self._client = None
+        """
+        Release this client. Connections belong to the shared pool and stay
+        open for other consumers; use close_connection_pools() on shutdown.
+        """
     
     # ==================== Conversation History ====================
     
@@ -98,14 +218,17 @@ class RedisClient:
         key = f"chat:history:{user_id}"
         
         try:
-            # Add message to the right of the list
-            await client.rpush(key, json.dumps(message, ensure_ascii=False))
-            
-            # Trim to keep only last max_history messages
-            await client.ltrim(key, -max_history, -1)
-            
-            # Set expiration (30 days)
-            await client.expire(key, 30 * 24 * 60 * 60)
+            async with client.pipeline(transaction=True) as pipe:
+                # Add message to the right of the list
+                pipe.rpush(key, json.dumps(message, ensure_ascii=False))
+                
+                # Trim to keep only last max_history messages
+                pipe.ltrim(key, -max_history, -1)
+                
+                # Set expiration (30 days)
+                pipe.expire(key, HISTORY_TTL)
+                
+                await pipe.execute()
             
             return True
         except Exception as e:
@@ -113,12 +236,12 @@ class RedisClient:
             return False
     
     async def clear_conversation_history(self, user_id: str) -> bool:
-        """Clear all conversation history for a user."""
+        """Clear all conversation history (with its running summary and quiz) for a user."""
         client = await self.get_client()
         key = f"chat:history:{user_id}"
         
         try:
-            await client.delete(key)
+            await client.delete(key, f"chat:summary:{user_id}", f"chat:quiz:{user_id}")
             return True
         except Exception as e:
             logger.error(f"Error clearing conversation history: {e}")
@@ -163,8 +286,7 @@ class RedisClient:
         try:
             # Clamp level between 0 and 3
             level = max(0, min(3, level))
-            await client.set(key, level)
-            await client.expire(key, 7 * 24 * 60 * 60)  # 7 days
+            await client.set(key, level, ex=SULKING_TTL)
             return True
         except Exception as e:
             logger.error(f"Error setting sulking level: {e}")
@@ -212,20 +334,10 @@ class RedisClient:
                 return json.loads(state_json)
             else:
                 # Default state
-                return {
-                    "user_role": "Sư huynh",
-                    "agent_role": "Muội muội",
-                    "sulking_level": 0,
-                    "preferred_voice": "zh-CN-XiaoxiaoNeural"
-                }
+                return dict(DEFAULT_USER_STATE)
         except Exception as e:
             logger.error(f"Error getting user state: {e}")
-            return {
-                "user_role": "Sư huynh",
-                "agent_role": "Muội muội",
-                "sulking_level": 0,
-                "preferred_voice": "zh-CN-XiaoxiaoNeural"
-            }
+            return dict(DEFAULT_USER_STATE)
     
     async def set_user_state(self, user_id: str, state: Dict[str, Any]) -> bool:
         """Save complete user state."""
@@ -233,10 +345,235 @@ class RedisClient:
         key = f"chat:state:{user_id}"
         
         try:
-            await client.set(key, json.dumps(state, ensure_ascii=False))
-            await client.expire(key, 30 * 24 * 60 * 60)  # 30 days
+            await client.set(key, json.dumps(state, ensure_ascii=False), ex=STATE_TTL)
             return True
         except Exception as e:
             logger.error(f"Error setting user state: {e}")
             return False
-
+    
+    # ==================== Batched Turn Operations ====================
+    
+    async def load_turn_context(
+        self,
+        user_id: str,
+        history_limit: int = 20
+    ) -> Dict[str, Any]:
+        """
+        Load everything a chat turn needs in a single round-trip.
+        
+        Args:
+            user_id: Unique user identifier
+            history_limit: Maximum number of history messages to retrieve
+            
+        Returns:
+            Dict with 'state', 'sulking_level', 'history' (oldest to newest)
+            and 'summary' (running summary record or None)
+        """
+        client = await self.get_client()
+        
+        try:
+            async with client.pipeline(transaction=False) as pipe:
+                pipe.get(f"chat:state:{user_id}")
+                pipe.get(f"chat:sulking:{user_id}")
+                pipe.lrange(f"chat:history:{user_id}", -history_limit, -1)
+                pipe.get(f"chat:summary:{user_id}")
+                state_json, level, messages, summary_json = await pipe.execute()
+            
+            return {
+                "state": json.loads(state_json) if state_json else dict(DEFAULT_USER_STATE),
+                "sulking_level": int(level) if level else 0,
+                "history": [json.loads(msg) for msg in messages],
+                "summary": json.loads(summary_json) if summary_json else None
+            }
+        except Exception as e:
+            logger.error(f"Error loading turn context: {e}")
+            return {
+                "state": dict(DEFAULT_USER_STATE),
+                "sulking_level": 0,
+                "history": [],
+                "summary": None
+            }
+    
+    async def commit_turn(
+        self,
+        user_id: str,
+        user_message: Dict[str, Any],
+        assistant_message: Dict[str, Any],
+        state: Optional[Dict[str, Any]] = None,
+        max_history: int = 20,
+        quiz_list: Optional[List[Dict[str, Any]]] = None
+    ) -> bool:
+        """
+        Atomically append both sides of a turn to history (and optionally
+        save user state and a new quiz) in a single MULTI/EXEC round-trip.
+        
+        Args:
+            user_id: Unique user identifier
+            user_message: The learner's message dict
+            assistant_message: The tutor's reply dict
+            state: User state to persist, or None to leave it untouched
+            max_history: Maximum messages to keep in history
+            quiz_list: Quiz the reply asked, replacing the active one (answers included)
+            
+        Returns:
+            True if successful
+        """
+        client = await self.get_client()
+        history_key = f"chat:history:{user_id}"
+        
+        try:
+            async with client.pipeline(transaction=True) as pipe:
+                pipe.rpush(
+                    history_key,
+                    json.dumps(user_message, ensure_ascii=False),
+                    json.dumps(assistant_message, ensure_ascii=False)
+                )
+                pipe.ltrim(history_key, -max_history, -1)
+                pipe.expire(history_key, HISTORY_TTL)
+                if state is not None:
+                    pipe.set(
+                        f"chat:state:{user_id}",
+                        json.dumps(state, ensure_ascii=False),
+                        ex=STATE_TTL
+                    )
+                if quiz_list:
+                    pipe.set(
+                        f"chat:quiz:{user_id}",
+                        json.dumps(quiz_list, ensure_ascii=False),
+                        ex=QUIZ_TTL
+                    )
+                await pipe.execute()
+            
+            return True
+        except Exception as e:
+            logger.error(f"Error committing turn: {e}")
+            return False
+    
+    # ==================== Quiz ====================
+    
+    async def get_quiz_set(self, user_id: str) -> List[Dict[str, Any]]:
+        """
+        The latest quiz_list asked in chat (with its answers), empty if none.
+        
+        Raises:
+            redis.RedisError: If Redis is unreachable
+        """
+        client = await self.get_client()
+        quiz_json = await client.get(f"chat:quiz:{user_id}")
+        return json.loads(quiz_json) if quiz_json else []
+    
+    # ==================== Conversation Summary ====================
+    
+    async def get_history_length(self, user_id: str) -> int:
+        client = await self.get_client()
+        return await client.llen(f"chat:history:{user_id}")
+    
+    async def get_history_head(self, user_id: str, count: int) -> List[str]:
+        """Oldest ``count`` history entries as raw JSON strings."""
+        client = await self.get_client()
+        return await client.lrange(f"chat:history:{user_id}", 0, count - 1)
+    
+    async def get_conversation_summary(self, user_id: str) -> Optional[Dict[str, Any]]:
+        """Running summary record of turns folded out of history, if any."""
+        client = await self.get_client()
+        
+        try:
+            summary_json = await client.get(f"chat:summary:{user_id}")
+            return json.loads(summary_json) if summary_json else None
+        except Exception as e:
+            logger.error(f"Error getting conversation summary: {e}")
+            return None
+    
+    async def fold_into_summary(
+        self,
+        user_id: str,
+        folded: List[str],
+        summary: Dict[str, Any]
+    ) -> bool:
+        """
+        Replace the oldest history entries with an updated summary, atomically.
+        
+        The history head is watched and compared with ``folded`` (as returned
+        by get_history_head), so nothing happens if the history was trimmed
+        or cleared while the summary was being generated.
+        
+        Returns:
+            True if the summary was stored and the entries removed
+        """
+        client = await self.get_client()
+        history_key = f"chat:history:{user_id}"
+        
+        try:
+            async with client.pipeline(transaction=True) as pipe:
+                await pipe.watch(history_key)
+                head = await pipe.lrange(history_key, 0, len(folded) - 1)
+                if head != folded:
+                    await pipe.unwatch()
+                    return False
+                
+                pipe.multi()
+                pipe.ltrim(history_key, len(folded), -1)
+                pipe.set(
+                    f"chat:summary:{user_id}",
+                    json.dumps(summary, ensure_ascii=False),
+                    ex=HISTORY_TTL
+                )
+                await pipe.execute()
+            
+            return True
+        except aioredis.WatchError:
+            logger.info(f"History changed while summarizing for {user_id}, skipping")
+            return False
+        except Exception as e:
+            logger.error(f"Error storing conversation summary: {e}")
+            return False
+    
+    async def claim_summary_run(self, user_id: str) -> bool:
+        """Mark a summarization as running so duplicate tasks skip it."""
+        client = await self.get_client()
+        return bool(await client.set(f"chat:summary_lock:{user_id}", 1, nx=True, ex=SUMMARY_LOCK_TTL))
+    
+    async def release_summary_run(self, user_id: str):
+        client = await self.get_client()
+        await client.delete(f"chat:summary_lock:{user_id}")
+    
+    # ==================== Turn Lock ====================
+    
+    async def acquire_turn_lock(
+        self,
+        user_id: str,
+        timeout: float = TURN_LOCK_TTL,
+        blocking_timeout: float = 0
+    ) -> Optional[Lock]:
+        """
+        Take the per-user chat turn lock, shared by every worker, so two
+        tabs of the same user cannot interleave turns in history.
+        
+        Args:
+            user_id: Unique user identifier
+            timeout: Seconds until the lock expires on its own
+            blocking_timeout: Seconds to wait for another turn to finish
+            
+        Returns:
+            The held lock, or None if another turn still holds it
+            
+        Raises:
+            redis.RedisError: If Redis is unreachable
+        """
+        client = await self.get_client()
+        lock = client.lock(
+            f"chat:turn_lock:{user_id}",
+            timeout=timeout,
+            blocking_timeout=blocking_timeout
+        )
+        
+        if await lock.acquire():
+            return lock
+        return None
+    
+    async def release_turn_lock(self, lock: Lock):
+        """Release a turn lock; a lock that already expired is ignored."""
+        try:
+            await lock.release()
+        except Exception as e:
+            logger.warning(f"Error releasing turn lock: {e}")
@@ -0,0 +1,223 @@
+"""
+Opt-in cache for tutor replies to context-free questions.
+Learners keep asking the same things ("Dạy em nói cảm ơn", "xin chào tiếng
+Trung là gì"), and with little or no history the reply depends only on the
+message, the roles and the sulking level. Each key collects up to
+``variants`` Gemini replies; once it has them all, lookups rotate through
+them so a repeated question doesn't always get the same answer.
+"""
+
+import copy
+import hashlib
+import json
+import logging
+import re
+import time
+import unicodedata
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional
+from django.conf import settings
+from .redis_client import RedisClient
+from .metrics import record_cache_lookup
+
+logger = logging.getLogger(__name__)
+
+_PUNCTUATION_RE = re.compile(r"[\W_]+", re.UNICODE)
+
+
+def normalize_request_text(text: str) -> str:
+    """
+    Fold width and case, drop punctuation and collapse whitespace; Vietnamese
+    diacritics are kept ("ma" and "mà" are different questions).
+    """
+    text = unicodedata.normalize("NFKC", text or "").casefold()
+    return " ".join(_PUNCTUATION_RE.sub(" ", text).split())
+
+
+@dataclass
+class _Entry:
+    variants: List[Dict[str, Any]]
+    expires_at: float
+    served: int = field(default=0)
+
+
+class ResponseCache:
+    """
+    Variant-rotating reply cache: an in-process LRU of at most
+    ``max_entries`` keys in front of an optional Redis tier shared by all
+    workers. Both expire ``ttl`` seconds after a key's first reply.
+
+    Args:
+        variants: Replies collected per key before lookups start hitting
+        max_entries: Keys kept in memory
+        ttl: Seconds a key lives
+        max_history: Turns with more history messages than this (or with a
+            conversation summary) are not cached
+        redis_client: Client for the shared tier (None = memory only)
+    """
+
+    KEY_PREFIX = "resp:cache:"
+
+    def __init__(
+        self,
+        variants: int = 3,
+        max_entries: int = 2000,
+        ttl: int = 24 * 60 * 60,
+        max_history: int = 2,
+        redis_client: Optional[RedisClient] = None
+    ):
+        self.variants = max(1, variants)
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.max_history = max_history
+        self.redis_client = redis_client
+
+        self._entries: "OrderedDict[str, _Entry]" = OrderedDict()
+
+        self.hits = 0
+        self.misses = 0
+        self.skipped = 0
+        self.stored = 0
+
+    @staticmethod
+    def make_key(user_text: str, user_role: str, agent_role: str, sulking_level: int, model: str) -> str:
+        """Hash the normalized message, roles, sulking level and model into a key."""
+        raw = "\x1f".join((
+            normalize_request_text(user_text), user_role, agent_role, str(sulking_level), model
+        ))
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def cacheable(
+        self,
+        conversation_history: Optional[List[Dict[str, Any]]],
+        conversation_summary: Optional[Dict[str, Any]] = None
+    ) -> bool:
+        """Whether a turn's reply can be independent of its context."""
+        if conversation_summary or len(conversation_history or []) > self.max_history:
+            self.skipped += 1
+            return False
+        return True
+
+    async def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """
+        Next variant for ``key``, or None while it is still collecting
+        replies (the caller then asks Gemini and calls add()).
+        """
+        entry = self._lookup(key)
+        # Other workers may have collected more variants in the meantime
+        if self.redis_client and (entry is None or len(entry.variants) < self.variants):
+            entry = await self._load(key) or entry
+
+        if entry is None or len(entry.variants) < self.variants:
+            self.misses += 1
+            record_cache_lookup("response", hit=False)
+            return None
+
+        variant = entry.variants[entry.served % len(entry.variants)]
+        entry.served += 1
+        self.hits += 1
+        record_cache_lookup("response", hit=True)
+        return copy.deepcopy(variant)
+
+    async def add(self, key: str, response: Dict[str, Any]):
+        """Store a fresh Gemini reply as one more variant of ``key``."""
+        entry = self._lookup(key)
+        if entry is None:
+            entry = _Entry(variants=[], expires_at=time.monotonic() + self.ttl)
+        if len(entry.variants) >= self.variants:
+            return
+
+        entry.variants.append(copy.deepcopy(response))
+        self._remember(key, entry)
+        self.stored += 1
+
+        if self.redis_client:
+            try:
+                client = await self.redis_client.get_client()
+                redis_key = self.KEY_PREFIX + key
+                async with client.pipeline(transaction=False) as pipe:
+                    pipe.rpush(redis_key, json.dumps(response, ensure_ascii=False))
+                    pipe.ltrim(redis_key, 0, self.variants - 1)
+                    pipe.expire(redis_key, self.ttl, nx=True)
+                    await pipe.execute()
+            except Exception as e:
+                logger.warning(f"Response cache Redis store failed: {e}")
+
+    def stats(self) -> Dict[str, Any]:
+        """Hit/miss counters and memory tier occupancy."""
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "skipped": self.skipped,
+            "stored": self.stored,
+            "hit_ratio": self.hits / lookups if lookups else 0.0,
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "variants": self.variants,
+        }
+
+    def _lookup(self, key: str) -> Optional[_Entry]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if entry.expires_at <= time.monotonic():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return entry
+
+    async def _load(self, key: str) -> Optional[_Entry]:
+        """Promote a key's variants from Redis into the memory tier."""
+        try:
+            client = await self.redis_client.get_client()
+            redis_key = self.KEY_PREFIX + key
+            async with client.pipeline(transaction=False) as pipe:
+                pipe.lrange(redis_key, 0, self.variants - 1)
+                pipe.ttl(redis_key)
+                encoded, ttl = await pipe.execute()
+        except Exception as e:
+            logger.warning(f"Response cache Redis lookup failed: {e}")
+            return None
+
+        if not encoded or ttl <= 0:
+            return None
+        entry = _Entry(
+            variants=[json.loads(item) for item in encoded],
+            expires_at=time.monotonic() + ttl
+        )
+        previous = self._entries.get(key)
+        if previous is not None:
+            entry.served = previous.served
+        self._remember(key, entry)
+        return entry
+
+    def _remember(self, key: str, entry: _Entry):
+        if self.max_entries <= 0:
+            return
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+
+_response_cache: Optional[ResponseCache] = None
+
+
+def get_response_cache() -> Optional[ResponseCache]:
+    """Process-wide response cache, or None unless enabled in settings."""
+    global _response_cache
+
+    if not settings.XIAOYUE_RESPONSE_CACHE_ENABLED:
+        return None
+
+    if _response_cache is None:
+        _response_cache = ResponseCache(
+            variants=settings.XIAOYUE_RESPONSE_CACHE_VARIANTS,
+            max_entries=settings.XIAOYUE_RESPONSE_CACHE_MAX_ENTRIES,
+            ttl=settings.XIAOYUE_RESPONSE_CACHE_TTL,
+            max_history=settings.XIAOYUE_RESPONSE_CACHE_MAX_HISTORY,
+            redis_client=RedisClient("cache") if settings.XIAOYUE_RESPONSE_CACHE_REDIS else None
+        )
+    return _response_cache
@@ -0,0 +1,159 @@
+"""
+Parsing and validation of Gemini's structured JSON replies.
+With response_schema set Gemini almost always returns valid JSON, so the
+strict ujson parser runs first and json_repair only handles the rest. The
+result is checked against a validator compiled once from the genai Schema.
+"""
+
+import copy
+import logging
+from typing import Any, Callable, Dict, List
+import json_repair
+import ujson
+from google.genai import types
+from .metrics import RESPONSE_PARSES
+
+logger = logging.getLogger(__name__)
+
+# Validator: (value, path) -> list of error strings
+Validator = Callable[[Any, str], List[str]]
+
+_PYTHON_TYPES = {
+    types.Type.STRING: (str,),
+    types.Type.INTEGER: (int,),
+    types.Type.NUMBER: (int, float),
+    types.Type.BOOLEAN: (bool,),
+    types.Type.ARRAY: (list,),
+    types.Type.OBJECT: (dict,),
+}
+
+
+class ResponseParseError(ValueError):
+    """Raised when a reply is not a JSON object even after repair."""
+
+
+def compile_schema(schema: types.Schema) -> Validator:
+    """Build a validator for ``schema`` (types, required keys, enums, nesting)."""
+    expected = _PYTHON_TYPES.get(schema.type)
+    enum = frozenset(schema.enum) if schema.enum else None
+    properties = {
+        name: compile_schema(prop) for name, prop in (schema.properties or {}).items()
+    }
+    required = tuple(schema.required or ())
+    items = compile_schema(schema.items) if schema.items else None
+    nullable = bool(schema.nullable)
+
+    def validate(value: Any, path: str = "$") -> List[str]:
+        if value is None and (nullable or schema.type == types.Type.OBJECT):
+            # Optional objects (e.g. correction_detail) come back as null
+            return []
+        if expected and (not isinstance(value, expected) or (isinstance(value, bool) and bool not in expected)):
+            return [f"{path}: expected {schema.type.value.lower()}, got {type(value).__name__}"]
+        if enum is not None and value not in enum:
+            return [f"{path}: {value!r} not in enum"]
+
+        errors: List[str] = []
+        if properties:
+            for name in required:
+                if name not in value:
+                    errors.append(f"{path}.{name}: missing")
+            for name, sub in properties.items():
+                if name in value:
+                    errors.extend(sub(value[name], f"{path}.{name}"))
+        if items is not None:
+            for index, item in enumerate(value):
+                errors.extend(items(item, f"{path}[{index}]"))
+        return errors
+
+    return validate
+
+
+def _default_for(schema: types.Schema) -> Any:
+    if schema.enum:
+        return schema.enum[0]
+    return {
+        types.Type.STRING: "",
+        types.Type.INTEGER: 0,
+        types.Type.NUMBER: 0,
+        types.Type.BOOLEAN: False,
+        types.Type.ARRAY: [],
+        types.Type.OBJECT: {},
+    }.get(schema.type)
+
+
+class ResponseParser:
+    """
+    Strict-then-repair JSON parser for one response schema.
+
+    Top-level fields that are missing or have an invalid value are reset to
+    a default (the first enum value, or the type's empty value) so callers
+    can rely on them; anything else wrong is only logged and counted.
+    Outcomes are exported per ``name`` as xiaoyue_response_parses_total.
+    """
+
+    def __init__(self, schema: types.Schema, name: str = "reply"):
+        self.schema = schema
+        self.name = name
+        self.validate = compile_schema(schema)
+        self._defaults = {
+            name: _default_for(prop) for name, prop in (schema.properties or {}).items()
+        }
+        self._required = tuple(schema.required or ())
+        self._field_validators = {
+            name: compile_schema(prop) for name, prop in (schema.properties or {}).items()
+        }
+
+        self.parsed = 0
+        self.repaired = 0
+        self.failed = 0
+        self.invalid = 0
+
+    def parse(self, text: str) -> Dict[str, Any]:
+        """
+        Parse and validate a reply.
+
+        Raises:
+            ResponseParseError: If no JSON object can be recovered
+        """
+        text = text or ""
+        outcome = "strict"
+        try:
+            result = ujson.loads(text)
+        except ValueError:
+            result = json_repair.loads(text)
+            self.repaired += 1
+            outcome = "repaired"
+            logger.warning(f"Gemini returned malformed JSON, repaired ({len(text)} chars)")
+
+        if not isinstance(result, dict):
+            self.failed += 1
+            RESPONSE_PARSES.labels(parser=self.name, outcome="failed").inc()
+            raise ResponseParseError(f"Expected a JSON object, got {type(result).__name__}")
+        self.parsed += 1
+
+        errors = self.validate(result)
+        if errors:
+            self.invalid += 1
+            outcome = "invalid"
+            logger.warning(f"Gemini response failed schema validation: {errors[:5]}")
+            self._apply_defaults(result)
+        RESPONSE_PARSES.labels(parser=self.name, outcome=outcome).inc()
+        return result
+
+    def _apply_defaults(self, result: Dict[str, Any]):
+        for name, validate in self._field_validators.items():
+            if name in result:
+                if validate(result[name]) and not isinstance(result[name], (dict, list)):
+                    result[name] = copy.copy(self._defaults[name])
+            elif name in self._required:
+                result[name] = copy.copy(self._defaults[name])
+
+    def stats(self) -> Dict[str, Any]:
+        total = self.parsed + self.failed
+        return {
+            "parsed": self.parsed,
+            "repaired": self.repaired,
+            "failed": self.failed,
+            "invalid": self.invalid,
+            "repair_rate": self.repaired / total if total else 0.0,
+        }
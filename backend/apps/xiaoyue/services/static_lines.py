@@ -0,0 +1,391 @@
+"""
+Fixed tutor lines (reset, fallback, welcome, routed intents) and their
+pre-rendered audio.
+These lines never change, so their TTS is synthesized once at startup and
+served from memory: resets and degraded-mode replies cost no LLM and no
+TTS time.
+"""
+
+import asyncio
+import base64
+import logging
+import time
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterator, Optional, Tuple
+from django.conf import settings
+from .admission import Priority, admission_priority
+from .tts_handler import resolve_voice_preset, synthesize_speech
+
+logger = logging.getLogger(__name__)
+
+WELCOME_MESSAGE = "欢迎回来！小师妹准备好教你中文了~"
+WELCOME_EMOTION = "happy"
+
+# Reset lines per user role, "normal" or "sulking" (sulking level >= 2)
+RESET_MESSAGES = {
+    "Sư huynh": {
+        "normal": {
+            "chinese": "既然师兄想重新开始，那师妹就陪你多练几次吧。",
+            "vietnamese": "Được thôi, nếu sư huynh muốn bắt đầu lại, muội sẽ cùng luyện tập với huynh thêm lần nữa.",
+            "pinyin": "Jìrán shīxiōng xiǎng chóngxīn kāishǐ, nà shīmèi jiù péi nǐ duō liàn jǐ cì ba.",
+            "emotion": "happy"
+        },
+        "sulking": {
+            "chinese": "哼！怎么什么都忘了？真是拿你没办法。好吧，最后再教你一次！",
+            "vietnamese": "Hừ! Sao cái gì cũng quên hết vậy? Thật hết cách với huynh. Được rồi, muội dạy lại lần cuối đấy nhé!",
+            "pinyin": "Heng! Zěnme shénme dōu wàng le? Zhēnshi ná nǐ méi bànfǎ. Hǎo ba, zuìhòu zài jiāo nǐ yīcì!",
+            "emotion": "sulking"
+        }
+    },
+    "Tỷ tỷ": {
+        "normal": {
+            "chinese": "好的姐姐，我们重新来过。这次小月会讲慢一点的。",
+            "vietnamese": "Vâng ạ tỷ tỷ, chúng ta bắt đầu lại nhé. Lần này Tiểu Nguyệt sẽ giảng chậm hơn một chút.",
+            "pinyin": "Hǎo de jiějie, wǒmen chóngxīn láiguò. Zhècì Xiǎoyuè huì jiǎng màn yīdiǎn de.",
+            "emotion": "happy"
+        },
+        "sulking": {
+            "chinese": "哎，姐姐刚才还不理人家呢... 好吧，都听姐姐的，重新开始。",
+            "vietnamese": "Haizz, nãy tỷ tỷ còn chẳng thèm để ý muội... Thôi được, nghe theo tỷ hết, chúng ta làm lại nào.",
+            "pinyin": "Ai, jiějie gāngcái hái bù lǐ rénjia ne... Hǎo ba, dōu tīng jiějie de, chóngxīn kāishǐ.",
+            "emotion": "sad"
+        }
+    },
+    
+    # ===> ĐỆ ĐỆ (Ác Ma Tỷ Tỷ): Dùng "Ta - Đệ/Ngươi" <===
+    "Đệ đệ": {
+        "normal": {
+            "chinese": "怎么？觉得难就想把进度清零？真是没耐心的弟弟。行吧，重新来，这次给我专心点。",
+            "vietnamese": "Sao? Thấy khó là muốn xóa sạch làm lại à? Đúng là đệ đệ thiếu kiên nhẫn. Được thôi, lại từ đầu, lần này tập trung vào cho ta.",
+            "pinyin": "Zěnme? Juéde nán jiù xiǎng bǎ jìndù qīnglíng? Zhēnshi méi nàixīn de dìdì. Xíng ba, chóngxīn lái, zhècì gěi wǒ zhuānxīn diǎn.",
+            "emotion": "smug"
+        },
+        "sulking": {
+            "chinese": "呵，以为按个重置键就能逃避挨骂了？想得美！给我坐好，魔鬼特训现在开始！",
+            "vietnamese": "Hơ, tưởng ấn nút reset là trốn được vụ bị mắng hả? Mơ đi! Ngồi ngay ngắn vào, khóa huấn luyện địa ngục của ta bắt đầu ngay bây giờ!",
+            "pinyin": "Hē, yǐwéi àn gè chóngzhì jiàn jiù néng táobì áimà le? Xiǎng de měi! Gěi wǒ zuòhǎo, móguǐ tèxùn xiànzài kāishǐ!",
+            "emotion": "angry"
+        }
+    },
+    
+    # ===> MUỘI MUỘI (Hiền Hậu Tỷ Tỷ): Dùng "Tỷ - Muội" <===
+    "Muội muội": {
+        "normal": {
+            "chinese": "没关系妹妹，熟能生巧嘛。我们再把基础巩固一下！",
+            "vietnamese": "Không sao đâu muội muội, trăm hay không bằng tay quen mà. Tỷ muội ta cùng củng cố lại kiến thức nhé!",
+            "pinyin": "Méiguānxi mèimei, shúnéngshēngqiǎo ma. Wǒmen zài bǎ jīchǔ gǒnggù yīxià!",
+            "emotion": "happy"
+        },
+        "sulking": {
+            "chinese": "哼，刚才叫你听讲你不听。现在知道难了吧？好吧，姐姐再带你过一遍。",
+            "vietnamese": "Hừ, nãy bảo nghe giảng thì không nghe. Giờ thấy khó rồi chứ gì? Được rồi, tỷ sẽ dẫn muội đi lại một lượt nữa.",
+            "pinyin": "Heng, gāngcái jiào nǐ tīngjiǎng nǐ bù tīng. Xiànzài zhīdào nán le ba? Hǎo ba, jiějie zài dài nǐ guò yībiàn.",
+            "emotion": "sulking"
+        }
+    }
+}
+# Fallback replies when Gemini fails, per sulking bucket
+FALLBACK_RESPONSES = {
+    "normal": {
+        "thought": "API error, using fallback",
+        "chinese_content": "师兄，系统有点小问题，稍等一下好吗？",
+        "vietnamese_display": "Sư huynh, hệ thống có chút vấn đề, chờ một chút được không?",
+        "pinyin": "Shī xiōng, xìtǒng yǒudiǎn xiǎo wèntí, shāo děng yīxià hǎo ma?",
+        "emotion": "concerned",
+        "action": "none",
+        "quiz_list": []
+    },
+    "sulking": {
+        "thought": "API error, using fallback",
+        "chinese_content": "哼，现在系统出问题了，师妹暂时不能教你了。",
+        "vietnamese_display": "Hừm, hệ thống đang có vấn đề, tiểu sư muội tạm thời không thể dạy anh được.",
+        "pinyin": "Hng, xiànzài xìtǒng chū wèntí le, shī mèi zànshí bù néng jiāo nǐ le.",
+        "emotion": "sulking",
+        "action": "none",
+        "quiz_list": []
+    }
+}
+
+
+# Replies to trivial intents answered without Gemini (see intent_router), per
+# user role; keys follow role_mapper.ROLE_RELATIONSHIPS
+ROUTED_REPLIES = {
+    "Sư huynh": {
+        "greeting": {
+            "chinese": "师兄好呀~！今天想学什么？",
+            "vietnamese": "Chào sư huynh~! Hôm nay huynh muốn học gì nào?",
+            "pinyin": "Shīxiōng hǎo ya~! Jīntiān xiǎng xué shénme?",
+            "emotion": "happy"
+        },
+        "thanks": {
+            "chinese": "不客气啦~ 师兄学得认真，师妹也开心！",
+            "vietnamese": "Không có gì đâu~ Sư huynh học chăm chỉ, muội cũng vui lắm!",
+            "pinyin": "Bú kèqi la~ Shīxiōng xué de rènzhēn, shīmèi yě kāixīn!",
+            "emotion": "cheerful"
+        },
+        "goodbye": {
+            "chinese": "师兄再见~ 明天也要来练习哦！",
+            "vietnamese": "Tạm biệt sư huynh~ Ngày mai cũng phải tới luyện tập đó nha!",
+            "pinyin": "Shīxiōng zàijiàn~ Míngtiān yě yào lái liànxí o!",
+            "emotion": "happy"
+        },
+        "quiz": {
+            "chinese": "好呀，师妹出三道题考考你！",
+            "vietnamese": "Được thôi, muội ra ba câu đố huynh nhé!",
+            "pinyin": "Hǎo ya, shīmèi chū sān dào tí kǎokao nǐ!",
+            "emotion": "excited"
+        }
+    },
+    "Muội muội": {
+        "greeting": {
+            "chinese": "妹妹来啦！今天我们学点什么呢？",
+            "vietnamese": "Muội muội tới rồi à! Hôm nay tỷ muội mình học gì đây?",
+            "pinyin": "Mèimei lái la! Jīntiān wǒmen xué diǎn shénme ne?",
+            "emotion": "happy"
+        },
+        "thanks": {
+            "chinese": "跟姐姐客气什么呀，继续加油！",
+            "vietnamese": "Khách sáo với tỷ làm gì, tiếp tục cố lên nhé!",
+            "pinyin": "Gēn jiějie kèqi shénme ya, jìxù jiāyóu!",
+            "emotion": "happy"
+        },
+        "goodbye": {
+            "chinese": "妹妹再见，回去记得复习哦。",
+            "vietnamese": "Tạm biệt muội muội, về nhớ ôn bài nhé.",
+            "pinyin": "Mèimei zàijiàn, huíqu jìde fùxí o.",
+            "emotion": "happy"
+        },
+        "quiz": {
+            "chinese": "好，姐姐出几道题，妹妹认真做哦。",
+            "vietnamese": "Được, tỷ ra vài câu, muội làm cẩn thận nhé.",
+            "pinyin": "Hǎo, jiějie chū jǐ dào tí, mèimei rènzhēn zuò o.",
+            "emotion": "cheerful"
+        }
+    },
+    "Đệ đệ": {
+        "greeting": {
+            "chinese": "哼，来了？别磨蹭，今天学什么？",
+            "vietnamese": "Hừ, tới rồi à? Đừng lề mề, hôm nay học gì?",
+            "pinyin": "Hng, lái le? Bié mócèng, jīntiān xué shénme?",
+            "emotion": "strict"
+        },
+        "thanks": {
+            "chinese": "谢什么谢，学会了才算数。",
+            "vietnamese": "Cảm ơn cái gì, học thuộc rồi mới tính.",
+            "pinyin": "Xiè shénme xiè, xuéhuì le cái suànshù.",
+            "emotion": "strict"
+        },
+        "goodbye": {
+            "chinese": "走吧，明天不准迟到。",
+            "vietnamese": "Đi đi, ngày mai không được đến muộn.",
+            "pinyin": "Zǒu ba, míngtiān bù zhǔn chídào.",
+            "emotion": "strict"
+        },
+        "quiz": {
+            "chinese": "好，给我认真答，错一题罚抄十遍！",
+            "vietnamese": "Được, trả lời cho đàng hoàng, sai một câu chép phạt mười lần!",
+            "pinyin": "Hǎo, gěi wǒ rènzhēn dá, cuò yī tí fá chāo shí biàn!",
+            "emotion": "strict"
+        }
+    },
+    "Tỷ tỷ": {
+        "greeting": {
+            "chinese": "姐姐你来啦~ 小月等你好久了！",
+            "vietnamese": "Tỷ tỷ tới rồi~ Tiểu Nguyệt đợi tỷ lâu lắm rồi!",
+            "pinyin": "Jiějie nǐ lái la~ Xiǎoyuè děng nǐ hǎojiǔ le!",
+            "emotion": "excited"
+        },
+        "thanks": {
+            "chinese": "嘿嘿，能帮到姐姐我好开心~",
+            "vietnamese": "Hihi, giúp được tỷ tỷ muội vui lắm~",
+            "pinyin": "Hēihēi, néng bāngdào jiějie wǒ hǎo kāixīn~",
+            "emotion": "cheerful"
+        },
+        "goodbye": {
+            "chinese": "姐姐要走了吗？那明天早点来哦~",
+            "vietnamese": "Tỷ tỷ phải đi rồi sao? Vậy mai tới sớm nha~",
+            "pinyin": "Jiějie yào zǒu le ma? Nà míngtiān zǎodiǎn lái o~",
+            "emotion": "concerned"
+        },
+        "quiz": {
+            "chinese": "姐姐要做题吗？小月出题给你~",
+            "vietnamese": "Tỷ tỷ muốn làm bài à? Tiểu Nguyệt ra đề cho tỷ nè~",
+            "pinyin": "Jiějie yào zuò tí ma? Xiǎoyuè chū tí gěi nǐ~",
+            "emotion": "happy"
+        }
+    }
+}
+
+# Beginner quizzes handed out by the routed "quiz" intent, in rotation
+QUIZ_SETS = [
+    [
+        {"id": 1, "type": "multiple_choice", "question": "'Cảm ơn' tiếng Trung là gì?",
+         "options": ["A. 你好", "B. 谢谢", "C. 再见"], "answer": "B"},
+        {"id": 2, "type": "fill_blank", "question": "Điền từ: 我___中国人。(Tôi là người Trung Quốc)",
+         "options": [], "answer": "是"},
+        {"id": 3, "type": "fill_blank", "question": "Viết pinyin của 你好", "options": [], "answer": "nǐ hǎo"},
+    ],
+    [
+        {"id": 1, "type": "multiple_choice", "question": "'再见' nghĩa là gì?",
+         "options": ["A. Xin chào", "B. Tạm biệt", "C. Xin lỗi"], "answer": "B"},
+        {"id": 2, "type": "fill_blank", "question": "Điền từ: 你叫什么___？(Bạn tên là gì?)",
+         "options": [], "answer": "名字"},
+        {"id": 3, "type": "fill_blank", "question": "Viết pinyin của 谢谢", "options": [], "answer": "xièxie"},
+    ],
+    [
+        {"id": 1, "type": "multiple_choice", "question": "'Bao nhiêu tiền?' nói thế nào?",
+         "options": ["A. 多少钱？", "B. 几点了？", "C. 在哪儿？"], "answer": "A"},
+        {"id": 2, "type": "fill_blank", "question": "Điền từ: 我___喝茶。(Tôi thích uống trà)",
+         "options": [], "answer": "喜欢"},
+        {"id": 3, "type": "fill_blank", "question": "Viết pinyin của 中文", "options": [], "answer": "zhōngwén"},
+    ],
+]
+
+
+def get_reset_message(user_role: str, is_sulking: bool) -> Dict[str, str]:
+    """Reset line for a role and mood (unknown roles use Sư huynh)."""
+    role_data = RESET_MESSAGES.get(user_role, RESET_MESSAGES["Sư huynh"])
+    return role_data["sulking" if is_sulking else "normal"]
+
+
+def get_fallback_response(sulking_level: int) -> Dict[str, Any]:
+    """Fresh copy of the fallback reply for a sulking level."""
+    response = FALLBACK_RESPONSES["sulking" if sulking_level >= 2 else "normal"]
+    return {**response, "quiz_list": []}
+
+
+def get_routed_reply(user_role: str, intent: str, rotation: int = 0) -> Dict[str, Any]:
+    """
+    Reply dict (same shape as Gemini's) for a routed intent; unknown roles
+    use Sư huynh. "quiz" replies carry one of QUIZ_SETS, picked by ``rotation``.
+    """
+    line = ROUTED_REPLIES.get(user_role, ROUTED_REPLIES["Sư huynh"])[intent]
+    quiz_list = []
+    if intent == "quiz":
+        quiz_list = [dict(item) for item in QUIZ_SETS[rotation % len(QUIZ_SETS)]]
+    return {
+        "thought": f"Answered locally (intent: {intent})",
+        "chinese_content": line["chinese"],
+        "vietnamese_display": line["vietnamese"],
+        "pinyin": line["pinyin"],
+        "emotion": line["emotion"],
+        "action": "quiz" if quiz_list else "none",
+        "quiz_list": quiz_list
+    }
+
+
+def iter_static_lines() -> Iterator[Tuple[str, str]]:
+    """Every fixed (chinese text, emotion) the tutor can say."""
+    yield WELCOME_MESSAGE, WELCOME_EMOTION
+    for moods in RESET_MESSAGES.values():
+        for line in moods.values():
+            yield line["chinese"], line["emotion"]
+    for response in FALLBACK_RESPONSES.values():
+        yield response["chinese_content"], response["emotion"]
+    for intents in ROUTED_REPLIES.values():
+        for line in intents.values():
+            yield line["chinese"], line["emotion"]
+
+
+@dataclass
+class StaticAudio:
+    """Pre-rendered MP3 with its Base64 form computed on first use."""
+    audio: bytes
+    _base64: Optional[str] = field(default=None, repr=False)
+
+    @property
+    def base64(self) -> str:
+        if self._base64 is None:
+            self._base64 = base64.b64encode(self.audio).decode("utf-8")
+        return self._base64
+
+
+# (text, voice, rate, volume) -> audio; plain bytes, so shared by every loop
+_static_audio: Dict[Tuple[str, str, str, str], StaticAudio] = {}
+_prerender_task: Optional[asyncio.Task] = None
+_prerender_started_at = 0.0
+
+# Lines that failed (e.g. edge-tts down) are retried on a later connect
+PRERENDER_RETRY_INTERVAL = 60
+
+
+def _audio_key(text: str, emotion: str, custom_voice: Optional[str] = None) -> Tuple[str, str, str, str]:
+    preset = resolve_voice_preset(emotion, custom_voice)
+    return text, preset["voice"], preset["rate"], preset["volume"]
+
+
+def get_static_audio(
+    text: str,
+    emotion: str = "neutral",
+    custom_voice: Optional[str] = None
+) -> Optional[StaticAudio]:
+    """Pre-rendered audio for a fixed line, or None if it isn't ready (or not fixed)."""
+    if not text:
+        return None
+    return _static_audio.get(_audio_key(text, emotion, custom_voice))
+
+
+async def prerender_static_audio() -> int:
+    """
+    Synthesize every fixed line concurrently at background priority.
+
+    Goes through synthesize_speech, so workers after the first one are
+    served from the shared TTS cache.
+
+    Returns:
+        Number of lines with audio
+    """
+    pending = {}
+    for text, emotion in iter_static_lines():
+        key = _audio_key(text, emotion)
+        if key not in _static_audio:
+            pending[key] = text
+
+    async def render(key, text):
+        _, voice, rate, volume = key
+        audio = await synthesize_speech(text, voice=voice, rate=rate, volume=volume)
+        if audio:
+            _static_audio[key] = StaticAudio(audio)
+
+    with admission_priority(Priority.BACKGROUND):
+        results = await asyncio.gather(
+            *[render(key, text) for key, text in pending.items()],
+            return_exceptions=True
+        )
+
+    failed = sum(1 for result in results if isinstance(result, Exception))
+    if failed:
+        logger.warning(f"Pre-rendering failed for {failed} static lines")
+    logger.info(f"Pre-rendered audio for {len(_static_audio)} static lines")
+    return len(_static_audio)
+
+
+async def start_prerender():
+    """
+    Kick off pre-rendering in the background. Called from the ASGI lifespan
+    startup and, for servers without lifespan, on every connect; it only
+    starts work when lines are missing and no recent attempt is running.
+    """
+    global _prerender_task, _prerender_started_at
+
+    if not settings.XIAOYUE_PRERENDER_STATIC_AUDIO:
+        return
+    if _prerender_task is not None and not _prerender_task.done():
+        return
+    if time.monotonic() - _prerender_started_at < PRERENDER_RETRY_INTERVAL and _prerender_task is not None:
+        return
+    if all(_audio_key(text, emotion) in _static_audio for text, emotion in iter_static_lines()):
+        return
+
+    _prerender_started_at = time.monotonic()
+    _prerender_task = asyncio.create_task(prerender_static_audio())
+
+
+async def stop_prerender():
+    """Cancel pre-rendering if the worker shuts down before it finishes."""
+    global _prerender_task
+
+    task, _prerender_task = _prerender_task, None
+    if task is not None and not task.done():
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
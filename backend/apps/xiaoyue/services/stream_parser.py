@@ -0,0 +1,155 @@
+"""
+Incremental JSON field parser for streamed Gemini output.
+Surfaces string field deltas while the structured response is still arriving.
+"""
+
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+# Fields pushed to the client as soon as they start streaming
+STREAMED_FIELDS = ("chinese_content", "vietnamese_display", "pinyin")
+
+_SIMPLE_ESCAPES = {
+    '"': '"',
+    "\\": "\\",
+    "/": "/",
+    "b": "\b",
+    "f": "\f",
+    "n": "\n",
+    "r": "\r",
+    "t": "\t",
+}
+
+
+class StreamingJSONFieldParser:
+    """
+    Scans a JSON object chunk by chunk and decodes top-level string values.
+
+    Only the top-level object is tracked; nested objects and arrays
+    (correction_detail, quiz_list) are skipped and left to the final parse.
+    Escapes split across chunk boundaries (including \\uXXXX surrogate pairs)
+    are buffered until complete.
+    """
+
+    def __init__(self, fields: Iterable[str] = STREAMED_FIELDS):
+        self.fields: Set[str] = set(fields)
+        self.values: Dict[str, str] = {}
+        self.completed: Set[str] = set()
+
+        self._chunks: List[str] = []
+        self._depth = 0
+        self._in_string = False
+        self._is_key = False
+        self._expecting_key = False
+        self._key_buffer: List[str] = []
+        self._current_key: Optional[str] = None
+        self._capture_key: Optional[str] = None
+        self._escape: Optional[str] = None
+        self._high_surrogate: Optional[int] = None
+
+    @property
+    def text(self) -> str:
+        """Raw text received so far."""
+        return "".join(self._chunks)
+
+    def feed(self, chunk: str) -> List[Tuple[str, str]]:
+        """
+        Consume a chunk of raw model output.
+
+        Args:
+            chunk: Next piece of the streamed JSON text
+
+        Returns:
+            Ordered list of (field, delta) pairs for tracked fields
+        """
+        if not chunk:
+            return []
+
+        self._chunks.append(chunk)
+        deltas: Dict[str, List[str]] = {}
+
+        for char in chunk:
+            if self._in_string:
+                decoded = self._consume_string_char(char)
+                if decoded is None:
+                    continue
+                if self._is_key:
+                    self._key_buffer.append(decoded)
+                elif self._capture_key is not None:
+                    self.values[self._capture_key] += decoded
+                    if self._capture_key in self.fields:
+                        deltas.setdefault(self._capture_key, []).append(decoded)
+                continue
+
+            if char == '"':
+                self._open_string()
+            elif char in "{[":
+                self._depth += 1
+                if char == "{" and self._depth == 1:
+                    self._expecting_key = True
+            elif char in "}]":
+                self._depth -= 1
+            elif char == "," and self._depth == 1:
+                self._expecting_key = True
+                self._current_key = None
+
+        return [(field, "".join(parts)) for field, parts in deltas.items()]
+
+    def _open_string(self):
+        self._in_string = True
+        self._is_key = self._depth == 1 and self._expecting_key
+        if self._is_key:
+            self._key_buffer = []
+            self._expecting_key = False
+        elif self._depth == 1 and self._current_key is not None:
+            self._capture_key = self._current_key
+            self.values[self._capture_key] = ""
+
+    def _close_string(self):
+        self._in_string = False
+        if self._is_key:
+            self._current_key = "".join(self._key_buffer)
+            self._is_key = False
+        elif self._capture_key is not None:
+            self.completed.add(self._capture_key)
+            self._capture_key = None
+
+    def _consume_string_char(self, char: str) -> Optional[str]:
+        """Decode one character inside a string, returning text to append."""
+        if self._escape is not None:
+            return self._consume_escape_char(char)
+
+        if char == "\\":
+            self._escape = ""
+            return None
+        if char == '"':
+            self._close_string()
+            return None
+        return char
+
+    def _consume_escape_char(self, char: str) -> Optional[str]:
+        if self._escape == "":
+            if char == "u":
+                self._escape = "u"
+                return None
+            self._escape = None
+            return _SIMPLE_ESCAPES.get(char, char)
+
+        # Inside a \uXXXX sequence
+        self._escape += char
+        if len(self._escape) < 5:
+            return None
+
+        hex_digits = self._escape[1:]
+        self._escape = None
+        try:
+            code = int(hex_digits, 16)
+        except ValueError:
+            return None
+
+        if 0xD800 <= code <= 0xDBFF:
+            self._high_surrogate = code
+            return None
+        if 0xDC00 <= code <= 0xDFFF and self._high_surrogate is not None:
+            high, self._high_surrogate = self._high_surrogate, None
+            return chr(0x10000 + ((high - 0xD800) << 10) + (code - 0xDC00))
+        return chr(code)
@@ -0,0 +1,135 @@
+"""
+Rolling conversation summarization.
+Once a user's history passes a threshold, the oldest turns are folded into
+a compact running summary stored next to the history, so prompts carry
+summary + recent turns instead of up to 20 raw turns.
+"""
+
+import json
+import logging
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+from google.genai import types
+from .admission import Priority, admission_priority, get_admission_controller
+from .prompts import SUMMARY_PROMPT_TEMPLATE
+from .redis_client import RedisClient
+from .token_budget import TokenCounter
+
+logger = logging.getLogger(__name__)
+
+SUMMARY_MAX_WORDS = 150
+
+
+def format_summary_turn(summary: Dict[str, Any]) -> str:
+    """Text of the history entry that carries the running summary."""
+    return f"[Tóm tắt các lượt trò chuyện trước / Earlier conversation summary]\n{summary['text']}"
+
+
+class ConversationSummarizer:
+    """
+    Folds the oldest history entries of a user into ``chat:summary:{user_id}``.
+
+    Args:
+        client: genai.Client
+        redis_client: RedisClient
+        model: Gemini model used for summarization (a cheap one is enough)
+        trigger_messages: Summarize once history holds this many messages
+        keep_messages: Most recent messages that stay verbatim
+    """
+
+    def __init__(
+        self,
+        client: Any,
+        redis_client: RedisClient,
+        model: str,
+        trigger_messages: int = 16,
+        keep_messages: int = 8
+    ):
+        self.client = client
+        self.redis_client = redis_client
+        self.model = model
+        self.trigger_messages = trigger_messages
+        self.keep_messages = keep_messages
+        # Background work, so the exact count is worth the extra round-trip
+        self.token_counter = TokenCounter(client, model, use_api=True)
+
+    async def summarize(self, user_id: str) -> Optional[Dict[str, Any]]:
+        """
+        Fold everything but the last ``keep_messages`` entries into the summary.
+
+        Returns:
+            The stored summary record, or None if there was nothing to do,
+            another run holds the user's summary lock, or the history changed
+            underneath us
+        """
+        if not await self.redis_client.claim_summary_run(user_id):
+            return None
+        try:
+            return await self._summarize(user_id)
+        finally:
+            await self.redis_client.release_summary_run(user_id)
+
+    async def _summarize(self, user_id: str) -> Optional[Dict[str, Any]]:
+        length = await self.redis_client.get_history_length(user_id)
+        fold_count = length - self.keep_messages
+        if length < self.trigger_messages or fold_count <= 0:
+            return None
+
+        folded = await self.redis_client.get_history_head(user_id, fold_count)
+        messages = [json.loads(raw) for raw in folded]
+        previous = await self.redis_client.get_conversation_summary(user_id)
+        state = await self.redis_client.get_user_state(user_id)
+
+        prompt = SUMMARY_PROMPT_TEMPLATE.format(
+            user_role=state.get("user_role") or "Sư huynh",
+            agent_role=state.get("agent_role") or "Muội muội",
+            max_words=SUMMARY_MAX_WORDS,
+            previous_summary=previous["text"] if previous else "(none)",
+            turns=self._format_turns(messages)
+        )
+
+        with admission_priority(Priority.BACKGROUND):
+            async with get_admission_controller("gemini").admit():
+                response = await self.client.aio.models.generate_content(
+                    model=self.model,
+                    contents=prompt,
+                    config=types.GenerateContentConfig(
+                        temperature=0.2,
+                        max_output_tokens=1024
+                    )
+                )
+            folded_tokens = await self.token_counter.count_messages(messages)
+
+        text = (response.text or "").strip()
+        if not text:
+            logger.warning(f"Empty summary for {user_id}, keeping raw history")
+            return None
+
+        summary_tokens = await self.token_counter.count_messages(
+            [{"role": "user", "content": format_summary_turn({"text": text})}]
+        )
+        summary = {
+            "text": text,
+            "messages": (previous or {}).get("messages", 0) + len(messages),
+            # Raw tokens now represented by the summary vs. what it costs per turn
+            "source_tokens": (previous or {}).get("source_tokens", 0) + folded_tokens,
+            "summary_tokens": summary_tokens,
+            "updated_at": datetime.utcnow().isoformat()
+        }
+
+        if not await self.redis_client.fold_into_summary(user_id, folded, summary):
+            return None
+
+        logger.info(
+            f"Summarized {len(messages)} messages for {user_id}: "
+            f"{summary['source_tokens']} -> {summary_tokens} tokens per prompt"
+        )
+        return summary
+
+    @staticmethod
+    def _format_turns(messages: List[Dict[str, Any]]) -> str:
+        lines = []
+        for message in messages:
+            speaker = "Learner" if message.get("role") == "user" else "Tutor"
+            lines.append(f"{speaker}: {message.get('content', '')}")
+        return "\n".join(lines)
@@ -0,0 +1,150 @@
+"""
+Token-budget aware conversation history packing.
+History entries carry their own token count (``tokens``), measured once
+when the turn is committed, so every later turn can fill a fixed prompt
+budget newest-first without re-counting.
+"""
+
+import logging
+import math
+from typing import Any, Dict, List, NamedTuple
+from google.genai import types
+
+logger = logging.getLogger(__name__)
+
+# Role/turn markers Gemini adds around each message
+MESSAGE_OVERHEAD_TOKENS = 4
+
+# Latin-script characters per token; Vietnamese diacritics split words more
+LATIN_CHARS_PER_TOKEN = 3.5
+
+
+def _is_cjk(char: str) -> bool:
+    code = ord(char)
+    return (
+        0x4E00 <= code <= 0x9FFF      # CJK Unified Ideographs
+        or 0x3400 <= code <= 0x4DBF   # Extension A
+        or 0x3000 <= code <= 0x30FF   # CJK punctuation, kana
+        or 0xFF00 <= code <= 0xFFEF   # Full-width forms
+        or 0xAC00 <= code <= 0xD7AF   # Hangul
+    )
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    Approximate Gemini token count without a network call.
+
+    CJK characters are counted as one token each; other non-space characters
+    at LATIN_CHARS_PER_TOKEN per token.
+    """
+    cjk = 0
+    other = 0
+    for char in text:
+        if _is_cjk(char):
+            cjk += 1
+        elif not char.isspace():
+            other += 1
+    return cjk + math.ceil(other / LATIN_CHARS_PER_TOKEN)
+
+
+def message_tokens(message: Dict[str, Any]) -> int:
+    """Tokens a history entry costs in the prompt (memoized count if present)."""
+    tokens = message.get("tokens")
+    if tokens is None:
+        tokens = estimate_tokens(message.get("content", "")) + MESSAGE_OVERHEAD_TOKENS
+    return tokens
+
+
+class TokenCounter:
+    """
+    Counts message tokens with the SDK's count_tokens endpoint, falling back
+    to the local estimate when the call is disabled or fails.
+
+    Args:
+        client: genai.Client
+        model: Model whose tokenizer to use
+        use_api: Call count_tokens (one extra round-trip per count)
+    """
+
+    def __init__(self, client: Any, model: str, use_api: bool = False):
+        self.client = client
+        self.model = model
+        self.use_api = use_api
+
+        self.api_counts = 0
+        self.estimated_counts = 0
+
+    async def count_messages(self, messages: List[Dict[str, Any]]) -> int:
+        """Prompt tokens these messages cost when sent as history."""
+        if self.use_api:
+            contents = [
+                types.Content(
+                    role="user" if message.get("role") == "user" else "model",
+                    parts=[types.Part(text=message.get("content", ""))]
+                )
+                for message in messages
+            ]
+            try:
+                result = await self.client.aio.models.count_tokens(model=self.model, contents=contents)
+                self.api_counts += 1
+                return result.total_tokens or 0
+            except Exception as e:
+                logger.warning(f"count_tokens failed, estimating locally: {e}")
+
+        self.estimated_counts += 1
+        return sum(message_tokens(message) for message in messages)
+
+    async def annotate(self, message: Dict[str, Any]) -> Dict[str, Any]:
+        """Store the message's token count on it (before it goes to history)."""
+        message["tokens"] = await self.count_messages([{**message, "tokens": None}])
+        return message
+
+
+class PackedHistory(NamedTuple):
+    messages: List[Dict[str, Any]]  # Oldest to newest
+    tokens: int                      # Their token count
+    dropped: int                     # History entries left out
+
+
+class HistoryPacker:
+    """
+    Picks the newest history entries that fit a prompt token budget.
+    Shared by concurrent turns, so it keeps no per-turn state: pack()
+    returns the turn's numbers (see metrics.record_history_packing).
+
+    Args:
+        budget: Tokens available for history (summary included)
+        max_messages: Hard cap on entries regardless of budget
+    """
+
+    def __init__(self, budget: int, max_messages: int):
+        self.budget = budget
+        self.max_messages = max_messages
+
+    def pack(
+        self,
+        messages: List[Dict[str, Any]],
+        reserved_tokens: int = 0
+    ) -> PackedHistory:
+        """
+        Fill the budget newest-first; stops at the first entry that does not
+        fit so the packed history stays contiguous.
+
+        Args:
+            messages: History, oldest to newest
+            reserved_tokens: Budget already used (e.g. by the summary)
+        """
+        remaining = self.budget - reserved_tokens
+        packed: List[Dict[str, Any]] = []
+        used = 0
+
+        for message in reversed(messages[-self.max_messages:]):
+            tokens = message_tokens(message)
+            if tokens > remaining:
+                break
+            packed.append(message)
+            remaining -= tokens
+            used += tokens
+
+        packed.reverse()
+        return PackedHistory(packed, used, len(messages) - len(packed))
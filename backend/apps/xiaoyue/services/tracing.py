@@ -0,0 +1,315 @@
+"""
+Lightweight per-turn tracing.
+Spans use OpenTelemetry's data model (128-bit trace ids, 64-bit span ids,
+parent links, ns timestamps, attributes) without depending on it: finished
+traces go to pluggable exporters. InMemorySpanExporter serves tests,
+LoggingSpanExporter prints one latency breakdown per turn, and
+OTLPSpanExporter forwards to an OTLP collector when opentelemetry-sdk is
+installed.
+"""
+
+import asyncio
+import contextvars
+import logging
+import random
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Any, Deque, Dict, Iterator, List, Optional
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+STATUS_UNSET = "UNSET"
+STATUS_OK = "OK"
+STATUS_ERROR = "ERROR"
+
+
+class Span:
+    """One timed stage; ended spans are immutable."""
+
+    __slots__ = (
+        "tracer", "name", "trace_id", "span_id", "parent_id", "root",
+        "start_ns", "end_ns", "attributes", "status", "status_message",
+    )
+
+    def __init__(
+        self,
+        tracer: "Tracer",
+        name: str,
+        parent: Optional["Span"] = None,
+        attributes: Optional[Dict[str, Any]] = None
+    ):
+        self.tracer = tracer
+        self.name = name
+        self.span_id = random.getrandbits(64)
+        if parent is None:
+            self.trace_id = random.getrandbits(128)
+            self.parent_id = None
+            self.root = self
+        else:
+            self.trace_id = parent.trace_id
+            self.parent_id = parent.span_id
+            self.root = parent.root
+        self.start_ns = time.time_ns()
+        self.end_ns: Optional[int] = None
+        self.attributes: Dict[str, Any] = dict(attributes or {})
+        self.status = STATUS_UNSET
+        self.status_message = ""
+
+    @property
+    def duration_ms(self) -> Optional[float]:
+        if self.end_ns is None:
+            return None
+        return (self.end_ns - self.start_ns) / 1e6
+
+    def set_attribute(self, key: str, value: Any):
+        self.attributes[key] = value
+
+    def update_name(self, name: str):
+        self.name = name
+
+    def record_error(self, error: BaseException):
+        self.status = STATUS_ERROR
+        self.status_message = f"{type(error).__name__}: {error}"
+
+    def end(self):
+        if self.end_ns is not None:
+            return
+        self.end_ns = time.time_ns()
+        if self.status == STATUS_UNSET:
+            self.status = STATUS_OK
+        self.tracer._on_end(self)
+
+    def to_dict(self) -> Dict[str, Any]:
+        """OTLP/JSON-style representation."""
+        return {
+            "name": self.name,
+            "traceId": f"{self.trace_id:032x}",
+            "spanId": f"{self.span_id:016x}",
+            "parentSpanId": f"{self.parent_id:016x}" if self.parent_id else "",
+            "startTimeUnixNano": self.start_ns,
+            "endTimeUnixNano": self.end_ns,
+            "attributes": dict(self.attributes),
+            "status": {"code": self.status, "message": self.status_message},
+        }
+
+
+class _NoopSpan:
+    """Returned while tracing is off; accepts and drops everything."""
+
+    def set_attribute(self, key: str, value: Any):
+        pass
+
+    def update_name(self, name: str):
+        pass
+
+    def record_error(self, error: BaseException):
+        pass
+
+    def end(self):
+        pass
+
+
+NOOP_SPAN = _NoopSpan()
+
+_current_span: contextvars.ContextVar[Optional[Span]] = contextvars.ContextVar(
+    "current_span", default=None
+)
+
+
+class SpanExporter:
+    """Receives every span of a trace once its root span has ended."""
+
+    def export(self, spans: List[Span]):
+        raise NotImplementedError
+
+
+class InMemorySpanExporter(SpanExporter):
+    """Keeps the most recent finished spans in memory (for tests)."""
+
+    def __init__(self, max_spans: int = 10_000):
+        self.spans: Deque[Span] = deque(maxlen=max_spans)
+
+    def export(self, spans: List[Span]):
+        self.spans.extend(spans)
+
+    def names(self) -> List[str]:
+        return [span.name for span in self.spans]
+
+    def clear(self):
+        self.spans.clear()
+
+
+class LoggingSpanExporter(SpanExporter):
+    """Logs one line per trace: the root duration and each stage's."""
+
+    def export(self, spans: List[Span]):
+        root = next((span for span in spans if span.parent_id is None), spans[-1])
+        stages = " | ".join(
+            f"{span.name}={span.duration_ms:.0f}ms"
+            for span in sorted(spans, key=lambda span: span.start_ns)
+            if span is not root
+        )
+        logger.info(f"Trace {root.name} {root.duration_ms:.0f}ms [{root.status}]: {stages}")
+
+
+class OTLPSpanExporter(SpanExporter):
+    """
+    Converts spans to opentelemetry-sdk ReadableSpans and hands them to an
+    OTel exporter (OTLP over HTTP by default, configured with the standard
+    OTEL_EXPORTER_OTLP_* environment variables).
+    """
+
+    def __init__(self, exporter: Any = None, service_name: str = "xiaoyue"):
+        # Optional dependency: only needed when this exporter is configured
+        from opentelemetry.sdk.resources import Resource
+        if exporter is None:
+            from opentelemetry.exporter.otlp.proto.http.trace_exporter import (
+                OTLPSpanExporter as HTTPExporter,
+            )
+            exporter = HTTPExporter()
+        self.exporter = exporter
+        self.resource = Resource.create({"service.name": service_name})
+
+    def export(self, spans: List[Span]):
+        from opentelemetry.sdk.trace import ReadableSpan
+        from opentelemetry.trace import SpanContext, Status, StatusCode, TraceFlags
+
+        def context(trace_id: int, span_id: int) -> SpanContext:
+            return SpanContext(trace_id, span_id, is_remote=False, trace_flags=TraceFlags(TraceFlags.SAMPLED))
+
+        readable = [
+            ReadableSpan(
+                name=span.name,
+                context=context(span.trace_id, span.span_id),
+                parent=context(span.trace_id, span.parent_id) if span.parent_id else None,
+                resource=self.resource,
+                attributes=span.attributes,
+                status=Status(StatusCode[span.status], span.status_message or None),
+                start_time=span.start_ns,
+                end_time=span.end_ns,
+            )
+            for span in spans
+        ]
+        # The OTLP exporter does blocking HTTP
+        try:
+            asyncio.get_running_loop().run_in_executor(None, self.exporter.export, readable)
+        except RuntimeError:
+            self.exporter.export(readable)
+
+
+class Tracer:
+    """
+    Creates spans and batches them per trace; a trace is exported when its
+    root span ends. With no exporters every call is a no-op.
+    """
+
+    def __init__(self, exporters: Optional[List[SpanExporter]] = None, max_pending_traces: int = 1000):
+        self.exporters: List[SpanExporter] = list(exporters or [])
+        self.max_pending_traces = max_pending_traces
+        # Finished spans of traces whose root is still open, oldest first
+        self._pending: Dict[int, List[Span]] = {}
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.exporters)
+
+    def add_exporter(self, exporter: SpanExporter):
+        self.exporters.append(exporter)
+
+    def remove_exporter(self, exporter: SpanExporter):
+        self.exporters.remove(exporter)
+
+    def start_span(self, name: str, parent: Optional[Span] = None, **attributes: Any) -> Span:
+        """
+        Start a span under ``parent`` (default: the current span) without
+        making it current, for stages that straddle yields or tasks; call
+        ``end()`` on it. Without a live parent the span starts a new trace.
+        """
+        if not self.enabled:
+            return NOOP_SPAN
+        if parent is None:
+            parent = _current_span.get()
+        if not isinstance(parent, Span) or parent.root.end_ns is not None:
+            parent = None
+        return Span(self, name, parent, attributes)
+
+    @contextmanager
+    def span(self, name: str, parent: Optional[Span] = None, **attributes: Any) -> Iterator[Span]:
+        """Time the block as a child of ``parent`` (or the current span) and make it current."""
+        with self.use_span(self.start_span(name, parent, **attributes)) as span:
+            yield span
+
+    @contextmanager
+    def use_span(self, span: Span, end_on_exit: bool = True) -> Iterator[Span]:
+        """Make an existing span current for the block (and end it afterwards)."""
+        if span is NOOP_SPAN:
+            yield span
+            return
+
+        token = _current_span.set(span)
+        try:
+            yield span
+        except BaseException as e:
+            if not isinstance(e, (GeneratorExit, asyncio.CancelledError)):
+                span.record_error(e)
+            else:
+                span.set_attribute("cancelled", True)
+            raise
+        finally:
+            _current_span.reset(token)
+            if end_on_exit:
+                span.end()
+
+    def _on_end(self, span: Span):
+        if span.root.end_ns is None:
+            if span.trace_id not in self._pending and len(self._pending) >= self.max_pending_traces:
+                # Roots that never end (e.g. turns dropped from the queue)
+                del self._pending[next(iter(self._pending))]
+            self._pending.setdefault(span.trace_id, []).append(span)
+            return
+
+        # Root ended: flush the trace (a straggler that outlived its root
+        # goes out on its own)
+        batch = self._pending.pop(span.trace_id, [])
+        batch.append(span)
+        for exporter in self.exporters:
+            try:
+                exporter.export(batch)
+            except Exception as e:
+                logger.warning(f"Span exporter {type(exporter).__name__} failed: {e}")
+
+
+def current_span() -> Optional[Span]:
+    return _current_span.get()
+
+
+_tracer: Optional[Tracer] = None
+
+# XIAOYUE_TRACING_EXPORTERS name -> exporter class
+EXPORTERS = {
+    "log": LoggingSpanExporter,
+    "memory": InMemorySpanExporter,
+    "otlp": OTLPSpanExporter,
+}
+
+
+def get_tracer() -> Tracer:
+    """
+    Process-wide tracer with the exporters named in XIAOYUE_TRACING_EXPORTERS
+    (plus the Prometheus histograms when XIAOYUE_METRICS_ENABLED).
+    """
+    global _tracer
+    if _tracer is None:
+        exporters = []
+        if settings.XIAOYUE_METRICS_ENABLED:
+            from .metrics import MetricsSpanExporter
+            exporters.append(MetricsSpanExporter())
+        for name in settings.XIAOYUE_TRACING_EXPORTERS:
+            try:
+                exporters.append(EXPORTERS[name]())
+            except Exception as e:
+                logger.error(f"Tracing exporter {name!r} unavailable: {e}")
+        _tracer = Tracer(exporters)
+    return _tracer
@@ -0,0 +1,138 @@
+"""
+Two-tier cache for synthesized TTS audio.
+In-process LRU (bounded by bytes) in front of a shared Redis tier with TTL,
+keyed on a hash of text + voice + rate + volume.
+"""
+
+import base64
+import hashlib
+import logging
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+from django.conf import settings
+from .redis_client import RedisClient
+from .metrics import record_cache_lookup
+
+logger = logging.getLogger(__name__)
+
+
+class TTSAudioCache:
+    """
+    Content-addressed cache for MP3 bytes.
+
+    The memory tier is per process; the Redis tier is shared by all workers
+    so an utterance synthesized once is reused cluster-wide.
+    """
+
+    KEY_PREFIX = "tts:audio:"
+
+    def __init__(
+        self,
+        max_bytes: int = 64 * 1024 * 1024,
+        redis_ttl: int = 7 * 24 * 60 * 60,
+        redis_client: Optional[RedisClient] = None
+    ):
+        self.max_bytes = max_bytes
+        self.redis_ttl = redis_ttl
+        self.redis_client = redis_client
+
+        self._entries: "OrderedDict[str, bytes]" = OrderedDict()
+        self._size = 0
+
+        self.memory_hits = 0
+        self.redis_hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def make_key(text: str, voice: str, rate: str, volume: str) -> str:
+        """Hash the synthesis parameters into a cache key."""
+        raw = "\x1f".join((text, voice, rate, volume))
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    async def get(self, key: str) -> Optional[bytes]:
+        """Look up audio, promoting Redis hits into the memory tier."""
+        audio = self._entries.get(key)
+        if audio is not None:
+            self._entries.move_to_end(key)
+            self.memory_hits += 1
+            record_cache_lookup("tts", hit=True)
+            return audio
+
+        if self.redis_client:
+            try:
+                client = await self.redis_client.get_client()
+                encoded = await client.get(self.KEY_PREFIX + key)
+                if encoded:
+                    audio = base64.b64decode(encoded)
+                    self._remember(key, audio)
+                    self.redis_hits += 1
+                    record_cache_lookup("tts", hit=True)
+                    return audio
+            except Exception as e:
+                logger.warning(f"TTS cache Redis lookup failed: {e}")
+
+        self.misses += 1
+        record_cache_lookup("tts", hit=False)
+        return None
+
+    async def set(self, key: str, audio: bytes):
+        """Store audio in both tiers."""
+        self._remember(key, audio)
+
+        if self.redis_client:
+            try:
+                client = await self.redis_client.get_client()
+                await client.set(
+                    self.KEY_PREFIX + key,
+                    base64.b64encode(audio).decode("ascii"),
+                    ex=self.redis_ttl
+                )
+            except Exception as e:
+                logger.warning(f"TTS cache Redis store failed: {e}")
+
+    def stats(self) -> Dict[str, Any]:
+        """Hit/miss counters and memory tier occupancy."""
+        lookups = self.memory_hits + self.redis_hits + self.misses
+        return {
+            "memory_hits": self.memory_hits,
+            "redis_hits": self.redis_hits,
+            "misses": self.misses,
+            "hit_ratio": (self.memory_hits + self.redis_hits) / lookups if lookups else 0.0,
+            "entries": len(self._entries),
+            "bytes": self._size,
+            "max_bytes": self.max_bytes,
+        }
+
+    def _remember(self, key: str, audio: bytes):
+        if len(audio) > self.max_bytes:
+            return
+
+        previous = self._entries.pop(key, None)
+        if previous is not None:
+            self._size -= len(previous)
+
+        self._entries[key] = audio
+        self._size += len(audio)
+
+        while self._size > self.max_bytes:
+            _, evicted = self._entries.popitem(last=False)
+            self._size -= len(evicted)
+
+
+_tts_cache: Optional[TTSAudioCache] = None
+
+
+def get_tts_cache() -> Optional[TTSAudioCache]:
+    """Process-wide TTS cache, or None when disabled in settings."""
+    global _tts_cache
+
+    if not settings.XIAOYUE_TTS_CACHE_ENABLED:
+        return None
+
+    if _tts_cache is None:
+        _tts_cache = TTSAudioCache(
+            max_bytes=settings.XIAOYUE_TTS_CACHE_MAX_BYTES,
+            redis_ttl=settings.XIAOYUE_TTS_CACHE_TTL,
+            redis_client=RedisClient("cache") if settings.XIAOYUE_TTS_CACHE_REDIS else None
+        )
+    return _tts_cache
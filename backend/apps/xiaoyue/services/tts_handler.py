@@ -1,57 +1,130 @@
 """
 Text-to-Speech handler using edge-tts.
-Generates audio in-memory and returns Base64 encoded string.
+Generates audio in-memory (through the TTS audio cache) and returns
+Base64 encoded string.
 """
 
+import asyncio
 import base64
 import logging
 from io import BytesIO
-from typing import Optional
+from typing import Awaitable, Callable, Dict, Optional
 import edge_tts
+from .tts_cache import get_tts_cache
+from .admission import get_admission_controller
+from .tracing import Span, get_tracer
 
 logger = logging.getLogger(__name__)
 
+# In-flight synthesis keyed by cache key (single-flight de-duplication)
+_inflight: Dict[str, "asyncio.Task[Optional[bytes]]"] = {}
 
-async def generate_tts_audio(
+
+async def synthesize_speech(
     text: str,
     voice: str = "zh-CN-XiaoxiaoNeural",
     rate: str = "+0%",
     volume: str = "+0%",
-) -> Optional[str]:
+) -> Optional[bytes]:
     """
-    Generate Text-to-Speech audio and return as Base64 string.
+    Synthesize speech and return raw MP3 bytes, served from the TTS cache
+    when the same (text, voice, rate, volume) was rendered before.
     
-    Args:
-        text: Chinese text to convert to speech
-        voice: Edge TTS voice name (default: zh-CN-XiaoxiaoNeural - young female)
-               Other options:
-               - zh-CN-YunxiNeural (male)
-               - zh-CN-XiaoyiNeural (female)
-               - zh-CN-YunjianNeural (male)
-        rate: Speech rate (e.g., "+10%", "-10%")
-        volume: Speech volume (e.g., "+10%", "-10%")
+    Concurrent requests for the same utterance share a single edge-tts call.
     
     Returns:
-        Base64 encoded audio string (MP3 format), or None if failed
+        MP3 bytes, or None if failed
     """
+    if not text:
+        return None
+
+    with get_tracer().span("tts.synthesize", chars=len(text)) as span:
+        audio_bytes = await _synthesize_speech(text, voice, rate, volume, span)
+        span.set_attribute("bytes", len(audio_bytes or b""))
+        return audio_bytes
+
+
+async def _synthesize_speech(text: str, voice: str, rate: str, volume: str, span: Span) -> Optional[bytes]:
+    cache = get_tts_cache()
+    if cache is None:
+        span.set_attribute("cache", "off")
+        return await _synthesize_with_edge_tts(text, voice, rate, volume)
+
+    key = cache.make_key(text, voice, rate, volume)
+    audio_bytes = await cache.get(key)
+    if audio_bytes is not None:
+        logger.info(f"TTS cache hit for text: {text[:50]}...")
+        span.set_attribute("cache", "hit")
+        return audio_bytes
+
+    task = _inflight.get(key)
+    if task is not None:
+        span.set_attribute("cache", "shared")
+    else:
+        span.set_attribute("cache", "miss")
+        # A task of its own, so a caller that is cancelled (disconnect,
+        # timeout, pipeline reset) doesn't cancel it for the others
+        task = asyncio.ensure_future(_synthesize_and_store(cache, key, text, voice, rate, volume))
+        _inflight[key] = task
+        task.add_done_callback(lambda done: _finish_inflight(key, done))
+    return await asyncio.shield(task)
+
+
+async def _synthesize_and_store(cache, key: str, text: str, voice: str, rate: str, volume: str) -> Optional[bytes]:
+    audio_bytes = await _synthesize_with_edge_tts(text, voice, rate, volume)
+    if audio_bytes:
+        await cache.set(key, audio_bytes)
+    return audio_bytes
+
+
+def _finish_inflight(key: str, task: "asyncio.Task[Optional[bytes]]"):
+    if _inflight.get(key) is task:
+        del _inflight[key]
+    # Mark retrieved so failures nobody waited for don't warn at GC
+    if not task.cancelled():
+        task.exception()
+
+
+# Optional replacement for edge-tts, called as backend(text, voice, rate, volume)
+# and returning MP3 bytes; used by load tests (see fakes.FakeEdgeTTS)
+_tts_backend: Optional[Callable[[str, str, str, str], Awaitable[bytes]]] = None
+
+
+def set_tts_backend(backend: Optional[Callable[[str, str, str, str], Awaitable[bytes]]]):
+    """Route synthesis through ``backend`` instead of edge-tts (None restores it)."""
+    global _tts_backend
+    _tts_backend = backend
+
+
+async def _synthesize_with_edge_tts(
+    text: str,
+    voice: str,
+    rate: str,
+    volume: str,
+) -> Optional[bytes]:
+    """Call edge-tts and collect the MP3 stream in memory."""
     try:
         logger.info(f"Generating TTS for text: {text[:50]}... with voice: {voice}")
         
-        # Create TTS communicator
-        communicate = edge_tts.Communicate(
-            text=text,
-            voice=voice,
-            rate=rate,
-            volume=volume
-        )
-        
         # Use BytesIO to store audio in memory
         audio_buffer = BytesIO()
         
-        # Stream audio chunks into buffer
-        async for chunk in communicate.stream():
-            if chunk["type"] == "audio":
-                audio_buffer.write(chunk["data"])
+        async with get_admission_controller("edge_tts").admit():
+            if _tts_backend is not None:
+                audio_buffer.write(await _tts_backend(text, voice, rate, volume))
+            else:
+                # Create TTS communicator
+                communicate = edge_tts.Communicate(
+                    text=text,
+                    voice=voice,
+                    rate=rate,
+                    volume=volume
+                )
+                
+                # Stream audio chunks into buffer
+                async for chunk in communicate.stream():
+                    if chunk["type"] == "audio":
+                        audio_buffer.write(chunk["data"])
         
         # Get audio bytes
         audio_bytes = audio_buffer.getvalue()
@@ -60,18 +133,46 @@ async def generate_tts_audio(
             logger.warning("TTS generated empty audio")
             return None
         
-        # Convert to Base64
-        audio_base64 = base64.b64encode(audio_bytes).decode("utf-8")
-        
         logger.info(f"TTS generated successfully, size: {len(audio_bytes)} bytes")
         
-        return audio_base64
+        return audio_bytes
         
     except Exception as e:
         logger.error(f"Error generating TTS audio: {e}", exc_info=True)
         return None
 
 
+async def generate_tts_audio(
+    text: str,
+    voice: str = "zh-CN-XiaoxiaoNeural",
+    rate: str = "+0%",
+    volume: str = "+0%",
+) -> Optional[str]:
+    """
+    Generate Text-to-Speech audio and return as Base64 string.
+    
+    Args:
+        text: Chinese text to convert to speech
+        voice: Edge TTS voice name (default: zh-CN-XiaoxiaoNeural - young female)
+               Other options:
+               - zh-CN-YunxiNeural (male)
+               - zh-CN-XiaoyiNeural (female)
+               - zh-CN-YunjianNeural (male)
+        rate: Speech rate (e.g., "+10%", "-10%")
+        volume: Speech volume (e.g., "+10%", "-10%")
+    
+    Returns:
+        Base64 encoded audio string (MP3 format), or None if failed
+    """
+    audio_bytes = await synthesize_speech(text, voice=voice, rate=rate, volume=volume)
+    
+    if not audio_bytes:
+        return None
+    
+    # Convert to Base64
+    return base64.b64encode(audio_bytes).decode("utf-8")
+
+
 async def get_available_voices() -> list:
     """
     Get list of available Chinese voices from edge-tts.
@@ -146,13 +247,23 @@ VOICE_PRESETS = {
 }
 
 
-async def generate_tts_with_emotion(
+def resolve_voice_preset(emotion: str = "neutral", custom_voice: Optional[str] = None) -> Dict[str, str]:
+    """Voice, rate and volume for an emotion, with an optional voice override."""
+    preset = dict(VOICE_PRESETS.get(emotion, VOICE_PRESETS["neutral"]))
+    
+    if custom_voice:
+        preset["voice"] = custom_voice
+    
+    return preset
+
+
+async def synthesize_with_emotion(
     text: str,
     emotion: str = "neutral",
     custom_voice: Optional[str] = None
-) -> Optional[str]:
+) -> Optional[bytes]:
     """
-    Generate TTS with emotion-based voice modulation.
+    Synthesize speech with emotion-based voice modulation.
     
     Args:
         text: Chinese text to convert
@@ -160,17 +271,37 @@ async def generate_tts_with_emotion(
         custom_voice: Override default voice
         
     Returns:
-        Base64 encoded audio string
+        Raw MP3 bytes, or None if failed
     """
-    preset = VOICE_PRESETS.get(emotion, VOICE_PRESETS["neutral"])
+    preset = resolve_voice_preset(emotion, custom_voice)
     
-    if custom_voice:
-        preset["voice"] = custom_voice
-    
-    return await generate_tts_audio(
+    return await synthesize_speech(
         text=text,
         voice=preset["voice"],
         rate=preset["rate"],
         volume=preset["volume"]
     )
 
+
+async def generate_tts_with_emotion(
+    text: str,
+    emotion: str = "neutral",
+    custom_voice: Optional[str] = None
+) -> Optional[str]:
+    """
+    Generate TTS with emotion-based voice modulation.
+    
+    Args:
+        text: Chinese text to convert
+        emotion: Emotion type (happy, excited, sulking, angry, etc.)
+        custom_voice: Override default voice
+        
+    Returns:
+        Base64 encoded audio string
+    """
+    audio_bytes = await synthesize_with_emotion(text, emotion=emotion, custom_voice=custom_voice)
+    
+    if not audio_bytes:
+        return None
+    
+    return base64.b64encode(audio_bytes).decode("utf-8")
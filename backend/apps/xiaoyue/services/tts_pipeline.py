@@ -0,0 +1,197 @@
+"""
+Sentence-level TTS pipeline.
+Splits chinese_content into sentences as it streams and synthesizes them
+concurrently, emitting audio chunks in order.
+"""
+
+import asyncio
+import logging
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+from .tts_handler import generate_tts_with_emotion, synthesize_with_emotion
+
+logger = logging.getLogger(__name__)
+
+# Chinese sentence-ending punctuation (plus the tilde the persona loves)
+SENTENCE_DELIMITERS = "。！？~～!?"
+
+
+class SentenceSplitter:
+    """
+    Accumulates streamed text and yields complete sentences.
+
+    A sentence is closed by a run of delimiters ("好吧！！", "师兄~！");
+    the run is only known to be over once a non-delimiter arrives, so the
+    last sentence is released by flush().
+    """
+
+    def __init__(self, delimiters: str = SENTENCE_DELIMITERS):
+        self.delimiters = delimiters
+        self._buffer: List[str] = []
+        self._in_delimiter_run = False
+
+    def feed(self, text: str) -> List[str]:
+        """
+        Add streamed text.
+
+        Returns:
+            Sentences completed by this piece of text
+        """
+        sentences = []
+
+        for char in text:
+            if char in self.delimiters:
+                self._in_delimiter_run = True
+            elif self._in_delimiter_run:
+                sentence = self._take()
+                if sentence:
+                    sentences.append(sentence)
+                self._in_delimiter_run = False
+            self._buffer.append(char)
+
+        return sentences
+
+    def flush(self) -> Optional[str]:
+        """Return whatever text is left as a final sentence."""
+        self._in_delimiter_run = False
+        return self._take() or None
+
+    def _take(self) -> str:
+        sentence = "".join(self._buffer).strip()
+        self._buffer = []
+        return sentence
+
+
+class SentenceTTSPipeline:
+    """
+    Dispatches each sentence to edge-tts as soon as it is complete and
+    emits the results strictly in order through ``on_chunk``.
+
+    Synthesis runs concurrently; only emission is serialized, so sentence
+    one can play in the browser while later sentences are still rendering.
+
+    With ``binary=True`` chunks carry raw MP3 bytes under ``audio_bytes``
+    instead of ``audio_base64``, for clients using binary audio frames.
+
+    ``text_filter`` is applied to each sentence before synthesis; sentences
+    it empties are dropped. A sentence not synthesized within ``timeout``
+    seconds is emitted without audio.
+    """
+
+    def __init__(
+        self,
+        on_chunk: Callable[[Dict[str, Any]], Awaitable[None]],
+        emotion: str = "neutral",
+        custom_voice: Optional[str] = None,
+        binary: bool = False,
+        text_filter: Optional[Callable[[str], str]] = None,
+        timeout: Optional[float] = None
+    ):
+        self.on_chunk = on_chunk
+        self.emotion = emotion
+        self.custom_voice = custom_voice
+        self.binary = binary
+        self.text_filter = text_filter
+        self.timeout = timeout
+        self.sentence_count = 0
+        self.text = ""
+
+        self._splitter = SentenceSplitter()
+        self._queue: asyncio.Queue = asyncio.Queue()
+        self._tasks: List[asyncio.Task] = []
+        self._emitter: Optional[asyncio.Task] = None
+
+    def feed(self, text: str):
+        """Feed a chinese_content delta; complete sentences start synthesizing."""
+        self.text += text
+        for sentence in self._splitter.feed(text):
+            self._dispatch(sentence)
+
+    def flush(self) -> int:
+        """
+        Dispatch the trailing sentence, if any.
+
+        Returns:
+            Total number of audio chunks this turn will emit
+        """
+        sentence = self._splitter.flush()
+        if sentence:
+            self._dispatch(sentence)
+        return self.sentence_count
+
+    async def finish(self) -> int:
+        """
+        Flush and wait until every chunk has been emitted.
+
+        Returns:
+            Number of audio chunks emitted
+        """
+        self.flush()
+        if self._emitter is not None:
+            await self._queue.put(None)
+            await self._emitter
+        return self.sentence_count
+
+    async def cancel(self):
+        """Abort pending synthesis (e.g. the socket went away)."""
+        for task in self._tasks:
+            task.cancel()
+        if self._emitter is not None:
+            self._emitter.cancel()
+            await asyncio.gather(self._emitter, return_exceptions=True)
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+
+    async def reset(self):
+        """Abort everything dispatched so far and start over (the reply is being redone)."""
+        await self.cancel()
+        self.sentence_count = 0
+        self.text = ""
+        self._splitter = SentenceSplitter()
+        self._queue = asyncio.Queue()
+        self._tasks = []
+        self._emitter = None
+
+    def _dispatch(self, sentence: str):
+        if self.text_filter:
+            sentence = self.text_filter(sentence)
+            if not sentence:
+                return
+
+        synthesize = synthesize_with_emotion if self.binary else generate_tts_with_emotion
+        task = asyncio.create_task(
+            asyncio.wait_for(
+                synthesize(
+                    text=sentence,
+                    emotion=self.emotion,
+                    custom_voice=self.custom_voice
+                ),
+                timeout=self.timeout
+            )
+        )
+        self._tasks.append(task)
+        self._queue.put_nowait((self.sentence_count, sentence, task))
+        self.sentence_count += 1
+
+        if self._emitter is None:
+            self._emitter = asyncio.create_task(self._emit_in_order())
+
+    async def _emit_in_order(self):
+        while True:
+            item = await self._queue.get()
+            if item is None:
+                return
+
+            seq, sentence, task = item
+            try:
+                audio = await task
+            except asyncio.TimeoutError:
+                logger.warning(f"Sentence TTS timed out after {self.timeout}s (seq={seq})")
+                audio = None
+            except Exception as e:
+                logger.error(f"Sentence TTS failed (seq={seq}): {e}")
+                audio = None
+
+            await self.on_chunk({
+                "seq": seq,
+                "text": sentence,
+                "audio_bytes" if self.binary else "audio_base64": audio
+            })
@@ -0,0 +1,90 @@
+"""
+Per-connection chat turn scheduler.
+Runs turns one at a time off the receive loop, so a fast client cannot
+queue unbounded LLM + TTS work and a disconnect can cancel the turn that
+is still generating.
+"""
+
+import asyncio
+import logging
+from typing import Awaitable, Callable, Optional
+from .metrics import QUEUED_TURNS
+
+logger = logging.getLogger(__name__)
+
+Turn = Callable[[], Awaitable[None]]
+
+
+class TurnScheduler:
+    """
+    Single-worker queue of chat turns.
+
+    At most one turn runs at a time and at most ``max_pending`` more wait
+    behind it; ``submit`` returns False instead of queueing past that so
+    the caller can answer "busy". ``max_pending`` 0 (or less) rejects every
+    turn submitted while another is running.
+    """
+
+    def __init__(self, max_pending: int = 2):
+        self.max_pending = max(0, max_pending)
+        # A turn passes through the queue on its way to the worker, and an
+        # asyncio.Queue with maxsize 0 would be unbounded
+        self._queue: asyncio.Queue = asyncio.Queue(maxsize=max(1, self.max_pending))
+        self._worker: Optional[asyncio.Task] = None
+        self._running = False
+
+        self.accepted = 0
+        self.rejected = 0
+
+    @property
+    def pending(self) -> int:
+        """Turns waiting behind the in-flight one."""
+        return self._queue.qsize()
+
+    @property
+    def running(self) -> bool:
+        return self._running
+
+    def submit(self, turn: Turn) -> bool:
+        """
+        Queue a turn.
+
+        Returns:
+            False if the queue is full (the turn was not accepted)
+        """
+        try:
+            if not self.max_pending and self._running:
+                raise asyncio.QueueFull
+            self._queue.put_nowait(turn)
+        except asyncio.QueueFull:
+            self.rejected += 1
+            return False
+
+        self.accepted += 1
+        QUEUED_TURNS.inc()
+        if self._worker is None or self._worker.done():
+            self._worker = asyncio.create_task(self._run())
+        return True
+
+    async def cancel(self):
+        """Drop queued turns and cancel the one in flight."""
+        while not self._queue.empty():
+            self._queue.get_nowait()
+            QUEUED_TURNS.dec()
+
+        if self._worker is not None:
+            self._worker.cancel()
+            await asyncio.gather(self._worker, return_exceptions=True)
+            self._worker = None
+
+    async def _run(self):
+        while True:
+            turn = await self._queue.get()
+            QUEUED_TURNS.dec()
+            self._running = True
+            try:
+                await turn()
+            except Exception as e:
+                logger.error(f"Chat turn failed: {e}", exc_info=True)
+            finally:
+                self._running = False
@@ -0,0 +1,38 @@
+"""
+Celery tasks for the XiaoYue app.
+"""
+
+import asyncio
+import logging
+from celery import shared_task
+from django.conf import settings
+from .services.agent_registry import close_tutor_agents, get_tutor_agent
+from .services.redis_client import RedisClient, close_connection_pools
+from .services.summarizer import ConversationSummarizer
+
+logger = logging.getLogger(__name__)
+
+
+async def _summarize_conversation(user_id: str):
+    try:
+        summarizer = ConversationSummarizer(
+            client=get_tutor_agent().client,
+            redis_client=RedisClient(),
+            model=settings.GEMINI_SUMMARY_MODEL,
+            trigger_messages=settings.XIAOYUE_SUMMARY_TRIGGER_MESSAGES,
+            keep_messages=settings.XIAOYUE_SUMMARY_KEEP_MESSAGES
+        )
+        await summarizer.summarize(user_id)
+    finally:
+        # Each task runs on a fresh event loop; don't leak its connections
+        await close_tutor_agents()
+        await close_connection_pools()
+
+
+@shared_task(ignore_result=True)
+def summarize_conversation(user_id: str):
+    """Fold a user's oldest history turns into their running summary."""
+    try:
+        asyncio.run(_summarize_conversation(user_id))
+    except Exception as e:
+        logger.error(f"Summarizing conversation for {user_id} failed: {e}", exc_info=True)
@@ -0,0 +1,122 @@
+"""
+Unit tests for upstream admission control.
+"""
+
+import asyncio
+import time
+import pytest
+from prometheus_client import REGISTRY
+from apps.xiaoyue.services.admission import (
+    AdmissionController,
+    AdmissionTimeout,
+    Priority,
+    admission_priority,
+)
+
+
+def sample(name, **labels):
+    return REGISTRY.get_sample_value(name, labels) or 0
+
+
+@pytest.mark.asyncio
+async def test_concurrency_is_bounded():
+    controller = AdmissionController("test", max_concurrency=2)
+    active = 0
+    peak = 0
+
+    async def call():
+        nonlocal active, peak
+        async with controller.admit():
+            active += 1
+            peak = max(peak, active)
+            await asyncio.sleep(0.01)
+            active -= 1
+
+    await asyncio.gather(*[call() for _ in range(6)])
+
+    assert peak == 2
+    assert controller.stats()["admitted"]["interactive"] == 6
+    assert controller.stats()["in_flight"] == 0
+
+
+@pytest.mark.asyncio
+async def test_interactive_callers_jump_the_queue():
+    """Queued interactive turns are admitted before queued background work."""
+    controller = AdmissionController("test", max_concurrency=1)
+    order = []
+    release = asyncio.Event()
+
+    async def holder():
+        async with controller.admit():
+            await release.wait()
+
+    async def call(name, priority):
+        async with controller.admit(priority):
+            order.append(name)
+
+    tasks = [asyncio.create_task(holder())]
+    await asyncio.sleep(0)
+    tasks.append(asyncio.create_task(call("summary", Priority.BACKGROUND)))
+    await asyncio.sleep(0)
+    with admission_priority(Priority.INTERACTIVE):
+        tasks.append(asyncio.create_task(call("chat", None)))
+    await asyncio.sleep(0)
+
+    release.set()
+    await asyncio.gather(*tasks)
+
+    assert order == ["chat", "summary"]
+
+
+@pytest.mark.asyncio
+async def test_rate_limit_spaces_out_calls():
+    controller = AdmissionController("test", rate=50, burst=1)
+    waits = sample("xiaoyue_admission_wait_seconds_count", service="test", priority="interactive")
+    started = time.monotonic()
+
+    for _ in range(4):
+        async with controller.admit():
+            pass
+
+    # One token up front, three more at 50/s
+    assert time.monotonic() - started >= 0.05
+    assert controller.stats()["wait_seconds_max"]["interactive"] > 0
+    assert sample("xiaoyue_admission_wait_seconds_count", service="test", priority="interactive") == waits + 4
+
+
+@pytest.mark.asyncio
+async def test_waiting_too_long_times_out():
+    controller = AdmissionController("test", max_concurrency=1, max_wait=0.05)
+    release = asyncio.Event()
+    labels = {"service": "test", "priority": "interactive", "reason": "timeout"}
+    rejected = sample("xiaoyue_admission_rejections_total", **labels)
+
+    async def holder():
+        async with controller.admit():
+            await release.wait()
+
+    task = asyncio.create_task(holder())
+    await asyncio.sleep(0)
+
+    with pytest.raises(AdmissionTimeout):
+        async with controller.admit():
+            pass
+
+    release.set()
+    await task
+    assert controller.stats()["timed_out"]["interactive"] == 1
+    assert sample("xiaoyue_admission_rejections_total", **labels) == rejected + 1
+    assert controller.stats()["in_flight"] == 0
+
+
+@pytest.mark.asyncio
+async def test_throttle_pauses_admissions():
+    controller = AdmissionController("test")
+    controller.throttle(0.05)
+    started = time.monotonic()
+
+    async with controller.admit():
+        pass
+
+    assert time.monotonic() - started >= 0.04
+    assert controller.stats()["throttled"] == 1
@@ -0,0 +1,65 @@
+"""
+Unit tests for the shared agent registry and ASGI lifespan hooks.
+"""
+
+import asyncio
+import pytest
+from apps.xiaoyue import lifespan
+from apps.xiaoyue.services import agent_registry
+from apps.xiaoyue.services.agent_registry import close_tutor_agents, get_tutor_agent
+
+
+@pytest.mark.asyncio
+async def test_agent_is_shared_within_a_worker():
+    """Consumers on the same event loop get the same agent and client."""
+    first = get_tutor_agent()
+    second = get_tutor_agent()
+
+    assert first is second
+    assert first.client is second.client
+
+    http_client = agent_registry._http_clients[asyncio.get_running_loop()]
+    assert first.client._api_client._async_httpx_client is http_client
+
+    await close_tutor_agents()
+    assert http_client.is_closed
+    assert get_tutor_agent() is not first
+
+    await close_tutor_agents()
+
+
+@pytest.mark.asyncio
+async def test_lifespan_runs_hooks():
+    """Startup and shutdown hooks run through the ASGI lifespan protocol."""
+    calls = []
+
+    async def startup_hook():
+        calls.append("startup")
+
+    async def failing_shutdown_hook():
+        raise RuntimeError("boom")
+
+    async def shutdown_hook():
+        calls.append("shutdown")
+
+    lifespan.on_startup(startup_hook)
+    lifespan.on_shutdown(failing_shutdown_hook)
+    lifespan.on_shutdown(shutdown_hook)
+
+    messages = asyncio.Queue()
+    await messages.put({"type": "lifespan.startup"})
+    await messages.put({"type": "lifespan.shutdown"})
+    sent = []
+
+    async def send(message):
+        sent.append(message["type"])
+
+    try:
+        await lifespan.lifespan_app({"type": "lifespan"}, messages.get, send)
+    finally:
+        lifespan._startup_hooks.remove(startup_hook)
+        lifespan._shutdown_hooks.remove(failing_shutdown_hook)
+        lifespan._shutdown_hooks.remove(shutdown_hook)
+
+    assert calls == ["startup", "shutdown"]
+    assert sent == ["lifespan.startup.complete", "lifespan.shutdown.complete"]
@@ -0,0 +1,28 @@
+"""
+Unit tests for binary WebSocket audio frames.
+"""
+
+import pytest
+from apps.xiaoyue.services.audio_frames import decode_audio_frame, encode_audio_frame, new_audio_id
+
+
+def test_frame_round_trip():
+    audio_id = new_audio_id()
+    audio = b"\xff\xfb\x90\x00" * 100
+
+    frame = encode_audio_frame({"audio_id": audio_id, "seq": 2}, audio)
+    header, payload = decode_audio_frame(frame)
+
+    assert header == {"mime": "audio/mpeg", "audio_id": audio_id, "seq": 2}
+    assert payload == audio
+    # No Base64 inflation: only the small header is added
+    assert len(frame) - len(audio) < 80
+
+
+def test_truncated_frame_is_rejected():
+    frame = encode_audio_frame({"audio_id": "abc"}, b"mp3")
+
+    with pytest.raises(ValueError):
+        decode_audio_frame(frame[:1])
+    with pytest.raises(ValueError):
+        decode_audio_frame(frame[:5])
@@ -0,0 +1,151 @@
+"""
+Unit tests for the chat consumer: deferred audio, quiz grading, local routing
+and streamed reply restarts.
+"""
+
+import asyncio
+import base64
+import json
+import pytest
+from django.test import override_settings
+from apps.xiaoyue import consumers
+from apps.xiaoyue.consumers import ChineseTutorConsumer
+from apps.xiaoyue.services.audio_frames import AUDIO_TRANSPORT_BINARY, decode_audio_frame
+
+
+def make_consumer():
+    consumer = ChineseTutorConsumer()
+    sent = []
+
+    async def send(text_data=None, bytes_data=None):
+        sent.append(text_data if text_data is not None else bytes_data)
+
+    consumer.send = send
+    return consumer, sent
+
+
+@pytest.mark.asyncio
+async def test_audio_ready_follows_reply(monkeypatch):
+    async def fake_synthesize(text, emotion="neutral", custom_voice=None):
+        return text.encode("utf-8")
+
+    monkeypatch.setattr(consumers, "synthesize_with_emotion", fake_synthesize)
+
+    consumer, sent = make_consumer()
+    await consumer.deliver_audio("m1", "你好。", "happy")
+    assert len(sent) == 1
+    assert '"audio_ready"' in sent[0] and '"m1"' in sent[0]
+    assert base64.b64encode("你好。".encode("utf-8")).decode("utf-8") in sent[0]
+
+    consumer, sent = make_consumer()
+    consumer.audio_transport = AUDIO_TRANSPORT_BINARY
+    await consumer.deliver_audio("m2", "你好。", "happy")
+    header, payload = decode_audio_frame(sent[1])
+    assert '"audio_ready"' in sent[0] and header["audio_id"] in sent[0]
+    assert payload == "你好。".encode("utf-8")
+
+
+@pytest.mark.asyncio
+@override_settings(XIAOYUE_TTS_TIMEOUT=0.05)
+async def test_audio_failed_on_timeout(monkeypatch):
+    async def stuck_synthesize(text, emotion="neutral", custom_voice=None):
+        await asyncio.sleep(10)
+
+    async def failed_synthesize(text, emotion="neutral", custom_voice=None):
+        return None
+
+    consumer, sent = make_consumer()
+    monkeypatch.setattr(consumers, "synthesize_with_emotion", stuck_synthesize)
+    await asyncio.wait_for(consumer.deliver_audio("m1", "你好。", "happy"), 1)
+    monkeypatch.setattr(consumers, "synthesize_with_emotion", failed_synthesize)
+    await consumer.deliver_audio("m2", "你好。", "happy")
+
+    assert [('"audio_failed"' in frame, '"reason": "timeout"' in frame) for frame in sent] == [
+        (True, True), (True, False)
+    ]
+    assert '"tts_failed"' in sent[1]
+
+
+@pytest.mark.asyncio
+async def test_answer_quiz_grades_without_gemini(monkeypatch):
+    quiz = [
+        {"id": 1, "type": "fill_blank", "question": "谢___", "answer": "谢"},
+        {"id": 2, "type": "fill_blank", "question": "___好", "answer": "你"},
+    ]
+    explained = []
+
+    async def get_quiz_set(user_id):
+        return quiz
+
+    async def explain_quiz_mistakes(wrong_items, user_role):
+        explained.append([item["id"] for item in wrong_items])
+        return {"2": "你好 là xin chào."}
+
+    consumer, sent = make_consumer()
+    consumer.user_id = "u1"
+    monkeypatch.setattr(consumer.redis_client, "get_quiz_set", get_quiz_set)
+    monkeypatch.setattr(consumer.ai_agent, "explain_quiz_mistakes", explain_quiz_mistakes)
+
+    await consumer.handle_answer_quiz({"answers": {"1": "謝", "2": "他"}, "explain": True})
+    await asyncio.gather(*consumer.background_tasks)
+
+    result, explanation = (json.loads(frame) for frame in sent)
+    assert result["status"] == "quiz_result"
+    assert (result["data"]["score"], result["data"]["total"]) == (1, 2)
+    assert result["data"]["explanation_pending"] is True
+    assert explained == [[2]]
+    assert explanation == {"status": "quiz_explanation", "data": {"explanations": {"2": "你好 là xin chào."}}}
+
+
+@pytest.mark.asyncio
+async def test_route_locally():
+    consumer, _ = make_consumer()
+    consumer.user_id = "u1"
+    history = [
+        {"role": "user", "content": "你好"},
+        {"role": "assistant", "content": "师兄好！", "emotion": "happy", "vietnamese_display": "Chào sư huynh!"},
+    ]
+
+    greeting = consumer.route_locally("Xin chào sư muội!", "Sư huynh", 0, [])
+    assert greeting["chinese_content"] == "师兄好呀~！今天想学什么？"
+    assert consumer.route_locally("Xin chào sư muội!", "Sư huynh", 2, []) is None
+
+    repeat = consumer.route_locally("再说一遍", "Sư huynh", 0, history)
+    assert (repeat["chinese_content"], repeat["vietnamese_display"]) == ("师兄好！", "Chào sư huynh!")
+    # Nothing to repeat yet
+    assert consumer.route_locally("再说一遍", "Sư huynh", 0, []) is None
+    assert consumer.route_locally("这个字怎么读？", "Sư huynh", 0, history) is None
+
+    # The greeting asked what to study: the answer is for Gemini
+    history.append({"role": "assistant", **{k: greeting[k] for k in ("vietnamese_display", "action")},
+                    "content": greeting["chinese_content"]})
+    assert consumer.route_locally("Cảm ơn nhiều nha", "Sư huynh", 0, history) is None
+
+
+@pytest.mark.asyncio
+async def test_restart_resets_stream_and_pipeline():
+    async def stream_response(**kwargs):
+        yield {"type": "delta", "field": "chinese_content", "delta": "Ni hao。"}
+        yield {"type": "restart", "reason": "language"}
+        yield {"type": "delta", "field": "chinese_content", "delta": "你好。"}
+        yield {"type": "final", "data": {"chinese_content": "你好。"}}
+
+    class Pipeline:
+        def __init__(self):
+            self.fed, self.resets = [], 0
+
+        def feed(self, text):
+            self.fed.append(text)
+
+        async def reset(self):
+            self.fed, self.resets = [], self.resets + 1
+
+    consumer, sent = make_consumer()
+    consumer.ai_agent.stream_response = stream_response
+    pipeline = Pipeline()
+
+    response = await consumer.stream_ai_response(tts_pipeline=pipeline)
+
+    assert response == {"chinese_content": "你好。"}
+    assert (pipeline.fed, pipeline.resets) == (["你好。"], 1)
+    assert [json.loads(frame)["status"] for frame in sent] == ["partial", "partial_reset", "partial"]
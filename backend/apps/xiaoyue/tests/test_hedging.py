@@ -0,0 +1,200 @@
+"""
+Unit tests for hedged, deadline-bounded Gemini requests.
+"""
+
+import asyncio
+import time
+import pytest
+from google.genai import errors
+from apps.xiaoyue.fakes import DEFAULT_FAKE_RESPONSE, FakeGeminiClient
+from apps.xiaoyue.services.ai_agent import ChineseTutorAgent
+from apps.xiaoyue.services.hedging import DeadlineExceeded, HedgeCopy, HedgePolicy, race, within
+from apps.xiaoyue.services.model_router import ModelRouter
+from apps.xiaoyue.services.static_lines import get_fallback_response
+
+
+class SlowClient(FakeGeminiClient):
+    """Fake client whose successive requests wait the given seconds each."""
+
+    def __init__(self, latencies, **kwargs):
+        super().__init__(**kwargs)
+        self.latencies = list(latencies)
+
+    @property
+    def latency(self):
+        return self.latencies.pop(0) if self.latencies else 0.0
+
+    @latency.setter
+    def latency(self, value):
+        pass
+
+
+class FailingHedgeClient(SlowClient):
+    """Slow client whose first reply to be ready (the hedge's) is a 503."""
+
+    def _response(self, model, contents, config):
+        self.responses = getattr(self, "responses", 0) + 1
+        if self.responses == 1:
+            raise errors.ServerError(503, {"error": {"code": 503, "message": "Overloaded", "status": "UNAVAILABLE"}})
+        return super()._response(model, contents, config)
+
+
+def make_agent(client, policy=None):
+    agent = ChineseTutorAgent(client=client)
+    agent.prompt_cache = None
+    agent.model_router = ModelRouter()
+    agent.hedge_policy = policy or HedgePolicy(enabled=False)
+    return agent
+
+
+def warmed_policy(model, stream, **kwargs):
+    policy = HedgePolicy(min_samples=1, min_delay=0.05, **kwargs)
+    copy = HedgeCopy(model)
+    copy.latency = 0.01
+    policy.settle([copy], 0, stream)
+    return policy
+
+
+@pytest.mark.asyncio
+async def test_race_hedges_and_cancels_the_loser():
+    cancelled = []
+
+    async def start(index):
+        try:
+            await asyncio.sleep([1.0, 0.01][index])
+        except asyncio.CancelledError:
+            cancelled.append(index)
+            raise
+        return index
+
+    outcome = await race(start, hedge_after=0.05)
+    await asyncio.sleep(0)
+    assert (outcome.value, outcome.winner, outcome.hedged) == (1, 1, True)
+    assert cancelled == [0]
+
+    # Not hedged before the delay, nor ever without one
+    assert (await race(lambda index: asyncio.sleep(0, "primary"), hedge_after=0.05)).hedged is False
+    assert (await race(start, hedge_after=None)).winner == 0
+
+
+@pytest.mark.asyncio
+async def test_race_waits_for_an_accepted_value():
+    async def start(index):
+        await asyncio.sleep([0.1, 0.15][index])
+        return ["bad", "good"][index]
+
+    outcome = await race(start, hedge_after=0.01, accept=lambda value: value == "good")
+    assert (outcome.value, outcome.winner) == ("good", 1)
+
+    # Nothing accepted: the primary's value, and errors only when nothing else came back
+    async def failing(index):
+        await asyncio.sleep([0.05, 0.1][index])
+        if index == 0:
+            raise RuntimeError("503")
+        return "bad"
+
+    outcome = await race(failing, hedge_after=0.01, accept=lambda value: False)
+    assert (outcome.value, outcome.winner) == ("bad", 1)
+    with pytest.raises(RuntimeError):
+        await race(failing, hedge_after=None)
+
+
+@pytest.mark.asyncio
+async def test_within_deadline():
+    assert await within(None, asyncio.sleep(0, "done")) == "done"
+    assert await within(time.monotonic() + 1, asyncio.sleep(0, "done")) == "done"
+    with pytest.raises(DeadlineExceeded):
+        await within(time.monotonic() + 0.02, asyncio.sleep(1))
+    with pytest.raises(DeadlineExceeded):
+        await within(time.monotonic() - 1, asyncio.sleep(0))
+
+
+def test_policy_delay_and_wasted_tokens():
+    policy = HedgePolicy(percentile=90, min_samples=10, min_delay=0.5)
+    for seconds in range(1, 10):
+        copy = HedgeCopy("m")
+        copy.latency = float(seconds)
+        policy.settle([copy], 0, stream=False)
+    assert policy.delay("m", stream=False) is None
+
+    copy = HedgeCopy("m")
+    copy.latency = 10.0
+    policy.settle([copy], 0, stream=False)
+    assert policy.delay("m", stream=False) == 10.0
+    assert policy.delay("m", stream=True) is None
+    assert HedgePolicy(enabled=False).delay("m", stream=False) is None
+
+    # A finished loser counts its usage; a cancelled one the winner's prompt and its streamed text
+    winner, finished, cancelled = HedgeCopy("m"), HedgeCopy("m", hedge=True), HedgeCopy("m", hedge=True)
+    winner.usage = finished.usage = type("Usage", (), {
+        "prompt_token_count": 100, "candidates_token_count": 20, "thoughts_token_count": 5
+    })()
+    cancelled.text = "你好你好"
+    policy.settle([winner, finished], 0, stream=False)
+    policy.settle([cancelled, winner], 1, stream=True)
+
+    stats = policy.stats()
+    assert (stats["hedged"], stats["hedge_wins"]) == (2, 1)
+    assert stats["hedge_rate"] == pytest.approx(2 / 12)
+    assert stats["wasted_tokens"] == {"prompt": 200, "output": 24, "thinking": 5}
+
+
+@pytest.mark.asyncio
+async def test_agent_hedges_slow_requests():
+    client = SlowClient([1.0, 0.0, 1.0, 0.0])
+    agent = make_agent(client, warmed_policy("gemini-2.5-flash", stream=False))
+
+    started = time.monotonic()
+    result = await agent.generate_response("Xin chào")
+    assert result["chinese_content"] == DEFAULT_FAKE_RESPONSE["chinese_content"]
+    assert time.monotonic() - started < 0.5
+    assert len(client.calls) == 2
+
+    agent.hedge_policy = warmed_policy("gemini-2.5-flash", stream=True)
+    events = [event async for event in agent.stream_response("Xin chào")]
+    assert events[-1]["data"]["chinese_content"] == DEFAULT_FAKE_RESPONSE["chinese_content"]
+    assert "".join(e["delta"] for e in events if e.get("field") == "chinese_content" and e["type"] == "delta") == \
+        DEFAULT_FAKE_RESPONSE["chinese_content"]
+    assert agent.hedge_policy.stats()["hedge_wins"] == 1
+
+
+@pytest.mark.asyncio
+async def test_failed_hedge_is_no_latency_sample():
+    agent = make_agent(FailingHedgeClient([0.3, 0.0]), warmed_policy("gemini-2.5-flash", stream=False))
+
+    result = await agent.generate_response("Xin chào")
+    assert result["chinese_content"] == DEFAULT_FAKE_RESPONSE["chinese_content"]
+
+    # The warm-up sample and the slow primary; not the hedge's instant 503
+    samples = sorted(agent.hedge_policy._latencies[("gemini-2.5-flash", False)])
+    assert len(samples) == 2 and samples[1] >= 0.3
+    stats = agent.hedge_policy.stats()
+    assert (stats["hedged"], stats["hedge_wins"], stats["wasted_tokens"]) == (1, 0, {})
+
+
+@pytest.mark.asyncio
+async def test_agent_flash_hedge_for_pro_turns():
+    client = SlowClient([1.0])
+    agent = make_agent(client, warmed_policy("gemini-2.5-pro", stream=False, hedge_tier="flash"))
+
+    await agent.generate_response("Ra đề kiểm tra cho em")
+    assert [model for _, model in client.calls] == ["gemini-2.5-pro", "gemini-2.5-flash"]
+    assert agent.hedge_policy.stats()["wasted_tokens"]["prompt"] > 0
+
+
+@pytest.mark.asyncio
+async def test_agent_deadline():
+    agent = make_agent(SlowClient([1.0, 1.0]))
+
+    result = await agent.generate_response("Xin chào", deadline=time.monotonic() + 0.05)
+    assert result == get_fallback_response(0)
+    events = [event async for event in agent.stream_response("Xin chào", deadline=time.monotonic() + 0.05)]
+    assert [event["type"] for event in events] == ["final"]
+
+    # Only the pro redo of a flash reply was late: the flash reply is kept
+    client = SlowClient([0.0, 1.0], response=lambda model, text: {
+        **DEFAULT_FAKE_RESPONSE, "chinese_content": "Ni hao" if "flash" in model else "你好"
+    })
+    agent = make_agent(client)
+    result = await agent.generate_response("Xin chào", deadline=time.monotonic() + 0.3)
+    assert result["chinese_content"] == "Ni hao"
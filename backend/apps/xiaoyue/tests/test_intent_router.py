@@ -0,0 +1,120 @@
+"""
+Unit tests for the local intent router.
+"""
+
+import pytest
+from apps.xiaoyue.services.intent_router import (
+    INTENT_GOODBYE,
+    INTENT_GREETING,
+    INTENT_QUIZ,
+    INTENT_REPEAT,
+    INTENT_THANKS,
+    INTENTS,
+    SOURCE_CLASSIFIER,
+    SOURCE_RULE,
+    IntentRouter,
+    awaits_answer,
+    fold_text,
+)
+from apps.xiaoyue.services.role_mapper import ROLE_RELATIONSHIPS
+from apps.xiaoyue.services.static_lines import ROUTED_REPLIES, get_routed_reply
+
+
+def test_fold_text():
+    assert fold_text("Cảm ơn sư muội!!") == "cam on su muoi"
+    assert fold_text("谢谢你，我明白了。") == "谢谢你我明白了"
+
+
+@pytest.mark.parametrize("message, intent", [
+    ("Xin chào sư muội!", INTENT_GREETING),
+    ("你好，小师妹！", INTENT_GREETING),
+    ("Cảm ơn nhiều nha", INTENT_THANKS),
+    ("Tạm biệt!", INTENT_GOODBYE),
+    ("再说一遍", INTENT_REPEAT),
+    ("请给我出一个小测验。", INTENT_QUIZ),
+])
+def test_rules(message, intent):
+    decision = IntentRouter().classify(message)
+
+    assert (decision.intent, decision.source) == (intent, SOURCE_RULE)
+
+
+@pytest.mark.parametrize("message", [
+    "这个字怎么读？",
+    "cảm ơn tiếng trung nói thế nào",
+    "你好是什么意思",
+    "hello, dạy anh đếm số",
+    "em ăn cơm chưa",
+])
+def test_real_questions_are_forwarded(message):
+    assert IntentRouter().classify(message) is None
+
+
+def test_classifier_catches_paraphrases():
+    decision = IntentRouter().classify("Cảm ơn em, anh hiểu rồi")
+
+    assert (decision.intent, decision.source) == (INTENT_THANKS, SOURCE_CLASSIFIER)
+    assert IntentRouter(threshold=1.01).classify("Cảm ơn em, anh hiểu rồi") is None
+
+
+def test_hanzi_sentences_need_a_rule():
+    # May be a sentence the learner is practising: only set phrases are routed
+    assert IntentRouter().classify("谢谢你，我明白了。") is None
+    assert IntentRouter().classify("谢谢小师妹！").intent == INTENT_THANKS
+
+
+def test_greetings_match_the_text_as_typed():
+    assert IntentRouter().classify("Chào em nhé").intent == INTENT_GREETING
+    # "Cháo" is rice porridge, though both fold to "chao"
+    assert IntentRouter().classify("Cháo em") is None
+    assert IntentRouter().classify("Cháo") is None
+
+
+def test_answers_to_the_tutor_are_forwarded():
+    question = {"role": "assistant", "content": "你叫什么名字？", "vietnamese_display": "Huynh tên gì?"}
+    quiz = {"role": "assistant", "content": "考考你。", "action": "quiz"}
+    correction = {"role": "assistant", "content": "应该说“谢谢”。", "action": "correction"}
+    statement = {"role": "assistant", "content": "好的。", "vietnamese_display": "Được.", "action": "none"}
+
+    assert [awaits_answer(reply) for reply in (question, quiz, correction, statement, None)] == \
+        [True, True, True, False, False]
+
+    router = IntentRouter()
+    assert router.route("Cảm ơn nhiều nha", "u1", previous=question) is None
+    assert router.route("再说一遍", "u1", previous=quiz) is None
+    assert router.route("Cảm ơn nhiều nha", "u1", previous=statement).intent == INTENT_THANKS
+    assert router.stats()["routed"] == 1
+
+
+def test_rate_zero_disables_and_stats():
+    router = IntentRouter(rate=0)
+    assert router.route("你好", "u1") is None
+    assert router.stats()["checked"] == 0
+
+    router = IntentRouter(rate=0.5)
+    users = [f"user-{i}" for i in range(200)]
+    in_experiment = [user for user in users if router.in_experiment(user)]
+    assert 60 < len(in_experiment) < 140
+    assert all(router.in_experiment(user) for user in in_experiment)
+
+    router = IntentRouter()
+    router.route("你好", "u1")
+    router.route("再说一遍", "u1", allowed=(INTENT_GREETING,))
+    router.route("这个字怎么读？", "u1")
+    stats = router.stats()
+    assert (stats["checked"], stats["routed"], stats["by_intent"]) == (3, 1, {INTENT_GREETING: 1})
+    assert stats["hit_rate"] == pytest.approx(1 / 3)
+
+
+def test_templates_cover_every_role():
+    assert set(ROUTED_REPLIES) == set(ROLE_RELATIONSHIPS)
+    for role in ROLE_RELATIONSHIPS:
+        for intent in INTENTS:
+            if intent == INTENT_REPEAT:
+                continue
+            reply = get_routed_reply(role, intent)
+            assert reply["chinese_content"] and reply["vietnamese_display"]
+
+    quiz = get_routed_reply("Tỷ tỷ", INTENT_QUIZ, rotation=1)
+    assert quiz["action"] == "quiz" and len(quiz["quiz_list"]) == 3
+    assert get_routed_reply("Tỷ tỷ", INTENT_QUIZ, rotation=2)["quiz_list"] != quiz["quiz_list"]
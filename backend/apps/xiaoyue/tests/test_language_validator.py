@@ -0,0 +1,105 @@
+"""
+Unit tests for the chinese_content language validator.
+"""
+
+import pytest
+from prometheus_client import REGISTRY
+from apps.xiaoyue.fakes import FakeGeminiClient
+from apps.xiaoyue.services.ai_agent import ChineseTutorAgent
+from apps.xiaoyue.services.language_validator import (
+    POLICY_LOG,
+    POLICY_REGENERATE,
+    POLICY_STRIP,
+    LanguageValidator,
+    classify,
+    strip_foreign,
+)
+
+OUTCOMES = ("clean", "logged", "regenerated", "stripped", "emptied")
+
+
+def counts(policy, before=None):
+    """xiaoyue_language_checks_total by outcome, or the non-zero change since ``before``."""
+    now = {
+        outcome: REGISTRY.get_sample_value(
+            "xiaoyue_language_checks_total", {"policy": policy, "outcome": outcome}
+        ) or 0
+        for outcome in OUTCOMES
+    }
+    if before is None:
+        return now
+    return {outcome: now[outcome] - before[outcome] for outcome in OUTCOMES if now[outcome] != before[outcome]}
+
+
+def test_classify_scripts():
+    assert classify("师兄好~！我们开始吧。").is_clean
+    assert classify("你好（nǐ hǎo）").pinyin == 5
+    assert classify("Chào sư huynh").vietnamese == 2
+    assert classify("我喜欢 Python").latin == 6
+    assert not classify("").is_clean
+
+
+def test_strip_foreign():
+    assert strip_foreign("你好（nǐ hǎo）！") == "你好！"
+    assert strip_foreign("我喜欢 Python 编程。") == "我喜欢编程。"
+    assert strip_foreign("Chào sư huynh! 我们学习吧") == "我们学习吧"
+    assert strip_foreign("我有3本书。") == "我有3本书。"
+
+
+@pytest.mark.asyncio
+async def test_strip_policy():
+    before = counts(POLICY_STRIP)
+    validator = LanguageValidator(POLICY_STRIP)
+
+    response = await validator.enforce({"chinese_content": "师兄好！(Shīxiōng hǎo)"})
+    assert response["chinese_content"] == "师兄好！"
+
+    response = await validator.enforce({"chinese_content": "Xin chào sư huynh"})
+    assert response["chinese_content"] == ""
+
+    await validator.enforce({"chinese_content": "好的。"})
+    assert counts(POLICY_STRIP, before) == {"clean": 1, "stripped": 1, "emptied": 1}
+
+
+@pytest.mark.asyncio
+async def test_log_policy_leaves_text():
+    before = counts(POLICY_LOG)
+    validator = LanguageValidator(POLICY_LOG)
+    response = await validator.enforce({"chinese_content": "你好 hello"})
+    assert response["chinese_content"] == "你好 hello"
+    assert counts(POLICY_LOG, before) == {"logged": 1}
+
+
+@pytest.mark.asyncio
+async def test_regenerate_policy():
+    before = counts(POLICY_REGENERATE)
+    validator = LanguageValidator(POLICY_REGENERATE)
+
+    async def regenerate(response):
+        return {"chinese_content": "你好，师兄。", "pinyin": "Nǐ hǎo, shīxiōng."}
+
+    response = await validator.enforce({"chinese_content": "Hello 师兄", "pinyin": "x"}, regenerate)
+    assert response == {"chinese_content": "你好，师兄。", "pinyin": "Nǐ hǎo, shīxiōng."}
+
+    async def still_wrong(response):
+        return {"chinese_content": "Hello", "pinyin": ""}
+
+    response = await validator.enforce({"chinese_content": "Hello 师兄"}, still_wrong)
+    assert response["chinese_content"] == "师兄"
+    # The failed regeneration was stripped instead
+    assert counts(POLICY_REGENERATE, before) == {"regenerated": 1, "stripped": 1}
+
+
+@pytest.mark.asyncio
+async def test_agent_regenerates_with_fix_model():
+    client = FakeGeminiClient(response={"chinese_content": "你好。", "pinyin": "Nǐ hǎo."})
+    agent = ChineseTutorAgent(client=client)
+
+    fixed = await agent.regenerate_chinese_content({"chinese_content": "Hello", "vietnamese_display": "Xin chào"})
+
+    assert fixed == {"chinese_content": "你好。", "pinyin": "Nǐ hǎo."}
+
+
+def test_unknown_policy_rejected():
+    with pytest.raises(ValueError):
+        LanguageValidator("translate")
@@ -0,0 +1,103 @@
+"""
+Unit tests for the load-test stand-ins and report helpers.
+"""
+
+import json
+import pytest
+from django.test import override_settings
+from apps.xiaoyue.fakes import FakeEdgeTTS, FakeGeminiClient, install_fake_upstreams
+from apps.xiaoyue.management.commands.load_test import LoadStats, percentile, run_turn
+from apps.xiaoyue.services.audio_frames import encode_audio_frame
+from apps.xiaoyue.services import tts_handler
+from apps.xiaoyue.services.agent_registry import (
+    close_tutor_agents,
+    get_tutor_agent,
+    set_gemini_client_factory,
+)
+
+
+def test_percentile_nearest_rank():
+    values = [float(v) for v in range(1, 101)]
+    assert percentile(values, 50) == 50
+    assert percentile(values, 95) == 95
+    assert percentile(values, 99) == 99
+    assert percentile([0.3], 99) == 0.3
+    assert percentile([], 50) is None
+
+
+@pytest.mark.asyncio
+async def test_tts_backend_replaces_edge_tts():
+    fake = FakeEdgeTTS(audio_bytes=64)
+    tts_handler.set_tts_backend(fake)
+    try:
+        with override_settings(XIAOYUE_TTS_CACHE_ENABLED=False):
+            audio = await tts_handler.synthesize_speech("你好")
+    finally:
+        tts_handler.set_tts_backend(None)
+
+    assert len(audio) == 64
+    assert fake.calls == 1
+
+
+@pytest.mark.asyncio
+async def test_fake_failures_are_counted():
+    tts = FakeEdgeTTS(error_rate=1.0)
+    with pytest.raises(RuntimeError):
+        await tts("你好", "zh-CN-XiaoxiaoNeural", "+0%", "+0%")
+    assert tts.failures == 1
+
+    gemini = FakeGeminiClient(error_rate=1.0)
+    with pytest.raises(Exception):
+        await gemini.aio.models.generate_content(model="m", contents="你好")
+    assert gemini.failures == 1
+
+
+@pytest.mark.asyncio
+async def test_agent_registry_uses_client_factory():
+    fake = FakeGeminiClient()
+    set_gemini_client_factory(lambda: fake)
+    try:
+        assert get_tutor_agent().client is fake
+    finally:
+        await close_tutor_agents()
+        set_gemini_client_factory(None)
+
+
+@pytest.mark.asyncio
+async def test_run_turn_waits_for_audio():
+    frames = [
+        {"type": "websocket.send", "text": json.dumps({"status": "typing"})},
+        {"type": "websocket.send", "text": json.dumps({"status": "audio_chunk", "data": {"audio_id": "a1"}})},
+        {"type": "websocket.send", "text": json.dumps({"status": "success", "data": {"chinese_content": "好", "audio_chunks": 2}})},
+        {"type": "websocket.send", "bytes": encode_audio_frame({"audio_id": "a1"}, b"mp3")},
+        {"type": "websocket.send", "text": json.dumps({"status": "audio_chunk", "data": {"audio_id": "a2"}})},
+        {"type": "websocket.send", "bytes": encode_audio_frame({"audio_id": "a2"}, b"mp3")},
+    ]
+    sent = []
+
+    async def send(text):
+        sent.append(json.loads(text))
+
+    async def receive(timeout):
+        return frames.pop(0)
+
+    stats = LoadStats()
+    await run_turn(send, receive, "你好", 5.0, stats)
+
+    assert sent == [{"action": "chat", "message": "你好"}]
+    assert not frames
+    assert stats.completed == 1
+    assert len(stats.first_audio) == 1
+
+
+@pytest.mark.asyncio
+async def test_install_fake_upstreams():
+    with override_settings(XIAOYUE_FAKE_UPSTREAMS=True, XIAOYUE_FAKE_GEMINI_LATENCY=0.0, XIAOYUE_FAKE_TTS_TIME=0.0):
+        await install_fake_upstreams()
+    try:
+        assert isinstance(get_tutor_agent().client, FakeGeminiClient)
+        assert isinstance(tts_handler._tts_backend, FakeEdgeTTS)
+    finally:
+        await close_tutor_agents()
+        set_gemini_client_factory(None)
+        tts_handler.set_tts_backend(None)
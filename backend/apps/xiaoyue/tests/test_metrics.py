@@ -0,0 +1,64 @@
+"""
+Unit tests for the Prometheus metrics.
+"""
+
+import asyncio
+import pytest
+from channels.testing import HttpCommunicator
+from prometheus_client import REGISTRY
+from apps.xiaoyue.services.metrics import MetricsSpanExporter
+from apps.xiaoyue.services.tracing import Tracer
+from apps.xiaoyue.services.turn_scheduler import TurnScheduler
+
+
+def sample(name, **labels):
+    return REGISTRY.get_sample_value(name, labels) or 0
+
+
+def test_spans_feed_histograms():
+    tracer = Tracer([MetricsSpanExporter()])
+    turns = sample("xiaoyue_turn_seconds_count", action="chat", status="ok")
+    gemini = sample("xiaoyue_gemini_request_seconds_count", model="m", stream="true", status="error")
+    tts_bytes = sample("xiaoyue_tts_audio_bytes_sum")
+    redis = sample("xiaoyue_redis_command_seconds_count", operation="load_context")
+
+    with tracer.span("ws.chat"):
+        with tracer.span("redis.load_context"):
+            pass
+        request = tracer.start_span("gemini.request", model="m", stream=True)
+        request.record_error(RuntimeError("503"))
+        request.end()
+        with tracer.span("tts.synthesize", cache="miss", bytes=2048):
+            pass
+
+    assert sample("xiaoyue_turn_seconds_count", action="chat", status="ok") == turns + 1
+    assert sample("xiaoyue_gemini_request_seconds_count", model="m", stream="true", status="error") == gemini + 1
+    assert sample("xiaoyue_tts_audio_bytes_sum") == tts_bytes + 2048
+    assert sample("xiaoyue_redis_command_seconds_count", operation="load_context") == redis + 1
+
+
+@pytest.mark.asyncio
+async def test_queued_turns_gauge():
+    scheduler = TurnScheduler(max_pending=2)
+    release = asyncio.Event()
+    queued = sample("xiaoyue_queued_turns")
+
+    assert scheduler.submit(release.wait)
+    assert scheduler.submit(release.wait)
+    await asyncio.sleep(0)
+    assert sample("xiaoyue_queued_turns") == queued + 1
+
+    await scheduler.cancel()
+    assert sample("xiaoyue_queued_turns") == queued
+
+
+@pytest.mark.asyncio
+async def test_metrics_endpoint():
+    from config.asgi import application
+
+    communicator = HttpCommunicator(application, "GET", "/metrics")
+    response = await communicator.get_response()
+
+    assert response["status"] == 200
+    assert b"xiaoyue_turn_seconds" in response["body"]
+    assert b"xiaoyue_websocket_connections" in response["body"]
@@ -0,0 +1,79 @@
+"""
+Unit tests for flash/pro model tiering.
+"""
+
+import pytest
+from apps.xiaoyue.fakes import DEFAULT_FAKE_RESPONSE, FakeGeminiClient
+from apps.xiaoyue.services.ai_agent import ChineseTutorAgent
+from apps.xiaoyue.services.model_router import (
+    PROBLEM_ERROR,
+    PROBLEM_LANGUAGE,
+    PROBLEM_SCHEMA,
+    TIER_FLASH,
+    TIER_PRO,
+    ModelRouter,
+)
+
+
+@pytest.mark.parametrize("message, tier, budget, reason", [
+    ("em ăn cơm chưa", TIER_FLASH, 0, "chat"),
+    ("我今天很高兴", TIER_FLASH, 512, "chinese"),
+    ("Cho anh làm bài kiểm tra đi", TIER_PRO, 2048, "quiz_or_correction"),
+    ("我说的对不对？", TIER_PRO, 2048, "quiz_or_correction"),
+    ("sửa lỗi câu này giúp anh: 我是去学校昨天", TIER_PRO, 2048, "quiz_or_correction"),
+    ("a" * 151, TIER_PRO, 2048, "long_message"),
+])
+def test_choose(message, tier, budget, reason):
+    decision = ModelRouter().choose(message)
+
+    assert (decision.tier, decision.thinking_budget, decision.reason) == (tier, budget, reason)
+    assert decision.model == ("gemini-2.5-flash" if tier == TIER_FLASH else "gemini-2.5-pro")
+
+
+def test_disabled_router_keeps_pro_defaults():
+    decision = ModelRouter(enabled=False).choose("em ăn cơm chưa")
+
+    assert (decision.model, decision.thinking_budget) == ("gemini-2.5-pro", None)
+
+
+def test_escalation_and_failure_rate():
+    router = ModelRouter(failure_window=10, failure_threshold=0.3, escalate_on=(PROBLEM_SCHEMA, PROBLEM_ERROR))
+    flash = router.choose("hello")
+
+    assert router.record(flash, None) is None
+    assert router.record(flash, PROBLEM_LANGUAGE) is None  # Not configured to escalate
+    escalated = router.record(flash, PROBLEM_SCHEMA)
+    assert (escalated.tier, escalated.reason) == (TIER_PRO, "escalated_schema")
+    assert router.record(escalated, PROBLEM_SCHEMA) is None  # Pro is the last resort
+
+    # 2 of 3 flash replies had problems: everything goes to pro for now
+    assert router.choose("hello").reason == "flash_failing"
+    for _ in range(7):
+        router.record(flash, None)
+    assert router.flash_failure_rate == pytest.approx(0.2)
+    assert router.choose("hello").tier == TIER_FLASH
+    assert router.stats()["escalations"] == {PROBLEM_SCHEMA: 1}
+
+
+@pytest.mark.asyncio
+async def test_agent_escalates_flash_reply():
+    def respond(model, text):
+        if model == "gemini-2.5-flash":
+            return {**DEFAULT_FAKE_RESPONSE, "chinese_content": "Ni hao 师兄"}
+        return DEFAULT_FAKE_RESPONSE
+
+    client = FakeGeminiClient(response=respond)
+    agent = ChineseTutorAgent(client=client)
+    agent.prompt_cache = None
+    agent.response_cache = None
+    agent.model_router = ModelRouter()
+
+    events = [event async for event in agent.stream_response("em ăn cơm chưa")]
+
+    assert [call[1] for call in client.calls] == ["gemini-2.5-flash", "gemini-2.5-pro"]
+    restart = events.index({"type": "restart", "reason": PROBLEM_LANGUAGE})
+    assert any(event["type"] == "delta" for event in events[:restart])
+    assert events[-1]["data"]["chinese_content"] == DEFAULT_FAKE_RESPONSE["chinese_content"]
+
+    _, config = await agent._build_request("你好", "师兄", "小师妹", 0, None, decision=agent.model_router.choose("hi"))
+    assert config.thinking_config.thinking_budget == 0
@@ -0,0 +1,132 @@
+"""
+Unit tests for Gemini context caching of the system prompt.
+"""
+
+import time
+import pytest
+from apps.xiaoyue.fakes import FakeGeminiClient
+from apps.xiaoyue.services.ai_agent import ChineseTutorAgent
+from apps.xiaoyue.services.model_router import ModelRouter
+from apps.xiaoyue.services.prompt_cache import PromptCacheManager
+
+
+class FakeRedis:
+    def __init__(self):
+        self.data = {}
+
+    async def get(self, key):
+        return self.data.get(key)
+
+    async def set(self, key, value, ex=None):
+        self.data[key] = value
+
+
+class FakeRedisClient:
+    def __init__(self):
+        self.redis = FakeRedis()
+
+    async def get_client(self):
+        return self.redis
+
+
+class FailingCaches:
+    async def create(self, **kwargs):
+        raise RuntimeError("prompt too small to cache")
+
+
+def make_agent(client):
+    agent = ChineseTutorAgent(client=client)
+    agent.prompt_cache = PromptCacheManager(client, ttl=3600)
+    # Every turn on one model, so prompts are cached once per role x sulking
+    agent.model_router = ModelRouter(enabled=False)
+    return agent
+
+
+@pytest.mark.asyncio
+async def test_handle_is_reused_across_turns():
+    """One cache per role x sulking combination; later turns reference it."""
+    client = FakeGeminiClient()
+    agent = make_agent(client)
+
+    for _ in range(3):
+        await agent.generate_response("你好", user_role="师兄", sulking_level=0)
+    await agent.generate_response("你好", user_role="师兄", sulking_level=2)
+
+    creates = [call for call in client.calls if call[0] == "caches.create"]
+    assert len(creates) == 2
+    assert agent.prompt_cache.stats()["hits"] == 2
+    assert all(usage.cached_content_token_count for usage in client.usage)
+
+
+@pytest.mark.asyncio
+async def test_request_omits_inline_system_prompt_when_cached():
+    client = FakeGeminiClient()
+    agent = make_agent(client)
+
+    _, config = await agent._build_request("你好", "师兄", "小师妹", 0, None)
+
+    assert config.cached_content.startswith("cachedContents/")
+    assert config.system_instruction is None
+
+
+@pytest.mark.asyncio
+async def test_falls_back_inline_when_create_fails():
+    client = FakeGeminiClient()
+    client.aio.caches = FailingCaches()
+    agent = make_agent(client)
+
+    _, config = await agent._build_request("你好", "师兄", "小师妹", 0, None)
+    response = await agent.generate_response("你好")
+
+    assert config.cached_content is None
+    assert "师兄" in config.system_instruction
+    assert response["thought"] == "Fake Gemini reply"
+    assert agent.prompt_cache.stats()["failures"] == 1
+
+
+@pytest.mark.asyncio
+async def test_refreshes_before_expiry_and_recreates_after_rejection():
+    client = FakeGeminiClient()
+    cache = PromptCacheManager(client, ttl=3600, refresh_margin=300)
+
+    name = await cache.get_handle("model", "prompt")
+    cache._entries[cache.make_key("model", "prompt")].expires_at = time.time() + 60
+
+    assert await cache.get_handle("model", "prompt") == name
+    assert cache.stats()["refreshes"] == 1
+
+    await client.aio.caches.delete(name=name)
+    cache.invalidate(name)
+
+    assert await cache.get_handle("model", "prompt") != name
+    assert cache.stats()["creates"] == 2
+
+
+@pytest.mark.asyncio
+async def test_rejected_handle_shared_in_redis_is_not_reused():
+    """A handle another worker advertises is skipped once the API rejects it."""
+    redis_client = FakeRedisClient()
+    worker_a = PromptCacheManager(FakeGeminiClient(), redis_client=redis_client)
+    name = await worker_a.get_handle("model", "prompt")
+
+    client_b = FakeGeminiClient()  # does not know worker A's cache
+    agent = make_agent(client_b)
+    agent.model_name = "model"
+    agent.prompt_cache = PromptCacheManager(client_b, redis_client=redis_client)
+
+    assert await agent.prompt_cache.get_handle("model", "prompt") == name
+    agent.prompt_cache.invalidate(name)
+
+    fresh = await agent.prompt_cache.get_handle("model", "prompt")
+    assert fresh != name
+    assert fresh in redis_client.redis.data["gemini:prompt_cache:" + PromptCacheManager.make_key("model", "prompt")]
+
+
+def test_rejected_handles_are_forgotten_after_a_ttl():
+    """Rejected handle names are remembered for one TTL, not forever."""
+    cache = PromptCacheManager(FakeGeminiClient(), ttl=60)
+    cache.invalidate("cachedContents/old")
+    cache._rejected["cachedContents/old"] = time.time() - 1
+
+    cache.invalidate("cachedContents/new")
+    assert list(cache._rejected) == ["cachedContents/new"]
@@ -0,0 +1,74 @@
+"""
+Unit tests for local quiz grading.
+"""
+
+import pytest
+from apps.xiaoyue.services import quiz_grader
+from apps.xiaoyue.services.quiz_grader import (
+    MATCH_EXACT,
+    MATCH_PINYIN,
+    MATCH_TYPO,
+    MATCH_VARIANT,
+    edit_distance,
+    grade_quiz,
+    match_answer,
+    strip_tones,
+)
+
+
+@pytest.mark.parametrize("given, expected, match", [
+    ("谢谢！", "谢谢", MATCH_EXACT),
+    (" Ｎǐ hǎo ", "nǐ hǎo", MATCH_EXACT),
+    ("謝謝", "谢谢", MATCH_VARIANT),
+    ("xie4xie", "xièxie", MATCH_PINYIN),
+    ("nv3 er2", "nǚ'ér", MATCH_PINYIN),
+    ("xiexi", "xièxie", MATCH_TYPO),
+    ("ni", "nǐ hǎo", None),
+    ("她", "他", None),
+    ("我爱学汉文", "我爱学中文", None),
+    ("", "谢谢", None),
+])
+def test_match_answer(given, expected, match):
+    assert match_answer(given, expected) == match
+
+
+def test_pinyin_against_characters(monkeypatch):
+    # Stands in for pypinyin, which may not be installed
+    monkeypatch.setattr(quiz_grader, "hanzi_to_pinyin", {"谢谢": "xiexie"}.get)
+
+    assert match_answer("xie4 xie", "谢谢") == MATCH_PINYIN
+    # Characters don't answer a "write the pinyin" item
+    assert match_answer("谢谢", "xièxie") is None
+    assert match_answer("谢谢", "xiexi") is None
+
+
+def test_multiple_choice_labels():
+    options = ["A. 再见", "B. 你好", "C. 谢谢"]
+
+    assert match_answer("b", "你好", options) == MATCH_EXACT
+    assert match_answer("你好", "B", options) == MATCH_EXACT
+    # Close spelling never rescues the wrong option
+    assert match_answer("A", "B", options) is None
+
+
+def test_pinyin_helpers():
+    assert strip_tones("Lǜ sè") == strip_tones("lu:4se4") == "lvse"
+    assert edit_distance("kitten", "sitting", 3) == 3
+    assert edit_distance("kitten", "sitting", 1) == 2
+
+
+def test_grade_quiz():
+    quiz = [
+        {"id": 1, "type": "fill_blank", "question": "谢___", "answer": "谢"},
+        {"id": 2, "type": "multiple_choice", "question": "Hello?", "options": ["A. 再见", "B. 你好"], "answer": "B"},
+        {"id": 3, "type": "fill_blank", "question": "___好", "answer": "你"},
+    ]
+
+    grade = grade_quiz(quiz, [{"id": "1", "answer": "謝"}, {"id": 2, "answer": "A"}, {"id": 9, "answer": "x"}])
+
+    assert [(r["id"], r["correct"], r["match"]) for r in grade["results"]] == [
+        (1, True, MATCH_VARIANT), (2, False, None), (3, False, None)
+    ]
+    assert grade["results"][2]["answer"] is None
+    assert (grade["score"], grade["total"], grade["percent"]) == (1, 3, 33)
+    assert grade_quiz(quiz, {1: "谢", "2": "b", "3": "你"})["score"] == 3
@@ -1,17 +1,30 @@
 """
 Unit tests for Redis client.
+They run against an in-process fakeredis server, not a live Redis.
 """
 
+import asyncio
+import fakeredis
 import pytest
-from apps.xiaoyue.services.redis_client import RedisClient
+from apps.xiaoyue.services import redis_client as redis_module
+from apps.xiaoyue.services.redis_client import MeteredConnectionPool, RedisClient
 
 
 @pytest.fixture
-async def redis_client():
-    """Create Redis client for testing."""
+async def redis_client(monkeypatch):
+    """Create Redis client for testing, its pool backed by fakeredis."""
     client = RedisClient()
+    pool = MeteredConnectionPool(
+        connection_class=fakeredis.aioredis.FakeAsyncRedisConnection,
+        server=fakeredis.FakeServer(),
+        encoding="utf-8",
+        decode_responses=True
+    )
+    loop_pools = redis_module._pools.setdefault(asyncio.get_running_loop(), {})
+    monkeypatch.setitem(loop_pools, client.redis_url, pool)
     yield client
     await client.close()
+    await pool.disconnect()
 
 
 @pytest.mark.asyncio
@@ -74,8 +87,8 @@ async def test_user_state(redis_client):
     
     # Get default state
     state = await redis_client.get_user_state(user_id)
-    assert state["user_role"] == "师兄"
-    assert state["agent_role"] == "小师妹"
+    assert state["user_role"] == "Sư huynh"
+    assert state["agent_role"] == "Muội muội"
     
     # Update state
     new_state = {
@@ -114,3 +127,82 @@ async def test_history_limit(redis_client):
     # Cleanup
     await redis_client.clear_conversation_history(user_id)
 
+
+
+@pytest.mark.asyncio
+async def test_turn_context_and_commit(redis_client):
+    """Test batched turn load/commit operations."""
+    user_id = "test_user_turn"
+    
+    await redis_client.clear_conversation_history(user_id)
+    await redis_client.set_sulking_level(user_id, 1)
+    
+    # Commit a turn together with updated state
+    state = {
+        "user_role": "Tỷ tỷ",
+        "agent_role": "Muội muội",
+        "sulking_level": 1,
+        "preferred_voice": "zh-CN-XiaoxiaoNeural"
+    }
+    ok = await redis_client.commit_turn(
+        user_id,
+        user_message={"role": "user", "content": "你好"},
+        assistant_message={"role": "assistant", "content": "姐姐好~"},
+        state=state
+    )
+    assert ok
+    
+    # Load everything back in one call
+    context = await redis_client.load_turn_context(user_id)
+    assert context["sulking_level"] == 1
+    assert context["state"]["user_role"] == "Tỷ tỷ"
+    assert [m["content"] for m in context["history"]] == ["你好", "姐姐好~"]
+    
+    # Cleanup
+    await redis_client.clear_conversation_history(user_id)
+
+
+@pytest.mark.asyncio
+async def test_turn_lock(redis_client):
+    """Only one turn per user holds the lock at a time."""
+    user_id = "test_user_lock"
+    
+    lock = await redis_client.acquire_turn_lock(user_id, timeout=5)
+    assert lock is not None
+    
+    # A second socket for the same user is refused while the turn runs
+    assert await redis_client.acquire_turn_lock(user_id, timeout=5) is None
+    
+    await redis_client.release_turn_lock(lock)
+    
+    lock = await redis_client.acquire_turn_lock(user_id, timeout=5)
+    assert lock is not None
+    await redis_client.release_turn_lock(lock)
+
+
+@pytest.mark.asyncio
+async def test_fold_into_summary(redis_client):
+    """Folding replaces the history head with the summary, unless it changed."""
+    user_id = "test_user_summary"
+    await redis_client.clear_conversation_history(user_id)
+    
+    for i in range(3):
+        await redis_client.commit_turn(
+            user_id,
+            user_message={"role": "user", "content": f"问题{i}"},
+            assistant_message={"role": "assistant", "content": f"回答{i}"}
+        )
+    
+    folded = await redis_client.get_history_head(user_id, 4)
+    assert await redis_client.fold_into_summary(user_id, folded, {"text": "summary"})
+    
+    context = await redis_client.load_turn_context(user_id)
+    assert [m["content"] for m in context["history"]] == ["问题2", "回答2"]
+    assert context["summary"]["text"] == "summary"
+    
+    # A stale head (already folded) is not folded twice
+    assert not await redis_client.fold_into_summary(user_id, folded, {"text": "again"})
+    assert (await redis_client.get_conversation_summary(user_id))["text"] == "summary"
+    
+    await redis_client.clear_conversation_history(user_id)
+    assert await redis_client.get_conversation_summary(user_id) is None
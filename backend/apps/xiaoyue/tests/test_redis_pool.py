@@ -0,0 +1,129 @@
+"""
+Unit tests for the shared Redis connection pool.
+These don't need a running Redis: pools connect lazily.
+"""
+
+import asyncio
+import fakeredis
+import pytest
+from django.conf import settings
+from prometheus_client import REGISTRY
+from redis import exceptions as redis_exceptions
+from apps.xiaoyue.services import redis_client as redis_module
+from apps.xiaoyue.services.redis_client import (
+    RedisClient,
+    close_connection_pools,
+    get_connection_pool,
+    get_pool_stats,
+)
+
+
+@pytest.mark.asyncio
+async def test_clients_share_one_pool():
+    """Every RedisClient in the process borrows from the same pool."""
+    first = await RedisClient().get_client()
+    second = await RedisClient().get_client()
+
+    assert first.connection_pool is second.connection_pool
+    assert first.connection_pool.max_connections > 0
+
+    await close_connection_pools()
+
+
+def test_pool_per_event_loop():
+    """Each event loop gets its own pool (connections are loop-bound)."""
+    async def grab():
+        return get_connection_pool("redis://localhost:6379/0")
+
+    pool_a = asyncio.run(grab())
+    pool_b = asyncio.run(grab())
+
+    assert pool_a is not pool_b
+
+
+@pytest.mark.asyncio
+async def test_pool_stats():
+    """Utilization metrics are reported for live pools."""
+    get_connection_pool("redis://localhost:6379/9")
+
+    stats = [s for s in get_pool_stats() if s["url"] == "redis://localhost:6379/9"]
+
+    assert len(stats) == 1
+    assert stats[0]["in_use"] == 0
+    assert stats[0]["utilization"] == 0.0
+    assert set(stats[0]) >= {"max_connections", "idle", "waiting", "acquired_total"}
+
+    await close_connection_pools()
+    assert asyncio.get_running_loop() not in redis_module._pools
+
+
+def test_roles_use_separate_databases():
+    """Chat state, caches and the channel layer live in different databases."""
+    urls = {role: RedisClient(role).redis_url for role in ("state", "cache")}
+
+    assert urls["state"] == RedisClient().redis_url == settings.REDIS_URLS["state"]
+    assert urls["state"] != urls["cache"]
+    assert settings.CHANNEL_LAYERS["default"]["CONFIG"]["hosts"] == [settings.REDIS_URLS["channels"]]
+    assert settings.CELERY_BROKER_URL == settings.REDIS_URLS["celery"]
+    assert len(set(settings.REDIS_URLS.values())) == len(settings.REDIS_URLS)
+
+
+@pytest.mark.asyncio
+async def test_pool_metrics_exported():
+    """In-use connections, waiters and acquire time reach Prometheus."""
+    pool = redis_module.MeteredConnectionPool(
+        connection_class=fakeredis.aioredis.FakeAsyncRedisConnection,
+        server=fakeredis.FakeServer(),
+        db=7,
+        max_connections=1,
+        timeout=1
+    )
+
+    def sample(name):
+        return REGISTRY.get_sample_value(name, {"database": "7"}) or 0
+
+    acquired = sample("xiaoyue_redis_pool_acquire_seconds_count")
+    connection = await pool.get_connection()
+    assert sample("xiaoyue_redis_pool_connections_in_use") == 1
+
+    waiter = asyncio.ensure_future(pool.get_connection())
+    await asyncio.sleep(0.01)
+    assert sample("xiaoyue_redis_pool_waiting") == 1
+
+    await pool.release(connection)
+    await pool.release(await waiter)
+    assert sample("xiaoyue_redis_pool_connections_in_use") == 0
+    assert sample("xiaoyue_redis_pool_waiting") == 0
+    assert sample("xiaoyue_redis_pool_acquire_seconds_count") == acquired + 2
+    await pool.disconnect()
+
+
+@pytest.mark.asyncio
+async def test_pool_timeout_is_a_failure_not_an_acquisition():
+    """A caller that times out waiting is counted apart from acquisitions."""
+    pool = redis_module.MeteredConnectionPool(
+        connection_class=fakeredis.aioredis.FakeAsyncRedisConnection,
+        server=fakeredis.FakeServer(),
+        db=8,
+        max_connections=1,
+        timeout=0.05
+    )
+
+    def sample(name, **labels):
+        return REGISTRY.get_sample_value(name, {"database": "8", **labels}) or 0
+
+    acquired = sample("xiaoyue_redis_pool_acquire_seconds_count")
+    timeouts = sample("xiaoyue_redis_pool_acquire_failures_total", reason="timeout")
+    connection = await pool.get_connection()
+
+    with pytest.raises(redis_exceptions.ConnectionError):
+        await pool.get_connection()
+
+    assert sample("xiaoyue_redis_pool_acquire_seconds_count") == acquired + 1
+    assert sample("xiaoyue_redis_pool_acquire_failures_total", reason="timeout") == timeouts + 1
+    assert sample("xiaoyue_redis_pool_connections_in_use") == 1
+    assert sample("xiaoyue_redis_pool_waiting") == 0
+    assert (pool.stats()["acquired_total"], pool.stats()["acquire_failures"]) == (1, 1)
+
+    await pool.release(connection)
+    await pool.disconnect()
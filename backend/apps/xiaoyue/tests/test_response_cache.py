@@ -0,0 +1,164 @@
+"""
+Unit tests for the reply cache.
+"""
+
+import pytest
+from apps.xiaoyue.fakes import DEFAULT_FAKE_RESPONSE, FakeGeminiClient
+from apps.xiaoyue.services.ai_agent import ChineseTutorAgent
+from apps.xiaoyue.services.model_router import ModelRouter
+from apps.xiaoyue.services.response_cache import ResponseCache, normalize_request_text
+
+
+class FakePipeline:
+    def __init__(self, redis):
+        self.redis = redis
+        self.commands = []
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    def __getattr__(self, name):
+        return lambda *args, **kwargs: self.commands.append((name, args, kwargs))
+
+    async def execute(self):
+        return [getattr(self.redis, name)(*args, **kwargs) for name, args, kwargs in self.commands]
+
+
+class FakeRedis:
+    """Minimal stand-in for the list commands the cache uses."""
+
+    def __init__(self):
+        self.lists = {}
+        self.ttls = {}
+
+    def pipeline(self, transaction=True):
+        return FakePipeline(self)
+
+    def rpush(self, key, value):
+        self.lists.setdefault(key, []).append(value)
+        return len(self.lists[key])
+
+    def ltrim(self, key, start, end):
+        self.lists[key] = self.lists.get(key, [])[start:end + 1]
+
+    def expire(self, key, seconds, nx=False):
+        if not (nx and key in self.ttls):
+            self.ttls[key] = seconds
+
+    def lrange(self, key, start, end):
+        return self.lists.get(key, [])[start:end + 1]
+
+    def ttl(self, key):
+        return self.ttls.get(key, -2)
+
+
+class FakeRedisClient:
+    def __init__(self):
+        self.redis = FakeRedis()
+
+    async def get_client(self):
+        return self.redis
+
+
+def reply(text):
+    return {"chinese_content": text, "emotion": "happy"}
+
+
+def test_key_normalizes_text_but_not_context():
+    key = ResponseCache.make_key("Dạy em nói cảm ơn!", "Sư huynh", "Muội muội", 0, "gemini-2.5-pro")
+
+    assert normalize_request_text("  Dạy EM nói,  cảm ơn？ ") == "dạy em nói cảm ơn"
+    assert key == ResponseCache.make_key("dạy em nói cảm ơn", "Sư huynh", "Muội muội", 0, "gemini-2.5-pro")
+    assert key != ResponseCache.make_key("day em noi cam on", "Sư huynh", "Muội muội", 0, "gemini-2.5-pro")
+    assert key != ResponseCache.make_key("Dạy em nói cảm ơn!", "Tỷ tỷ", "Muội muội", 0, "gemini-2.5-pro")
+    assert key != ResponseCache.make_key("Dạy em nói cảm ơn!", "Sư huynh", "Muội muội", 1, "gemini-2.5-pro")
+    assert key != ResponseCache.make_key("Dạy em nói cảm ơn!", "Sư huynh", "Muội muội", 0, "gemini-2.5-flash")
+
+
+@pytest.mark.asyncio
+async def test_collects_variants_then_rotates():
+    cache = ResponseCache(variants=2)
+
+    assert await cache.get("k") is None
+    await cache.add("k", reply("一"))
+    assert await cache.get("k") is None  # Still collecting
+    await cache.add("k", reply("二"))
+    await cache.add("k", reply("三"))  # Ignored, the key is full
+
+    served = [(await cache.get("k"))["chinese_content"] for _ in range(4)]
+    assert served == ["一", "二", "一", "二"]
+
+    # Callers get copies they can mutate
+    (await cache.get("k"))["chinese_content"] = "改"
+    assert {(await cache.get("k"))["chinese_content"] for _ in range(2)} == {"一", "二"}
+    assert cache.stats()["hit_ratio"] == pytest.approx(7 / 9)
+
+
+@pytest.mark.asyncio
+async def test_ttl_entries_and_history_limits(monkeypatch):
+    cache = ResponseCache(variants=1, max_entries=2, ttl=60, max_history=2)
+    for key in ("a", "b", "c"):
+        await cache.add(key, reply(key))
+
+    assert await cache.get("a") is None
+    assert cache.stats()["entries"] == 2
+
+    clock = [1000.0]
+    monkeypatch.setattr("apps.xiaoyue.services.response_cache.time.monotonic", lambda: clock[0])
+    await cache.add("d", reply("d"))
+    clock[0] += 61
+    assert await cache.get("d") is None
+
+    assert cache.cacheable([]) and cache.cacheable([{"role": "assistant"}] * 2)
+    assert not cache.cacheable([{"role": "user"}] * 3)
+    assert not cache.cacheable([], {"summary": "..."})
+    assert cache.stats()["skipped"] == 2
+
+
+@pytest.mark.asyncio
+async def test_redis_tier_is_shared_between_processes():
+    redis_client = FakeRedisClient()
+    worker_a = ResponseCache(variants=2, redis_client=redis_client)
+    worker_b = ResponseCache(variants=2, redis_client=redis_client)
+
+    await worker_a.add("k", reply("一"))
+    await worker_b.add("k", reply("二"))
+
+    assert (await worker_a.get("k"))["chinese_content"] == "一"
+    assert (await worker_b.get("k"))["chinese_content"] == "一"
+    assert redis_client.redis.ttls[ResponseCache.KEY_PREFIX + "k"] == worker_a.ttl
+
+
+@pytest.mark.asyncio
+async def test_agent_serves_cached_replies():
+    replies = iter(["一", "二"])
+    client = FakeGeminiClient(response=lambda model, text: {**DEFAULT_FAKE_RESPONSE, "chinese_content": next(replies)})
+    agent = ChineseTutorAgent(client=client)
+    agent.prompt_cache = None
+    agent.model_router = ModelRouter(escalate_on=())
+    agent.response_cache = ResponseCache(variants=2)
+
+    streamed = []
+    for _ in range(2):
+        async for event in agent.stream_response("Dạy em nói cảm ơn"):
+            streamed.append(event)
+    for _ in range(2):
+        streamed.append({"type": "final", "data": await agent.generate_response("dạy em nói cảm ơn?")})
+
+    finals = [event["data"]["chinese_content"] for event in streamed if event["type"] == "final"]
+    assert finals == ["一", "二", "一", "二"]
+    assert len(client.calls) == 2
+
+    # Replies that needed schema defaults are not kept
+    agent.response_cache = ResponseCache(variants=1)
+    client.response = {"chinese_content": "坏"}
+    await agent.generate_response("你好")
+    assert agent.response_cache.stats()["stored"] == 0
+
+    # Long conversations always go to Gemini
+    history = [{"role": "user", "content": "你好"}] * 3
+    client.response = {**DEFAULT_FAKE_RESPONSE, "chinese_content": "三"}
+    assert (await agent.generate_response("Dạy em nói cảm ơn", conversation_history=history))["chinese_content"] == "三"
@@ -0,0 +1,93 @@
+"""
+Unit tests for strict-then-repair response parsing.
+"""
+
+import json
+import pytest
+from prometheus_client import REGISTRY
+from apps.xiaoyue.fakes import DEFAULT_FAKE_RESPONSE, FakeGeminiClient
+from apps.xiaoyue.services.ai_agent import ChineseTutorAgent
+from apps.xiaoyue.services.response_parser import ResponseParseError, ResponseParser
+
+SCHEMA = ChineseTutorAgent.RESPONSE_SCHEMA
+
+
+def test_valid_json_takes_the_strict_path():
+    parser = ResponseParser(SCHEMA)
+    result = parser.parse(json.dumps(DEFAULT_FAKE_RESPONSE, ensure_ascii=False))
+
+    assert result == DEFAULT_FAKE_RESPONSE
+    assert parser.stats() == {"parsed": 1, "repaired": 0, "failed": 0, "invalid": 0, "repair_rate": 0.0}
+
+
+def test_malformed_json_is_repaired_and_counted():
+    parser = ResponseParser(SCHEMA)
+    text = json.dumps(DEFAULT_FAKE_RESPONSE, ensure_ascii=False)[:-1] + ",}"
+
+    result = parser.parse(text)
+
+    assert result["chinese_content"] == DEFAULT_FAKE_RESPONSE["chinese_content"]
+    assert parser.repaired == 1
+    assert parser.stats()["repair_rate"] == 1.0
+
+
+def test_schema_violations_get_defaults():
+    parser = ResponseParser(SCHEMA)
+    body = dict(DEFAULT_FAKE_RESPONSE, emotion="furious", quiz_list=[{"id": "one"}])
+    del body["pinyin"]
+
+    result = parser.parse(json.dumps(body))
+
+    assert result["emotion"] == "neutral"
+    assert result["pinyin"] == ""
+    # Nested problems are reported, not rewritten
+    assert result["quiz_list"] == [{"id": "one"}]
+    assert parser.invalid == 1
+
+    errors = parser.validate(body)
+    assert "$.quiz_list[0].id: expected integer, got str" in errors
+    assert "$.quiz_list[0].question: missing" in errors
+
+
+def test_null_correction_detail_is_valid():
+    parser = ResponseParser(SCHEMA)
+    assert parser.validate(dict(DEFAULT_FAKE_RESPONSE, correction_detail=None)) == []
+
+
+def test_non_object_reply_fails():
+    parser = ResponseParser(SCHEMA)
+    with pytest.raises(ResponseParseError):
+        parser.parse("")
+    assert parser.failed == 1
+
+
+@pytest.mark.asyncio
+async def test_agent_uses_parser():
+    agent = ChineseTutorAgent(client=FakeGeminiClient(response="not json at all"))
+    agent.prompt_cache = None
+
+    result = await agent.generate_response("你好")
+
+    # Unrecoverable reply (from flash, then again from pro) -> fallback response
+    assert result["chinese_content"]
+    assert agent.response_parser.failed == 2
+
+
+def test_outcomes_exported():
+    def sample(outcome):
+        return REGISTRY.get_sample_value(
+            "xiaoyue_response_parses_total", {"parser": "test", "outcome": outcome}
+        ) or 0
+
+    before = {outcome: sample(outcome) for outcome in ("strict", "repaired", "invalid", "failed")}
+    parser = ResponseParser(SCHEMA, name="test")
+    text = json.dumps(DEFAULT_FAKE_RESPONSE, ensure_ascii=False)
+    parser.parse(text)
+    parser.parse(text[:-1] + ",}")
+    parser.parse(json.dumps(dict(DEFAULT_FAKE_RESPONSE, emotion="furious")))
+    with pytest.raises(ResponseParseError):
+        parser.parse("")
+
+    assert {outcome: sample(outcome) - count for outcome, count in before.items()} == {
+        "strict": 1, "repaired": 1, "invalid": 1, "failed": 1
+    }
@@ -0,0 +1,63 @@
+"""
+Unit tests for the fixed tutor lines and their pre-rendered audio.
+"""
+
+import pytest
+from apps.xiaoyue.services import static_lines
+from apps.xiaoyue.services.static_lines import (
+    get_fallback_response,
+    get_reset_message,
+    get_static_audio,
+    iter_static_lines,
+    prerender_static_audio,
+)
+
+
+@pytest.fixture
+def fake_tts(monkeypatch):
+    calls = []
+
+    async def fake_synthesize(text, voice, rate, volume):
+        calls.append((text, voice))
+        return f"{voice}:{text}".encode("utf-8")
+
+    monkeypatch.setattr(static_lines, "synthesize_speech", fake_synthesize)
+    monkeypatch.setattr(static_lines, "_static_audio", {})
+    return calls
+
+
+def test_reset_and_fallback_lines():
+    assert get_reset_message("Tỷ tỷ", is_sulking=True)["emotion"] == "sad"
+    assert get_reset_message("unknown", is_sulking=False) == get_reset_message("Sư huynh", is_sulking=False)
+
+    fallback = get_fallback_response(sulking_level=3)
+    fallback["quiz_list"].append("mutated")
+    assert fallback["emotion"] == "sulking"
+    assert get_fallback_response(sulking_level=3)["quiz_list"] == []
+    assert get_fallback_response(sulking_level=0)["emotion"] == "concerned"
+
+
+@pytest.mark.asyncio
+async def test_prerender_covers_every_static_line(fake_tts):
+    count = await prerender_static_audio()
+
+    lines = set(iter_static_lines())
+    assert count == len(lines) == 27
+    for text, emotion in lines:
+        assert get_static_audio(text, emotion) is not None
+
+    # Already rendered lines are not synthesized again
+    await prerender_static_audio()
+    assert len(fake_tts) == len(lines)
+
+
+@pytest.mark.asyncio
+async def test_static_audio_matches_voice(fake_tts):
+    await prerender_static_audio()
+    text = get_reset_message("Sư huynh", is_sulking=False)["chinese"]
+
+    audio = get_static_audio(text, "happy")
+    assert audio.audio == f"zh-CN-XiaoxiaoNeural:{text}".encode("utf-8")
+    assert audio.base64 == audio.base64  # computed once, reused
+    assert get_static_audio(text, "happy", custom_voice="zh-CN-YunxiNeural") is None
+    assert get_static_audio("师兄你好", "happy") is None
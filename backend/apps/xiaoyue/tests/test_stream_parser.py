@@ -0,0 +1,68 @@
+"""
+Unit tests for the streaming JSON field parser.
+"""
+
+import json
+from apps.xiaoyue.services.stream_parser import StreamingJSONFieldParser
+
+
+SAMPLE_RESPONSE = {
+    "thought": "Senior brother greeted me",
+    "chinese_content": "师兄~！终于想起我了吗？嘿嘿！",
+    "vietnamese_display": "Sư huynh~! Cuối cùng cũng nhớ đến muội muội à? \"Hehe\"!",
+    "pinyin": "Shī xiōng~! Zhōngyú xiǎngqǐ wǒ le ma? Hēihēi!",
+    "emotion": "cheerful",
+    "action": "quiz",
+    "quiz_list": [{"id": 1, "type": "fill_blank", "question": "chinese_content", "answer": "好"}],
+}
+
+
+def _collect(parser, chunks):
+    collected = {}
+    for chunk in chunks:
+        for field, delta in parser.feed(chunk):
+            collected[field] = collected.get(field, "") + delta
+    return collected
+
+
+def test_single_chunk():
+    """All tracked fields are decoded from a complete document."""
+    parser = StreamingJSONFieldParser()
+    collected = _collect(parser, [json.dumps(SAMPLE_RESPONSE, ensure_ascii=False)])
+
+    assert collected == {
+        "chinese_content": SAMPLE_RESPONSE["chinese_content"],
+        "vietnamese_display": SAMPLE_RESPONSE["vietnamese_display"],
+        "pinyin": SAMPLE_RESPONSE["pinyin"],
+    }
+    assert parser.values["emotion"] == "cheerful"
+    assert "emotion" in parser.completed
+
+
+def test_char_by_char_with_ascii_escapes():
+    """Escapes split across chunks (including \\uXXXX) decode correctly."""
+    raw = json.dumps(SAMPLE_RESPONSE, ensure_ascii=True)
+    parser = StreamingJSONFieldParser()
+    collected = _collect(parser, list(raw))
+
+    assert collected["chinese_content"] == SAMPLE_RESPONSE["chinese_content"]
+    assert collected["vietnamese_display"] == SAMPLE_RESPONSE["vietnamese_display"]
+    assert parser.text == raw
+
+
+def test_nested_strings_are_ignored():
+    """Keys and values inside quiz_list never leak as top-level deltas."""
+    parser = StreamingJSONFieldParser()
+    collected = _collect(parser, [json.dumps(SAMPLE_RESPONSE, ensure_ascii=False)])
+
+    assert "question" not in parser.values
+    assert collected["chinese_content"] != "chinese_content"
+
+
+def test_surrogate_pair():
+    """Emoji encoded as a surrogate pair is reassembled."""
+    raw = json.dumps({"chinese_content": "好😀"}, ensure_ascii=True)
+    parser = StreamingJSONFieldParser()
+    collected = _collect(parser, [raw[:20], raw[20:]])
+
+    assert collected["chinese_content"] == "好😀"
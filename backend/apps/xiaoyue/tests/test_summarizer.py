@@ -0,0 +1,126 @@
+"""
+Unit tests for rolling conversation summarization.
+"""
+
+import json
+import pytest
+from apps.xiaoyue.fakes import FakeGeminiClient
+from apps.xiaoyue.services.ai_agent import ChineseTutorAgent
+from apps.xiaoyue.services.summarizer import ConversationSummarizer
+
+
+class FakeRedisClient:
+    """In-memory stand-in for the summary-related RedisClient methods."""
+
+    def __init__(self, history=None, summary=None):
+        self.history = [json.dumps(m, ensure_ascii=False) for m in history or []]
+        self.summary = summary
+        self.running = False
+
+    async def claim_summary_run(self, user_id):
+        if self.running:
+            return False
+        self.running = True
+        return True
+
+    async def release_summary_run(self, user_id):
+        self.running = False
+
+    async def get_history_length(self, user_id):
+        return len(self.history)
+
+    async def get_history_head(self, user_id, count):
+        return self.history[:count]
+
+    async def get_conversation_summary(self, user_id):
+        return self.summary
+
+    async def get_user_state(self, user_id):
+        return {"user_role": "Tỷ tỷ", "agent_role": "Muội muội"}
+
+    async def fold_into_summary(self, user_id, folded, summary):
+        if self.history[:len(folded)] != folded:
+            return False
+        self.history = self.history[len(folded):]
+        self.summary = summary
+        return True
+
+
+def make_history(turns):
+    history = []
+    for i in range(turns):
+        history.append({"role": "user", "content": f"我想学第{i}课的生词，请给我讲一下。"})
+        history.append({"role": "assistant", "content": f"好的姐姐，第{i}课的生词是：朋友、老师、学生。"})
+    return history
+
+
+@pytest.mark.asyncio
+async def test_oldest_turns_are_folded():
+    client = FakeGeminiClient(response="- Đã học từ vựng bài 0-4")
+    redis_client = FakeRedisClient(history=make_history(8))
+    summarizer = ConversationSummarizer(client, redis_client, "gemini-2.5-flash", trigger_messages=16, keep_messages=8)
+
+    summary = await summarizer.summarize("u1")
+
+    assert summary["text"] == "- Đã học từ vựng bài 0-4"
+    assert summary["messages"] == 8
+    assert summary["source_tokens"] > summary["summary_tokens"]
+    assert len(redis_client.history) == 8
+    assert json.loads(redis_client.history[0])["content"].startswith("我想学第4课")
+    assert not redis_client.running
+
+
+@pytest.mark.asyncio
+async def test_previous_summary_is_merged():
+    prompts = []
+
+    def respond(model, text):
+        prompts.append(text)
+        return "- merged"
+
+    previous = {"text": "- earlier facts", "messages": 8, "source_tokens": 100, "summary_tokens": 20}
+    redis_client = FakeRedisClient(history=make_history(8), summary=previous)
+    summarizer = ConversationSummarizer(FakeGeminiClient(response=respond), redis_client, "gemini-2.5-flash")
+
+    summary = await summarizer.summarize("u1")
+
+    assert "- earlier facts" in prompts[0]
+    assert "Tỷ tỷ" in prompts[0]
+    assert summary["messages"] == 16
+    assert summary["source_tokens"] > 100
+
+
+@pytest.mark.asyncio
+async def test_short_or_busy_history_is_left_alone():
+    client = FakeGeminiClient(response="- x")
+    redis_client = FakeRedisClient(history=make_history(4))
+    summarizer = ConversationSummarizer(client, redis_client, "gemini-2.5-flash", trigger_messages=16)
+    assert await summarizer.summarize("u1") is None
+
+    redis_client = FakeRedisClient(history=make_history(8))
+    redis_client.running = True
+    summarizer = ConversationSummarizer(client, redis_client, "gemini-2.5-flash")
+    assert await summarizer.summarize("u1") is None
+    assert len(redis_client.history) == 16
+    assert not [call for call in client.calls if call[0] == "generate_content"]
+
+
+@pytest.mark.asyncio
+async def test_agent_sends_summary_before_recent_turns():
+    client = FakeGeminiClient()
+    agent = ChineseTutorAgent(client=client)
+    agent.prompt_cache = None
+    summary = {"text": "- Đã học chào hỏi", "messages": 8, "source_tokens": 400, "summary_tokens": 40}
+
+    history, _ = await agent._build_request(
+        user_text="你好",
+        user_role="Sư huynh",
+        agent_role="Muội muội",
+        sulking_level=0,
+        conversation_history=make_history(1),
+        conversation_summary=summary
+    )
+
+    assert "- Đã học chào hỏi" in history[0].parts[0].text
+    assert len(history) == 4
+    assert agent.summary_tokens_saved == 360
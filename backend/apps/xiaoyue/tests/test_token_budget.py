@@ -0,0 +1,97 @@
+"""
+Unit tests for token-budget history packing.
+"""
+
+import asyncio
+import pytest
+from prometheus_client import REGISTRY
+from apps.xiaoyue.fakes import FakeGeminiClient
+from apps.xiaoyue.services.ai_agent import ChineseTutorAgent
+from apps.xiaoyue.services.token_budget import (
+    HistoryPacker,
+    TokenCounter,
+    estimate_tokens,
+    message_tokens,
+)
+from apps.xiaoyue.services.tracing import InMemorySpanExporter, Tracer
+
+
+class FailingModels:
+    async def count_tokens(self, **kwargs):
+        raise RuntimeError("quota exceeded")
+
+
+class FailingClient:
+    class aio:
+        models = FailingModels()
+
+
+def test_estimate_counts_cjk_per_character():
+    assert estimate_tokens("你好吗") == 3
+    assert estimate_tokens("Chào sư huynh") == 4
+    assert estimate_tokens("我叫Lan") == 3
+    assert estimate_tokens("") == 0
+
+
+def test_memoized_count_is_used():
+    assert message_tokens({"role": "user", "content": "你好", "tokens": 50}) == 50
+    assert message_tokens({"role": "user", "content": "你好"}) == 6
+
+
+def test_pack_fills_budget_newest_first():
+    history = [
+        {"role": "user", "content": "old", "tokens": 10},
+        {"role": "assistant", "content": "long", "tokens": 500},
+        {"role": "user", "content": "a", "tokens": 30},
+        {"role": "assistant", "content": "b", "tokens": 30},
+    ]
+    packer = HistoryPacker(budget=100, max_messages=20)
+
+    packed, used, dropped = packer.pack(history)
+
+    # Stops at the long entry even though the older one would still fit
+    assert [m["content"] for m in packed] == ["a", "b"]
+    assert (used, dropped) == (60, 2)
+
+    packed = packer.pack(history, reserved_tokens=50)
+    assert [m["content"] for m in packed.messages] == ["b"]
+
+    packer = HistoryPacker(budget=10_000, max_messages=3)
+    assert len(packer.pack(history).messages) == 3
+
+
+@pytest.mark.asyncio
+async def test_counter_uses_api_and_falls_back():
+    counter = TokenCounter(FakeGeminiClient(), "gemini-2.5-flash", use_api=True)
+    message = await counter.annotate({"role": "user", "content": "师兄，我们今天学什么？"})
+    assert message["tokens"] > 0
+    assert counter.api_counts == 1
+
+    counter = TokenCounter(FailingClient(), "gemini-2.5-flash", use_api=True)
+    message = await counter.annotate({"role": "user", "content": "你好", "tokens": 999})
+    assert message["tokens"] == 6
+    assert counter.estimated_counts == 1
+
+
+@pytest.mark.asyncio
+async def test_agent_records_prompt_tokens_per_turn():
+    exporter = InMemorySpanExporter()
+    agent = ChineseTutorAgent(client=FakeGeminiClient())
+    agent.prompt_cache = None
+    agent.tracer = Tracer([exporter])
+    history = [{"role": "user", "content": "你好" * 10, "tokens": 24}] * 4
+    observed = REGISTRY.get_sample_value("xiaoyue_prompt_history_tokens_sum") or 0
+
+    # Concurrent turns each keep their own numbers
+    await asyncio.gather(
+        agent.generate_response("你好", conversation_history=history),
+        agent.generate_response("你好", conversation_history=history[:1])
+    )
+
+    builds = sorted(
+        (span.attributes["history_messages"], span.attributes["history_tokens"])
+        for span in exporter.spans if span.name == "prompt.build"
+    )
+    assert builds == [(1, 24), (4, 96)]
+    assert all(span.attributes["prompt_tokens"] > 0 for span in exporter.spans if span.name == "gemini.request")
+    assert REGISTRY.get_sample_value("xiaoyue_prompt_history_tokens_sum") == observed + 120
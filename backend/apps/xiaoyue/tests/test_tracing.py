@@ -0,0 +1,79 @@
+"""
+Unit tests for per-turn tracing.
+"""
+
+import pytest
+from apps.xiaoyue.fakes import FakeGeminiClient
+from apps.xiaoyue.services.ai_agent import ChineseTutorAgent
+from apps.xiaoyue.services.tracing import (
+    NOOP_SPAN,
+    STATUS_ERROR,
+    InMemorySpanExporter,
+    Tracer,
+)
+
+
+def test_trace_is_exported_when_root_ends():
+    exporter = InMemorySpanExporter()
+    tracer = Tracer([exporter])
+
+    root = tracer.start_span("ws.chat")
+    with tracer.span("redis.load_context", parent=root) as load:
+        with tracer.span("redis.pipeline"):
+            pass
+    assert not exporter.spans
+
+    root.end()
+    assert exporter.names() == ["redis.pipeline", "redis.load_context", "ws.chat"]
+    inner, load_span, root_span = exporter.spans
+    assert {span.trace_id for span in exporter.spans} == {root.trace_id}
+    assert inner.parent_id == load.span_id
+    assert load_span.parent_id == root.span_id
+    assert root_span.to_dict()["parentSpanId"] == ""
+    assert len(root_span.to_dict()["traceId"]) == 32
+
+
+def test_error_status_and_stragglers():
+    exporter = InMemorySpanExporter()
+    tracer = Tracer([exporter])
+
+    with pytest.raises(ValueError):
+        with tracer.span("ws.chat") as root:
+            late = tracer.start_span("tts.synthesize")
+            raise ValueError("boom")
+    assert root.status == STATUS_ERROR
+    assert exporter.names() == ["ws.chat"]
+
+    # A child ending after its root is exported on its own
+    late.end()
+    assert exporter.names() == ["ws.chat", "tts.synthesize"]
+
+    # ...and later spans start a fresh trace
+    with tracer.span("ws.get_state") as span:
+        assert span.trace_id != root.trace_id
+
+
+def test_disabled_tracer_is_noop():
+    tracer = Tracer()
+    with tracer.span("ws.chat") as span:
+        assert span is NOOP_SPAN
+        assert tracer.start_span("gemini.request") is NOOP_SPAN
+
+
+@pytest.mark.asyncio
+async def test_agent_stream_spans():
+    exporter = InMemorySpanExporter()
+    agent = ChineseTutorAgent(client=FakeGeminiClient(latency=0.01))
+    agent.prompt_cache = None
+    agent.tracer = Tracer([exporter])
+
+    with agent.tracer.span("ws.chat") as root:
+        async for event in agent.stream_response(user_text="你好"):
+            pass
+    assert event["data"]["chinese_content"]
+
+    spans = {span.name: span for span in exporter.spans}
+    assert set(spans) == {"prompt.build", "gemini.ttfb", "gemini.request", "response.parse", "ws.chat"}
+    assert spans["gemini.ttfb"].parent_id == spans["gemini.request"].span_id
+    assert spans["gemini.request"].parent_id == root.span_id
+    assert spans["gemini.ttfb"].duration_ms <= spans["gemini.request"].duration_ms
@@ -0,0 +1,120 @@
+"""
+Unit tests for the TTS audio cache.
+"""
+
+import asyncio
+import pytest
+from apps.xiaoyue.services import tts_handler
+from apps.xiaoyue.services.tts_cache import TTSAudioCache
+
+
+class FakeRedis:
+    """Minimal async stand-in for the redis.asyncio client."""
+
+    def __init__(self):
+        self.data = {}
+
+    async def get(self, key):
+        return self.data.get(key)
+
+    async def set(self, key, value, ex=None):
+        self.data[key] = value
+
+
+class FakeRedisClient:
+    def __init__(self):
+        self.redis = FakeRedis()
+
+    async def get_client(self):
+        return self.redis
+
+
+def test_key_depends_on_all_parameters():
+    """Changing any synthesis parameter changes the key."""
+    base = TTSAudioCache.make_key("你好", "zh-CN-XiaoxiaoNeural", "+0%", "+0%")
+
+    assert base == TTSAudioCache.make_key("你好", "zh-CN-XiaoxiaoNeural", "+0%", "+0%")
+    assert base != TTSAudioCache.make_key("你好", "zh-CN-YunxiNeural", "+0%", "+0%")
+    assert base != TTSAudioCache.make_key("你好", "zh-CN-XiaoxiaoNeural", "+5%", "+0%")
+    assert base != TTSAudioCache.make_key("你好", "zh-CN-XiaoxiaoNeural", "+0%", "+5%")
+
+
+@pytest.mark.asyncio
+async def test_memory_tier_evicts_by_bytes():
+    """The LRU stays under its byte cap and evicts least recently used first."""
+    cache = TTSAudioCache(max_bytes=10)
+
+    await cache.set("a", b"12345")
+    await cache.set("b", b"12345")
+    assert await cache.get("a") == b"12345"  # a is now most recent
+
+    await cache.set("c", b"12345")
+
+    assert await cache.get("b") is None
+    assert await cache.get("a") == b"12345"
+    assert cache.stats()["bytes"] <= 10
+    assert cache.stats()["memory_hits"] == 2
+    assert cache.stats()["misses"] == 1
+
+
+@pytest.mark.asyncio
+async def test_redis_tier_is_shared_between_processes():
+    """A second cache (another worker) hits the Redis tier and promotes it."""
+    redis_client = FakeRedisClient()
+    worker_a = TTSAudioCache(redis_client=redis_client)
+    worker_b = TTSAudioCache(redis_client=redis_client)
+
+    await worker_a.set("k", b"mp3-bytes")
+
+    assert await worker_b.get("k") == b"mp3-bytes"
+    assert worker_b.stats()["redis_hits"] == 1
+    assert await worker_b.get("k") == b"mp3-bytes"
+    assert worker_b.stats()["memory_hits"] == 1
+
+
+@pytest.mark.asyncio
+async def test_synthesize_speech_uses_cache_and_single_flight(monkeypatch):
+    """Repeated and concurrent requests for one utterance hit edge-tts once."""
+    calls = []
+
+    async def fake_edge_tts(text, voice, rate, volume):
+        calls.append(text)
+        await asyncio.sleep(0.01)
+        return b"audio"
+
+    cache = TTSAudioCache()
+    monkeypatch.setattr(tts_handler, "get_tts_cache", lambda: cache)
+    monkeypatch.setattr(tts_handler, "_synthesize_with_edge_tts", fake_edge_tts)
+
+    results = await asyncio.gather(*[tts_handler.synthesize_speech("师兄好") for _ in range(5)])
+    again = await tts_handler.generate_tts_audio("师兄好")
+
+    assert results == [b"audio"] * 5
+    assert again == "YXVkaW8="
+    assert calls == ["师兄好"]
+
+
+@pytest.mark.asyncio
+async def test_cancelled_caller_does_not_cancel_shared_synthesis(monkeypatch):
+    """A learner who disconnects mid-synthesis leaves the others' audio alone."""
+    calls = []
+
+    async def fake_edge_tts(text, voice, rate, volume):
+        calls.append(text)
+        await asyncio.sleep(0.05)
+        return b"audio"
+
+    cache = TTSAudioCache()
+    monkeypatch.setattr(tts_handler, "get_tts_cache", lambda: cache)
+    monkeypatch.setattr(tts_handler, "_synthesize_with_edge_tts", fake_edge_tts)
+
+    first = asyncio.ensure_future(tts_handler.synthesize_speech("师兄好"))
+    await asyncio.sleep(0.01)
+    second = asyncio.ensure_future(tts_handler.synthesize_speech("师兄好"))
+    await asyncio.sleep(0.01)
+    first.cancel()
+
+    assert await second == b"audio"
+    assert first.cancelled()
+    assert calls == ["师兄好"]
+    assert await cache.get(cache.make_key("师兄好", "zh-CN-XiaoxiaoNeural", "+0%", "+0%")) == b"audio"
@@ -0,0 +1,151 @@
+"""
+Unit tests for the sentence-level TTS pipeline.
+"""
+
+import asyncio
+import pytest
+from apps.xiaoyue.services import tts_pipeline
+from apps.xiaoyue.services.tts_pipeline import SentenceSplitter, SentenceTTSPipeline
+
+
+def test_splitter_handles_streamed_text():
+    """Sentences are released once their delimiter run ends."""
+    splitter = SentenceSplitter()
+    sentences = []
+    for piece in ["师兄~", "！终于想起", "我了吗？嘿", "嘿！"]:
+        sentences.extend(splitter.feed(piece))
+
+    assert sentences == ["师兄~！", "终于想起我了吗？"]
+    assert splitter.flush() == "嘿嘿！"
+    assert splitter.flush() is None
+
+
+def test_splitter_without_punctuation():
+    """Text without delimiters is released as one sentence on flush."""
+    splitter = SentenceSplitter()
+    assert splitter.feed("你好") == []
+    assert splitter.flush() == "你好"
+
+
+@pytest.mark.asyncio
+async def test_pipeline_emits_in_order(monkeypatch):
+    """Chunks are emitted in sentence order even if synthesis finishes out of order."""
+    delays = {"一。": 0.05, "二。": 0.0, "三": 0.01}
+    emotions = []
+
+    async def fake_tts(text, emotion="neutral", custom_voice=None):
+        emotions.append(emotion)
+        await asyncio.sleep(delays[text])
+        return f"audio:{text}"
+
+    monkeypatch.setattr(tts_pipeline, "generate_tts_with_emotion", fake_tts)
+
+    chunks = []
+
+    async def on_chunk(chunk):
+        chunks.append(chunk)
+
+    pipeline = SentenceTTSPipeline(on_chunk=on_chunk, emotion="happy")
+    pipeline.feed("一。二")
+    pipeline.feed("。三")
+    count = await pipeline.finish()
+
+    assert count == 3
+    assert [c["seq"] for c in chunks] == [0, 1, 2]
+    assert [c["audio_base64"] for c in chunks] == ["audio:一。", "audio:二。", "audio:三"]
+    assert emotions == ["happy", "happy", "happy"]
+
+
+@pytest.mark.asyncio
+async def test_pipeline_failed_sentence_keeps_sequence(monkeypatch):
+    """A failed sentence still produces a chunk so sequence numbers stay contiguous."""
+    async def fake_tts(text, emotion="neutral", custom_voice=None):
+        if text == "坏。":
+            raise RuntimeError("edge-tts down")
+        return "ok"
+
+    monkeypatch.setattr(tts_pipeline, "generate_tts_with_emotion", fake_tts)
+
+    chunks = []
+
+    async def on_chunk(chunk):
+        chunks.append(chunk)
+
+    pipeline = SentenceTTSPipeline(on_chunk=on_chunk)
+    pipeline.feed("坏。好。")
+    await pipeline.finish()
+
+    assert [(c["seq"], c["audio_base64"]) for c in chunks] == [(0, None), (1, "ok")]
+
+
+@pytest.mark.asyncio
+async def test_pipeline_binary_mode_emits_raw_bytes(monkeypatch):
+    """Binary clients get MP3 bytes without a Base64 round-trip."""
+    async def fake_synthesize(text, emotion="neutral", custom_voice=None):
+        return text.encode("utf-8")
+
+    async def fail_base64(*args, **kwargs):
+        raise AssertionError("Base64 path used in binary mode")
+
+    monkeypatch.setattr(tts_pipeline, "synthesize_with_emotion", fake_synthesize)
+    monkeypatch.setattr(tts_pipeline, "generate_tts_with_emotion", fail_base64)
+
+    chunks = []
+
+    async def on_chunk(chunk):
+        chunks.append(chunk)
+
+    pipeline = SentenceTTSPipeline(on_chunk=on_chunk, binary=True)
+    pipeline.feed("好。")
+    await pipeline.finish()
+
+    assert chunks == [{"seq": 0, "text": "好。", "audio_bytes": "好。".encode("utf-8")}]
+
+
+@pytest.mark.asyncio
+async def test_pipeline_text_filter(monkeypatch):
+    """Filtered sentences are synthesized as filtered; emptied ones are skipped."""
+    spoken = []
+
+    async def fake_tts(text, emotion="neutral", custom_voice=None):
+        spoken.append(text)
+        return "QUJD"
+
+    monkeypatch.setattr(tts_pipeline, "generate_tts_with_emotion", fake_tts)
+
+    chunks = []
+
+    async def on_chunk(chunk):
+        chunks.append(chunk)
+
+    pipeline = SentenceTTSPipeline(
+        on_chunk=on_chunk,
+        text_filter=lambda sentence: "" if sentence.isascii() else sentence
+    )
+    pipeline.feed("Hello! 你好。Hi!")
+    assert await pipeline.finish() == 1
+
+    assert spoken == ["你好。"]
+    assert [chunk["seq"] for chunk in chunks] == [0]
+
+
+@pytest.mark.asyncio
+async def test_pipeline_timeout_emits_without_audio(monkeypatch):
+    """A sentence stuck in edge-tts doesn't hold back the ones after it for long."""
+    async def fake_tts(text, emotion="neutral", custom_voice=None):
+        if text == "慢。":
+            await asyncio.sleep(10)
+        return "ok"
+
+    monkeypatch.setattr(tts_pipeline, "generate_tts_with_emotion", fake_tts)
+
+    chunks = []
+
+    async def on_chunk(chunk):
+        chunks.append(chunk)
+
+    pipeline = SentenceTTSPipeline(on_chunk=on_chunk, timeout=0.05)
+    pipeline.feed("慢。快。")
+    await asyncio.wait_for(pipeline.finish(), 1)
+
+    assert [(c["seq"], c["audio_base64"]) for c in chunks] == [(0, None), (1, "ok")]
@@ -0,0 +1,116 @@
+"""
+Unit tests for the per-connection chat turn scheduler.
+"""
+
+import asyncio
+import pytest
+from apps.xiaoyue.services.turn_scheduler import TurnScheduler
+
+
+@pytest.mark.asyncio
+async def test_turns_run_one_at_a_time_in_order():
+    scheduler = TurnScheduler(max_pending=3)
+    events = []
+
+    def make_turn(name):
+        async def turn():
+            events.append(f"start:{name}")
+            await asyncio.sleep(0.01)
+            events.append(f"end:{name}")
+        return turn
+
+    for name in "abc":
+        assert scheduler.submit(make_turn(name))
+    while scheduler.running or scheduler.pending:
+        await asyncio.sleep(0.01)
+
+    assert events == ["start:a", "end:a", "start:b", "end:b", "start:c", "end:c"]
+
+
+@pytest.mark.asyncio
+async def test_full_queue_rejects_turns():
+    """Beyond the in-flight turn only max_pending turns may wait."""
+    scheduler = TurnScheduler(max_pending=1)
+    release = asyncio.Event()
+
+    async def blocking_turn():
+        await release.wait()
+
+    assert scheduler.submit(blocking_turn)
+    await asyncio.sleep(0)  # worker picks up the first turn
+    assert scheduler.submit(blocking_turn)
+    assert not scheduler.submit(blocking_turn)
+    assert scheduler.rejected == 1
+
+    release.set()
+    await scheduler.cancel()
+
+
+@pytest.mark.asyncio
+async def test_zero_pending_rejects_while_a_turn_runs():
+    """max_pending=0 means no waiting slots, not an unbounded queue."""
+    scheduler = TurnScheduler(max_pending=0)
+    release = asyncio.Event()
+
+    async def blocking_turn():
+        await release.wait()
+
+    assert scheduler.submit(blocking_turn)
+    assert not scheduler.submit(blocking_turn)  # queued, not yet running
+    await asyncio.sleep(0)
+    assert scheduler.running
+    assert not scheduler.submit(blocking_turn)
+    assert (scheduler.accepted, scheduler.rejected) == (1, 2)
+
+    release.set()
+    await asyncio.sleep(0)
+    assert scheduler.submit(blocking_turn)
+    await scheduler.cancel()
+
+
+@pytest.mark.asyncio
+async def test_cancel_stops_in_flight_and_drops_queued_turns():
+    scheduler = TurnScheduler(max_pending=2)
+    started = asyncio.Event()
+    cancelled = []
+    ran = []
+
+    async def slow_turn():
+        started.set()
+        try:
+            await asyncio.sleep(10)
+        except asyncio.CancelledError:
+            cancelled.append(True)
+            raise
+
+    async def queued_turn():
+        ran.append(True)
+
+    scheduler.submit(slow_turn)
+    scheduler.submit(queued_turn)
+    await started.wait()
+    await scheduler.cancel()
+
+    assert cancelled == [True]
+    assert ran == []
+    assert scheduler.pending == 0
+
+
+@pytest.mark.asyncio
+async def test_failed_turn_does_not_stop_the_worker():
+    scheduler = TurnScheduler()
+    ran = []
+
+    async def failing_turn():
+        raise RuntimeError("boom")
+
+    async def next_turn():
+        ran.append(True)
+
+    scheduler.submit(failing_turn)
+    scheduler.submit(next_turn)
+    while scheduler.running or scheduler.pending:
+        await asyncio.sleep(0.01)
+
+    assert ran == [True]
+    await scheduler.cancel()
@@ -1,5 +1,7 @@
 import os
+from django.conf import settings
 from django.core.asgi import get_asgi_application
+from django.urls import path, re_path
 from channels.routing import ProtocolTypeRouter, URLRouter
 from channels.auth import AuthMiddlewareStack
 
@@ -8,10 +10,20 @@ os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'config.settings')
 django_asgi_app = get_asgi_application()
 
 from apps.xiaoyue.routing import websocket_urlpatterns
+from apps.xiaoyue.lifespan import lifespan_app
+from apps.xiaoyue.services.metrics import metrics_asgi_app
+
+# Prometheus scrapes /metrics straight off the ASGI router, outside Django's
+# middleware stack; everything else goes to Django
+http_routes = [re_path(r"", django_asgi_app)]
+if settings.XIAOYUE_METRICS_ENABLED:
+    http_routes.insert(0, path("metrics", metrics_asgi_app()))
 
 application = ProtocolTypeRouter({
 
-    "http": django_asgi_app,
+    "http": URLRouter(http_routes),
+
+    "lifespan": lifespan_app,
 
     "websocket": AuthMiddlewareStack(
         URLRouter(
@@ -12,6 +12,7 @@ https://docs.djangoproject.com/en/5.2/ref/settings/
 
 from pathlib import Path
 import os
+from urllib.parse import quote
 from decouple import config, Csv
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -74,25 +75,169 @@ TEMPLATES = [
 
 WSGI_APPLICATION = 'config.wsgi.application'
 ASGI_APPLICATION = 'config.asgi.application'
+# Redis: the single source for every Redis URL below. REDIS_URL (no database
+# number) overrides REDIS_HOST/REDIS_PORT/REDIS_PASSWORD; each role gets its own
+# logical database so the cache can be flushed without touching chat history.
+# Chat state stays in DB 0, where it lived before the split.
+REDIS_HOST = config("REDIS_HOST", default="127.0.0.1")
+REDIS_PORT = config("REDIS_PORT", default=6379, cast=int)
+REDIS_PASSWORD = config("REDIS_PASSWORD", default="")
+_redis_auth = f":{quote(REDIS_PASSWORD, safe='')}@" if REDIS_PASSWORD else ""
+REDIS_URL = config("REDIS_URL", default=f"redis://{_redis_auth}{REDIS_HOST}:{REDIS_PORT}").rstrip("/")
+REDIS_DATABASES = {
+    # history, user state, summaries, turn locks
+    "state": config("REDIS_STATE_DB", default=0, cast=int),
+    # Django Channels layer
+    "channels": config("REDIS_CHANNELS_DB", default=1, cast=int),
+    # TTS audio, Gemini prompt-cache handles, cluster admission counters
+    "cache": config("REDIS_CACHE_DB", default=2, cast=int),
+    # Celery broker and results
+    "celery": config("REDIS_CELERY_DB", default=3, cast=int),
+}
+REDIS_URLS = {role: f"{REDIS_URL}/{db}" for role, db in REDIS_DATABASES.items()}
+
 CHANNEL_LAYERS = {
     "default": {
         "BACKEND": "channels_redis.core.RedisChannelLayer",
         "CONFIG": {
-            "hosts": [("redis", 6379)],
+            "hosts": [REDIS_URLS["channels"]],
         },
     },
 }
 
 
+# Shared Redis connection pool (per worker process, per event loop, per database)
+REDIS_POOL_MAX_CONNECTIONS = config("REDIS_POOL_MAX_CONNECTIONS", default=50, cast=int)
+REDIS_POOL_TIMEOUT = config("REDIS_POOL_TIMEOUT", default=5, cast=float)
+REDIS_HEALTH_CHECK_INTERVAL = config("REDIS_HEALTH_CHECK_INTERVAL", default=30, cast=int)
 
 # Celery Configuration
-CELERY_BROKER_URL = 'redis://127.0.0.1:6379/0'
-CELERY_RESULT_BACKEND = 'redis://127.0.0.1:6379/0'
+CELERY_BROKER_URL = REDIS_URLS["celery"]
+CELERY_RESULT_BACKEND = REDIS_URLS["celery"]
 CELERY_ACCEPT_CONTENT = ['json']
 CELERY_TASK_SERIALIZER = 'json'
 
 # Google Gemini API
 GOOGLE_API_KEY =config("GOOGLE_API_KEY")
+# Shared keep-alive HTTP pool to the Gemini endpoint (per worker process)
+GEMINI_HTTP_MAX_CONNECTIONS = config("GEMINI_HTTP_MAX_CONNECTIONS", default=100, cast=int)
+GEMINI_HTTP_MAX_KEEPALIVE = config("GEMINI_HTTP_MAX_KEEPALIVE", default=20, cast=int)
+GEMINI_HTTP_KEEPALIVE_EXPIRY = config("GEMINI_HTTP_KEEPALIVE_EXPIRY", default=60, cast=float)
+GEMINI_HTTP_TIMEOUT = config("GEMINI_HTTP_TIMEOUT", default=120, cast=float)
+# Model tiering: each tutoring turn goes to the flash or the pro model. Quiz and
+# correction requests and messages over LONG_MESSAGE_CHARS go to pro, as does
+# every turn while more than FAILURE_THRESHOLD of recent flash replies had problems;
+# a flash reply with a problem listed in ESCALATE_ON (error, schema, language) is
+# redone on pro. Flash thinks only when the learner wrote Chinese (-1 = dynamic)
+XIAOYUE_MODEL_TIERING = config("XIAOYUE_MODEL_TIERING", default=True, cast=bool)
+GEMINI_FLASH_MODEL = config("GEMINI_FLASH_MODEL", default="gemini-2.5-flash")
+GEMINI_PRO_MODEL = config("GEMINI_PRO_MODEL", default="gemini-2.5-pro")
+GEMINI_FLASH_THINKING_BUDGET = config("GEMINI_FLASH_THINKING_BUDGET", default=512, cast=int)
+GEMINI_PRO_THINKING_BUDGET = config("GEMINI_PRO_THINKING_BUDGET", default=2048, cast=int)
+XIAOYUE_TIER_LONG_MESSAGE_CHARS = config("XIAOYUE_TIER_LONG_MESSAGE_CHARS", default=150, cast=int)
+XIAOYUE_TIER_ESCALATE_ON = config("XIAOYUE_TIER_ESCALATE_ON", default="error,schema,language", cast=Csv())
+XIAOYUE_TIER_FAILURE_THRESHOLD = config("XIAOYUE_TIER_FAILURE_THRESHOLD", default=0.3, cast=float)
+# Every Gemini call of a chat turn must finish within TURN_DEADLINE seconds of the
+# turn starting (0 = no deadline); a late turn gets the fallback reply, or the
+# flash reply when only its pro redo was late
+XIAOYUE_TURN_DEADLINE = config("XIAOYUE_TURN_DEADLINE", default=30, cast=float)
+# Hedging: a request still without output after the HEDGE_PERCENTILE latency of
+# the last requests to its model (once it has MIN_SAMPLES, and never sooner than
+# MIN_DELAY seconds) gets a second copy; the first good result wins. HEDGE_TIER
+# "flash" sends the copy of a pro request to flash instead of pro ("same")
+XIAOYUE_HEDGE_ENABLED = config("XIAOYUE_HEDGE_ENABLED", default=True, cast=bool)
+XIAOYUE_HEDGE_PERCENTILE = config("XIAOYUE_HEDGE_PERCENTILE", default=95, cast=float)
+XIAOYUE_HEDGE_MIN_SAMPLES = config("XIAOYUE_HEDGE_MIN_SAMPLES", default=20, cast=int)
+XIAOYUE_HEDGE_MIN_DELAY = config("XIAOYUE_HEDGE_MIN_DELAY", default=1.0, cast=float)
+XIAOYUE_HEDGE_TIER = config("XIAOYUE_HEDGE_TIER", default="same")
+# Upload each role x sulking system prompt once as Gemini cached content
+GEMINI_CONTEXT_CACHE_ENABLED = config("GEMINI_CONTEXT_CACHE_ENABLED", default=True, cast=bool)
+GEMINI_CONTEXT_CACHE_TTL = config("GEMINI_CONTEXT_CACHE_TTL", default=3600, cast=int)
+
+# Admission control for upstream calls (0 = unlimited). Callers queue by
+# priority for up to *_ADMISSION_MAX_WAIT seconds before failing the call.
+GEMINI_MAX_CONCURRENCY = config("GEMINI_MAX_CONCURRENCY", default=32, cast=int)
+GEMINI_RATE_PER_SECOND = config("GEMINI_RATE_PER_SECOND", default=0, cast=float)
+GEMINI_CLUSTER_RATE_PER_SECOND = config("GEMINI_CLUSTER_RATE_PER_SECOND", default=0, cast=int)
+GEMINI_ADMISSION_MAX_WAIT = config("GEMINI_ADMISSION_MAX_WAIT", default=15, cast=float)
+# Pause new Gemini admissions for this long after a 429
+GEMINI_RATE_LIMIT_COOLDOWN = config("GEMINI_RATE_LIMIT_COOLDOWN", default=2, cast=float)
+EDGE_TTS_MAX_CONCURRENCY = config("EDGE_TTS_MAX_CONCURRENCY", default=16, cast=int)
+EDGE_TTS_RATE_PER_SECOND = config("EDGE_TTS_RATE_PER_SECOND", default=0, cast=float)
+EDGE_TTS_CLUSTER_RATE_PER_SECOND = config("EDGE_TTS_CLUSTER_RATE_PER_SECOND", default=0, cast=int)
+EDGE_TTS_ADMISSION_MAX_WAIT = config("EDGE_TTS_ADMISSION_MAX_WAIT", default=10, cast=float)
+
+# XiaoYue chat pipeline
+# Stream Gemini output to the client as "partial" frames while the JSON arrives
+XIAOYUE_STREAM_RESPONSES = config("XIAOYUE_STREAM_RESPONSES", default=True, cast=bool)
+# Synthesize chinese_content sentence by sentence and send ordered "audio_chunk" frames
+XIAOYUE_PIPELINED_TTS = config("XIAOYUE_PIPELINED_TTS", default=True, cast=bool)
+# Without pipelined TTS: send the reply text as soon as it is parsed and push its
+# audio afterwards as an "audio_ready" (or "audio_failed") frame with the message_id
+XIAOYUE_DEFERRED_AUDIO = config("XIAOYUE_DEFERRED_AUDIO", default=True, cast=bool)
+# Seconds one synthesis (a reply, or a sentence when pipelined) may take (0 = no limit)
+XIAOYUE_TTS_TIMEOUT = config("XIAOYUE_TTS_TIMEOUT", default=10, cast=float)
+# Synthesize the fixed reset/fallback/welcome lines once at startup and serve them from memory
+XIAOYUE_PRERENDER_STATIC_AUDIO = config("XIAOYUE_PRERENDER_STATIC_AUDIO", default=True, cast=bool)
+# Allow clients to negotiate binary audio frames (?audio=binary) instead of Base64 in JSON
+XIAOYUE_BINARY_AUDIO = config("XIAOYUE_BINARY_AUDIO", default=True, cast=bool)
+# Per-user turn scheduling: queued turns per connection beyond the in-flight one,
+# and how long a turn waits for the same user's turn on another socket/worker
+XIAOYUE_TURN_QUEUE_SIZE = config("XIAOYUE_TURN_QUEUE_SIZE", default=2, cast=int)
+XIAOYUE_TURN_LOCK_WAIT = config("XIAOYUE_TURN_LOCK_WAIT", default=5, cast=float)
+# Rolling summary: once history holds SUMMARY_TRIGGER messages, a Celery task folds
+# all but the last SUMMARY_KEEP into chat:summary:{user_id} using GEMINI_SUMMARY_MODEL
+XIAOYUE_SUMMARY_ENABLED = config("XIAOYUE_SUMMARY_ENABLED", default=True, cast=bool)
+XIAOYUE_SUMMARY_TRIGGER_MESSAGES = config("XIAOYUE_SUMMARY_TRIGGER_MESSAGES", default=16, cast=int)
+XIAOYUE_SUMMARY_KEEP_MESSAGES = config("XIAOYUE_SUMMARY_KEEP_MESSAGES", default=8, cast=int)
+GEMINI_SUMMARY_MODEL = config("GEMINI_SUMMARY_MODEL", default="gemini-2.5-flash")
+# Prompt tokens available for history (summary included), filled newest-first;
+# COUNT_TOKENS_API measures each new message with Gemini's count_tokens instead of
+# the local CJK/Latin estimate (one extra round-trip per turn)
+XIAOYUE_HISTORY_TOKEN_BUDGET = config("XIAOYUE_HISTORY_TOKEN_BUDGET", default=4000, cast=int)
+XIAOYUE_COUNT_TOKENS_API = config("XIAOYUE_COUNT_TOKENS_API", default=False, cast=bool)
+# What to do when chinese_content is not pure Chinese: "log", "strip" the
+# pinyin/Latin fragments before TTS, or "regenerate" it with GEMINI_LANGUAGE_FIX_MODEL
+XIAOYUE_LANGUAGE_POLICY = config("XIAOYUE_LANGUAGE_POLICY", default="strip")
+GEMINI_LANGUAGE_FIX_MODEL = config("GEMINI_LANGUAGE_FIX_MODEL", default="gemini-2.5-flash")
+# Answer trivial chat intents (greeting, thanks, goodbye, repeat, quiz request) from
+# per-role templates without Gemini. RATE is the share of learners routed (stable
+# per user, 0 = off, for A/B); classifier guesses below THRESHOLD are forwarded
+XIAOYUE_INTENT_ROUTER_RATE = config("XIAOYUE_INTENT_ROUTER_RATE", default=1.0, cast=float)
+XIAOYUE_INTENT_ROUTER_THRESHOLD = config("XIAOYUE_INTENT_ROUTER_THRESHOLD", default=0.8, cast=float)
+XIAOYUE_INTENT_ROUTER_MAX_CHARS = config("XIAOYUE_INTENT_ROUTER_MAX_CHARS", default=40, cast=int)
+# answer_quiz is graded locally; wrong items can get one batched explanation from
+# GEMINI_QUIZ_EXPLANATION_MODEL when the client asks for it ("explain": true)
+XIAOYUE_QUIZ_EXPLANATIONS = config("XIAOYUE_QUIZ_EXPLANATIONS", default=True, cast=bool)
+GEMINI_QUIZ_EXPLANATION_MODEL = config("GEMINI_QUIZ_EXPLANATION_MODEL", default="gemini-2.5-flash")
+# Opt-in reply cache for turns with at most MAX_HISTORY history messages (and no
+# summary), keyed on normalized text + roles + sulking level: each key collects
+# VARIANTS Gemini replies, then lookups rotate through them (memory LRU + Redis)
+XIAOYUE_RESPONSE_CACHE_ENABLED = config("XIAOYUE_RESPONSE_CACHE_ENABLED", default=False, cast=bool)
+XIAOYUE_RESPONSE_CACHE_VARIANTS = config("XIAOYUE_RESPONSE_CACHE_VARIANTS", default=3, cast=int)
+XIAOYUE_RESPONSE_CACHE_MAX_HISTORY = config("XIAOYUE_RESPONSE_CACHE_MAX_HISTORY", default=2, cast=int)
+XIAOYUE_RESPONSE_CACHE_MAX_ENTRIES = config("XIAOYUE_RESPONSE_CACHE_MAX_ENTRIES", default=2000, cast=int)
+XIAOYUE_RESPONSE_CACHE_REDIS = config("XIAOYUE_RESPONSE_CACHE_REDIS", default=True, cast=bool)
+XIAOYUE_RESPONSE_CACHE_TTL = config("XIAOYUE_RESPONSE_CACHE_TTL", default=24 * 60 * 60, cast=int)
+# Content-addressed TTS audio cache: in-process LRU + shared Redis tier
+XIAOYUE_TTS_CACHE_ENABLED = config("XIAOYUE_TTS_CACHE_ENABLED", default=True, cast=bool)
+XIAOYUE_TTS_CACHE_MAX_BYTES = config("XIAOYUE_TTS_CACHE_MAX_BYTES", default=64 * 1024 * 1024, cast=int)
+XIAOYUE_TTS_CACHE_REDIS = config("XIAOYUE_TTS_CACHE_REDIS", default=True, cast=bool)
+XIAOYUE_TTS_CACHE_TTL = config("XIAOYUE_TTS_CACHE_TTL", default=7 * 24 * 60 * 60, cast=int)
+# Per-turn stage tracing (off when empty): "log" prints one latency breakdown per
+# message, "otlp" exports to OTEL_EXPORTER_OTLP_ENDPOINT (needs opentelemetry-sdk
+# and opentelemetry-exporter-otlp-proto-http), "memory" keeps spans in-process
+XIAOYUE_TRACING_EXPORTERS = config("XIAOYUE_TRACING_EXPORTERS", default="", cast=Csv())
+# Prometheus /metrics on the ASGI app; with several uvicorn workers, also set
+# PROMETHEUS_MULTIPROC_DIR to an empty directory shared by all of them
+XIAOYUE_METRICS_ENABLED = config("XIAOYUE_METRICS_ENABLED", default=True, cast=bool)
+# `manage.py serve`: uvicorn workers sharing one listening socket
+UVICORN_WORKERS = config("UVICORN_WORKERS", default=os.cpu_count() or 1, cast=int)
+# Benchmarks only: simulate Gemini and edge-tts with apps.xiaoyue.fakes
+XIAOYUE_FAKE_UPSTREAMS = config("XIAOYUE_FAKE_UPSTREAMS", default=False, cast=bool)
+XIAOYUE_FAKE_GEMINI_LATENCY = config("XIAOYUE_FAKE_GEMINI_LATENCY", default=0.5, cast=float)
+XIAOYUE_FAKE_GEMINI_TOKEN_RATE = config("XIAOYUE_FAKE_GEMINI_TOKEN_RATE", default=200.0, cast=float)
+XIAOYUE_FAKE_TTS_TIME = config("XIAOYUE_FAKE_TTS_TIME", default=0.3, cast=float)
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
 
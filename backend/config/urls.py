@@ -0,0 +1,7 @@
+"""
+URL configuration for the HTTP side of the app.
+The chat runs over WebSockets (apps.xiaoyue.routing) and /metrics is served
+by the ASGI router (config.asgi), so there are no HTTP views yet.
+"""
+
+urlpatterns = []
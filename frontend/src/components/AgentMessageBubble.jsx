@@ -2,13 +2,13 @@ import { useState } from 'react';
 import { CheckCircle2, XCircle, Sparkles, Volume2, Loader2 } from 'lucide-react';
 import useChatStore from '../store/chatStore';
 import { getEmotionDisplay } from '../utils/emotionHelper';
-import { playAudioFromBase64 } from '../utils/audioPlayer';
+import { playAudioClip } from '../utils/audioPlayer';
 
 /**
  * Agent (AI) message bubble with Vietnamese text, pinyin, and interactive features
  */
 const AgentMessageBubble = ({ message }) => {
-  const { openHanziModal, audioVolume } = useChatStore();
+  const { openHanziModal, audioVolume, audioClips } = useChatStore();
   const [quizAnswers, setQuizAnswers] = useState({});
   const [showQuizResults, setShowQuizResults] = useState({});
   const [isPlaying, setIsPlaying] = useState(false);
@@ -21,15 +21,21 @@ const AgentMessageBubble = ({ message }) => {
     correction_detail,
     quiz_list = [],
     audio_base64,
+    audio_id,
+    audio_parts = [],
   } = message;
+  const audioClip = audio_base64 || (audio_id && audioClips[audio_id]);
 
   const emotionDisplay = getEmotionDisplay(emotion);
   const handlePlayAudio = async () => {
-    if (!audio_base64 || isPlaying) return;
+    const clips = audioClip ? [audioClip] : audio_parts;
+    if (clips.length === 0 || isPlaying) return;
     
     setIsPlaying(true);
     try {
-      await playAudioFromBase64(audio_base64, audioVolume);
+      for (const clip of clips) {
+        await playAudioClip(clip, audioVolume);
+      }
     } catch (error) {
       console.error("Lỗi phát audio:", error);
     } finally {
@@ -285,7 +291,7 @@ const AgentMessageBubble = ({ message }) => {
             </div>
 
             {/* --- NÚT PHÁT LẠI MỚI --- */}
-            {audio_base64 && (
+            {(audioClip || audio_parts.length > 0) && (
               <button
                 onClick={handlePlayAudio}
                 disabled={isPlaying}
@@ -7,13 +7,13 @@ import UserMessageBubble from './UserMessageBubble';
  * Main chat message display area
  */
 const ChatWindow = () => {
-  const { messages, isTyping } = useChatStore();
+  const { messages, isTyping, streamingMessage } = useChatStore();
   const messagesEndRef = useRef(null);
 
   // Auto-scroll to bottom when new messages arrive
   useEffect(() => {
     messagesEndRef.current?.scrollIntoView({ behavior: 'smooth' });
-  }, [messages, isTyping]);
+  }, [messages, isTyping, streamingMessage]);
 
   return (
     <div className="flex-1 overflow-y-auto scrollbar-wuxia scroll-shadow p-4 space-y-4">
@@ -60,6 +60,16 @@ const ChatWindow = () => {
           return null;
         })}
 
+        {/* Reply being streamed */}
+        {streamingMessage && (
+          <AgentMessageBubble
+            message={{
+              ...streamingMessage,
+              content: streamingMessage.vietnamese_display || streamingMessage.chinese_content,
+            }}
+          />
+        )}
+
         {/* Typing indicator */}
         {isTyping && (
           <div className="flex items-start gap-3">
@@ -1,7 +1,7 @@
 import { useEffect, useRef, useCallback } from 'react';
 import useWebSocket, { ReadyState } from 'react-use-websocket';
 import useChatStore from '../store/chatStore';
-import { playAudioFromBase64 } from '../utils/audioPlayer';
+import { playAudioClip, decodeAudioFrame } from '../utils/audioPlayer';
 /**
  * Custom hook for WebSocket chat connection and message handling
  */
@@ -26,14 +26,84 @@ const useChat = () => {
   const lastProcessedMessageRef = useRef(null);
 
   // WebSocket connection
-  const WS_URL = `ws://localhost:8000/ws/chat/${userId}/`;
+  // audio=binary: MP3 arrives as binary frames instead of Base64 in JSON
+  const WS_URL = `ws://localhost:8000/ws/chat/${userId}/?audio=binary`;
   
+  // Binary audio frame: header carries audio_id (and seq for sentence chunks)
+  const handleAudioFrame = (buffer) => {
+    let decoded;
+    try {
+      decoded = decodeAudioFrame(buffer);
+    } catch (error) {
+      console.error('Invalid audio frame:', error);
+      return;
+    }
+    const { header, blob } = decoded;
+    const store = useChatStore.getState();
+    if (header.seq !== undefined) {
+      store.attachAudioPart(blob);
+    } else {
+      store.storeAudioClip(header.audio_id, blob);
+    }
+    if (store.audioUnlocked) {
+      store.enqueueAudio(blob);
+    }
+  };
+
+  // "partial" frames arrive in bursts; handle them per message instead of
+  // through lastJsonMessage, which React may batch and drop.
+  const handleRawMessage = useCallback((event) => {
+    if (event.data instanceof ArrayBuffer) {
+      handleAudioFrame(event.data);
+      return;
+    }
+    if (typeof event.data !== 'string') return;
+    let frame;
+    try {
+      frame = JSON.parse(event.data);
+    } catch {
+      return;
+    }
+    const store = useChatStore.getState();
+    if (frame.status === 'partial' && frame.data) {
+      store.appendStreamingDelta(frame.data.field, frame.data.delta);
+    }
+    // The server is redoing the reply on a stronger model
+    if (frame.status === 'partial_reset') {
+      store.discardStreamingMessage();
+    }
+    // Sentence audio arrives in order; queue it so playback starts with
+    // sentence one while later sentences are still being synthesized.
+    if (frame.status === 'audio_chunk' && frame.data?.audio_base64) {
+      store.attachAudioPart(frame.data.audio_base64);
+      if (store.audioUnlocked) {
+        store.enqueueAudio(frame.data.audio_base64);
+      }
+    }
+    // Text was sent first; its audio follows (a binary frame comes after
+    // "audio_ready" when it carries an audio_id)
+    if (frame.status === 'audio_ready' && frame.data) {
+      const { message_id, audio_id, audio_base64 } = frame.data;
+      store.attachDeferredAudio(message_id, { audio_id: audio_id || null, audio_base64 });
+      if (audio_base64 && store.audioUnlocked) {
+        store.enqueueAudio(audio_base64);
+      }
+    }
+    if (frame.status === 'audio_failed') {
+      console.warn('Audio unavailable for message', frame.data?.message_id, frame.data?.reason);
+    }
+  }, []);
+
   const { sendJsonMessage, lastJsonMessage, readyState } = useWebSocket(
     WS_URL,
     {
       shouldReconnect: () => true,
       reconnectInterval: 3000,
       reconnectAttempts: 10,
+      onMessage: handleRawMessage,
+      onOpen: (event) => {
+        event.target.binaryType = 'arraybuffer';
+      },
     }
   );
 
@@ -63,10 +133,10 @@ const useChat = () => {
         isProcessingAudioRef.current = true;
         setIsPlayingAudio(true);
 
-        const audioBase64 = audioQueue[0];
+        const clip = audioQueue[0];
 
         try {
-          await playAudioFromBase64(audioBase64, audioVolume);
+          await playAudioClip(clip, audioVolume);
         } catch (error) {
           console.error('Error playing audio:', error);
         } finally {
@@ -89,6 +159,13 @@ const useChat = () => {
 
     const { status, data, message } = lastJsonMessage;
 
+    // Partial and audio chunk frames are handled in onMessage
+    if (['audio_chunk', 'audio_ready', 'audio_failed', 'partial_reset'].includes(status)) return;
+    if (status === 'partial') {
+      setIsTyping(false);
+      return;
+    }
+
     // Prevent duplicate processing using timestamp + content
     const messageKey = data?.timestamp || lastJsonMessage.timestamp || Date.now();
     if (lastProcessedMessageRef.current === messageKey) {
@@ -103,16 +180,34 @@ const useChat = () => {
       return;
     }
 
+    // Message rejected because a previous turn is still running; keep the
+    // typing indicator of the in-flight turn
+    if (status === 'busy') {
+      addMessage({
+        role: 'system',
+        content: message,
+      });
+      return;
+    }
+
     setIsTyping(false);
 
     // Handle connection message
     if (status === 'connected') {
       console.log('✅ Connected:', message);
+      // Welcome line is pre-rendered on the server
+      if (lastJsonMessage.audio_base64 && audioUnlocked) {
+        enqueueAudio(lastJsonMessage.audio_base64);
+      }
       return;
     }
 
     // Handle success response
     if (status === 'success' && data) {
+      // Final frame replaces any streamed draft
+      const draft = useChatStore.getState().streamingMessage;
+      useChatStore.getState().clearStreamingMessage();
+
       // Update agent emotion state
       if (data.emotion) {
         setAgentState(data.emotion, data.sulking_level);
@@ -133,6 +228,9 @@ const useChat = () => {
         sulking_level: data.sulking_level,
         correction_detail: data.correction_detail || null,
         audio_base64: data.audio_base64,
+        audio_id: data.audio_id || null,
+        message_id: data.message_id || null,
+        audio_parts: draft?.audio_parts || [],
       });
 
       // Queue audio if available
@@ -143,6 +241,7 @@ const useChat = () => {
 
     // Handle error
     if (status === 'error') {
+      useChatStore.getState().clearStreamingMessage();
       console.error('❌ Error from server:', message);
       addMessage({
         role: 'system',
@@ -15,9 +15,12 @@ const useChatStore = create((set) => ({
   
   // Messages
   messages: [],
+  streamingMessage: null, // Agent reply being streamed ("partial" frames)
   
   // Audio state
-  audioQueue: [],
+  audioQueue: [], // Base64 strings or Blobs (binary audio frames)
+  audioClips: {}, // audio_id -> Blob for replies whose audio came as a binary frame
+  deferredAudio: {}, // message_id -> audio fields from an "audio_ready" frame
   isPlayingAudio: false,
   audioUnlocked: false,
   audioVolume: 0.7,
@@ -41,18 +44,77 @@ const useChatStore = create((set) => ({
       id: Date.now() + Math.random(),
       timestamp: new Date().toISOString(),
       ...message,
+      // "audio_ready" may be handled before the reply it belongs to
+      ...(message.message_id && state.deferredAudio[message.message_id]),
     }],
   })),
   
-  clearMessages: () => set({ messages: [] }),
+  clearMessages: () => set({ messages: [], streamingMessage: null, audioClips: {}, deferredAudio: {} }),
+
+  // Streaming reply management
+  appendStreamingDelta: (field, delta) => set((state) => {
+    const current = state.streamingMessage || { role: 'assistant', id: 'streaming' };
+    return {
+      streamingMessage: {
+        ...current,
+        [field]: (current[field] || '') + delta,
+      },
+    };
+  }),
+
+  clearStreamingMessage: () => set({ streamingMessage: null }),
+
+  // The streamed reply is being redone ("partial_reset"): drop it and its
+  // audio that has not started playing
+  discardStreamingMessage: () => set((state) => {
+    const parts = state.streamingMessage?.audio_parts || [];
+    const playing = state.isPlayingAudio ? 1 : 0;
+    return {
+      streamingMessage: null,
+      audioQueue: state.audioQueue.filter((clip, i) => i < playing || !parts.includes(clip)),
+    };
+  }),
+
+  // Attach a sentence-level audio chunk to the reply it belongs to: the
+  // streamed draft if the final frame has not arrived yet, else the latest
+  // assistant message.
+  attachAudioPart: (clip) => set((state) => {
+    if (state.streamingMessage) {
+      const parts = state.streamingMessage.audio_parts || [];
+      return {
+        streamingMessage: { ...state.streamingMessage, audio_parts: [...parts, clip] },
+      };
+    }
+    const messages = [...state.messages];
+    for (let i = messages.length - 1; i >= 0; i--) {
+      if (messages[i].role === 'assistant') {
+        const parts = messages[i].audio_parts || [];
+        messages[i] = { ...messages[i], audio_parts: [...parts, clip] };
+        break;
+      }
+    }
+    return { messages };
+  }),
   
+  // Audio of a reply whose text was sent first ("audio_ready" frame)
+  attachDeferredAudio: (messageId, audio) => set((state) => ({
+    deferredAudio: { ...state.deferredAudio, [messageId]: audio },
+    messages: state.messages.map((message) => (
+      message.message_id === messageId ? { ...message, ...audio } : message
+    )),
+  })),
+
+  storeAudioClip: (audioId, blob) => set((state) => ({
+    audioClips: { ...state.audioClips, [audioId]: blob },
+  })),
+
   setIsConnected: (connected) => set({ isConnected: connected }),
   setAudioVolume: (volume) => set({ audioVolume: volume }),
   setIsTyping: (typing) => set({ isTyping: typing }),
   
   // Audio queue management
-  enqueueAudio: (audioBase64) => set((state) => ({
-    audioQueue: [...state.audioQueue, audioBase64],
+  enqueueAudio: (clip) => set((state) => ({
+    audioQueue: [...state.audioQueue, clip],
   })),
   
   dequeueAudio: () => set((state) => ({
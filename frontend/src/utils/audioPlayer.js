@@ -25,16 +25,6 @@ export const playAudioFromBase64 = async (base64Audio, volume = 1.0) => {
   }
 
   try {
-    // Ensure AudioContext is initialized
-    if (!audioContext) {
-      audioContext = initAudioContext();
-    }
-
-    // Resume context if suspended (browser autoplay policy)
-    if (audioContext.state === 'suspended') {
-      await audioContext.resume();
-    }
-
     // Convert base64 to binary
     const binaryString = atob(base64Audio);
     const bytes = new Uint8Array(binaryString.length);
@@ -42,33 +32,77 @@ export const playAudioFromBase64 = async (base64Audio, volume = 1.0) => {
       bytes[i] = binaryString.charCodeAt(i);
     }
 
-    // Create audio element (simpler approach for MP3)
-    return new Promise((resolve, reject) => {
-      const audio = new Audio();
-      const blob = new Blob([bytes], { type: 'audio/mpeg' });
-      const url = URL.createObjectURL(blob);
-
-      audio.src = url;
-      audio.volume = volume;
-
-      audio.onended = () => {
-        URL.revokeObjectURL(url);
-        resolve();
-      };
-
-      audio.onerror = (error) => {
-        URL.revokeObjectURL(url);
-        reject(error);
-      };
-
-      audio.play().catch(reject);
-    });
+    return playAudioBlob(new Blob([bytes], { type: 'audio/mpeg' }), volume);
   } catch (error) {
     console.error('Error playing audio:', error);
     throw error;
   }
 };
 
+/**
+ * Play an MP3 Blob (e.g. from a binary WebSocket audio frame)
+ * @param {Blob} blob - Audio blob
+ * @returns {Promise<void>}
+ */
+export const playAudioBlob = async (blob, volume = 1.0) => {
+  if (!blob) {
+    throw new Error('No audio data provided');
+  }
+
+  if (!audioContext) {
+    audioContext = initAudioContext();
+  }
+  if (audioContext.state === 'suspended') {
+    await audioContext.resume();
+  }
+
+  // Create audio element (simpler approach for MP3)
+  return new Promise((resolve, reject) => {
+    const audio = new Audio();
+    const url = URL.createObjectURL(blob);
+
+    audio.src = url;
+    audio.volume = volume;
+
+    audio.onended = () => {
+      URL.revokeObjectURL(url);
+      resolve();
+    };
+
+    audio.onerror = (error) => {
+      URL.revokeObjectURL(url);
+      reject(error);
+    };
+
+    audio.play().catch(reject);
+  });
+};
+
+/**
+ * Play a clip that is either a Base64 string or a Blob
+ * @param {string|Blob} clip
+ * @returns {Promise<void>}
+ */
+export const playAudioClip = (clip, volume = 1.0) => (
+  typeof clip === 'string' ? playAudioFromBase64(clip, volume) : playAudioBlob(clip, volume)
+);
+
+/**
+ * Split a binary audio frame into its JSON header and an MP3 Blob.
+ * Layout: [uint16 big-endian header length][UTF-8 JSON header][MP3 bytes]
+ * @param {ArrayBuffer} buffer
+ * @returns {{header: Object, blob: Blob}}
+ */
+export const decodeAudioFrame = (buffer) => {
+  const view = new DataView(buffer);
+  const headerLength = view.getUint16(0);
+  const header = JSON.parse(new TextDecoder().decode(new Uint8Array(buffer, 2, headerLength)));
+  const blob = new Blob([new Uint8Array(buffer, 2 + headerLength)], {
+    type: header.mime || 'audio/mpeg',
+  });
+  return { header, blob };
+};
+
 /**
  * Preload audio from base64 (for smoother playback)
  * @param {string} base64Audio